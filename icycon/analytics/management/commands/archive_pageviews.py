@@ -0,0 +1,15 @@
+from django.core.management.base import BaseCommand
+
+from analytics.services.pageview_archive import archive_pageviews
+
+
+class Command(BaseCommand):
+    help = 'Move PageViews older than the retention window to columnar archive files (run daily, after rollup_pageviews).'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--retention-days', type=int, help='Defaults to ANALYTICS_RAW_RETENTION_DAYS')
+        parser.add_argument('--archive-dir', help='Defaults to ANALYTICS_ARCHIVE_DIR')
+
+    def handle(self, *args, **options):
+        result = archive_pageviews(retention_days=options['retention_days'], directory=options['archive_dir'])
+        self.stdout.write(self.style.SUCCESS(f"{result['rows']:,} page views archived into {result['days']:,} site-day files"))
@@ -0,0 +1,16 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from analytics.services.hit_spool import HitSpool
+
+
+class Command(BaseCommand):
+    help = ("Write PageView hits left in the beacon spool by stopped workers. Segments of running workers "
+            "are skipped. Run it on each host after scaling workers down.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--spool-dir', default=settings.ANALYTICS_SPOOL_DIR)
+
+    def handle(self, *args, **options):
+        written = HitSpool(options['spool_dir'], flush_ms=0).recover()
+        self.stdout.write(self.style.SUCCESS(f'{written:,} page views written'))
@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from analytics.services.rollups import BATCH_SIZE, roll_up
+
+
+class Command(BaseCommand):
+    help = 'Fold PageViews written since the last run into the hourly and daily rollups (run every few minutes).'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=BATCH_SIZE)
+
+    def handle(self, *args, **options):
+        result = roll_up(batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f"{result['rows']:,} page views rolled up, watermark {result['last_id']}"))
@@ -0,0 +1,16 @@
+from django.core.management.base import BaseCommand
+
+from analytics.services.sessions import BATCH_SIZE, sessionize
+
+
+class Command(BaseCommand):
+    help = 'Group PageViews written since the last run into visitor sessions (run every few minutes).'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=BATCH_SIZE)
+
+    def handle(self, *args, **options):
+        result = sessionize(batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(
+            f"{result['rows']:,} page views read, {result['closed']:,} sessions closed, {result['open']:,} open"
+        ))
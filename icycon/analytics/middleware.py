@@ -0,0 +1,85 @@
+import json
+
+from django.conf import settings
+from django.http import HttpResponse, JsonResponse
+
+from .services.beacon import clean_hit, site_for_key
+from .services.hit_spool import HitSpool
+
+MAX_BODY_BYTES = 64 * 1024
+MAX_HITS_PER_REQUEST = 100
+
+
+class BeaconMiddleware:
+    """Accept PageView hits at ``ANALYTICS_BEACON_PATH`` without the rest of the stack.
+
+    Beacons need none of the session, CSRF, auth or tenant work, so the hit is
+    answered here and later middleware never runs for it. Place it right after
+    ``SQLProfilingMiddleware``. Hits are POSTed as JSON, either one hit object
+    or ``{"hits": [...]}``, with the site's beacon key in the body's ``key``
+    or in ``?key=``. The body may be sent as ``text/plain`` (what
+    ``navigator.sendBeacon`` sends with a string), which needs no CORS
+    preflight. Accepted hits are spooled (``analytics.services.hit_spool``) and
+    written to the database in batches.
+
+    Responses: 202 ``{"accepted", "rejected"}``; 400 if no hit is valid; 403
+    for an unknown key; 413 for a body over ``MAX_BODY_BYTES``; 503 with
+    ``Retry-After`` while the spool is backed up.
+
+    Throughput on one core is bound by Django's per-request handling, not by
+    the spool. Measured through the WSGI handler: about 12-13k hits/s with ten
+    hits per request, but only about 4.6k hits/s with one hit per request.
+    The 5k hits/s per worker target therefore holds only for batched beacons;
+    snippets should queue hits and send them in batches.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.path = settings.ANALYTICS_BEACON_PATH
+        self.spool = HitSpool.from_settings()
+
+    def __call__(self, request):
+        if request.path_info != self.path:
+            return self.get_response(request)
+        if request.method == 'OPTIONS':
+            response = HttpResponse(status=204)
+            response['Access-Control-Allow-Methods'] = 'POST'
+            response['Access-Control-Allow-Headers'] = 'Content-Type'
+            response['Access-Control-Max-Age'] = '86400'
+        elif request.method != 'POST':
+            response = HttpResponse(status=405, headers={'Allow': 'POST, OPTIONS'})
+        else:
+            response = self.collect(request)
+        # Any site may send hits; the key decides which ones count
+        response['Access-Control-Allow-Origin'] = '*'
+        return response
+
+    def collect(self, request):
+        try:
+            length = int(request.META.get('CONTENT_LENGTH') or 0)
+        except ValueError:
+            length = 0
+        if length > MAX_BODY_BYTES:
+            return JsonResponse({'error': f'Body over {MAX_BODY_BYTES} bytes'}, status=413)
+        try:
+            body = json.loads(request.body or b'{}')
+        except ValueError:
+            return JsonResponse({'error': 'Body must be JSON'}, status=400)
+        if not isinstance(body, dict):
+            return JsonResponse({'error': 'Body must be a JSON object'}, status=400)
+
+        site = site_for_key(body.get('key') or request.GET.get('key'))
+        if site is None:
+            return JsonResponse({'error': 'Unknown beacon key'}, status=403)
+        hits = body['hits'] if 'hits' in body else [body]
+        if not isinstance(hits, list) or len(hits) > MAX_HITS_PER_REQUEST:
+            return JsonResponse({'error': f'hits must be a list of at most {MAX_HITS_PER_REQUEST}'}, status=400)
+
+        rows = [row for row in (clean_hit(site, hit) for hit in hits) if row is not None]
+        if not rows:
+            return JsonResponse({'error': 'No valid hits'}, status=400)
+        if not self.spool.add(rows):
+            return JsonResponse({'error': 'Busy, retry later'}, status=503, headers={'Retry-After': '1'})
+        # Formatted by hand: JsonResponse's encoder is a measurable share of a beacon request
+        return HttpResponse(f'{{"accepted": {len(rows)}, "rejected": {len(hits) - len(rows)}}}',
+                            content_type='application/json', status=202)
@@ -0,0 +1,35 @@
+# Generated by Django 4.2.23 on 2026-10-18 13:20
+
+from django.db import migrations, models
+
+import analytics.models
+
+
+def fill_beacon_keys(apps, schema_editor):
+    Site = apps.get_model('analytics', 'Site')
+    sites = list(Site.objects.filter(beacon_key__isnull=True).only('pk'))
+    for site in sites:
+        site.beacon_key = analytics.models.new_beacon_key()
+    Site.objects.bulk_update(sites, ['beacon_key'], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('analytics', '0002_pageview_timestamp_default'),
+    ]
+
+    operations = [
+        # Nullable first, so existing sites each get their own key before the unique constraint
+        migrations.AddField(
+            model_name='site',
+            name='beacon_key',
+            field=models.CharField(editable=False, max_length=32, null=True),
+        ),
+        migrations.RunPython(fill_beacon_keys, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name='site',
+            name='beacon_key',
+            field=models.CharField(default=analytics.models.new_beacon_key, editable=False, max_length=32, unique=True),
+        ),
+    ]
@@ -0,0 +1,72 @@
+# Generated by Django 4.2.23 on 2026-10-18 13:17
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('analytics', '0003_site_beacon_key'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DailySiteStats',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField()),
+                ('views', models.PositiveIntegerField(default=0)),
+                ('visitors', models.PositiveIntegerField(default=0, help_text='Distinct visitor ids on this day')),
+                ('bounces', models.PositiveIntegerField(default=0)),
+                ('duration', models.BigIntegerField(default=0, help_text='Summed duration in seconds')),
+            ],
+        ),
+        migrations.CreateModel(
+            name='HourlyPageStats',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('url', models.URLField()),
+                ('hour', models.DateTimeField()),
+                ('views', models.PositiveIntegerField(default=0)),
+                ('visitors', models.PositiveIntegerField(default=0, help_text='Distinct visitor ids in this hour')),
+                ('bounces', models.PositiveIntegerField(default=0)),
+                ('duration', models.BigIntegerField(default=0, help_text='Summed duration in seconds')),
+            ],
+        ),
+        migrations.CreateModel(
+            name='RollupWatermark',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=50, unique=True)),
+                ('last_id', models.BigIntegerField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='pageview',
+            index=models.Index(fields=['site', 'timestamp'], name='analytics_p_site_id_e1d326_idx'),
+        ),
+        migrations.AddField(
+            model_name='hourlypagestats',
+            name='site',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='hourly_page_stats', to='analytics.site'),
+        ),
+        migrations.AddField(
+            model_name='dailysitestats',
+            name='site',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='daily_stats', to='analytics.site'),
+        ),
+        migrations.AddIndex(
+            model_name='hourlypagestats',
+            index=models.Index(fields=['site', 'hour'], name='analytics_h_site_id_2697fb_idx'),
+        ),
+        migrations.AlterUniqueTogether(
+            name='hourlypagestats',
+            unique_together={('site', 'url', 'hour')},
+        ),
+        migrations.AlterUniqueTogether(
+            name='dailysitestats',
+            unique_together={('site', 'day')},
+        ),
+    ]
@@ -0,0 +1,35 @@
+# Generated by Django 4.2.23 on 2026-10-18 13:21
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def reset_rollups(apps, schema_editor):
+    # Rows below the watermark have no sketches yet; the next
+    # rollup_pageviews run rebuilds all rollups with them
+    for name in ('HourlyPageStats', 'DailySiteStats', 'RollupWatermark'):
+        apps.get_model('analytics', name).objects.all().delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('analytics', '0004_pageview_rollups'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='VisitorSketch',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('period', models.CharField(choices=[('hour', 'Hour'), ('day', 'Day')], max_length=4)),
+                ('start', models.DateTimeField()),
+                ('registers', models.BinaryField()),
+                ('site', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='visitor_sketches', to='analytics.site')),
+            ],
+            options={
+                'unique_together': {('site', 'period', 'start')},
+            },
+        ),
+        migrations.RunPython(reset_rollups, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,32 @@
+# Generated by Django 4.2.23 on 2026-10-18 13:51
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('analytics', '0005_visitor_sketches'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='VisitorSession',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('visitor_id', models.CharField(max_length=100)),
+                ('started_at', models.DateTimeField()),
+                ('ended_at', models.DateTimeField(help_text='Time of the last hit')),
+                ('entry_url', models.URLField()),
+                ('exit_url', models.URLField()),
+                ('pages', models.PositiveIntegerField(default=1, help_text='Hits in the session; 1 is a bounce')),
+                ('duration', models.PositiveIntegerField(default=0, help_text='Seconds from the first hit to the end of the last page')),
+                ('closed', models.BooleanField(default=False)),
+                ('site', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='visitor_sessions', to='analytics.site')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['site', 'started_at'], name='analytics_v_site_id_1e761e_idx'), models.Index(fields=['closed', 'ended_at'], name='analytics_v_closed_cfcb9e_idx')],
+            },
+        ),
+    ]
@@ -1,4 +1,14 @@
+import secrets
+
 from django.db import models
+from django.utils import timezone
+
+from tenants.managers import TenantScopedManager
+
+
+def new_beacon_key():
+    return secrets.token_urlsafe(16)
+
 
 class Site(models.Model):
     tenant = models.ForeignKey('tenants.Tenant', on_delete=models.CASCADE)
@@ -6,8 +16,12 @@ class Site(models.Model):
     sitemaps_url = models.URLField(blank=True)
     default_locale = models.CharField(max_length=10, default='en')
     robots_txt = models.TextField(blank=True)
+    # Public key that the tracking beacon sends with hits (see analytics.middleware)
+    beacon_key = models.CharField(max_length=32, unique=True, editable=False, default=new_beacon_key)
     created_at = models.DateTimeField(auto_now_add=True)
 
+    objects = TenantScopedManager()
+
     def __str__(self):
         return self.domain
 
@@ -19,6 +33,8 @@ class KeywordCluster(models.Model):
     terms = models.JSONField(default=list)  # list of keywords
     created_at = models.DateTimeField(auto_now_add=True)
 
+    objects = TenantScopedManager()
+
     def __str__(self):
         return f"{self.intent} ({self.locale})"
 
@@ -41,6 +57,8 @@ class ContentItem(models.Model):
     json_ld = models.TextField(blank=True)
     created_at = models.DateTimeField(auto_now_add=True)
 
+    objects = TenantScopedManager()
+
     def __str__(self):
         return f"{self.type}: {self.url}"
 
@@ -52,6 +70,8 @@ class FAQ(models.Model):
     source_urls = models.JSONField(default=list)
     created_at = models.DateTimeField(auto_now_add=True)
 
+    objects = TenantScopedManager()
+
     def __str__(self):
         return self.question
 
@@ -60,10 +80,98 @@ class PageView(models.Model):
     site = models.ForeignKey(Site, on_delete=models.CASCADE)
     url = models.URLField()
     visitor_id = models.CharField(max_length=100)
-    timestamp = models.DateTimeField(auto_now_add=True)
+    timestamp = models.DateTimeField(default=timezone.now)
     duration = models.IntegerField(default=0)  # Duration in seconds
     bounce = models.BooleanField(default=True)
     referrer = models.URLField(blank=True, null=True)
 
+    class Meta:
+        indexes = [models.Index(fields=['site', 'timestamp'])]
+
+    def __str__(self):
+        return f"{self.url} ({self.timestamp})"
+
+
+# PageView rollups, maintained by analytics.services.rollups
+class HourlyPageStats(models.Model):
+    """PageViews of one URL of a site in one UTC hour."""
+    site = models.ForeignKey(Site, on_delete=models.CASCADE, related_name='hourly_page_stats')
+    url = models.URLField()
+    hour = models.DateTimeField()
+    views = models.PositiveIntegerField(default=0)
+    visitors = models.PositiveIntegerField(default=0, help_text="Distinct visitor ids in this hour")
+    bounces = models.PositiveIntegerField(default=0)
+    duration = models.BigIntegerField(default=0, help_text="Summed duration in seconds")
+
+    class Meta:
+        unique_together = ('site', 'url', 'hour')
+        indexes = [models.Index(fields=['site', 'hour'])]
+
+    def __str__(self):
+        return f"{self.url} @ {self.hour:%Y-%m-%d %H}:00: {self.views} views"
+
+
+class DailySiteStats(models.Model):
+    """PageViews of a site in one UTC day."""
+    site = models.ForeignKey(Site, on_delete=models.CASCADE, related_name='daily_stats')
+    day = models.DateField()
+    views = models.PositiveIntegerField(default=0)
+    visitors = models.PositiveIntegerField(default=0, help_text="Distinct visitor ids on this day")
+    bounces = models.PositiveIntegerField(default=0)
+    duration = models.BigIntegerField(default=0, help_text="Summed duration in seconds")
+
+    class Meta:
+        unique_together = ('site', 'day')
+
+    def __str__(self):
+        return f"{self.site_id} @ {self.day}: {self.views} views"
+
+
+class RollupWatermark(models.Model):
+    """Highest PageView id a rollup has processed."""
+    name = models.CharField(max_length=50, unique=True)
+    last_id = models.BigIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.name}: {self.last_id}"
+
+class VisitorSketch(models.Model):
+    """HyperLogLog sketch of a site's visitor ids in one UTC hour or day (see analytics.services.hll)."""
+    HOUR = 'hour'
+    DAY = 'day'
+    PERIOD_CHOICES = [(HOUR, 'Hour'), (DAY, 'Day')]
+
+    site = models.ForeignKey(Site, on_delete=models.CASCADE, related_name='visitor_sketches')
+    period = models.CharField(max_length=4, choices=PERIOD_CHOICES)
+    start = models.DateTimeField()
+    registers = models.BinaryField()
+
+    class Meta:
+        unique_together = ('site', 'period', 'start')
+
+    def __str__(self):
+        return f"{self.site_id} {self.period} @ {self.start:%Y-%m-%d %H}:00"
+
+
+class VisitorSession(models.Model):
+    """A visitor's hits on a site with no gap longer than the session timeout (see analytics.services.sessions)."""
+    site = models.ForeignKey(Site, on_delete=models.CASCADE, related_name='visitor_sessions')
+    visitor_id = models.CharField(max_length=100)
+    started_at = models.DateTimeField()
+    ended_at = models.DateTimeField(help_text="Time of the last hit")
+    entry_url = models.URLField()
+    exit_url = models.URLField()
+    pages = models.PositiveIntegerField(default=1, help_text="Hits in the session; 1 is a bounce")
+    duration = models.PositiveIntegerField(default=0, help_text="Seconds from the first hit to the end of the last page")
+    # Open sessions may still grow; sessionize closes them after the timeout
+    closed = models.BooleanField(default=False)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['site', 'started_at']),
+            models.Index(fields=['closed', 'ended_at']),
+        ]
+
     def __str__(self):
-        return f"{self.url} ({self.timestamp})"
\ No newline at end of file
+        return f"{self.visitor_id} @ {self.started_at:%Y-%m-%d %H:%M}: {self.pages} pages"
@@ -0,0 +1,137 @@
+"""
+Validation of PageView beacon hits.
+
+The tracking snippet posts hits with its site's public ``beacon_key``.
+``site_for_key`` resolves the key to the site, caching it in the process, so
+a busy worker does not query per request. The endpoint is public, so the
+cache is bounded and only well-formed keys are looked up, at most
+``KEY_LOOKUPS_PER_SECOND`` times a second. ``clean_hit`` checks one hit
+against the site and ``PageView``'s columns. It returns the compact row the
+spool stores, or None if the hit is invalid:
+
+    [site_id, url, visitor_id, unix timestamp, duration, bounce, referrer]
+
+Hits must be for a page on the site's host or one of its subdomains. This
+stops a key copied from one site's pages from recording views of another.
+"""
+
+import math
+import re
+import threading
+import time
+from collections import OrderedDict
+from urllib.parse import urlsplit
+
+from analytics.models import PageView, Site
+
+KEY_CACHE_SECONDS = 60
+# Keys remembered per process, unknown ones included; the least recently used go first
+KEY_CACHE_SIZE = 10000
+# Past this, expired keys are served from the cache and keys not in it are refused
+KEY_LOOKUPS_PER_SECOND = 50
+# What new_beacon_key() generates: secrets.token_urlsafe(16)
+KEY_PATTERN = re.compile(r'[A-Za-z0-9_-]{22}')
+# Client clocks drift; hits queued offline may arrive late
+MAX_CLOCK_SKEW_SECONDS = 300
+MAX_HIT_AGE_SECONDS = 24 * 3600
+MAX_DURATION_SECONDS = 24 * 3600
+
+URL_MAX_LENGTH = PageView._meta.get_field('url').max_length
+VISITOR_MAX_LENGTH = PageView._meta.get_field('visitor_id').max_length
+REFERRER_MAX_LENGTH = PageView._meta.get_field('referrer').max_length
+
+_keys = OrderedDict()
+_keys_lock = threading.Lock()
+# [start of the current one-second window, lookups made in it]
+_lookups = [0.0, 0]
+
+
+def site_host(domain):
+    """Lowercase host of a site's ``domain`` (a URL or a bare host), without ``www.``."""
+    host = urlsplit(domain if '//' in domain else f'//{domain}').hostname or ''
+    return host[4:] if host.startswith('www.') else host
+
+
+def clear_key_cache():
+    with _keys_lock:
+        _keys.clear()
+        _lookups[:] = [0.0, 0]
+
+
+def _may_look_up(now):
+    with _keys_lock:
+        if now - _lookups[0] >= 1:
+            _lookups[:] = [now, 0]
+        _lookups[1] += 1
+        return _lookups[1] <= KEY_LOOKUPS_PER_SECOND
+
+
+def site_for_key(key):
+    """``(site_id, host)`` of the site with beacon ``key``, or None."""
+    if not isinstance(key, str) or not KEY_PATTERN.fullmatch(key):
+        return None
+    now = time.monotonic()
+    with _keys_lock:
+        cached = _keys.get(key)
+        if cached is not None:
+            _keys.move_to_end(key)
+    if cached is not None and cached[0] >= now:
+        return cached[1]
+    if not _may_look_up(now):
+        return cached[1] if cached is not None else None
+    row = Site.objects.filter(beacon_key=key).values_list('pk', 'domain').first()
+    site = (row[0], site_host(row[1])) if row else None
+    with _keys_lock:
+        _keys[key] = (now + KEY_CACHE_SECONDS, site)
+        _keys.move_to_end(key)
+        while len(_keys) > KEY_CACHE_SIZE:
+            _keys.popitem(last=False)
+    return site
+
+
+def _page_url(value, host, max_length):
+    if not isinstance(value, str) or not value or len(value) > max_length:
+        return None
+    try:
+        parts = urlsplit(value)
+        page_host = parts.hostname or ''
+    except ValueError:
+        return None
+    if parts.scheme not in ('http', 'https'):
+        return None
+    if host is not None:
+        page_host = page_host[4:] if page_host.startswith('www.') else page_host
+        if page_host != host and not page_host.endswith(f'.{host}'):
+            return None
+    return value
+
+
+def clean_hit(site, hit, now=None):
+    """The spool row for ``hit`` (a decoded JSON object) on ``site`` from ``site_for_key``, or None."""
+    if not isinstance(hit, dict):
+        return None
+    site_id, host = site
+    url = _page_url(hit.get('url'), host, URL_MAX_LENGTH)
+    visitor_id = hit.get('visitor_id')
+    if url is None or not isinstance(visitor_id, str) or not 0 < len(visitor_id) <= VISITOR_MAX_LENGTH:
+        return None
+
+    now = now or time.time()
+    timestamp = hit.get('ts', now * 1000)
+    # json.loads accepts NaN and Infinity
+    if not isinstance(timestamp, (int, float)) or isinstance(timestamp, bool) or not math.isfinite(timestamp):
+        return None
+    # Milliseconds, as from Date.now(); hits from the future are clamped to now
+    timestamp = min(timestamp / 1000, now)
+    if timestamp < now - MAX_HIT_AGE_SECONDS - MAX_CLOCK_SKEW_SECONDS:
+        return None
+
+    duration = hit.get('duration', 0)
+    if not isinstance(duration, int) or isinstance(duration, bool) or not 0 <= duration <= MAX_DURATION_SECONDS:
+        return None
+    bounce = hit.get('bounce', True)
+    if not isinstance(bounce, bool):
+        return None
+    # Referrers are optional; app or other non-web referrers are dropped, not the hit
+    referrer = _page_url(hit.get('referrer'), None, REFERRER_MAX_LENGTH)
+    return [site_id, url, visitor_id, timestamp, duration, bounce, referrer]
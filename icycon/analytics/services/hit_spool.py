@@ -0,0 +1,260 @@
+"""
+Durable in-process buffer of PageView hits.
+
+``HitSpool.add`` appends rows (see ``beacon.clean_hit``) as JSON lines to
+the worker's open segment file and keeps them in memory. The beacon answers
+only after that write. A flusher writes a segment's rows with one
+``bulk_create`` once it holds ``batch_size`` rows or is ``flush_ms`` old. It
+runs on a background thread, or inline when ``flush_ms`` is 0. The segment
+file is deleted only after its rows are committed.
+
+A worker holds an exclusive ``flock`` on each of its segment files until it
+deletes them. When a worker dies, the lock goes with it. ``recover`` replays
+every unlocked segment left in the directory. It runs on the flusher thread
+when a spool starts, never inside a request, and from ``manage.py
+flush_pageview_spool`` (the only way with ``flush_ms`` 0). Delivery is
+therefore at least once: a crash between the commit and the unlink replays
+that segment. A segment that cannot be decoded is renamed to ``*.corrupt``
+and left for inspection; a row that cannot be converted to a PageView is
+logged and dropped, so neither stops the rows behind it.
+
+Backpressure: ``add`` refuses hits while ``max_pending`` rows are spooled but
+not yet written, e.g. while the database is down, or when no segment file
+can be opened. The beacon then answers 503. While a segment fails to write,
+new hits go on being appended to the open segment rather than to new files,
+so an outage holds at most two segment files open.
+"""
+
+import atexit
+import fcntl
+import json
+import logging
+import os
+import threading
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+
+from django.conf import settings
+from django.db import DatabaseError, IntegrityError, close_old_connections, transaction
+
+from analytics.models import PageView, Site
+
+logger = logging.getLogger(__name__)
+
+SEGMENT_SUFFIX = '.hits'
+CORRUPT_SUFFIX = '.corrupt'
+
+
+def _page_view(row):
+    site_id, url, visitor_id, timestamp, duration, bounce, referrer = row
+    return PageView(site_id=site_id, url=url, visitor_id=visitor_id,
+                    timestamp=datetime.fromtimestamp(timestamp, timezone.utc),
+                    duration=duration, bounce=bounce, referrer=referrer)
+
+
+def _page_views(rows):
+    views = []
+    for row in rows:
+        try:
+            views.append(_page_view(row))
+        except (TypeError, ValueError, OverflowError, OSError):
+            # E.g. spooled before clean_hit checked it; it must not hold up the rows behind it
+            logger.warning('Dropping spooled page view that cannot be converted: %r', row)
+    return views
+
+
+def write_rows(rows, batch_size=1000):
+    """Insert spooled rows as PageViews in one transaction; returns rows written.
+
+    Rows that cannot be converted, and rows of sites deleted since the hit was
+    accepted, are dropped.
+    """
+    views = _page_views(rows)
+    try:
+        with transaction.atomic():
+            PageView.objects.bulk_create(views, batch_size=batch_size)
+    except IntegrityError:
+        live = set(Site.objects.filter(pk__in={view.site_id for view in views}).values_list('pk', flat=True))
+        views = [view for view in views if view.site_id in live]
+        with transaction.atomic():
+            PageView.objects.bulk_create(views, batch_size=batch_size)
+    return len(views)
+
+
+class _Segment:
+    """A spool file, locked by this process until its rows are written."""
+
+    def __init__(self, path, file):
+        self.path = path
+        self.file = file
+        self.rows = []
+        self.opened = time.monotonic()
+
+    def discard(self):
+        os.unlink(self.path)
+        self.file.close()
+
+
+class HitSpool:
+    def __init__(self, directory, batch_size=1000, flush_ms=500, max_pending=100_000, fsync=False):
+        self.directory = Path(directory)
+        self.batch_size = batch_size
+        self.flush_ms = flush_ms
+        self.max_pending = max_pending
+        self.fsync = fsync
+        self._lock = threading.Lock()
+        # Serialises flushes, so segments are written in order and once
+        self._flush_lock = threading.Lock()
+        self._wake = threading.Event()
+        self._open = None
+        self._sealed = []
+        self._sequence = 0
+        self._pid = None
+        self._thread = None
+
+    @classmethod
+    def from_settings(cls):
+        return cls(
+            settings.ANALYTICS_SPOOL_DIR,
+            batch_size=settings.ANALYTICS_BEACON_BATCH_SIZE,
+            flush_ms=settings.ANALYTICS_BEACON_FLUSH_MS,
+            max_pending=settings.ANALYTICS_BEACON_MAX_PENDING,
+            fsync=settings.ANALYTICS_SPOOL_FSYNC,
+        )
+
+    @property
+    def pending(self):
+        """Rows spooled but not yet written."""
+        return sum(len(segment.rows) for segment in self._sealed) + (len(self._open.rows) if self._open else 0)
+
+    def add(self, rows):
+        """Spool ``rows``; False (nothing spooled) while the backlog is at ``max_pending``."""
+        self._start()
+        with self._lock:
+            if self.pending + len(rows) > self.max_pending:
+                return False
+            try:
+                segment = self._open or self._new_segment()
+            except OSError:
+                logger.exception('Could not open a page view spool segment')
+                return False
+            # Unbuffered: one write() per request puts the rows in the OS page cache
+            segment.file.write(''.join(json.dumps(row, separators=(',', ':')) + '\n' for row in rows).encode())
+            if self.fsync:
+                os.fsync(segment.file.fileno())
+            segment.rows.extend(rows)
+            full = len(segment.rows) >= self.batch_size
+        if full:
+            if self.flush_ms:
+                self._wake.set()
+            else:
+                self.flush()
+        return True
+
+    def flush(self):
+        """Write every spooled row now; returns rows written.
+
+        Segments that fail to write stay spooled and are retried on the next flush.
+        The open segment is sealed only once the ones before it are written.
+        """
+        written = 0
+        sealed_open = False
+        with self._flush_lock:
+            while True:
+                with self._lock:
+                    if not self._sealed and not sealed_open and self._open is not None:
+                        self._sealed.append(self._open)
+                        self._open = None
+                        sealed_open = True
+                    if not self._sealed:
+                        break
+                    segment = self._sealed[0]
+                try:
+                    written += write_rows(segment.rows, self.batch_size)
+                except DatabaseError:
+                    logger.exception('Could not write %d spooled page views; will retry', len(segment.rows))
+                    close_old_connections()
+                    break
+                segment.discard()
+                with self._lock:
+                    self._sealed.pop(0)
+        return written
+
+    def recover(self):
+        """Write the segments of dead workers left in the directory; returns rows written."""
+        written = 0
+        for path in sorted(self.directory.glob(f'*{SEGMENT_SUFFIX}')):
+            try:
+                file = open(path, 'rb')
+            except FileNotFoundError:
+                continue
+            with file:
+                try:
+                    fcntl.flock(file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                except BlockingIOError:
+                    continue
+                # Another worker may have replayed and deleted it since we opened it
+                if os.fstat(file.fileno()).st_nlink == 0:
+                    continue
+                try:
+                    rows = [json.loads(line) for line in file if line.endswith(b'\n')]
+                except ValueError:
+                    logger.error('Spooled page views in %s cannot be decoded; moved aside as %s', path, CORRUPT_SUFFIX)
+                    os.rename(path, path.with_suffix(CORRUPT_SUFFIX))
+                    continue
+                written += write_rows(rows, self.batch_size)
+                os.unlink(path)
+        return written
+
+    def close(self):
+        """Flush and stop the background flusher."""
+        thread, self._thread = self._thread, None
+        if thread is not None:
+            self._wake.set()
+            thread.join()
+        self.flush()
+
+    def _new_segment(self):
+        self._sequence += 1
+        path = self.directory / f'{os.getpid()}-{time.time_ns()}-{self._sequence}{SEGMENT_SUFFIX}'
+        file = open(path, 'xb', buffering=0)
+        fcntl.flock(file, fcntl.LOCK_EX)
+        self._open = _Segment(path, file)
+        return self._open
+
+    def _start(self):
+        # Per process: a forked worker starts its own flusher and recovery
+        if self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._pid == os.getpid():
+                return
+            self._pid = os.getpid()
+            self._open, self._sealed = None, []
+            self.directory.mkdir(parents=True, exist_ok=True)
+            if self.flush_ms:
+                self._thread = threading.Thread(target=self._run, name='pageview-spool', daemon=True)
+                self._thread.start()
+                atexit.register(self.close)
+
+    def _run(self):
+        recovered = False
+        while self._thread is threading.current_thread():
+            self._wake.wait(self.flush_ms / 1000)
+            self._wake.clear()
+            # Whatever goes wrong, the flusher must keep running or the spool backs up into 503s
+            try:
+                if not recovered:
+                    self.recover()
+                    recovered = True
+                with self._lock:
+                    due = self._open is not None and (
+                        len(self._open.rows) >= self.batch_size
+                        or time.monotonic() - self._open.opened >= self.flush_ms / 1000
+                    )
+                if due or self._sealed:
+                    self.flush()
+            except Exception:
+                logger.exception('Page view spool flusher failed; will retry')
+            close_old_connections()
@@ -0,0 +1,242 @@
+"""
+Columnar cold storage of raw PageViews.
+
+``archive_pageviews`` (``manage.py archive_pageviews`` or
+``archive_pageviews_task``, run daily) moves PageViews older than
+``ANALYTICS_RAW_RETENTION_DAYS`` into one file per site and UTC day under
+``ANALYTICS_ARCHIVE_DIR``, then deletes them from the table in batches. Only
+rows both the rollups and the sessionizer have read (ids up to both of their
+watermarks) are moved, so stats, visitor sketches and sessions are
+unaffected.
+
+A file holds a day's rows in time order, one zlib-compressed column each:
+ids and timestamps (microseconds) as int64 deltas, ``url``, ``visitor_id``
+and ``referrer`` as a dictionary of distinct values plus uint32 codes,
+``duration`` as int32 and ``bounce`` as one byte per row. The file is
+written to a temporary name and renamed into place, and rows are deleted
+only after that. A rerun after a crash merges the rows still in the table
+into the existing file by id, so nothing is lost or stored twice.
+
+``ArchivedDay`` memory-maps a file and decodes only the columns a report
+asks for; ``scan`` reads a site's files over a range of days.
+"""
+
+import json
+import mmap
+import os
+import struct
+import sys
+import zlib
+from array import array
+from collections import Counter
+from datetime import date, datetime, time, timedelta, timezone
+from itertools import accumulate
+from pathlib import Path
+
+from django.conf import settings
+from django.db import router
+from django.db.models import Min
+
+from analytics.models import PageView, Site
+
+from . import rollups, sessions
+
+COLUMNS = ('id', 'timestamp', 'url', 'visitor_id', 'duration', 'bounce', 'referrer')
+DICTIONARY_COLUMNS = ('url', 'visitor_id', 'referrer')
+DELETE_BATCH_SIZE = 5000
+SUFFIX = '.pvc'
+
+MAGIC = b'PVC1'
+_HEADER_LENGTH = struct.Struct('<I')
+_EPOCH = datetime(1970, 1, 1, tzinfo=timezone.utc)
+_MICROSECOND = timedelta(microseconds=1)
+_DAY = timedelta(days=1)
+
+
+def _array_bytes(typecode, values):
+    values = array(typecode, values)
+    if sys.byteorder == 'big':
+        values.byteswap()
+    return values.tobytes()
+
+
+def _array(typecode, data):
+    values = array(typecode)
+    values.frombytes(data)
+    if sys.byteorder == 'big':
+        values.byteswap()
+    return values
+
+
+def _deltas(values):
+    return [value - previous for previous, value in zip([0, *values], values)]
+
+
+def _dictionary(values):
+    """``(distinct values in first-seen order, uint32 code of each value)``."""
+    dictionary = {}
+    codes = [dictionary.setdefault(value, len(dictionary)) for value in values]
+    return list(dictionary), codes
+
+
+def day_path(site_id, day, directory=None):
+    return Path(directory or settings.ANALYTICS_ARCHIVE_DIR) / str(site_id) / f'{day.isoformat()}{SUFFIX}'
+
+
+def write_day(path, rows):
+    """Write ``rows`` (tuples of ``COLUMNS``, in time order) as an archive file, atomically."""
+    ids, stamps, urls, visitors, durations, bounces, referrers = zip(*rows)
+    blobs = {
+        'id': _array_bytes('q', _deltas(ids)),
+        'timestamp': _array_bytes('q', _deltas([(stamp - _EPOCH) // _MICROSECOND for stamp in stamps])),
+        'duration': _array_bytes('i', durations),
+        'bounce': bytes(bounces),
+    }
+    for name, values in zip(DICTIONARY_COLUMNS, (urls, visitors, referrers)):
+        dictionary, codes = _dictionary(values)
+        blobs[f'{name}.dictionary'] = json.dumps(dictionary, separators=(',', ':')).encode()
+        blobs[name] = _array_bytes('I', codes)
+
+    columns, offset = {}, 0
+    for name, blob in blobs.items():
+        blobs[name] = blob = zlib.compress(blob)
+        columns[name] = [offset, len(blob)]
+        offset += len(blob)
+    header = json.dumps({'rows': len(ids), 'columns': columns}, separators=(',', ':')).encode()
+
+    path.parent.mkdir(parents=True, exist_ok=True)
+    temporary = path.with_suffix('.tmp')
+    with open(temporary, 'wb') as file:
+        file.write(MAGIC + _HEADER_LENGTH.pack(len(header)) + header)
+        for blob in blobs.values():
+            file.write(blob)
+        file.flush()
+        os.fsync(file.fileno())
+    os.replace(temporary, path)
+
+
+class ArchivedDay:
+    """A memory-mapped archive file; columns are decoded on first use."""
+
+    def __init__(self, path):
+        with open(path, 'rb') as file:
+            self._map = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+        if self._map[:len(MAGIC)] != MAGIC:
+            self._map.close()
+            raise ValueError(f'{path} is not a PageView archive')
+        start = len(MAGIC) + _HEADER_LENGTH.size
+        (length,) = _HEADER_LENGTH.unpack_from(self._map, len(MAGIC))
+        header = json.loads(self._map[start:start + length])
+        self.rows = header['rows']
+        self._columns = header['columns']
+        self._data = start + length
+        self._decoded = {}
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def __len__(self):
+        return self.rows
+
+    def close(self):
+        self._map.close()
+
+    def _blob(self, name):
+        offset, length = self._columns[name]
+        return zlib.decompress(self._map[self._data + offset:self._data + offset + length])
+
+    def codes(self, name):
+        """``(dictionary, codes)`` of a dictionary column, without building its values."""
+        return json.loads(self._blob(f'{name}.dictionary')), _array('I', self._blob(name))
+
+    def column(self, name):
+        """The values of column ``name``, as a list in row order."""
+        if name not in self._decoded:
+            if name in DICTIONARY_COLUMNS:
+                dictionary, codes = self.codes(name)
+                values = list(map(dictionary.__getitem__, codes))
+            elif name == 'id':
+                values = list(accumulate(_array('q', self._blob(name))))
+            elif name == 'timestamp':
+                values = [_EPOCH + stamp * _MICROSECOND for stamp in accumulate(_array('q', self._blob(name)))]
+            elif name == 'duration':
+                values = _array('i', self._blob(name)).tolist()
+            elif name == 'bounce':
+                values = list(map(bool, self._blob(name)))
+            else:
+                raise KeyError(name)
+            self._decoded[name] = values
+        return self._decoded[name]
+
+    def counts(self, name):
+        """``{value: rows}`` of a dictionary column, counted on the codes."""
+        dictionary, codes = self.codes(name)
+        return {dictionary[code]: count for code, count in Counter(codes).items()}
+
+    def iter_rows(self, columns=COLUMNS):
+        """Tuples of ``columns``, in time order."""
+        return zip(*(self.column(name) for name in columns))
+
+
+def archived_days(site_id, first_day, last_day, directory=None):
+    """``(day, path)`` of the site's archive files from ``first_day`` to ``last_day`` inclusive."""
+    days = []
+    for path in day_path(site_id, first_day, directory).parent.glob(f'*{SUFFIX}'):
+        day = date.fromisoformat(path.stem)
+        if first_day <= day <= last_day:
+            days.append((day, path))
+    return sorted(days)
+
+
+def scan(site_id, first_day, last_day, columns=COLUMNS, directory=None):
+    """Yield the site's archived rows (tuples of ``columns``) from ``first_day`` to ``last_day``, in time order."""
+    for _, path in archived_days(site_id, first_day, last_day, directory):
+        with ArchivedDay(path) as archived:
+            yield from archived.iter_rows(columns)
+
+
+def archive_day(site_id, day, last_id, directory=None, using=None):
+    """Move the site's PageViews of UTC ``day`` with ids up to ``last_id`` to its file; returns rows moved."""
+    start = datetime.combine(day, time.min, tzinfo=timezone.utc)
+    rows = list(
+        PageView.objects.using(using)
+        .filter(site_id=site_id, timestamp__gte=start, timestamp__lt=start + _DAY, pk__lte=last_id)
+        .values_list(*COLUMNS)
+    )
+    if not rows:
+        return 0
+    path = day_path(site_id, day, directory)
+    merged = {}
+    if path.exists():
+        with ArchivedDay(path) as archived:
+            merged = {row[0]: row for row in archived.iter_rows()}
+    merged.update((row[0], row) for row in rows)
+    write_day(path, sorted(merged.values(), key=lambda row: (row[1], row[0])))
+
+    ids = [row[0] for row in rows]
+    for start_index in range(0, len(ids), DELETE_BATCH_SIZE):
+        PageView.objects.using(using).filter(pk__in=ids[start_index:start_index + DELETE_BATCH_SIZE]).delete()
+    return len(rows)
+
+
+def archive_pageviews(retention_days=None, directory=None, using=None):
+    """Move every PageView older than ``retention_days`` that the rollups and sessions have read.
+
+    Returns ``{'rows': moved, 'days': site-days written}``.
+    """
+    using = using or router.db_for_write(PageView)
+    if retention_days is None:
+        retention_days = settings.ANALYTICS_RAW_RETENTION_DAYS
+    today = datetime.now(timezone.utc).replace(hour=0, minute=0, second=0, microsecond=0)
+    cutoff = today - timedelta(days=retention_days)
+    last_id = min(rollups.watermark(using), rollups.watermark(using, sessions.WATERMARK))
+    moved = days = 0
+    for site_id in Site.objects.using(using).values_list('pk', flat=True):
+        aged = PageView.objects.using(using).filter(site_id=site_id, timestamp__lt=cutoff, pk__lte=last_id)
+        while (first := aged.aggregate(first=Min('timestamp'))['first']) is not None:
+            moved += archive_day(site_id, first.astimezone(timezone.utc).date(), last_id, directory, using)
+            days += 1
+    return {'rows': moved, 'days': days}
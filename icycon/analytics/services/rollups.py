@@ -0,0 +1,259 @@
+"""
+Hourly and daily PageView rollups.
+
+``HourlyPageStats`` holds views, distinct visitors, bounces and summed
+duration per (site, url, UTC hour). ``DailySiteStats`` holds the same per
+(site, UTC day). ``VisitorSketch`` holds a HyperLogLog sketch of the
+visitor ids per site and UTC hour or day. ``roll_up`` (``manage.py
+rollup_pageviews`` or ``rollup_pageviews_task``, run every few minutes)
+folds in only the PageViews with ids above the ``RollupWatermark``. It works
+in id batches, and each batch commits its rollup rows together with the
+advanced watermark, so an interrupted run loses nothing and counts nothing
+twice.
+
+Distinct visitors are not additive across batches. A batch adds its visitor
+ids to the sketches it touches, and daily visitors are the estimate of the
+day's sketch. Per-URL hourly visitors stay exact: they are recounted from the
+raw rows up to the batch's last id, using the ``(site, timestamp)`` index.
+Visitor counts of different hours or days must not be summed;
+``unique_visitors`` merges the sketches of any range instead.
+
+Readers combine the rollups with the tail: the raw rows above the
+watermark, i.e. those written since the last run. On PostgreSQL an insert
+can commit with an id below one a finished run already read, so
+``settled_max_id`` reads ``max(id)`` under a brief SHARE lock, which waits
+for in-flight inserts.
+"""
+
+from collections import defaultdict
+from datetime import datetime, timedelta, timezone
+
+from django.db import connections, router, transaction
+from django.db.models import Count, Max, Q, Sum
+from django.db.models.functions import TruncHour
+
+from analytics.models import DailySiteStats, HourlyPageStats, PageView, RollupWatermark, VisitorSession, VisitorSketch
+
+from . import hll
+
+WATERMARK = 'pageviews'
+BATCH_SIZE = 50_000
+WRITE_BATCH_SIZE = 1000
+
+_HOUR = timedelta(hours=1)
+_DAY = timedelta(days=1)
+
+
+def settled_max_id(using=None):
+    """The highest PageView id below which no insert is still in flight."""
+    using = using or router.db_for_write(PageView)
+    connection = connections[using]
+    with transaction.atomic(using=using):
+        if connection.vendor == 'postgresql':
+            with connection.cursor() as cursor:
+                cursor.execute(f'LOCK TABLE {PageView._meta.db_table} IN SHARE MODE')
+        return PageView.objects.using(using).aggregate(last=Max('pk'))['last'] or 0
+
+
+def watermark(using=None, name=WATERMARK):
+    return RollupWatermark.objects.using(using).filter(name=name).values_list('last_id', flat=True).first() or 0
+
+
+def _upsert(model, unique_fields, rows, using, fields=('views', 'visitors', 'bounces', 'duration')):
+    for start in range(0, len(rows), WRITE_BATCH_SIZE):
+        model.objects.using(using).bulk_create(
+            rows[start:start + WRITE_BATCH_SIZE], update_conflicts=True, unique_fields=unique_fields, update_fields=fields,
+        )
+
+
+def _day_start(moment):
+    return moment.replace(hour=0, minute=0, second=0, microsecond=0)
+
+
+def _distinct_visitors(site_ids, hour, last_id, using):
+    """``{(site_id, url, hour): distinct visitors}`` of raw rows up to ``last_id`` in ``hour``."""
+    rows = (
+        PageView.objects.using(using)
+        .filter(site_id__in=site_ids, timestamp__gte=hour, timestamp__lt=hour + _HOUR, pk__lte=last_id)
+        .annotate(bucket=TruncHour('timestamp', tzinfo=timezone.utc))
+        .values('site_id', 'url', 'bucket')
+        .annotate(visitors=Count('visitor_id', distinct=True))
+        .order_by()
+    )
+    return {(row['site_id'], row['url'], row['bucket']): row['visitors'] for row in rows}
+
+
+def _add_visitors(batch, using):
+    """Add the batch's visitor ids to the hour and day sketches; returns ``{(site_id, day): estimate}``."""
+    added = defaultdict(set)
+    rows = batch.annotate(hour=TruncHour('timestamp', tzinfo=timezone.utc)).values_list('site_id', 'hour', 'visitor_id')
+    for site_id, hour, visitor_id in rows.distinct().order_by():
+        added[site_id, VisitorSketch.HOUR, hour].add(visitor_id)
+        added[site_id, VisitorSketch.DAY, _day_start(hour)].add(visitor_id)
+    stored = VisitorSketch.objects.using(using).filter(
+        site_id__in={key[0] for key in added}, start__in={key[2] for key in added},
+    )
+    stored = {(sketch.site_id, sketch.period, sketch.start): sketch for sketch in stored}
+    sketches, estimates = [], {}
+    for (site_id, period, start), visitor_ids in added.items():
+        sketch = stored.get((site_id, period, start)) or VisitorSketch(site_id=site_id, period=period, start=start)
+        registers = hll.add(hll.decode(sketch.registers), visitor_ids)
+        sketch.registers = hll.encode(registers)
+        sketches.append(sketch)
+        if period == VisitorSketch.DAY:
+            estimates[site_id, start.date()] = hll.estimate(registers)
+    _upsert(VisitorSketch, ['site', 'period', 'start'], sketches, using, fields=['registers'])
+    return estimates
+
+
+def _roll_up_batch(first_id, last_id, using):
+    """Fold PageViews with ids in ``(first_id, last_id]`` into the rollups; returns rows read."""
+    batch = PageView.objects.using(using).filter(pk__gt=first_id, pk__lte=last_id)
+    hourly = (
+        batch.annotate(hour=TruncHour('timestamp', tzinfo=timezone.utc))
+        .values('site_id', 'url', 'hour')
+        .annotate(views=Count('pk'), bounces=Count('pk', filter=Q(bounce=True)), duration=Sum('duration'))
+        .order_by()
+    )
+    hours, days = {}, defaultdict(lambda: [0, 0, 0])
+    for row in hourly:
+        hours[row['site_id'], row['url'], row['hour']] = row
+        totals = days[row['site_id'], row['hour'].date()]
+        totals[0] += row['views']
+        totals[1] += row['bounces']
+        totals[2] += row['duration'] or 0
+    if not hours:
+        return 0
+
+    sites_by_hour = defaultdict(set)
+    for site_id, _, hour in hours:
+        sites_by_hour[hour].add(site_id)
+    stored = {}
+    for hour, site_ids in sites_by_hour.items():
+        for stats in HourlyPageStats.objects.using(using).filter(site_id__in=site_ids, hour=hour):
+            stored[stats.site_id, stats.url, stats.hour] = stats
+        visitors = _distinct_visitors(site_ids, hour, last_id, using)
+        for key in [key for key in hours if key[2] == hour]:
+            row = hours[key]
+            stats = stored.get(key) or HourlyPageStats(site_id=key[0], url=key[1], hour=key[2])
+            stats.views += row['views']
+            stats.bounces += row['bounces']
+            stats.duration += row['duration'] or 0
+            stats.visitors = visitors.get(key, 0)
+            stored[key] = stats
+    _upsert(HourlyPageStats, ['site', 'url', 'hour'], list(stored.values()), using)
+
+    visitors = _add_visitors(batch, using)
+    sites_by_day = defaultdict(set)
+    for site_id, day in days:
+        sites_by_day[day].add(site_id)
+    daily = []
+    for day, site_ids in sites_by_day.items():
+        existing = {stats.site_id: stats for stats in DailySiteStats.objects.using(using).filter(site_id__in=site_ids, day=day)}
+        for site_id in site_ids:
+            stats = existing.get(site_id) or DailySiteStats(site_id=site_id, day=day)
+            views, bounces, duration = days[site_id, day]
+            stats.views += views
+            stats.bounces += bounces
+            stats.duration += duration
+            stats.visitors = visitors[site_id, day]
+            daily.append(stats)
+    _upsert(DailySiteStats, ['site', 'day'], daily, using)
+    return sum(row['views'] for row in hours.values())
+
+
+def roll_up(batch_size=BATCH_SIZE, using=None):
+    """Fold every PageView written since the last run into the rollups.
+
+    Returns ``{'rows': read, 'last_id': new watermark}``.
+    """
+    using = using or router.db_for_write(RollupWatermark)
+    end = settled_max_id(using)
+    rows = 0
+    while True:
+        with transaction.atomic(using=using):
+            # Locked, so concurrent runs take turns instead of double counting
+            state, _ = RollupWatermark.objects.using(using).select_for_update().get_or_create(name=WATERMARK)
+            if state.last_id >= end:
+                return {'rows': rows, 'last_id': state.last_id}
+            # Ids have gaps; bound the batch by rows, not by id arithmetic
+            last_id = (
+                PageView.objects.using(using).filter(pk__gt=state.last_id, pk__lte=end)
+                .order_by('pk').values_list('pk', flat=True)[batch_size - 1:batch_size].first()
+            ) or end
+            rows += _roll_up_batch(state.last_id, last_id, using)
+            state.last_id = last_id
+            state.save(update_fields=['last_id', 'updated_at'])
+
+
+def _tail(site_ids, since=None, using=None):
+    rows = PageView.objects.using(using).filter(site_id__in=site_ids, pk__gt=watermark(using))
+    if since is None:
+        return rows
+    # Ids first, so the query reads the rows above the watermark rather than
+    # every row since ``since`` through the (site, timestamp) index
+    return PageView.objects.using(using).filter(pk__in=rows.values('pk'), timestamp__gte=since)
+
+
+def total_views(site_ids, using=None):
+    """All-time page views of the sites: daily rollups plus the tail."""
+    site_ids = list(site_ids)
+    rolled = DailySiteStats.objects.using(using).filter(site_id__in=site_ids).aggregate(views=Sum('views'))['views']
+    return (rolled or 0) + _tail(site_ids, using=using).count()
+
+
+def page_stats(site_id, days=7, limit=100, using=None):
+    """Per-URL views, average duration and bounce rate of the last ``days`` days, most viewed first.
+
+    The bounce rate is the share of sessions entering at the URL that saw no
+    other page (see ``analytics.services.sessions``); None without entrances.
+    """
+    since = (datetime.now(timezone.utc) - timedelta(days=days)).replace(minute=0, second=0, microsecond=0)
+    totals = defaultdict(lambda: {'views': 0, 'duration': 0})
+    rolled = (
+        HourlyPageStats.objects.using(using).filter(site_id=site_id, hour__gte=since).values('url')
+        .annotate(views=Sum('views'), duration=Sum('duration')).order_by()
+    )
+    tail = _tail([site_id], since, using).values('url').annotate(views=Count('pk'), duration=Sum('duration')).order_by()
+    for row in [*rolled, *tail]:
+        page = totals[row['url']]
+        for field in ('views', 'duration'):
+            page[field] += row[field] or 0
+    pages = sorted(totals.items(), key=lambda item: (-item[1]['views'], item[0]))[:limit]
+    entrances = {
+        row['entry_url']: row
+        for row in VisitorSession.objects.using(using)
+        .filter(site_id=site_id, started_at__gte=since, entry_url__in=[url for url, _ in pages])
+        .values('entry_url').annotate(sessions=Count('pk'), bounces=Count('pk', filter=Q(pages=1))).order_by()
+    }
+    return [
+        {
+            'url': url,
+            'views': page['views'],
+            'avg_duration': round(page['duration'] / page['views']) if page['views'] else 0,
+            'bounce_rate': (
+                round(100 * entrances[url]['bounces'] / entrances[url]['sessions']) if url in entrances else None
+            ),
+        }
+        for url, page in pages
+    ]
+
+
+def unique_visitors(site_id, start, end, using=None):
+    """Estimated distinct visitors of the site in ``[start, end)``, aware datetimes floored to the UTC hour.
+
+    Whole days come from the day sketches, the hours around them from the
+    hour sketches and the tail from the raw rows.
+    """
+    start, end = (moment.astimezone(timezone.utc).replace(minute=0, second=0, microsecond=0) for moment in (start, end))
+    first_day = start if start == _day_start(start) else _day_start(start) + _DAY
+    first_day = min(first_day, end)
+    last_day = max(_day_start(end), first_day)
+    sketches = VisitorSketch.objects.using(using).filter(site_id=site_id).filter(
+        Q(period=VisitorSketch.DAY, start__gte=first_day, start__lt=last_day)
+        | Q(period=VisitorSketch.HOUR, start__gte=start, start__lt=first_day)
+        | Q(period=VisitorSketch.HOUR, start__gte=last_day, start__lt=end)
+    )
+    registers = hll.merge(sketches.values_list('registers', flat=True).iterator())
+    tail = _tail([site_id], start, using).filter(timestamp__lt=end).values_list('visitor_id', flat=True)
+    return hll.estimate(hll.add(registers, tail.distinct().order_by()))
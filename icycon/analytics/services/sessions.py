@@ -0,0 +1,220 @@
+"""
+Sessionization of PageViews.
+
+A session is a visitor's hits on a site with no gap longer than
+``ANALYTICS_SESSION_TIMEOUT_MINUTES``. ``sessionize`` (``manage.py
+sessionize_pageviews`` or ``sessionize_pageviews_task``, run every few
+minutes) feeds the PageViews above its ``RollupWatermark`` to a
+``Sessionizer`` in id batches, each sorted by timestamp. After every batch
+it writes the sessions that closed and the open ones that changed to
+``VisitorSession``, together with the advanced watermark.
+
+The sessionizer keeps open sessions in least-recently-active order. Its
+clock is the newest hit time seen; sessions idle longer than the timeout
+are closed as the clock passes them, and at the end of a run by the wall
+clock. At most ``ANALYTICS_SESSION_MAX_OPEN`` are held: past that, the
+least recently active one is closed early. Memory is therefore bounded by
+that cap plus one batch.
+
+Hits that are slightly out of order join their session and may move its
+entry page. A hit older than its visitor's open session by more than the
+timeout arrived after its own session was closed, so it is stored as a
+session of its own.
+
+A session of one hit is a bounce; ``session_stats`` and the per-page
+bounce rates are computed from sessions, not from PageView.bounce.
+"""
+
+from collections import OrderedDict
+from datetime import datetime, timedelta, timezone
+
+from django.conf import settings
+from django.db import router, transaction
+from django.db.models import Count, Q, Sum
+
+from analytics.models import PageView, RollupWatermark, VisitorSession
+
+from .rollups import BATCH_SIZE, WRITE_BATCH_SIZE, settled_max_id, watermark
+
+WATERMARK = 'sessions'
+
+
+def _seconds(delta):
+    return int(delta.total_seconds())
+
+
+class OpenSession:
+    __slots__ = ('pk', 'site_id', 'visitor_id', 'started_at', 'ended_at', 'entry_url', 'exit_url',
+                 'pages', 'duration', 'closed', 'changed')
+
+    def __init__(self, site_id, visitor_id, timestamp, url, duration, pk=None):
+        self.pk = pk
+        self.site_id = site_id
+        self.visitor_id = visitor_id
+        self.started_at = self.ended_at = timestamp
+        self.entry_url = self.exit_url = url
+        self.pages = 1
+        self.duration = duration
+        self.closed = False
+        self.changed = True
+
+    @classmethod
+    def from_model(cls, session):
+        opened = cls(session.site_id, session.visitor_id, session.started_at, session.entry_url, session.duration,
+                     pk=session.pk)
+        opened.ended_at, opened.exit_url, opened.pages = session.ended_at, session.exit_url, session.pages
+        opened.changed = False
+        return opened
+
+    def add(self, timestamp, url, duration):
+        self.pages += 1
+        if timestamp >= self.ended_at:
+            self.duration = _seconds(timestamp - self.started_at) + duration
+            self.ended_at, self.exit_url = timestamp, url
+        elif timestamp < self.started_at:
+            self.duration += _seconds(self.started_at - timestamp)
+            self.started_at, self.entry_url = timestamp, url
+        self.changed = True
+
+    def to_model(self):
+        return VisitorSession(
+            pk=self.pk, site_id=self.site_id, visitor_id=self.visitor_id, started_at=self.started_at,
+            ended_at=self.ended_at, entry_url=self.entry_url, exit_url=self.exit_url, pages=self.pages,
+            duration=self.duration, closed=self.closed,
+        )
+
+
+class Sessionizer:
+    """Groups hits, fed in (roughly) timestamp order, into sessions per site and visitor."""
+
+    def __init__(self, timeout, max_open, sessions=()):
+        self.timeout = timeout
+        self.max_open = max_open
+        self.clock = None
+        # (site_id, visitor_id) -> OpenSession, least recently active first
+        self.open = OrderedDict()
+        self.closed = []
+        for session in sorted(sessions, key=lambda session: session.ended_at):
+            self._open(session)
+
+    def _open(self, session):
+        self.open[session.site_id, session.visitor_id] = session
+        if len(self.open) > self.max_open:
+            self._close(next(iter(self.open)))
+
+    def _close(self, key):
+        session = self.open.pop(key)
+        session.closed = session.changed = True
+        self.closed.append(session)
+
+    def expire(self, now):
+        """Close the sessions idle for longer than the timeout at ``now``."""
+        while self.open:
+            key, session = next(iter(self.open.items()))
+            if session.ended_at + self.timeout >= now:
+                break
+            self._close(key)
+
+    def feed(self, site_id, visitor_id, timestamp, url, duration):
+        if self.clock is None or timestamp > self.clock:
+            self.clock = timestamp
+            self.expire(timestamp)
+        key = (site_id, visitor_id)
+        session = self.open.get(key)
+        if session is not None and timestamp > session.ended_at + self.timeout:
+            self._close(key)
+            session = None
+        if session is None:
+            self._open(OpenSession(site_id, visitor_id, timestamp, url, duration))
+        elif timestamp < session.started_at - self.timeout:
+            late = OpenSession(site_id, visitor_id, timestamp, url, duration)
+            late.closed = True
+            self.closed.append(late)
+        else:
+            moved = timestamp >= session.ended_at
+            session.add(timestamp, url, duration)
+            if moved:
+                self.open.move_to_end(key)
+
+    def take_changes(self):
+        """The sessions closed or changed since the last call, marked unchanged."""
+        changed = self.closed + [session for session in self.open.values() if session.changed]
+        self.closed = []
+        for session in changed:
+            session.changed = False
+        return changed
+
+
+def _save(sessions, using):
+    fields = ['started_at', 'ended_at', 'entry_url', 'exit_url', 'pages', 'duration', 'closed']
+    stored = [session for session in sessions if session.pk is not None]
+    new = [session for session in sessions if session.pk is None]
+    # An upsert on the id; bulk_update's CASE per field is several times slower
+    VisitorSession.objects.using(using).bulk_create(
+        [session.to_model() for session in stored], batch_size=WRITE_BATCH_SIZE,
+        update_conflicts=True, unique_fields=['id'], update_fields=fields,
+    )
+    created = VisitorSession.objects.using(using).bulk_create([session.to_model() for session in new],
+                                                                batch_size=WRITE_BATCH_SIZE)
+    for session, model in zip(new, created):
+        session.pk = model.pk
+
+
+def sessionize(batch_size=BATCH_SIZE, timeout=None, max_open=None, using=None):
+    """Group every PageView written since the last run into sessions.
+
+    Returns ``{'rows': read, 'closed': sessions closed, 'open': sessions still open}``.
+    """
+    using = using or router.db_for_write(RollupWatermark)
+    timeout = timedelta(minutes=settings.ANALYTICS_SESSION_TIMEOUT_MINUTES) if timeout is None else timeout
+    max_open = settings.ANALYTICS_SESSION_MAX_OPEN if max_open is None else max_open
+    end = settled_max_id(using)
+    expected = watermark(using, WATERMARK)
+    sessions = VisitorSession.objects.using(using).filter(closed=False)
+    sessionizer = Sessionizer(timeout, max_open, map(OpenSession.from_model, sessions.iterator()))
+    rows = closed = 0
+    while True:
+        with transaction.atomic(using=using):
+            state, _ = RollupWatermark.objects.using(using).select_for_update().get_or_create(name=WATERMARK)
+            if state.last_id != expected:
+                # Another run moved on since our open sessions were loaded
+                return {'rows': rows, 'closed': closed, 'open': len(sessionizer.open)}
+            done = state.last_id >= end
+            if done:
+                sessionizer.expire(datetime.now(timezone.utc))
+            else:
+                last_id = (
+                    PageView.objects.using(using).filter(pk__gt=state.last_id, pk__lte=end)
+                    .order_by('pk').values_list('pk', flat=True)[batch_size - 1:batch_size].first()
+                ) or end
+                batch = (
+                    PageView.objects.using(using).filter(pk__gt=state.last_id, pk__lte=last_id)
+                    .order_by('timestamp', 'pk').values_list('site_id', 'visitor_id', 'timestamp', 'url', 'duration')
+                )
+                for hit in batch.iterator(chunk_size=WRITE_BATCH_SIZE):
+                    sessionizer.feed(*hit)
+                    rows += 1
+                state.last_id = expected = last_id
+                state.save(update_fields=['last_id', 'updated_at'])
+            changes = sessionizer.take_changes()
+            closed += sum(session.closed for session in changes)
+            _save(changes, using)
+        if done:
+            return {'rows': rows, 'closed': closed, 'open': len(sessionizer.open)}
+
+
+def session_stats(site_id, start, end, using=None):
+    """Sessions starting in ``[start, end)``: count, bounce rate (%), average duration (s) and pages per session.
+
+    Open sessions are included with what they hold so far.
+    """
+    totals = VisitorSession.objects.using(using).filter(
+        site_id=site_id, started_at__gte=start, started_at__lt=end,
+    ).aggregate(sessions=Count('pk'), bounces=Count('pk', filter=Q(pages=1)), pages=Sum('pages'), duration=Sum('duration'))
+    sessions = totals['sessions']
+    return {
+        'sessions': sessions,
+        'bounce_rate': round(100 * totals['bounces'] / sessions) if sessions else 0,
+        'avg_duration': round(totals['duration'] / sessions) if sessions else 0,
+        'pages_per_session': round(totals['pages'] / sessions, 2) if sessions else 0,
+    }
@@ -0,0 +1,23 @@
+from celery import shared_task
+
+from .services.pageview_archive import archive_pageviews
+from .services.rollups import roll_up
+from .services.sessions import sessionize
+
+
+@shared_task
+def rollup_pageviews_task():
+    """Fold PageViews written since the last run into the hourly and daily rollups."""
+    return roll_up()
+
+
+@shared_task
+def archive_pageviews_task():
+    """Move PageViews older than ANALYTICS_RAW_RETENTION_DAYS to the columnar archive."""
+    return archive_pageviews()
+
+
+@shared_task
+def sessionize_pageviews_task():
+    """Group PageViews written since the last run into visitor sessions."""
+    return sessionize()
@@ -1,3 +1,398 @@
-from django.test import TestCase
+import io
+import json
+import tempfile
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+from unittest import mock
 
-# Create your tests here.
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.db import DatabaseError
+from django.db.models import Sum
+from django.test import Client, TestCase, override_settings
+
+from tenants.models import Tenant, TenantUser
+from .models import (DailySiteStats, HourlyPageStats, PageView, RollupWatermark, Site, VisitorSession,
+                     VisitorSketch)
+from .services import beacon, hll, pageview_archive, rollups, sessions
+from .services.hit_spool import CORRUPT_SUFFIX, SEGMENT_SUFFIX, HitSpool
+
+
+class BeaconTests(TestCase):
+    def setUp(self):
+        tenant = Tenant.objects.create(name='Acme', region='US')
+        self.site = Site.objects.create(tenant=tenant, domain='https://www.acme.example')
+        self.spool_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.spool_dir.cleanup)
+        beacon.clear_key_cache()
+
+    def settings_for(self, **overrides):
+        return override_settings(ANALYTICS_SPOOL_DIR=self.spool_dir.name, ANALYTICS_BEACON_FLUSH_MS=0,
+                                 **{'ANALYTICS_BEACON_BATCH_SIZE': 3, 'ANALYTICS_BEACON_MAX_PENDING': 100, **overrides})
+
+    def hit(self, path='/', **fields):
+        return {'url': f'https://acme.example{path}', 'visitor_id': 'v1', 'ts': time.time() * 1000, **fields}
+
+    def post(self, client, body, key=None):
+        return client.post(f'/analytics/collect?key={key or self.site.beacon_key}', json.dumps(body),
+                           content_type='text/plain')
+
+    def test_hits_are_spooled_then_written_in_batches(self):
+        with self.settings_for():
+            client = Client(enforce_csrf_checks=True)
+            response = self.post(client, {'hits': [self.hit('/a'), self.hit('/b', referrer='android-app://x')]})
+            self.assertEqual(response.status_code, 202)
+            self.assertEqual(response.json(), {'accepted': 2, 'rejected': 0})
+            # Nothing below the beacon ran: no CSRF check, no session or replica pin cookie
+            self.assertEqual(list(response.cookies), [])
+            self.assertEqual(response['Access-Control-Allow-Origin'], '*')
+            self.assertEqual(PageView.objects.count(), 0)
+
+            response = self.post(client, {'hits': [self.hit('/c', duration=12, bounce=False),
+                                                   {'url': 'https://evil.example/', 'visitor_id': 'v1'}]})
+            self.assertEqual(response.json(), {'accepted': 1, 'rejected': 1})
+            self.assertEqual(sorted(PageView.objects.values_list('url', flat=True)),
+                             ['https://acme.example/a', 'https://acme.example/b', 'https://acme.example/c'])
+            self.assertIsNone(PageView.objects.get(url__endswith='/b').referrer)
+            self.assertEqual(PageView.objects.get(url__endswith='/c').duration, 12)
+
+            self.assertEqual(self.post(client, self.hit(), key='nope').status_code, 403)
+            self.assertEqual(self.post(client, {'url': 'ftp://acme.example/'}).status_code, 400)
+            self.assertEqual(client.get('/analytics/collect').status_code, 405)
+
+    @mock.patch.object(beacon, 'KEY_CACHE_SIZE', 3)
+    @mock.patch.object(beacon, 'KEY_LOOKUPS_PER_SECOND', 5)
+    def test_key_cache_is_bounded_and_lookups_throttled(self):
+        with self.assertNumQueries(0):
+            for key in (None, 7, 'nope', self.site.beacon_key + 'x', 'é' * 22):
+                self.assertIsNone(beacon.site_for_key(key))
+        site = beacon.site_for_key(self.site.beacon_key)
+        self.assertEqual(site, (self.site.pk, 'acme.example'))
+        unknown = [f'{n:022d}' for n in range(4)]
+        with self.assertNumQueries(4):
+            for key in unknown:
+                self.assertIsNone(beacon.site_for_key(key))
+        self.assertEqual(list(beacon._keys), unknown[1:])
+
+        # Lookups for this second are spent: unknown keys are refused, expired ones served as cached
+        beacon._keys[self.site.beacon_key] = (0, site)
+        with self.assertNumQueries(0):
+            self.assertIsNone(beacon.site_for_key('x' * 22))
+            self.assertEqual(beacon.site_for_key(self.site.beacon_key), site)
+        self.assertNotIn('x' * 22, beacon._keys)
+
+    def test_backpressure_refuses_hits_until_flushed(self):
+        with self.settings_for(ANALYTICS_BEACON_BATCH_SIZE=10, ANALYTICS_BEACON_MAX_PENDING=2):
+            client = Client()
+            self.assertEqual(self.post(client, {'hits': [self.hit(), self.hit()]}).status_code, 202)
+            response = self.post(client, self.hit())
+            self.assertEqual((response.status_code, response['Retry-After']), (503, '1'))
+
+    def test_segments_of_dead_workers_are_replayed(self):
+        row = beacon.clean_hit(beacon.site_for_key(self.site.beacon_key), self.hit('/orphan'))
+        with open(f'{self.spool_dir.name}/1-1-1{SEGMENT_SUFFIX}', 'w') as orphan:
+            # The last line was cut short by the crash
+            orphan.write(json.dumps(row) + '\n' + json.dumps(row)[:10])
+
+        spool = HitSpool(self.spool_dir.name, batch_size=10, flush_ms=0)
+        spool.add([row])
+        # Never replayed inside a request
+        self.assertEqual(PageView.objects.count(), 0)
+        self.assertEqual(spool.recover(), 1)
+        # The live segment is locked, so another worker's recovery leaves it alone
+        self.assertEqual(HitSpool(self.spool_dir.name, flush_ms=0).recover(), 0)
+        spool.flush()
+        self.assertEqual(PageView.objects.filter(url__endswith='/orphan').count(), 2)
+
+        with open(f'{self.spool_dir.name}/2-1-1{SEGMENT_SUFFIX}', 'w') as orphan:
+            orphan.write(json.dumps(row) + '\n')
+        call_command('flush_pageview_spool', spool_dir=self.spool_dir.name, stdout=io.StringIO())
+        self.assertEqual(PageView.objects.count(), 3)
+
+    def test_non_finite_timestamps_are_rejected(self):
+        site = beacon.site_for_key(self.site.beacon_key)
+        for ts in (float('nan'), float('inf'), float('-inf')):
+            self.assertIsNone(beacon.clean_hit(site, self.hit(ts=ts)))
+        with self.settings_for():
+            body = json.dumps(self.hit(ts=0)).replace('"ts": 0', '"ts": NaN')
+            response = Client().post(f'/analytics/collect?key={self.site.beacon_key}', body, content_type='text/plain')
+            self.assertEqual(response.status_code, 400)
+
+    def test_bad_rows_and_segments_do_not_stall_the_spool(self):
+        row = beacon.clean_hit(beacon.site_for_key(self.site.beacon_key), self.hit('/ok'))
+        bad = [*row[:3], float('nan'), *row[4:]]
+        spool = HitSpool(self.spool_dir.name, batch_size=10, flush_ms=0)
+        spool.add([row, bad, ['short']])
+        with self.assertLogs('analytics.services.hit_spool', 'WARNING') as logs:
+            self.assertEqual(spool.flush(), 1)
+        self.assertEqual(len(logs.records), 2)
+        self.assertEqual(spool.pending, 0)
+
+        directory = Path(self.spool_dir.name)
+        (directory / f'1-1-1{SEGMENT_SUFFIX}').write_text(json.dumps(row) + '\n' + json.dumps(bad) + '\n')
+        (directory / f'2-1-1{SEGMENT_SUFFIX}').write_bytes(b'{"not": json\n' + json.dumps(row).encode() + b'\n')
+        with self.assertLogs('analytics.services.hit_spool', 'WARNING'):
+            self.assertEqual(HitSpool(self.spool_dir.name, flush_ms=0).recover(), 1)
+        self.assertEqual(sorted(path.name for path in directory.iterdir()), [f'2-1-1{CORRUPT_SUFFIX}'])
+        self.assertEqual(PageView.objects.count(), 2)
+
+    def test_database_outage_keeps_appending_to_one_segment(self):
+        row = beacon.clean_hit(beacon.site_for_key(self.site.beacon_key), self.hit())
+        spool = HitSpool(self.spool_dir.name, batch_size=2, flush_ms=0, max_pending=50)
+        directory = Path(self.spool_dir.name)
+        with mock.patch('analytics.services.hit_spool.write_rows', side_effect=DatabaseError('down')), \
+                self.assertLogs('analytics.services.hit_spool', 'ERROR'):
+            for _ in range(10):
+                self.assertTrue(spool.add([row, row]))
+                spool.flush()
+        self.assertEqual(len(list(directory.iterdir())), 2)
+        self.assertEqual(spool.pending, 20)
+        self.assertEqual(spool.flush(), 20)
+        self.assertEqual((PageView.objects.count(), list(directory.iterdir())), (20, []))
+
+        with mock.patch('analytics.services.hit_spool.open', side_effect=OSError(24, 'Too many open files'), create=True), \
+                self.assertLogs('analytics.services.hit_spool', 'ERROR'):
+            self.assertFalse(spool.add([row]))
+        self.assertEqual(spool.pending, 0)
+
+    def test_flusher_recovers_in_the_background_and_survives_errors(self):
+        row = beacon.clean_hit(beacon.site_for_key(self.site.beacon_key), self.hit())
+        spool = HitSpool(self.spool_dir.name, batch_size=10, flush_ms=5)
+        calls = []
+
+        def recover():
+            calls.append(('recover', threading.current_thread()))
+            if len(calls) == 1:
+                raise RuntimeError('boom')
+            return 0
+
+        def flush():
+            calls.append(('flush', threading.current_thread()))
+            raise RuntimeError('boom')
+
+        with mock.patch.object(spool, 'recover', side_effect=recover), \
+                mock.patch.object(spool, 'flush', side_effect=flush), \
+                self.assertLogs('analytics.services.hit_spool', 'ERROR'):
+            self.assertTrue(spool.add([row]))
+            thread = spool._thread
+            deadline = time.monotonic() + 5
+            while [name for name, _ in calls].count('flush') < 2 and time.monotonic() < deadline:
+                time.sleep(0.01)
+            self.assertTrue(thread.is_alive())
+            spool._thread = None
+            spool._wake.set()
+            thread.join()
+        names = [name for name, _ in calls]
+        self.assertEqual(names[:2], ['recover', 'recover'])
+        self.assertGreaterEqual(names.count('flush'), 2)
+        self.assertEqual({caller for _, caller in calls}, {thread})
+        self.assertEqual(spool.flush(), 1)
+
+
+class HyperLogLogTests(TestCase):
+    def test_merge_is_the_union_and_estimates_stay_within_error(self):
+        first = hll.add(hll.empty(), (f'v{i}' for i in range(15000)))
+        second = hll.add(hll.empty(), (f'v{i}' for i in range(10000, 30000)))
+        union = hll.add(hll.empty(), (f'v{i}' for i in range(30000)))
+        self.assertEqual(hll.merge([hll.encode(first), hll.encode(second)]), union)
+        self.assertLess(abs(hll.estimate(union) - 30000), 30000 * 3 * hll.STANDARD_ERROR)
+        self.assertEqual(hll.estimate(hll.add(hll.empty(), ['a', 'b', 'a', 'c'])), 3)
+        self.assertEqual(hll.estimate(hll.merge([])), 0)
+
+
+class RollupTests(TestCase):
+    def setUp(self):
+        self.tenant = Tenant.objects.create(name='Acme', region='US')
+        self.site = Site.objects.create(tenant=self.tenant, domain='https://acme.example')
+        self.hour = datetime.now(timezone.utc).replace(minute=0, second=0, microsecond=0) - timedelta(days=1)
+
+    def views(self, *specs):
+        PageView.objects.bulk_create([
+            PageView(site=self.site, url=f'https://acme.example{path}', visitor_id=visitor,
+                     timestamp=self.hour + timedelta(minutes=minutes), duration=10, bounce=bounce)
+            for path, visitor, minutes, bounce in specs
+        ])
+
+    def test_rollups_are_incremental_and_recount_visitors(self):
+        self.views(('/a', 'v1', 5, True), ('/a', 'v2', 10, False), ('/a', 'v1', 70, True), ('/b', 'v1', 20, True))
+        result = rollups.roll_up(batch_size=3)
+        self.assertEqual((result['rows'], result['last_id']), (4, PageView.objects.latest('pk').pk))
+
+        stats = HourlyPageStats.objects.get(url='https://acme.example/a', hour=self.hour)
+        self.assertEqual((stats.views, stats.visitors, stats.bounces, stats.duration), (2, 2, 1, 20))
+        self.assertEqual(HourlyPageStats.objects.get(url__endswith='/a', hour=self.hour + timedelta(hours=1)).views, 1)
+
+        # A returning visitor adds a view but not a visitor; only the new row is read
+        self.views(('/a', 'v2', 30, True))
+        self.assertEqual(rollups.roll_up()['rows'], 1)
+        stats.refresh_from_db()
+        self.assertEqual((stats.views, stats.visitors, stats.bounces), (3, 2, 2))
+        self.assertEqual(DailySiteStats.objects.get(day=self.hour.date()).visitors, 2)
+        self.assertEqual(DailySiteStats.objects.aggregate(views=Sum('views'))['views'], 5)
+
+        self.assertEqual(rollups.roll_up()['rows'], 0)
+        self.assertEqual(RollupWatermark.objects.get().last_id, PageView.objects.latest('pk').pk)
+
+    def test_readers_add_the_unrolled_tail(self):
+        self.views(('/a', 'v1', 5, True), ('/b', 'v1', 6, False))
+        rollups.roll_up()
+        self.views(('/b', 'v2', 7, False), ('/b', 'v3', 8, True))
+        self.assertEqual(rollups.total_views([self.site.pk]), 4)
+        # Bounce rates come from sessions: v1 entered at /a and went on, v2 and v3 saw /b only
+        sessions.sessionize()
+        self.assertEqual(rollups.page_stats(self.site.pk), [
+            {'url': 'https://acme.example/b', 'views': 3, 'avg_duration': 10, 'bounce_rate': 100},
+            {'url': 'https://acme.example/a', 'views': 1, 'avg_duration': 10, 'bounce_rate': 0},
+        ])
+
+        user = get_user_model().objects.create_user(username='owner', password='pass1234')
+        TenantUser.objects.create(user=user, tenant=self.tenant, role='owner')
+        self.client.force_login(user)
+        self.assertEqual(self.client.get('/analytics/').context['metrics']['total_pageviews'], 4)
+        response = self.client.get(f'/analytics/sites/{self.site.pk}/')
+        self.assertEqual([page['views'] for page in response.context['pages']], [3, 1])
+
+    def test_unique_visitors_merge_hour_and_day_sketches(self):
+        day = self.hour.replace(hour=0)
+        self.hour = day - timedelta(days=1)
+        # v1..v3 on the day before, v3..v5 on the day, v6 an hour into the next day
+        self.views(*[('/a', f'v{i}', 60 * 23, True) for i in (1, 2, 3)])
+        self.views(*[('/a', f'v{i}', 60 * 24 + 60 * i, True) for i in (3, 4, 5)])
+        rollups.roll_up()
+        self.views(('/a', 'v6', 60 * 49, True))
+        self.assertEqual(VisitorSketch.objects.filter(period=VisitorSketch.DAY).count(), 2)
+        self.assertEqual(DailySiteStats.objects.get(day=day.date()).visitors, 3)
+
+        self.assertEqual(rollups.unique_visitors(self.site.pk, day - timedelta(days=1), day + timedelta(days=2)), 6)
+        self.assertEqual(rollups.unique_visitors(self.site.pk, day, day + timedelta(days=1)), 3)
+        # Hour edges: from 23:00 of the day before; the end is floored to 04:00, before v4
+        self.assertEqual(rollups.unique_visitors(self.site.pk, day - timedelta(hours=1), day + timedelta(hours=4, minutes=30)), 3)
+        self.assertEqual(rollups.unique_visitors(self.site.pk, day - timedelta(hours=1), day + timedelta(hours=5)), 4)
+
+        user = get_user_model().objects.create_user(username='owner', password='pass1234')
+        TenantUser.objects.create(user=user, tenant=self.tenant, role='owner')
+        self.client.force_login(user)
+        url = f'/analytics/api/sites/{self.site.pk}/unique-visitors/'
+        response = self.client.get(url, {'start': str(day.date()), 'end': str(day.date() + timedelta(days=1))})
+        self.assertEqual(response.json()['visitors'], 4)
+        self.assertEqual(self.client.get(url, {'start': 'yesterday'}).status_code, 400)
+        self.assertEqual(self.client.get(url, {'start': '2026-02-01', 'end': '2026-01-01'}).status_code, 400)
+
+
+class PageViewArchiveTests(TestCase):
+    def setUp(self):
+        tenant = Tenant.objects.create(name='Acme', region='US')
+        self.site = Site.objects.create(tenant=tenant, domain='https://acme.example')
+        self.archive_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.archive_dir.cleanup)
+        self.day = (datetime.now(timezone.utc) - timedelta(days=100)).date()
+        self.start = datetime(self.day.year, self.day.month, self.day.day, 12, tzinfo=timezone.utc)
+
+    def view(self, minutes, path='/a', **fields):
+        return PageView.objects.create(site=self.site, url=f'https://acme.example{path}', visitor_id='v1',
+                                       timestamp=self.start + timedelta(minutes=minutes, microseconds=7), **fields)
+
+    def archive(self):
+        return pageview_archive.archive_pageviews(retention_days=90, directory=self.archive_dir.name)
+
+    def test_aged_rolled_up_views_move_to_columnar_files(self):
+        self.view(5, '/b', duration=30, bounce=False, referrer='https://search.example/?q=a')
+        self.view(1)
+        self.view(-60 * 13, '/a')
+        self.view(60 * 24 * 99, '/recent')
+        rollups.roll_up()
+        sessions.sessionize()
+        late = self.view(3, '/late')
+        fields = pageview_archive.COLUMNS
+        expected = list(PageView.objects.exclude(pk=late.pk).exclude(url__endswith='/recent')
+                        .order_by('timestamp', 'pk').values_list(*fields))
+
+        self.assertEqual(self.archive(), {'rows': 3, 'days': 2})
+        # Views the rollups have not counted yet, and recent ones, stay in the table
+        self.assertEqual(sorted(PageView.objects.values_list('url', flat=True)),
+                         ['https://acme.example/late', 'https://acme.example/recent'])
+        self.assertEqual(DailySiteStats.objects.aggregate(views=Sum('views'))['views'], 4)
+        self.assertEqual(list(pageview_archive.scan(self.site.pk, self.day - timedelta(days=1), self.day,
+                                                    directory=self.archive_dir.name)), expected)
+
+        rollups.roll_up()
+        # Not read by the sessionizer yet
+        self.assertEqual(self.archive(), {'rows': 0, 'days': 0})
+        sessions.sessionize()
+        self.assertEqual(self.archive(), {'rows': 1, 'days': 1})
+        path = pageview_archive.day_path(self.site.pk, self.day, self.archive_dir.name)
+        with pageview_archive.ArchivedDay(path) as archived:
+            self.assertEqual(len(archived), 3)
+            self.assertEqual(archived.column('url'), ['https://acme.example/a', 'https://acme.example/late',
+                                                      'https://acme.example/b'])
+            self.assertEqual(archived.column('referrer'), [None, None, 'https://search.example/?q=a'])
+            self.assertEqual(archived.counts('visitor_id'), {'v1': 3})
+            self.assertEqual(archived.column('timestamp')[0], self.start + timedelta(minutes=1, microseconds=7))
+        self.assertEqual(self.archive(), {'rows': 0, 'days': 0})
+
+
+class SessionTests(TestCase):
+    def setUp(self):
+        self.tenant = Tenant.objects.create(name='Acme', region='US')
+        self.site = Site.objects.create(tenant=self.tenant, domain='https://acme.example')
+        self.start = datetime.now(timezone.utc).replace(microsecond=0) - timedelta(hours=3)
+
+    def at(self, minutes):
+        return self.start + timedelta(minutes=minutes)
+
+    def view(self, visitor_id, minutes, path='/', duration=10):
+        PageView.objects.create(site=self.site, url=f'https://acme.example{path}', visitor_id=visitor_id,
+                                timestamp=self.at(minutes), duration=duration, bounce=False)
+
+    def test_sessionizer_splits_on_inactivity_and_bounds_open_sessions(self):
+        sessionizer = sessions.Sessionizer(timedelta(minutes=30), max_open=2)
+        sessionizer.feed(1, 'a', self.at(0), '/1', 5)
+        sessionizer.feed(1, 'a', self.at(-1), '/0', 5)  # slightly out of order: new entry page
+        sessionizer.feed(1, 'a', self.at(10), '/2', 20)
+        sessionizer.feed(1, 'b', self.at(11), '/1', 5)
+        sessionizer.feed(1, 'c', self.at(12), '/1', 5)  # over max_open: a, least recently active, closes
+        sessionizer.feed(1, 'b', self.at(50), '/3', 5)  # b and c idle past the timeout close; b starts over
+        sessionizer.feed(1, 'b', self.at(5), '/late', 5)  # its session is gone: kept apart
+        closed = sessionizer.take_changes()
+        summary = [(s.visitor_id, s.entry_url, s.exit_url, s.pages, s.duration, s.closed) for s in closed]
+        self.assertEqual(summary, [
+            ('a', '/0', '/2', 3, 11 * 60 + 20, True),
+            ('b', '/1', '/1', 1, 5, True),
+            ('c', '/1', '/1', 1, 5, True),
+            ('b', '/late', '/late', 1, 5, True),
+            ('b', '/3', '/3', 1, 5, False),
+        ])
+        self.assertEqual(sessionizer.take_changes(), [])
+
+    def test_sessions_continue_across_runs(self):
+        self.view('v1', 0, '/a')
+        self.view('v1', 5, '/b')
+        self.view('v2', 170, '/a')
+        self.assertEqual(sessions.sessionize(batch_size=2), {'rows': 3, 'closed': 1, 'open': 1})
+        first = VisitorSession.objects.get(visitor_id='v1')
+        self.assertEqual((first.entry_url, first.exit_url, first.pages, first.duration, first.closed),
+                         ('https://acme.example/a', 'https://acme.example/b', 2, 5 * 60 + 10, True))
+
+        self.view('v2', 175, '/c', duration=30)
+        self.assertEqual(sessions.sessionize(), {'rows': 1, 'closed': 0, 'open': 1})
+        second = VisitorSession.objects.get(visitor_id='v2')
+        self.assertEqual((second.pages, second.exit_url, second.duration, second.closed),
+                         (2, 'https://acme.example/c', 5 * 60 + 30, False))
+        self.assertEqual(VisitorSession.objects.count(), 2)
+
+        self.view('v3', 0, '/a')
+        self.assertEqual(sessions.session_stats(self.site.pk, self.at(-1), self.at(180)), {
+            'sessions': 2, 'bounce_rate': 0, 'avg_duration': 320, 'pages_per_session': 2.0,
+        })
+        # v2 is idle past the timeout by the time its session is looked at with no new hits
+        with override_settings(ANALYTICS_SESSION_TIMEOUT_MINUTES=1):
+            self.assertEqual(sessions.sessionize(), {'rows': 1, 'closed': 2, 'open': 0})
+
+        user = get_user_model().objects.create_user(username='owner', password='pass1234')
+        TenantUser.objects.create(user=user, tenant=self.tenant, role='owner')
+        self.client.force_login(user)
+        response = self.client.get(f'/analytics/api/sites/{self.site.pk}/sessions/')
+        self.assertEqual((response.json()['sessions'], response.json()['bounce_rate']), (3, 33))
+        self.assertEqual(self.client.get(f'/analytics/sites/{self.site.pk}/').context['session_stats']['sessions'], 3)
@@ -1,15 +1,33 @@
+from datetime import datetime, time, timedelta, timezone
+
 from django.shortcuts import render, get_object_or_404, redirect
 from django.views.decorators.csrf import csrf_exempt
 from django.contrib.auth.decorators import login_required
-from rest_framework import viewsets, permissions
+from django.utils.dateparse import parse_date, parse_datetime
+from rest_framework import viewsets, permissions, status
 from rest_framework.decorators import action
 from rest_framework.response import Response
-from .models import Site, KeywordCluster, ContentItem, FAQ, PageView
-from tenants.models import Tenant, TenantUser
+from .models import Site, KeywordCluster, ContentItem, FAQ
+from .serializers import SiteSerializer, KeywordClusterSerializer, ContentItemSerializer, FAQSerializer
+from .services import hll, rollups, sessions
+from tenants.mixins import TenantScopedViewSetMixin
+from icycon.db_routers import replica_reads
+
+DEFAULT_VISITOR_DAYS = 30
+
+def _moment(value, end=False):
+    """A UTC datetime for an ISO date or datetime; an ``end`` date includes the whole day."""
+    day = parse_date(value)
+    if day is not None:
+        return datetime.combine(day + timedelta(days=1 if end else 0), time.min, tzinfo=timezone.utc)
+    moment = parse_datetime(value)
+    if moment is None:
+        raise ValueError(value)
+    return moment if moment.tzinfo else moment.replace(tzinfo=timezone.utc)
 
-class SiteViewSet(viewsets.ModelViewSet):
+class SiteViewSet(TenantScopedViewSetMixin, viewsets.ModelViewSet):
     queryset = Site.objects.all()
-    serializer_class = None  # TODO: Move serializers
+    serializer_class = SiteSerializer
     permission_classes = [permissions.IsAuthenticated]
 
     @csrf_exempt
@@ -23,26 +41,68 @@ class SiteViewSet(viewsets.ModelViewSet):
         site = self.get_object()
         return Response({"message": "[DRY RUN] CWV audit simulated (no task executed)"})
 
-class KeywordClusterViewSet(viewsets.ModelViewSet):
+    def _date_range(self, request):
+        """``(start, end)`` from ``?start=&end=``; see ``unique_visitors``. Raises ValueError."""
+        today = datetime.now(timezone.utc).date()
+        start = _moment(request.query_params.get('start') or str(today - timedelta(days=DEFAULT_VISITOR_DAYS - 1)))
+        end = _moment(request.query_params.get('end') or str(today), end=True)
+        if start >= end:
+            raise ValueError('start must be before end')
+        return start, end
+
+    @action(detail=True, methods=["get"], url_path='unique-visitors')
+    def unique_visitors(self, request, pk=None):
+        """Estimated distinct visitors from ``start`` to ``end``, from the HyperLogLog sketches.
+
+        Both take an ISO date or datetime (UTC unless given); an ``end`` date
+        is included and datetimes are floored to the hour. The default is the
+        last ``DEFAULT_VISITOR_DAYS`` days including today.
+        """
+        site = self.get_object()
+        try:
+            start, end = self._date_range(request)
+        except ValueError:
+            return Response({'error': 'start and end must be ISO dates or datetimes, start before end'},
+                            status=status.HTTP_400_BAD_REQUEST)
+        return Response({
+            'start': start,
+            'end': end,
+            'visitors': rollups.unique_visitors(site.pk, start, end),
+            'standard_error': round(hll.STANDARD_ERROR, 4),
+        })
+
+    @action(detail=True, methods=["get"], url_path='sessions')
+    def session_metrics(self, request, pk=None):
+        """Sessions starting from ``start`` to ``end`` (as for ``unique-visitors``) and their bounce rate,
+        average duration and pages per session."""
+        site = self.get_object()
+        try:
+            start, end = self._date_range(request)
+        except ValueError:
+            return Response({'error': 'start and end must be ISO dates or datetimes, start before end'},
+                            status=status.HTTP_400_BAD_REQUEST)
+        return Response({'start': start, 'end': end, **sessions.session_stats(site.pk, start, end)})
+
+class KeywordClusterViewSet(TenantScopedViewSetMixin, viewsets.ModelViewSet):
     queryset = KeywordCluster.objects.all()
-    serializer_class = None  # TODO: Move serializers
+    serializer_class = KeywordClusterSerializer
     permission_classes = [permissions.IsAuthenticated]
 
-class ContentItemViewSet(viewsets.ModelViewSet):
+class ContentItemViewSet(TenantScopedViewSetMixin, viewsets.ModelViewSet):
     queryset = ContentItem.objects.all()
-    serializer_class = None  # TODO: Move serializers
+    serializer_class = ContentItemSerializer
     permission_classes = [permissions.IsAuthenticated]
 
-class FAQViewSet(viewsets.ModelViewSet):
+class FAQViewSet(TenantScopedViewSetMixin, viewsets.ModelViewSet):
     queryset = FAQ.objects.all()
-    serializer_class = None  # TODO: Move serializers
+    serializer_class = FAQSerializer
     permission_classes = [permissions.IsAuthenticated]
 
 @login_required
+@replica_reads
 def dashboard(request):
     """Combined SEO and Analytics dashboard."""
-    tenant_qs = Tenant.objects.filter(tenantuser__user=request.user)
-    tenant = tenant_qs.first()
+    tenant = request.tenant
     if not tenant:
         return render(request, 'analytics/no_tenant.html')
 
@@ -51,7 +111,7 @@ def dashboard(request):
         'site_count': sites.count(),
         'keyword_clusters': KeywordCluster.objects.filter(tenant=tenant).count(),
         'content_items': ContentItem.objects.filter(tenant=tenant).count(),
-        'total_pageviews': PageView.objects.filter(site__tenant=tenant).count(),
+        'total_pageviews': rollups.total_views(sites.values_list('pk', flat=True)),
     }
     return render(request, 'analytics/dashboard.html', {
         'tenant': tenant,
@@ -61,8 +121,7 @@ def dashboard(request):
 
 @login_required
 def site_list(request):
-    tenant_qs = Tenant.objects.filter(tenantuser__user=request.user)
-    tenant = tenant_qs.first()
+    tenant = request.tenant
     if not tenant:
         return render(request, 'analytics/no_tenant.html')
     sites = Site.objects.filter(tenant=tenant)
@@ -70,8 +129,7 @@ def site_list(request):
 
 @login_required
 def site_detail(request, site_id):
-    tenant_qs = Tenant.objects.filter(tenantuser__user=request.user)
-    tenant = tenant_qs.first()
+    tenant = request.tenant
     if not tenant:
         return render(request, 'analytics/no_tenant.html')
 
@@ -80,22 +138,24 @@ def site_detail(request, site_id):
     content_items = ContentItem.objects.filter(tenant=tenant)
     faqs = FAQ.objects.filter(tenant=tenant)
     
-    # Add analytics data
-    pageviews = PageView.objects.filter(site=site).order_by('-timestamp')[:100]
-    
+    # Per-URL stats of the last week, from the rollups and sessions
+    pages = rollups.page_stats(site.pk)
+    now = datetime.now(timezone.utc)
+    session_stats = sessions.session_stats(site.pk, now - timedelta(days=7), now)
+
     return render(request, 'analytics/site_detail.html', {
         'tenant': tenant,
         'site': site,
         'keyword_clusters': keyword_clusters,
         'content_items': content_items,
         'faqs': faqs,
-        'pageviews': pageviews,
+        'pages': pages,
+        'session_stats': session_stats,
     })
 
 @login_required
 def site_create(request):
-    tenant_qs = Tenant.objects.filter(tenantuser__user=request.user)
-    tenant = tenant_qs.first()
+    tenant = request.tenant
     if not tenant:
         return render(request, 'analytics/no_tenant.html')
 
@@ -135,8 +195,7 @@ def site_create(request):
 
 @login_required
 def site_edit(request, site_id):
-    tenant_qs = Tenant.objects.filter(tenantuser__user=request.user)
-    tenant = tenant_qs.first()
+    tenant = request.tenant
     if not tenant:
         return render(request, 'analytics/no_tenant.html')
 
@@ -178,8 +237,7 @@ def site_edit(request, site_id):
 @login_required
 def keyword_clusters(request):
     """Analytics Keyword Clusters view."""
-    tenant_qs = Tenant.objects.filter(tenantuser__user=request.user)
-    tenant = tenant_qs.first()
+    tenant = request.tenant
     if not tenant:
         return render(request, 'analytics/no_tenant.html')
     
@@ -193,8 +251,7 @@ def keyword_clusters(request):
 @login_required
 def content_items(request):
     """Analytics Content Items view."""
-    tenant_qs = Tenant.objects.filter(tenantuser__user=request.user)
-    tenant = tenant_qs.first()
+    tenant = request.tenant
     if not tenant:
         return render(request, 'analytics/no_tenant.html')
     
@@ -208,8 +265,7 @@ def content_items(request):
 @login_required
 def faqs(request):
     """Analytics FAQs view."""
-    tenant_qs = Tenant.objects.filter(tenantuser__user=request.user)
-    tenant = tenant_qs.first()
+    tenant = request.tenant
     if not tenant:
         return render(request, 'analytics/no_tenant.html')
     
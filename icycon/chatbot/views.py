@@ -5,7 +5,7 @@ from rest_framework.permissions import IsAuthenticated
 from rest_framework.response import Response
 from django.shortcuts import get_object_or_404
 from django.conf import settings
-from tenants.models import Tenant, TenantUser
+from tenants.models import Tenant
 from .models import Conversation, Message
 
 # Set OpenAI API key from settings
@@ -43,11 +43,10 @@ def send_message(request):
     if len(text) > 1000:  # Reasonable limit for message length
         return Response({'error': 'Message too long'}, status=400)
 
-    # Verify tenant access
+    # Verify tenant access against the cached membership
     try:
-        tenant = Tenant.objects.get(id=tenant_id)
-        TenantUser.objects.get(user=user, tenant=tenant)
-    except (Tenant.DoesNotExist, TenantUser.DoesNotExist):
+        tenant = Tenant.objects.filter(id__in=request.tenant_membership.tenant_ids).get(id=tenant_id)
+    except Tenant.DoesNotExist:
         return Response({'error': 'Invalid tenant or unauthorized'}, status=403)
 
     # Get or create conversation
@@ -0,0 +1,89 @@
+"""
+Primary/replica database routing.
+
+Writes always go to ``default``. Reads go to a replica (one of
+``settings.DATABASE_REPLICAS``) only inside views that opt in with
+``replica_reads`` / ``ReplicaReadMixin``, and only while the client is not
+pinned to the primary. A client is pinned for ``REPLICA_PIN_SECONDS`` after
+any request that wrote to the database (see ``ReplicaPinningMiddleware``), and
+a request is pinned from its first write onwards, which gives read-your-writes
+behaviour despite replication lag.
+"""
+
+import random
+from contextlib import contextmanager
+from contextvars import ContextVar
+from functools import wraps
+
+from django.conf import settings
+
+SAFE_METHODS = ('GET', 'HEAD', 'OPTIONS')
+
+# Apps whose reads never go to a replica; a lagging session row would log users out
+PRIMARY_ONLY_APPS = ('sessions',)
+
+# True while the current view may read from a replica
+_replica_reads = ContextVar('replica_reads', default=False)
+# True once the current request (or client, via cookie) must read from the primary
+_pinned = ContextVar('pinned_to_primary', default=False)
+# True once the current request has written to the primary
+_wrote = ContextVar('wrote_to_primary', default=False)
+
+
+def pin_to_primary():
+    _pinned.set(True)
+    _wrote.set(True)
+
+
+class PrimaryReplicaRouter:
+    def db_for_read(self, model, **hints):
+        replicas = getattr(settings, 'DATABASE_REPLICAS', [])
+        if (
+            replicas
+            and _replica_reads.get()
+            and not _pinned.get()
+            and model._meta.app_label not in PRIMARY_ONLY_APPS
+        ):
+            return random.choice(replicas)
+        return 'default'
+
+    def db_for_write(self, model, **hints):
+        pin_to_primary()
+        return 'default'
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Replicas hold the same data as the primary
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return db == 'default'
+
+
+@contextmanager
+def read_from_replica(request):
+    """Route reads in this block to a replica when it is safe to do so."""
+    if request.method not in SAFE_METHODS or _pinned.get():
+        yield
+        return
+    token = _replica_reads.set(True)
+    try:
+        yield
+    finally:
+        _replica_reads.reset(token)
+
+
+def replica_reads(view_func):
+    """Decorator for read-heavy function views (dashboards, listings)."""
+    @wraps(view_func)
+    def _wrapped_view(request, *args, **kwargs):
+        with read_from_replica(request):
+            return view_func(request, *args, **kwargs)
+    return _wrapped_view
+
+
+class ReplicaReadMixin:
+    """DRF viewset mixin that serves safe-method requests from a replica."""
+
+    def dispatch(self, request, *args, **kwargs):
+        with read_from_replica(request):
+            return super().dispatch(request, *args, **kwargs)
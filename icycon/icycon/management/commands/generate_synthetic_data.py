@@ -0,0 +1,316 @@
+import itertools
+import random
+import time
+from datetime import timedelta
+from decimal import Decimal
+
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+from django.core.management.base import BaseCommand, CommandError
+from django.db import models, transaction
+from django.db.models.deletion import get_candidate_relations_to_delete
+from django.utils import timezone
+
+from analytics.models import Site as AnalyticsSite, PageView
+from analytics.services import rollups, sessions
+from marketplace.models import Product
+from seo.models import Site, KeywordCluster, ContentItem, FAQ, Backlink
+from social_media.models import Post, Engagement
+from tenants.models import Tenant, TenantUser
+
+User = get_user_model()
+
+WORDS = (
+    'seo analytics growth content marketing audit backlink keyword ranking '
+    'traffic conversion funnel launch pricing guide tutorial review compare '
+    'best tools strategy local mobile speed schema sitemap crawl index'
+).split()
+REFERRING_DOMAINS = [f'ref{i}.example.net' for i in range(5000)]
+PATHS = ['/', '/pricing/', '/blog/', '/about/', '/contact/', '/docs/', '/features/', '/signup/']
+
+
+class Command(BaseCommand):
+    help = (
+        'Generate synthetic tenants, sites, page views, backlinks and products with batched '
+        'bulk_create, then roll the page views up into the rollup and session tables. Example at '
+        'production scale: --tenants 1000 --pageviews 10000000 --backlinks 1000000 --products 100000'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--tenants', type=int, default=20)
+        parser.add_argument('--users-per-tenant', type=int, default=3)
+        parser.add_argument('--sites-per-tenant', type=int, default=2)
+        parser.add_argument('--content-per-site', type=int, default=25)
+        parser.add_argument('--pageviews', type=int, default=50000)
+        parser.add_argument('--backlinks', type=int, default=10000)
+        parser.add_argument('--products', type=int, default=1000)
+        parser.add_argument('--posts-per-tenant', type=int, default=10)
+        parser.add_argument('--days', type=int, default=90, help='Spread of generated timestamps')
+        parser.add_argument('--batch-size', type=int, default=5000)
+        parser.add_argument('--seed', type=int, default=42)
+        parser.add_argument('--prefix', default='synth', help='Name prefix used to find/clear generated rows')
+        parser.add_argument('--clear', action='store_true', help='Delete previously generated rows first')
+
+    def handle(self, *args, **options):
+        if options['batch_size'] < 1:
+            raise CommandError('--batch-size must be positive')
+        if options['users_per_tenant'] < 1:
+            raise CommandError('--users-per-tenant must be at least 1 (products and posts need an author)')
+        self.batch_size = options['batch_size']
+        self.rng = random.Random(options['seed'])
+        self.prefix = options['prefix']
+        self.now = timezone.now()
+        self.days = max(options['days'], 1)
+
+        if options['clear']:
+            self._clear()
+
+        started = time.perf_counter()
+        tenant_ids = self._tenants(options['tenants'])
+        user_ids = self._users(tenant_ids, options['users_per_tenant'])
+        site_ids = self._seo_sites(tenant_ids, options['sites_per_tenant'])
+        self._seo_content(tenant_ids, options['content_per_site'] * options['sites_per_tenant'])
+        self._backlinks(site_ids, options['backlinks'])
+        analytics_site_ids = self._analytics_sites(tenant_ids, options['sites_per_tenant'])
+        self._pageviews(analytics_site_ids, options['pageviews'])
+        self._rollups()
+        self._products(tenant_ids, user_ids, options['products'])
+        self._posts(tenant_ids, user_ids, options['posts_per_tenant'])
+
+        self.stdout.write(self.style.SUCCESS(f'Done in {time.perf_counter() - started:.1f}s'))
+
+    # Helpers
+
+    def _insert(self, model, rows, total):
+        """bulk_create ``rows`` (an iterable of unsaved instances) in batches."""
+        started = time.perf_counter()
+        created = 0
+        rows = iter(rows)
+        while True:
+            batch = list(itertools.islice(rows, self.batch_size))
+            if not batch:
+                break
+            with transaction.atomic():
+                model.objects.bulk_create(batch, batch_size=self.batch_size)
+            created += len(batch)
+            if total > self.batch_size and self.stdout.isatty():
+                self.stdout.write(f'  {model.__name__}: {created}/{total}', ending='\r')
+        elapsed = time.perf_counter() - started
+        rate = created / elapsed if elapsed else 0
+        self.stdout.write(f'  {model.__name__}: {created} rows in {elapsed:.1f}s ({rate:,.0f} rows/s)')
+        return created
+
+    def _timestamp(self):
+        return self.now - timedelta(seconds=self.rng.randrange(self.days * 86400))
+
+    def _title(self, words=4):
+        return ' '.join(self.rng.choice(WORDS) for _ in range(words)).capitalize()
+
+    def _skewed(self, ids, k):
+        """Yield ``k`` ids with a long-tail distribution (a few very busy rows)."""
+        weights = list(itertools.accumulate(1 / (rank + 1) for rank in range(len(ids))))
+        while k > 0:
+            chunk = min(k, self.batch_size)
+            yield from self.rng.choices(ids, cum_weights=weights, k=chunk)
+            k -= chunk
+
+    def _clear(self):
+        self.stdout.write(f'Clearing rows generated with prefix "{self.prefix}"')
+        started = time.perf_counter()
+        deleted = {}
+        # Foreign keys are checked at commit, so tables can be emptied in any order
+        with transaction.atomic():
+            self._purge(Tenant._base_manager.filter(name__startswith=f'{self.prefix} '), deleted)
+            self._purge(User._base_manager.filter(username__startswith=f'{self.prefix}_'), deleted)
+        for label, rows in sorted(deleted.items()):
+            self.stdout.write(f'  {label}: {rows} rows')
+        self.stdout.write(f'  cleared in {time.perf_counter() - started:.1f}s')
+
+    def _purge(self, queryset, deleted, path=()):
+        """Delete ``queryset`` and what cascades from it with one DELETE per table, loading no rows.
+
+        Unlike ``QuerySet.delete()`` this sends no signals and skips the
+        querysets' derived-data hooks; everything derived from the rows goes with them.
+        """
+        model = queryset.model
+        path = path + (model,)
+        # The relations Collector follows, including hidden ones and m2m through tables
+        for relation in get_candidate_relations_to_delete(model._meta):
+            # Self-references are reached through the rows' other relations
+            if relation.related_model in path:
+                continue
+            children = relation.related_model._base_manager.filter(**{f'{relation.field.name}__in': queryset})
+            if relation.on_delete is models.CASCADE:
+                self._purge(children, deleted, path)
+            elif relation.on_delete is models.SET_NULL:
+                children.update(**{relation.field.name: None})
+        self._count(deleted, model, queryset)
+
+    def _count(self, deleted, model, queryset):
+        rows = queryset._raw_delete(queryset.db)
+        if rows:
+            deleted[model._meta.label] = deleted.get(model._meta.label, 0) + rows
+
+    # Generators
+
+    def _tenants(self, count):
+        self.stdout.write(f'Tenants ({count})')
+        if Tenant.objects.filter(name__startswith=f'{self.prefix} ').exists():
+            raise CommandError(f'Rows with prefix "{self.prefix}" already exist; use --clear or --prefix')
+        regions = ['US', 'EU', 'APAC']
+        self._insert(Tenant, (
+            Tenant(name=f'{self.prefix} Tenant {i}', region=self.rng.choice(regions), plan=self.rng.choice(['free', 'pro']))
+            for i in range(count)
+        ), count)
+        return list(Tenant.objects.filter(name__startswith=f'{self.prefix} ').order_by('pk').values_list('pk', flat=True))
+
+    def _users(self, tenant_ids, per_tenant):
+        total = len(tenant_ids) * per_tenant
+        self.stdout.write(f'Users ({total})')
+        # Hash once; generated accounts share the password "synthetic"
+        password = make_password('synthetic')
+        self._insert(User, (
+            User(username=f'{self.prefix}_{t}_{n}', email=f'{self.prefix}_{t}_{n}@example.com', password=password)
+            for t in tenant_ids for n in range(per_tenant)
+        ), total)
+        users = dict(User.objects.filter(username__startswith=f'{self.prefix}_').values_list('username', 'pk'))
+        roles = ['owner', 'admin', 'editor', 'viewer']
+        self._insert(TenantUser, (
+            TenantUser(user_id=users[f'{self.prefix}_{t}_{n}'], tenant_id=t, role=roles[min(n, len(roles) - 1)])
+            for t in tenant_ids for n in range(per_tenant)
+        ), total)
+        return {t: [users[f'{self.prefix}_{t}_{n}'] for n in range(per_tenant)] for t in tenant_ids}
+
+    def _seo_sites(self, tenant_ids, per_tenant):
+        total = len(tenant_ids) * per_tenant
+        self.stdout.write(f'SEO sites ({total})')
+        self._insert(Site, (
+            Site(tenant_id=t, domain=f'https://site{n}.tenant{t}.example', sitemaps_url=f'https://site{n}.tenant{t}.example/sitemap.xml')
+            for t in tenant_ids for n in range(per_tenant)
+        ), total)
+        return list(Site.objects.filter(tenant_id__in=tenant_ids).values_list('pk', flat=True))
+
+    def _seo_content(self, tenant_ids, per_tenant):
+        total = len(tenant_ids) * per_tenant
+        self.stdout.write(f'Content items, keyword clusters and FAQs ({total} each)')
+        types = [choice for choice, _ in ContentItem.TYPE_CHOICES]
+        # bulk_create derives ContentItem.site from the url (and the search index and JSON-LD)
+        self._insert(ContentItem, (
+            ContentItem(
+                tenant_id=t, type=self.rng.choice(types), url=f'https://site0.tenant{t}.example/content/{n}',
+                status=self.rng.choice(['draft', 'published', 'published']), draft_html=f'<p>{self._title(30)}</p>',
+            )
+            for t in tenant_ids for n in range(per_tenant)
+        ), total)
+        self._insert(KeywordCluster, (
+            KeywordCluster(
+                tenant_id=t, intent=self.rng.choice(['informational', 'commercial', 'transactional', 'navigational']),
+                terms=[self._title(self.rng.randint(1, 4)).lower() for _ in range(self.rng.randint(3, 12))],
+            )
+            for t in tenant_ids for _ in range(per_tenant)
+        ), total)
+        self._insert(FAQ, (
+            FAQ(tenant_id=t, question=f'{self._title(6)}?', answer=self._title(25))
+            for t in tenant_ids for _ in range(per_tenant)
+        ), total)
+
+    def _backlinks(self, site_ids, count):
+        self.stdout.write(f'Backlinks ({count})')
+        if not site_ids:
+            return
+        per_site = itertools.count()
+        statuses = ['active'] * 8 + ['lost', 'broken']
+        self._insert(Backlink, (
+            Backlink(
+                site_id=site_id,
+                # The running counter keeps (site, source, target) unique
+                source_url=f'https://{self.rng.choice(REFERRING_DOMAINS)}/page/{next(per_site)}',
+                target_url=f'https://target.example{self.rng.choice(PATHS)}',
+                anchor_text=self._title(3),
+                domain_rating=int(self.rng.betavariate(2, 5) * 100),
+                page_authority=int(self.rng.betavariate(2, 5) * 100),
+                status=self.rng.choice(statuses),
+                is_dofollow=self.rng.random() < 0.7,
+                last_checked=self._timestamp(),
+            )
+            for site_id in self._skewed(site_ids, count)
+        ), count)
+
+    def _analytics_sites(self, tenant_ids, per_tenant):
+        total = len(tenant_ids) * per_tenant
+        self.stdout.write(f'Analytics sites ({total})')
+        self._insert(AnalyticsSite, (
+            AnalyticsSite(tenant_id=t, domain=f'https://site{n}.tenant{t}.example')
+            for t in tenant_ids for n in range(per_tenant)
+        ), total)
+        return list(AnalyticsSite.objects.filter(tenant_id__in=tenant_ids).values_list('pk', flat=True))
+
+    def _pageviews(self, site_ids, count):
+        self.stdout.write(f'Page views ({count})')
+        if not site_ids:
+            return
+        visitors = max(count // 20, 1)
+        self._insert(PageView, (
+            PageView(
+                site_id=site_id,
+                url=f'https://site.example{self.rng.choice(PATHS)}',
+                visitor_id=f'v{self.rng.randrange(visitors)}',
+                timestamp=self._timestamp(),
+                duration=int(self.rng.expovariate(1 / 45)),
+                bounce=self.rng.random() < 0.4,
+                referrer=self.rng.choice([None, f'https://{self.rng.choice(REFERRING_DOMAINS)}/']),
+            )
+            for site_id in self._skewed(site_ids, count)
+        ), count)
+
+    def _rollups(self):
+        """Fold the page views into the hourly/daily rollups, sketches and sessions, as the periodic tasks do."""
+        self.stdout.write('Page view rollups and sessions')
+        started = time.perf_counter()
+        rolled = rollups.roll_up()
+        sessionized = sessions.sessionize()
+        self.stdout.write(
+            f'  {rolled["rows"]} page views rolled up, {sessionized["closed"] + sessionized["open"]} sessions '
+            f'in {time.perf_counter() - started:.1f}s'
+        )
+
+    def _products(self, tenant_ids, user_ids, count):
+        self.stdout.write(f'Products ({count})')
+        categories = [choice for choice, _ in Product.CATEGORY_CHOICES]
+
+        def rows():
+            for tenant_id in self._skewed(tenant_ids, count):
+                status = self.rng.choice(['draft', 'published', 'published', 'published', 'archived'])
+                yield Product(
+                    tenant_id=tenant_id,
+                    created_by_id=user_ids[tenant_id][0],
+                    title=self._title(3),
+                    description=self._title(40),
+                    category=self.rng.choice(categories),
+                    status=status,
+                    price=Decimal(self.rng.randrange(0, 50000)) / 100,
+                    review_count=self.rng.randrange(50),
+                    rating=Decimal(self.rng.randrange(100, 500)) / 100,
+                    published_at=self._timestamp() if status == 'published' else None,
+                )
+        if tenant_ids:
+            self._insert(Product, rows(), count)
+
+    def _posts(self, tenant_ids, user_ids, per_tenant):
+        total = len(tenant_ids) * per_tenant
+        self.stdout.write(f'Social posts ({total})')
+        self._insert(Post, (
+            Post(
+                tenant_id=t, author_id=user_ids[t][0], title=self._title(5), content=self._title(60),
+                status=self.rng.choice(['draft', 'published']), platforms=['x', 'linkedin'],
+            )
+            for t in tenant_ids for _ in range(per_tenant)
+        ), total)
+        post_ids = list(Post.objects.filter(tenant_id__in=tenant_ids).values_list('pk', flat=True))
+        self._insert(Engagement, (
+            Engagement(
+                post_id=post_id, platform=platform, likes=self.rng.randrange(500),
+                shares=self.rng.randrange(100), impressions=self.rng.randrange(10000), timestamp=self._timestamp(),
+            )
+            for post_id in post_ids for platform in ('x', 'linkedin')
+        ), total * 2)
@@ -0,0 +1,112 @@
+import json
+import math
+import statistics
+import time
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.test import Client
+
+from icycon.profiling import QueryRecorder
+from tenants.models import TenantUser
+
+User = get_user_model()
+
+# Representative read paths: server-rendered dashboards and the busiest APIs
+DEFAULT_PATHS = [
+    '/seo/ui/',
+    '/seo/ui/sites/',
+    '/analytics/',
+    '/marketplace/products/',
+    '/marketplace/my-products/',
+    '/marketplace/sales/',
+    '/seo/sites/',
+    '/seo/keywords/',
+    '/seo/content-items/',
+    '/analytics/api/sites/',
+    '/social-media/api/posts/',
+    '/social-media/api/engagements/',
+]
+
+
+def percentile(values, pct):
+    """Nearest-rank percentile of a non-empty list."""
+    ordered = sorted(values)
+    rank = max(math.ceil(pct / 100 * len(ordered)), 1)
+    return ordered[rank - 1]
+
+
+class Command(BaseCommand):
+    help = (
+        'Replay representative requests in-process and report p50/p95 latency and query '
+        'counts per path. Run after generate_synthetic_data for a repeatable baseline.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--username', help='User to log in as (default: owner of the first tenant)')
+        parser.add_argument('--path', action='append', dest='paths', help='Path to request (repeatable)')
+        parser.add_argument('--iterations', type=int, default=20)
+        parser.add_argument('--warmup', type=int, default=2, help='Unmeasured requests per path')
+        parser.add_argument('--json', dest='json_path', help='Also write results to this file')
+
+    def handle(self, *args, **options):
+        if options['iterations'] < 1:
+            raise CommandError('--iterations must be positive')
+        user = self._user(options['username'])
+        client = Client(raise_request_exception=False, HTTP_HOST=self._host())
+        client.force_login(user)
+        self.stdout.write(f'Benchmarking as {user.username}, {options["iterations"]} iterations per path')
+
+        results = []
+        for path in options['paths'] or DEFAULT_PATHS:
+            for _ in range(options['warmup']):
+                client.get(path)
+            timings, query_counts, statuses = [], [], set()
+            for _ in range(options['iterations']):
+                with QueryRecorder() as recorder:
+                    started = time.perf_counter()
+                    response = client.get(path)
+                    timings.append((time.perf_counter() - started) * 1000)
+                query_counts.append(recorder.profile.count)
+                statuses.add(response.status_code)
+            results.append({
+                'path': path,
+                'status': sorted(statuses),
+                'p50_ms': round(percentile(timings, 50), 2),
+                'p95_ms': round(percentile(timings, 95), 2),
+                'mean_ms': round(statistics.fmean(timings), 2),
+                'queries': max(query_counts),
+            })
+
+        self._report(results)
+        if options['json_path']:
+            with open(options['json_path'], 'w', encoding='utf-8') as fh:
+                json.dump({'user': user.username, 'iterations': options['iterations'], 'results': results}, fh, indent=2)
+            self.stdout.write(f'Wrote {options["json_path"]}')
+
+    def _user(self, username):
+        if username:
+            try:
+                return User.objects.get(username=username)
+            except User.DoesNotExist:
+                raise CommandError(f'User not found: {username}')
+        # The first tenant's owner has the most data under generate_synthetic_data's skew
+        membership = TenantUser.objects.filter(role='owner').select_related('user').order_by('tenant_id').first()
+        if membership is None:
+            raise CommandError('No tenant owner found; run generate_synthetic_data or pass --username')
+        return membership.user
+
+    def _host(self):
+        for host in settings.ALLOWED_HOSTS:
+            if host == '*' or not host.startswith('.'):
+                return 'localhost' if host == '*' else host
+        return 'localhost'
+
+    def _report(self, results):
+        width = max(len(r['path']) for r in results)
+        self.stdout.write(f'{"path":<{width}}  {"status":>7}  {"p50 ms":>8}  {"p95 ms":>8}  {"queries":>7}')
+        for r in results:
+            status = ','.join(str(s) for s in r['status'])
+            line = f'{r["path"]:<{width}}  {status:>7}  {r["p50_ms"]:>8.2f}  {r["p95_ms"]:>8.2f}  {r["queries"]:>7}'
+            self.stdout.write(self.style.ERROR(line) if any(s >= 500 for s in r['status']) else line)
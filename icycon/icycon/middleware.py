@@ -0,0 +1,79 @@
+import logging
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.urls import Resolver404, resolve
+
+from .db_routers import SAFE_METHODS, _pinned, _wrote
+from .profiling import N_PLUS_ONE_THRESHOLD, QueryRecorder, get_query_budget
+
+logger = logging.getLogger(__name__)
+
+
+class ReplicaPinningMiddleware:
+    """Keep a client on the primary database for a while after it writes.
+
+    Requests carrying the pin cookie read from the primary. Any request that
+    writes (or uses an unsafe method) refreshes the cookie for
+    ``REPLICA_PIN_SECONDS``. Place it near the top of ``MIDDLEWARE`` so the
+    session save on the way out is counted as a write too.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.cookie_name = getattr(settings, 'REPLICA_PIN_COOKIE', 'db_pin')
+        self.pin_seconds = getattr(settings, 'REPLICA_PIN_SECONDS', 5)
+
+    def __call__(self, request):
+        pinned_token = _pinned.set(self.cookie_name in request.COOKIES)
+        wrote_token = _wrote.set(False)
+        try:
+            response = self.get_response(request)
+            if _wrote.get() or request.method not in SAFE_METHODS:
+                response.set_cookie(
+                    self.cookie_name, '1', max_age=self.pin_seconds, httponly=True, samesite='Lax'
+                )
+        finally:
+            _pinned.reset(pinned_token)
+            _wrote.reset(wrote_token)
+        return response
+
+
+class SQLProfilingMiddleware:
+    """Report the SQL issued by each request (opt-in via ``SQL_PROFILING``).
+
+    Adds ``X-SQL-Count``, ``X-SQL-Time-Ms``, ``X-SQL-Duplicates`` and
+    ``X-SQL-N-Plus-One`` headers and logs one structured record per request.
+    Requests that repeat a statement shape ``SQL_PROFILING_N_PLUS_ONE`` times
+    or exceed the view's declared ``query_budget`` are logged as warnings.
+    Keep it first in ``MIDDLEWARE`` so session and auth queries are counted.
+    """
+
+    def __init__(self, get_response):
+        if not getattr(settings, 'SQL_PROFILING', False):
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.threshold = getattr(settings, 'SQL_PROFILING_N_PLUS_ONE', N_PLUS_ONE_THRESHOLD)
+
+    def __call__(self, request):
+        with QueryRecorder() as recorder:
+            response = self.get_response(request)
+
+        stats = recorder.profile.as_dict(self.threshold)
+        response['X-SQL-Count'] = str(stats['sql_count'])
+        response['X-SQL-Time-Ms'] = '%.2f' % stats['sql_time_ms']
+        response['X-SQL-Duplicates'] = str(stats['sql_duplicates'])
+        response['X-SQL-N-Plus-One'] = str(len(stats['sql_n_plus_one']))
+
+        try:
+            budget = get_query_budget(resolve(request.path_info).func)
+        except Resolver404:
+            budget = None
+        stats.update(method=request.method, path=request.path, status=response.status_code, sql_budget=budget)
+
+        over_budget = budget is not None and stats['sql_count'] > budget
+        if over_budget or stats['sql_n_plus_one']:
+            logger.warning('SQL profile %s %s: %d queries', request.method, request.path, stats['sql_count'], extra=stats)
+        else:
+            logger.info('SQL profile %s %s: %d queries', request.method, request.path, stats['sql_count'], extra=stats)
+        return response
@@ -0,0 +1,125 @@
+"""
+Per-request SQL profiling.
+
+``QueryRecorder`` hooks every database connection with an execute wrapper and
+keeps the statements run inside it. ``QueryProfile`` summarises them: query
+count, total time, exact duplicates (same SQL and params) and repeated
+fingerprints (same SQL shape with different params), which is what an N+1
+looks like from the database side.
+"""
+
+import re
+import time
+from collections import Counter
+from contextlib import ExitStack
+
+from django.db import connections
+
+# A statement shape repeated this many times in one request is reported as N+1
+N_PLUS_ONE_THRESHOLD = 5
+
+_STRING_RE = re.compile(r"'(?:[^']|'')*'")
+_NUMBER_RE = re.compile(r'\b\d+(?:\.\d+)?\b')
+_PARAM_RE = re.compile(r'%s|\?')
+_IN_LIST_RE = re.compile(r'\bIN\s*\((?:\s*\?\s*,?)+\)', re.IGNORECASE)
+_WHITESPACE_RE = re.compile(r'\s+')
+
+
+def fingerprint(sql):
+    """Normalise ``sql`` so statements differing only in literals compare equal."""
+    sql = _STRING_RE.sub('?', sql)
+    sql = _NUMBER_RE.sub('?', sql)
+    sql = _PARAM_RE.sub('?', sql)
+    sql = _IN_LIST_RE.sub('IN (...)', sql)
+    return _WHITESPACE_RE.sub(' ', sql).strip()
+
+
+def query_budget(max_queries):
+    """Declare how many queries a view may issue.
+
+    Works on function views (in any position among other ``functools.wraps``
+    decorators); DRF viewsets set a ``query_budget`` class attribute instead.
+    The budget is enforced by ``icycon.testing.QueryBudgetTestMixin`` and
+    reported by ``SQLProfilingMiddleware``.
+    """
+    def decorator(view_func):
+        view_func.query_budget = max_queries
+        return view_func
+    return decorator
+
+
+def get_query_budget(view_func):
+    """Return the budget declared on a resolved view callable, or None."""
+    budget = getattr(view_func, 'query_budget', None)
+    if budget is None:
+        # DRF as_view() callables expose the viewset/view class
+        budget = getattr(getattr(view_func, 'cls', None), 'query_budget', None)
+    return budget
+
+
+class QueryProfile:
+    def __init__(self, queries):
+        self.queries = queries
+
+    @property
+    def count(self):
+        return len(self.queries)
+
+    @property
+    def time_ms(self):
+        return sum(q['duration'] for q in self.queries) * 1000
+
+    @property
+    def duplicates(self):
+        """Number of statements that repeat an earlier one exactly."""
+        seen = Counter((q['alias'], q['sql'], repr(q['params'])) for q in self.queries)
+        return sum(n - 1 for n in seen.values())
+
+    def repeated(self, threshold=N_PLUS_ONE_THRESHOLD):
+        """Fingerprints seen at least ``threshold`` times, most frequent first."""
+        counts = Counter(fingerprint(q['sql']) for q in self.queries)
+        return [(fp, n) for fp, n in counts.most_common() if n >= threshold]
+
+    def as_dict(self, threshold=N_PLUS_ONE_THRESHOLD):
+        return {
+            'sql_count': self.count,
+            'sql_time_ms': round(self.time_ms, 2),
+            'sql_duplicates': self.duplicates,
+            'sql_n_plus_one': [{'fingerprint': fp, 'count': n} for fp, n in self.repeated(threshold)],
+        }
+
+
+class QueryRecorder:
+    """Context manager recording every statement on every configured database."""
+
+    def __init__(self):
+        self.queries = []
+        self._stack = None
+
+    def __enter__(self):
+        self._stack = ExitStack()
+        for conn in connections.all():
+            self._stack.enter_context(conn.execute_wrapper(self._make_wrapper(conn.alias)))
+        return self
+
+    def __exit__(self, *exc_info):
+        self._stack.close()
+        return False
+
+    def _make_wrapper(self, alias):
+        def wrapper(execute, sql, params, many, context):
+            start = time.perf_counter()
+            try:
+                return execute(sql, params, many, context)
+            finally:
+                self.queries.append({
+                    'alias': alias,
+                    'sql': sql,
+                    'params': params,
+                    'duration': time.perf_counter() - start,
+                })
+        return wrapper
+
+    @property
+    def profile(self):
+        return QueryProfile(self.queries)
@@ -0,0 +1,40 @@
+from contextlib import contextmanager
+
+from django.urls import resolve
+
+from .profiling import N_PLUS_ONE_THRESHOLD, QueryRecorder, get_query_budget
+
+
+class QueryBudgetTestMixin:
+    """TestCase mixin that fails when a view exceeds its declared query budget.
+
+    Views declare budgets with ``@query_budget(n)`` or a ``query_budget``
+    class attribute on viewsets; ``assertWithinQueryBudget`` requests the URL
+    and checks the count and that no statement shape repeats like an N+1.
+    """
+
+    n_plus_one_threshold = N_PLUS_ONE_THRESHOLD
+
+    @contextmanager
+    def assertMaxQueries(self, max_queries):
+        with QueryRecorder() as recorder:
+            yield recorder
+        self._check_profile(recorder.profile, max_queries)
+
+    def assertWithinQueryBudget(self, url, method='get', **kwargs):
+        budget = get_query_budget(resolve(url).func)
+        if budget is None:
+            self.fail('%s does not declare a query_budget' % url)
+        with self.assertMaxQueries(budget):
+            response = getattr(self.client, method)(url, **kwargs)
+        return response
+
+    def _check_profile(self, profile, max_queries):
+        details = '\n'.join('%d. %s' % (i, q['sql']) for i, q in enumerate(profile.queries, 1))
+        if profile.count > max_queries:
+            self.fail('%d queries executed, budget is %d:\n%s' % (profile.count, max_queries, details))
+        repeated = profile.repeated(self.n_plus_one_threshold)
+        if repeated:
+            self.fail('Repeated statements (likely N+1):\n%s' % '\n'.join(
+                '%dx %s' % (n, fp) for fp, n in repeated
+            ))
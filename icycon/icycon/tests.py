@@ -0,0 +1,111 @@
+import io
+
+from django.contrib.sessions.models import Session
+from django.core.management import call_command
+from django.db.models import Sum
+from django.http import HttpResponse
+from django.test import RequestFactory, SimpleTestCase, TestCase, override_settings
+
+from analytics.models import HourlyPageStats, PageView, VisitorSession
+from seo.models import BacklinkProfile, ContentItem, Site
+from tenants.models import Tenant
+
+from .db_routers import PrimaryReplicaRouter, read_from_replica
+from .middleware import ReplicaPinningMiddleware
+
+
+@override_settings(DATABASE_REPLICAS=['replica_0'], REPLICA_PIN_SECONDS=5, REPLICA_PIN_COOKIE='db_pin')
+class PrimaryReplicaRouterTests(SimpleTestCase):
+    def setUp(self):
+        self.router = PrimaryReplicaRouter()
+        self.factory = RequestFactory()
+
+    def _serve(self, request, view):
+        """Run ``view`` behind the pinning middleware inside a replica-read block; returns (response, result)."""
+        seen = {}
+
+        def get_response(request):
+            with read_from_replica(request):
+                seen['result'] = view()
+            return HttpResponse()
+
+        response = ReplicaPinningMiddleware(get_response)(request)
+        return response, seen['result']
+
+    def test_reads_outside_opted_in_views_use_the_primary(self):
+        self.assertEqual(self.router.db_for_read(Site), 'default')
+
+    def test_safe_request_reads_from_replica_and_writes_to_primary(self):
+        def view():
+            return self.router.db_for_read(Site), self.router.db_for_write(Site)
+
+        response, (read, write) = self._serve(self.factory.get('/'), view)
+        self.assertEqual((read, write), ('replica_0', 'default'))
+        self.assertIn('db_pin', response.cookies)
+
+    def test_request_pinned_after_its_first_write(self):
+        def view():
+            before = self.router.db_for_read(Site)
+            self.router.db_for_write(Site)
+            return before, self.router.db_for_read(Site)
+
+        _, (before, after) = self._serve(self.factory.get('/'), view)
+        self.assertEqual((before, after), ('replica_0', 'default'))
+
+    def test_read_only_request_sets_no_cookie(self):
+        response, read = self._serve(self.factory.get('/'), lambda: self.router.db_for_read(Site))
+        self.assertEqual(read, 'replica_0')
+        self.assertNotIn('db_pin', response.cookies)
+
+    def test_unsafe_method_reads_from_primary_and_pins(self):
+        response, read = self._serve(self.factory.post('/'), lambda: self.router.db_for_read(Site))
+        self.assertEqual(read, 'default')
+        self.assertEqual(response.cookies['db_pin']['max-age'], 5)
+
+    def test_pin_cookie_routes_reads_to_primary_until_it_expires(self):
+        pinned = self.factory.get('/')
+        pinned.COOKIES['db_pin'] = '1'
+        _, read = self._serve(pinned, lambda: self.router.db_for_read(Site))
+        self.assertEqual(read, 'default')
+        # The browser drops the cookie after max-age; the next request reads from the replica again
+        _, read = self._serve(self.factory.get('/'), lambda: self.router.db_for_read(Site))
+        self.assertEqual(read, 'replica_0')
+
+    def test_pin_does_not_leak_into_the_next_request(self):
+        self._serve(self.factory.get('/'), lambda: self.router.db_for_write(Site))
+        _, read = self._serve(self.factory.get('/'), lambda: self.router.db_for_read(Site))
+        self.assertEqual(read, 'replica_0')
+
+    def test_primary_only_apps(self):
+        _, read = self._serve(self.factory.get('/'), lambda: self.router.db_for_read(Session))
+        self.assertEqual(read, 'default')
+
+    @override_settings(DATABASE_REPLICAS=[])
+    def test_without_replicas_everything_uses_the_primary(self):
+        _, read = self._serve(self.factory.get('/'), lambda: self.router.db_for_read(Site))
+        self.assertEqual(read, 'default')
+
+    def test_migrations_only_on_the_primary(self):
+        self.assertTrue(self.router.allow_migrate('default', 'seo'))
+        self.assertFalse(self.router.allow_migrate('replica_0', 'seo'))
+
+
+class GenerateSyntheticDataTests(TestCase):
+    def generate(self, *args):
+        call_command('generate_synthetic_data', '--tenants', '2', '--pageviews', '300', '--backlinks', '50',
+                     '--products', '5', '--posts-per-tenant', '2', '--content-per-site', '3', *args, stdout=io.StringIO())
+
+    def test_generates_derived_tables_and_clears_without_touching_other_rows(self):
+        keep = Tenant.objects.create(name='Acme', region='US')
+        Site.objects.create(tenant=keep, domain='https://acme.example')
+        self.generate()
+        self.assertFalse(ContentItem.objects.filter(site=None).exists())
+        self.assertEqual(HourlyPageStats.objects.aggregate(views=Sum('views'))['views'], 300)
+        self.assertTrue(VisitorSession.objects.exists())
+        self.assertTrue(BacklinkProfile.objects.exists())
+
+        self.generate('--clear', '--prefix', 'synth')
+        self.assertEqual(Tenant.objects.exclude(pk=keep.pk).count(), 2)
+        self.assertEqual(PageView.objects.count(), 300)
+        self.assertEqual(ContentItem.objects.count(), 12)
+        self.assertTrue(Site.objects.filter(tenant=keep).exists())
@@ -1,3 +1,42 @@
+from decimal import Decimal
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
 from django.test import TestCase
+from django.urls import reverse
+
+from icycon.testing import QueryBudgetTestMixin
+from tenants.models import Tenant, TenantUser
+from .models import Product, Review, Order
+
+User = get_user_model()
+
+
+class MyProductsQueryBudgetTests(QueryBudgetTestMixin, TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username='seller', password='pass1234')
+        tenant = Tenant.objects.create(name='Acme', region='US')
+        TenantUser.objects.create(user=self.user, tenant=tenant, role='owner')
+        buyer = User.objects.create_user(username='buyer', password='pass1234')
+        self.product = None
+        for i, status in enumerate(['draft', 'published', 'archived'] * 3):
+            product = Product.objects.create(
+                tenant=tenant, created_by=self.user, title=f'Product {i}',
+                description='Useful', category='software', status=status, price=Decimal('10.00'),
+            )
+            Review.objects.create(product=product, reviewer=buyer, tenant=tenant, rating=4, title='Good', comment='Ok')
+            for j in range(2):
+                Order.objects.create(
+                    order_number=f'ORD-{i}-{j}', product=product, buyer_tenant=tenant, buyer_user=buyer,
+                    unit_price=Decimal('10.00'), total_price=Decimal('10.00'), customer_email='b@example.com',
+                )
+            self.product = product
+        self.client.force_login(self.user)
 
-# Create your tests here.
+    def test_my_products_within_budget(self):
+        response = self.assertWithinQueryBudget(reverse('my-products'))
+        self.assertEqual(response.status_code, 200)
+        # One review and two orders per product must not multiply each other
+        product = next(p for p in response.context['products'] if p.pk == self.product.pk)
+        self.assertEqual(product.order_count, 2)
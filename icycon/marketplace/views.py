@@ -8,6 +8,8 @@ from datetime import datetime
 import uuid
 
 from .models import Product, Review, Order, SavedProduct, Conversation, Message
+from icycon.db_routers import replica_reads
+from icycon.profiling import query_budget
 
 
 def marketplace_home(request):
@@ -29,6 +31,7 @@ def marketplace_home(request):
     return render(request, 'marketplace/home.html', context)
 
 
+@replica_reads
 def product_list(request):
     """Browse all marketplace products with filtering and search."""
     products = Product.objects.filter(status='published').select_related('tenant')
@@ -64,10 +67,9 @@ def product_list(request):
     if sort in allowed_sorts:
         products = products.order_by(sort)
     
-    # Annotations for ratings and review counts
+    # Annotate ratings; review_count is already denormalized on Product
     products = products.annotate(
         avg_rating=Avg('reviews__rating'),
-        review_count=Count('reviews')
     )
     
     context = {
@@ -122,7 +124,7 @@ def product_create(request):
     """Create a new product listing."""
     if request.method == 'POST':
         # Get the user's primary tenant
-        tenant = request.user.tenantuser_set.first().tenant
+        tenant = request.tenant
         
         product = Product.objects.create(
             tenant=tenant,
@@ -228,14 +230,16 @@ def product_archive(request, product_id):
 
 
 @login_required
+@query_budget(8)
 def my_products(request):
     """View user's own product listings."""
+    # review_count is already denormalized on Product; distinct keeps the
+    # reviews x orders join from inflating order_count
     products = Product.objects.filter(
         created_by=request.user
     ).select_related('tenant').annotate(
         avg_rating=Avg('reviews__rating'),
-        review_count=Count('reviews'),
-        order_count=Count('orders')
+        order_count=Count('orders', distinct=True)
     )
     
     context = {
@@ -307,7 +311,7 @@ def unsave_product(request, product_id):
 def review_create(request, product_id):
     """Create or update a review."""
     product = get_object_or_404(Product, id=product_id)
-    tenant = request.user.tenantuser_set.first().tenant
+    tenant = request.tenant
     
     # Check if user has already reviewed
     existing_review = Review.objects.filter(
@@ -356,7 +360,7 @@ def review_create(request, product_id):
 def order_create(request, product_id):
     """Create an order/purchase."""
     product = get_object_or_404(Product, id=product_id, status='published')
-    buyer_tenant = request.user.tenantuser_set.first().tenant
+    buyer_tenant = request.tenant
     
     if request.method == 'POST':
         quantity = int(request.POST.get('quantity', 1))
@@ -438,6 +442,7 @@ def my_orders(request):
 
 
 @login_required
+@replica_reads
 def sales_dashboard(request):
     """View seller's sales analytics."""
     products = Product.objects.filter(created_by=request.user)
@@ -464,12 +469,12 @@ def sales_dashboard(request):
 def conversation_list(request):
     """View user's marketplace conversations."""
     buyer_conversations = Conversation.objects.filter(
-        buyer_tenant__tenantuser__user=request.user
-    ).select_related('product', 'seller_tenant').distinct()
+        buyer_tenant_id__in=request.tenant_membership.tenant_ids
+    ).select_related('product', 'seller_tenant')
     
     seller_conversations = Conversation.objects.filter(
-        seller_tenant__tenantuser__user=request.user
-    ).select_related('product', 'buyer_tenant').distinct()
+        seller_tenant_id__in=request.tenant_membership.tenant_ids
+    ).select_related('product', 'buyer_tenant')
     
     conversations = (buyer_conversations | seller_conversations).order_by('-updated_at')
     
@@ -488,8 +493,8 @@ def conversation_detail(request, conversation_id):
     )
     
     # Check permissions
-    is_buyer = conversation.buyer_tenant.tenantuser_set.filter(user=request.user).exists()
-    is_seller = conversation.seller_tenant.tenantuser_set.filter(user=request.user).exists()
+    is_buyer = conversation.buyer_tenant_id in request.tenant_membership.tenant_ids
+    is_seller = conversation.seller_tenant_id in request.tenant_membership.tenant_ids
     
     if not (is_buyer or is_seller):
         return redirect('conversation-list')
@@ -520,7 +525,7 @@ def conversation_detail(request, conversation_id):
 def conversation_start(request, product_id):
     """Start a conversation about a product."""
     product = get_object_or_404(Product, id=product_id)
-    buyer_tenant = request.user.tenantuser_set.first().tenant
+    buyer_tenant = request.tenant
     seller_tenant = product.tenant
     
     # Check if conversation already exists
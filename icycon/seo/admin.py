@@ -35,7 +35,7 @@ class CompetitorBacklinkAdmin(admin.ModelAdmin):
 
 @admin.register(LinkOpportunity)
 class LinkOpportunityAdmin(admin.ModelAdmin):
-    list_display = ('prospect_domain', 'priority', 'status', 'relevance_score', 'site')
+    list_display = ('prospect_domain', 'score', 'priority', 'status', 'relevance_score', 'site')
     list_filter = ('status', 'priority', 'site', 'created_at')
     search_fields = ('prospect_domain', 'contact_email', 'prospect_url')
-    readonly_fields = ('created_at', 'updated_at')
+    readonly_fields = ('score', 'created_at', 'updated_at')
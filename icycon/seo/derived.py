@@ -0,0 +1,161 @@
+"""
+Keeping data derived from model rows in step with every write path.
+
+Several seo tables are derived from others: search documents, stored
+JSON-LD, backlink aggregates, competitor gaps and a few computed columns.
+Single-row ``save()``/``delete()`` keep them current on the models, which
+use ``TrackedFieldsMixin`` to know what a row held before it changed.
+Bulk writes go through a ``DerivedQuerySet``: each ``Derived`` in its
+``derived`` tuple is run around ``bulk_create``, ``bulk_update``,
+``update`` and ``delete``, inside the write's transaction.
+"""
+
+from contextvars import ContextVar
+
+from django.db import models, transaction
+
+# bulk_update() issues its own update() calls, which the trackers must not see twice
+_bulk_updating = ContextVar('seo_bulk_updating', default=False)
+
+
+class TrackedFieldsMixin:
+    """Remembers the stored values of ``TRACKED_FIELDS`` (attnames) as a row is loaded and saved."""
+
+    TRACKED_FIELDS = ()
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        if not set(cls.TRACKED_FIELDS) & instance.get_deferred_fields():
+            instance.remember_stored_values()
+        return instance
+
+    def tracked_values(self):
+        return tuple(getattr(self, name) for name in self.TRACKED_FIELDS)
+
+    def remember_stored_values(self):
+        self._stored_values = self.tracked_values()
+
+    def stored_values(self, using=None):
+        """The tracked values as last loaded or saved; None for a row not saved yet.
+
+        Rows loaded with a tracked field deferred have none remembered: they
+        are read back from ``using`` if given, and are None otherwise.
+        """
+        if hasattr(self, '_stored_values'):
+            return self._stored_values
+        if using is None or self._state.adding or self.pk is None:
+            return None
+        return type(self)._base_manager.using(using).filter(pk=self.pk).values_list(*self.TRACKED_FIELDS).first()
+
+
+class BulkWrite:
+    """A bulk write in progress, as the ``Derived`` hooks see it.
+
+    ``kind`` is ``'create'``, ``'bulk_update'``, ``'update'`` or ``'delete'``.
+    ``objs`` are the instances written by the first two, ``fields`` the
+    fields ``bulk_update()`` writes and ``values`` the keyword arguments of
+    ``update()`` or ``bulk_create()``. Hooks may add to ``fields`` and
+    ``values`` before the write.
+    """
+
+    def __init__(self, queryset, kind, objs=None, fields=None, values=None):
+        self.queryset = queryset
+        self.kind = kind
+        self.objs = objs
+        self.fields = fields
+        self.values = values
+
+    @property
+    def model(self):
+        return self.queryset.model
+
+    @property
+    def using(self):
+        return self.queryset.db
+
+    def rows(self):
+        """The stored rows the write changes (none for creates)."""
+        if self.kind == 'create':
+            return self.model._base_manager.none()
+        if self.kind == 'bulk_update':
+            return self.model._base_manager.using(self.using).filter(pk__in=[obj.pk for obj in self.objs])
+        return self.queryset.order_by()
+
+    def feeds(self, derived):
+        """Whether the write can change ``derived``: creates and deletes always can."""
+        if self.kind == 'bulk_update':
+            return bool(derived.fields.intersection(self.fields))
+        if self.kind == 'update':
+            return bool(derived.fields.intersection(self.values))
+        return True
+
+
+class Derived:
+    """Data derived from a model's rows, kept in step by ``DerivedQuerySet``.
+
+    ``fields`` are the fields (names and attnames) that feed it;
+    ``bulk_update()`` and ``update()`` calls that set none of them pass it by.
+    """
+
+    fields = frozenset()
+
+    def prepare(self, write):
+        """Fill derived columns of the rows before they are written."""
+
+    def before(self, write):
+        """Capture what the stored rows feed before they change; passed on to ``after``."""
+
+    def after(self, write, captured):
+        """Bring the derived data up to date once the rows are written."""
+
+
+class DerivedQuerySet(models.QuerySet):
+    """Runs the ``derived`` trackers of its model around bulk writes."""
+
+    derived = ()
+
+    def _write(self, write, perform):
+        derived = [item for item in self.derived if write.feeds(item)]
+        if not derived:
+            return perform()
+        for item in derived:
+            item.prepare(write)
+        with transaction.atomic(using=self.db):
+            captured = [item.before(write) for item in derived]
+            result = perform()
+            for item, state in zip(derived, captured):
+                item.after(write, state)
+        return result
+
+    def bulk_create(self, objs, *args, **kwargs):
+        bulk_create = super().bulk_create
+        write = BulkWrite(self, 'create', objs=list(objs), values=kwargs)
+        return self._write(write, lambda: bulk_create(write.objs, *args, **write.values))
+
+    def bulk_update(self, objs, fields, *args, **kwargs):
+        bulk_update = super().bulk_update
+        write = BulkWrite(self, 'bulk_update', objs=list(objs), fields=list(fields))
+
+        def perform():
+            token = _bulk_updating.set(True)
+            try:
+                return bulk_update(write.objs, write.fields, *args, **kwargs)
+            finally:
+                _bulk_updating.reset(token)
+
+        return self._write(write, perform)
+
+    def update(self, **kwargs):
+        if _bulk_updating.get():
+            return super().update(**kwargs)
+        update = super().update
+        write = BulkWrite(self, 'update', values=kwargs)
+        return self._write(write, lambda: update(**write.values))
+
+    def delete(self):
+        delete = super().delete
+        return self._write(BulkWrite(self, 'delete'), delete)
+
+    delete.alters_data = True
+    delete.queryset_only = True
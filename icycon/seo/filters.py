@@ -0,0 +1,20 @@
+from rest_framework import filters
+
+from .services import search_index
+
+
+class FullTextSearchFilter(filters.SearchFilter):
+    """``?search=`` through the full-text index instead of ``LIKE '%term%'`` scans.
+
+    For viewsets over models indexed by ``seo.services.search_index``; the
+    queryset keeps its own ordering.
+    """
+
+    def filter_queryset(self, request, queryset, view):
+        query = request.query_params.get(self.search_param, '')
+        tenant_id = request.tenant_membership.tenant_id
+        matches = search_index.matching_ids(queryset.model, tenant_id, query, using=queryset.db)
+        if matches is None:
+            return queryset
+        return queryset.filter(pk__in=matches)
+
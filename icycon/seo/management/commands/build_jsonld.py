@@ -0,0 +1,27 @@
+from django.core.management.base import BaseCommand
+
+from seo.models import FAQ, ContentItem, FaqPageDocument
+from seo.services.jsonld_store import rebuild_faq_document, refresh_content_jsonld
+
+
+class Command(BaseCommand):
+    help = ('Recompute stored ContentItem JSON-LD and per-tenant FAQPage documents '
+            '(backfill, or after writes that bypass save()).')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--tenant', type=int, help='Only this tenant id')
+
+    def handle(self, *args, **options):
+        items = ContentItem.objects.all()
+        tenant_ids = set(FAQ.objects.values_list('tenant_id', flat=True).distinct())
+        tenant_ids |= set(FaqPageDocument.objects.values_list('tenant_id', flat=True))
+        if options['tenant']:
+            items = items.filter(tenant_id=options['tenant'])
+            tenant_ids &= {options['tenant']}
+
+        changed = refresh_content_jsonld(items)
+        for tenant_id in sorted(tenant_ids):
+            rebuild_faq_document(tenant_id)
+        self.stdout.write(self.style.SUCCESS(
+            f'{changed} content items updated, {len(tenant_ids)} FAQ documents rebuilt'
+        ))
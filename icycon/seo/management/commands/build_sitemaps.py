@@ -0,0 +1,26 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from seo.models import Site
+from seo.services.sitemap_builder import build_site_sitemaps
+
+
+class Command(BaseCommand):
+    help = 'Build the gzipped ContentItem sitemap shards of each site, rebuilding only shards whose rows changed.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--site', type=int, help='Only this site id')
+        parser.add_argument('--force', action='store_true', help='Rebuild every shard')
+
+    def handle(self, *args, **options):
+        sites = Site.objects.order_by('pk')
+        if options['site']:
+            sites = sites.filter(pk=options['site'])
+            if not sites.exists():
+                raise CommandError(f"Site not found: {options['site']}")
+
+        for site in sites.iterator():
+            result = build_site_sitemaps(site, force=options['force'])
+            self.stdout.write(
+                f"{site.domain}: {result['urls']:,} urls in {result['shards']} shards, "
+                f"{result['built']} rebuilt in {result['seconds']}s"
+            )
@@ -0,0 +1,32 @@
+from django.core.management.base import BaseCommand
+
+from seo.services import backlink_checker
+from seo.services.backlink_checker import check_backlinks, stale_backlinks
+
+
+class Command(BaseCommand):
+    help = 'Re-verify backlinks concurrently (asyncio) and write verdicts back in batches.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--site', type=int, help='Only check this site id')
+        parser.add_argument('--older-than', type=float, default=24, help='Hours since the last check')
+        parser.add_argument('--limit', type=int)
+        parser.add_argument('--concurrency', type=int, default=backlink_checker.DEFAULT_CONCURRENCY)
+        parser.add_argument('--per-domain', type=int, default=backlink_checker.DEFAULT_PER_DOMAIN)
+        parser.add_argument('--domain-delay', type=float, default=backlink_checker.DEFAULT_DOMAIN_DELAY)
+        parser.add_argument('--timeout', type=float, default=backlink_checker.DEFAULT_TIMEOUT)
+
+    def handle(self, *args, **options):
+        summary = check_backlinks(
+            stale_backlinks(options['site'], options['older_than']),
+            concurrency=options['concurrency'],
+            per_domain=options['per_domain'],
+            domain_delay=options['domain_delay'],
+            timeout=options['timeout'],
+            limit=options['limit'],
+        )
+        self.stdout.write(self.style.SUCCESS(
+            f"{summary['checked']} checked ({summary['unknown']} unreachable, {summary['changed']} changed, "
+            f"{summary['dofollow_changed']} follow changes) in {summary['seconds']}s, "
+            f"{summary['checks_per_minute']:,} checks/min"
+        ))
@@ -0,0 +1,41 @@
+import gzip
+
+from django.core.management.base import BaseCommand, CommandError
+
+from seo.services.keyword_clustering import DEFAULT_THRESHOLD, cluster_keywords, read_keywords
+from tenants.models import Tenant
+
+
+class Command(BaseCommand):
+    help = ("Cluster a keyword export (one per line, or CSV with keyword[,volume]) into a tenant's "
+            "KeywordClusters, adding to existing clusters where keywords match.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('tenant_id', type=int)
+        parser.add_argument('path', help='Keyword file (.txt or .csv, optionally .gz)')
+        parser.add_argument('--locale', default='en')
+        parser.add_argument('--threshold', type=float, default=DEFAULT_THRESHOLD,
+                            help='Minimum trigram Jaccard similarity to join a cluster')
+
+    def handle(self, *args, **options):
+        try:
+            tenant = Tenant.objects.get(pk=options['tenant_id'])
+        except Tenant.DoesNotExist:
+            raise CommandError(f"Tenant not found: {options['tenant_id']}")
+        if not 0 < options['threshold'] <= 1:
+            raise CommandError('--threshold must be in (0, 1]')
+
+        path = options['path']
+        opener = gzip.open if path.endswith('.gz') else open
+        try:
+            with opener(path, 'rb') as fh:
+                result = cluster_keywords(tenant, read_keywords(fh), locale=options['locale'],
+                                          threshold=options['threshold'])
+        except FileNotFoundError:
+            raise CommandError(f'File not found: {path}')
+
+        self.stdout.write(self.style.SUCCESS(
+            f"{result['keywords']:,} new keywords ({result['duplicates']:,} already clustered): "
+            f"{result['assigned']:,} added to {result['clusters_updated']:,} existing clusters, "
+            f"{result['clusters_created']:,} clusters created in {result['seconds']}s"
+        ))
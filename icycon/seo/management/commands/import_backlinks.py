@@ -0,0 +1,39 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from seo.models import Site
+from seo.services.backlink_import import (
+    DEFAULT_BATCH_SIZE, FORMATS, PARSE_ERRORS, detect_format, import_backlinks, iter_rows, open_export,
+)
+
+
+class Command(BaseCommand):
+    help = 'Stream a CSV/JSONL backlink export (optionally gzipped) into a site, upserting in batches.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('site_id', type=int)
+        parser.add_argument('path', help='Export file (.csv, .jsonl, optionally .gz)')
+        parser.add_argument('--format', choices=FORMATS, help='Override format detection')
+        parser.add_argument('--full', action='store_true', help='File is the complete link set; mark missing links lost')
+        parser.add_argument('--batch-size', type=int, default=DEFAULT_BATCH_SIZE)
+
+    def handle(self, *args, **options):
+        try:
+            site = Site.objects.get(pk=options['site_id'])
+        except Site.DoesNotExist:
+            raise CommandError(f"Site not found: {options['site_id']}")
+
+        path = options['path']
+        fmt = options['format'] or detect_format(path)
+        try:
+            with open(path, 'rb') as fh:
+                rows = iter_rows(open_export(fh, path), fmt)
+                result = import_backlinks(site, rows, full=options['full'], batch_size=options['batch_size'])
+        except FileNotFoundError:
+            raise CommandError(f'File not found: {path}')
+        except PARSE_ERRORS as exc:
+            raise CommandError(f'Could not parse {path}: {exc}')
+
+        self.stdout.write(self.style.SUCCESS(
+            f"{result['rows']} rows ({result['upserted']} upserted, {result['skipped']} skipped, "
+            f"{result['lost']} marked lost) in {result['seconds']}s, {result['rows_per_second']:,} rows/s"
+        ))
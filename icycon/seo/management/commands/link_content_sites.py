@@ -0,0 +1,20 @@
+from django.core.management.base import BaseCommand
+
+from seo.services.content_sites import BATCH_SIZE, backfill
+
+
+class Command(BaseCommand):
+    help = ("Link unlinked ContentItems to the tenant's Site their URL is on. Batches commit as they go; "
+            "pass --after with the last reported pk to resume an interrupted run.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--tenant', type=int, help='Only this tenant id')
+        parser.add_argument('--after', type=int, default=0, help='Skip items with pk up to this one')
+        parser.add_argument('--batch-size', type=int, default=BATCH_SIZE)
+
+    def handle(self, *args, **options):
+        def progress(totals):
+            self.stdout.write(f"scanned {totals['scanned']:,}, linked {totals['changed']:,}, last pk {totals['last_pk']}")
+
+        result = backfill(options['tenant'], after=options['after'], batch_size=options['batch_size'], progress=progress)
+        self.stdout.write(self.style.SUCCESS(f"{result['changed']:,} of {result['scanned']:,} items linked"))
@@ -0,0 +1,16 @@
+from django.core.management.base import BaseCommand
+
+from seo.tasks import rebuild_backlink_gaps_task
+
+
+class Command(BaseCommand):
+    help = 'Recompute cached competitor backlink gaps from scratch (backfills interned domain ids first).'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--site', type=int, help='Only rebuild this site id')
+
+    def handle(self, *args, **options):
+        result = rebuild_backlink_gaps_task(options['site'])
+        for site_id, gaps in result.items():
+            self.stdout.write(f'site {site_id}: {gaps} gap domains')
+        self.stdout.write(self.style.SUCCESS(f'{len(result)} site(s) rebuilt'))
@@ -0,0 +1,15 @@
+from django.core.management.base import BaseCommand
+
+from seo.services.search_index import KINDS, reindex
+
+
+class Command(BaseCommand):
+    help = 'Rebuild full-text search documents for content items, FAQs and keyword clusters.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--kind', choices=sorted(KINDS), help='Only this kind of document')
+        parser.add_argument('--tenant', type=int, help='Only this tenant id')
+
+    def handle(self, *args, **options):
+        written = reindex(options['kind'], options['tenant'])
+        self.stdout.write(self.style.SUCCESS(f'{written} search documents indexed'))
@@ -0,0 +1,16 @@
+from django.core.management.base import BaseCommand
+
+from seo.tasks import reconcile_backlink_profiles_task
+
+
+class Command(BaseCommand):
+    help = 'Recompute BacklinkProfile/ReferringDomain aggregates from Backlink and repair drift (run from cron).'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--site', type=int, help='Only reconcile this site id')
+
+    def handle(self, *args, **options):
+        result = reconcile_backlink_profiles_task(options['site'])
+        for site_id, drift in result['drift'].items():
+            self.stdout.write(f'site {site_id}: {drift}')
+        self.stdout.write(self.style.SUCCESS(f"{result['sites_repaired']} site(s) repaired"))
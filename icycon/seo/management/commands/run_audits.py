@@ -0,0 +1,43 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from seo.models import AuditJob, Site
+from seo.services.cwv_audit import DEFAULT_URLS_PER_SITE, create_job, requeue_stale, run_job
+
+
+class Command(BaseCommand):
+    help = (
+        'Run queued Core Web Vitals audit jobs, or audit --site/--all sites now, in a bounded '
+        'pool of collector processes. Jobs left running by a dead worker are queued again first.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--site', type=int, action='append', dest='sites', help='Audit this site id (repeatable)')
+        parser.add_argument('--all', action='store_true', help='Audit every site')
+        parser.add_argument('--urls-per-site', type=int, default=DEFAULT_URLS_PER_SITE)
+        parser.add_argument('--collector', help='Dotted path of the collector (default: settings.CWV_COLLECTOR)')
+        parser.add_argument('--workers', type=int, help='Collector processes (default: settings.CWV_AUDIT_WORKERS)')
+        parser.add_argument('--timeout', type=int, help='Seconds per audit (default: settings.CWV_AUDIT_TIMEOUT)')
+
+    def handle(self, *args, **options):
+        if options['sites'] or options['all']:
+            sites = Site.objects.order_by('pk')
+            if options['sites']:
+                sites = sites.filter(pk__in=options['sites'])
+            if not sites.exists():
+                raise CommandError('No matching sites')
+            job_ids = [create_job(sites, collector=options['collector'], urls_per_site=options['urls_per_site']).pk]
+        else:
+            requeued = requeue_stale(workers=options['workers'], timeout=options['timeout'])
+            if requeued:
+                self.stdout.write(self.style.WARNING(f'Requeued abandoned jobs: {", ".join(map(str, requeued))}'))
+            job_ids = list(AuditJob.objects.filter(status='queued').order_by('created_at').values_list('pk', flat=True))
+
+        for job_id in job_ids:
+            job = run_job(job_id, workers=options['workers'], timeout=options['timeout'])
+            if job is None:
+                continue
+            seconds = (job.finished_at - job.started_at).total_seconds()
+            style = self.style.SUCCESS if job.status == 'done' else self.style.ERROR
+            self.stdout.write(style(
+                f'Job {job.pk}: {job.completed} audited, {job.failed} failed of {job.total} in {seconds:.1f}s'
+            ))
@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from seo.tasks import score_link_opportunities_task
+
+
+class Command(BaseCommand):
+    help = 'Recompute link opportunity scores, e.g. after changing LINK_OPPORTUNITY_WEIGHTS.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--site', type=int, help='Only rescore this site id')
+
+    def handle(self, *args, **options):
+        result = score_link_opportunities_task(options['site'])
+        self.stdout.write(self.style.SUCCESS(f"{result['scored']} opportunities scored"))
@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from seo.tasks import snapshot_backlinks_task
+
+
+class Command(BaseCommand):
+    help = "Record today's backlink snapshot of every site (run daily) and thin out old snapshots."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--site', type=int, help='Only snapshot this site id')
+
+    def handle(self, *args, **options):
+        result = snapshot_backlinks_task(options['site'])
+        self.stdout.write(self.style.SUCCESS(f"{result['snapshots']} sites snapshotted"))
@@ -0,0 +1,50 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from seo.models import Site
+from seo.services.gsc_client import submit_sitemap
+from seo.services.sitemap_ingest import SitemapError, ingest_site
+
+
+class Command(BaseCommand):
+    help = (
+        "Stream each site's sitemap tree into its URL inventory and resubmit sites with "
+        "new, changed or removed entries to Search Console."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--site', type=int, help='Only this site id')
+        parser.add_argument('--source', help='Read the sitemap from this URL or local file instead (needs --site)')
+        parser.add_argument('--force', action='store_true', help='Refetch every file, ignoring lastmod and HTTP validators')
+        parser.add_argument('--no-submit', action='store_true', help='Only refresh the inventory')
+
+    def handle(self, *args, **options):
+        if options['source'] and not options['site']:
+            raise CommandError('--source needs --site')
+        sites = Site.objects.exclude(sitemaps_url='').order_by('pk')
+        if options['site']:
+            sites = Site.objects.filter(pk=options['site'])
+            if not sites.exists():
+                raise CommandError(f"Site not found: {options['site']}")
+
+        for site in sites.iterator():
+            kwargs = {'force': options['force']}
+            if options['source']:
+                # An explicit source given by the operator may be a local fixture
+                kwargs.update(allow_local=True)
+            try:
+                if options['no_submit']:
+                    result = ingest_site(site, url=options['source'], **kwargs)
+                else:
+                    result = submit_sitemap(site, source=options['source'], **kwargs)
+            except SitemapError as exc:
+                raise CommandError(str(exc))
+            line = (
+                f"{site.domain}: {result['files']} files read, {result['files_unchanged']} unchanged; "
+                f"{result['urls']:,} urls ({result['new']:,} new, {result['changed']:,} changed, "
+                f"{result['removed']:,} removed) in {result['seconds']}s"
+            )
+            if 'submitted' in result:
+                line += f"; {result['pending']:,} pending, {'submitted' if result['submitted'] else 'not submitted'}"
+            self.stdout.write(self.style.SUCCESS(line))
+            for error in result['errors']:
+                self.stderr.write(f'  {error}')
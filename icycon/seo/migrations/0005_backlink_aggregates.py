@@ -0,0 +1,62 @@
+# Generated by Django 4.2.23 on 2026-10-18 11:46
+
+from urllib.parse import urlsplit
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def backfill_source_domain(apps, schema_editor):
+    Backlink = apps.get_model('seo', 'Backlink')
+    batch = []
+    for backlink in Backlink.objects.only('pk', 'source_url').iterator(chunk_size=2000):
+        host = urlsplit(backlink.source_url).hostname or ''
+        backlink.source_domain = host[4:] if host.startswith('www.') else host
+        batch.append(backlink)
+        if len(batch) >= 2000:
+            Backlink.objects.bulk_update(batch, ['source_domain'])
+            batch = []
+    Backlink.objects.bulk_update(batch, ['source_domain'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('seo', '0004_backlinkprofile_linkopportunity_competitorbacklink_and_more'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ReferringDomain',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('domain', models.CharField(max_length=255)),
+                ('backlink_count', models.IntegerField(default=0)),
+            ],
+        ),
+        migrations.AddField(
+            model_name='backlink',
+            name='source_domain',
+            field=models.CharField(blank=True, default='', help_text='Derived from source_url', max_length=255),
+        ),
+        migrations.AddField(
+            model_name='backlinkprofile',
+            name='domain_rating_sum',
+            field=models.BigIntegerField(default=0, help_text='Running sum behind avg_domain_rating'),
+        ),
+        migrations.AddIndex(
+            model_name='backlink',
+            index=models.Index(fields=['site', 'source_domain'], name='seo_backlin_site_id_1c0afc_idx'),
+        ),
+        migrations.AddField(
+            model_name='referringdomain',
+            name='site',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='referring_domains', to='seo.site'),
+        ),
+        migrations.AlterUniqueTogether(
+            name='referringdomain',
+            unique_together={('site', 'domain')},
+        ),
+        # Profiles are then rebuilt with `manage.py reconcile_backlink_profiles`
+        migrations.RunPython(backfill_source_domain, migrations.RunPython.noop),
+    ]
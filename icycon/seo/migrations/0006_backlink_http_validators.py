@@ -0,0 +1,23 @@
+# Generated by Django 4.2.23 on 2026-10-18 11:48
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('seo', '0005_backlink_aggregates'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='backlink',
+            name='http_etag',
+            field=models.CharField(blank=True, default='', max_length=255),
+        ),
+        migrations.AddField(
+            model_name='backlink',
+            name='http_last_modified',
+            field=models.CharField(blank=True, default='', max_length=64),
+        ),
+    ]
@@ -0,0 +1,49 @@
+# Generated by Django 4.2.23 on 2026-10-18 11:54
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('seo', '0006_backlink_http_validators'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SitemapFile',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('url', models.URLField(max_length=2048)),
+                ('is_index', models.BooleanField(default=False)),
+                ('lastmod', models.DateTimeField(blank=True, help_text='lastmod advertised by the parent index', null=True)),
+                ('http_etag', models.CharField(blank=True, default='', max_length=255)),
+                ('http_last_modified', models.CharField(blank=True, default='', max_length=64)),
+                ('url_count', models.IntegerField(default=0)),
+                ('fetched_at', models.DateTimeField(blank=True, null=True)),
+                ('parent', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='children', to='seo.sitemapfile')),
+                ('site', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='sitemap_files', to='seo.site')),
+            ],
+            options={
+                'unique_together': {('site', 'url')},
+            },
+        ),
+        migrations.CreateModel(
+            name='SitemapUrl',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('loc', models.URLField(max_length=2048)),
+                ('lastmod', models.DateTimeField(blank=True, null=True)),
+                ('changed_at', models.DateTimeField()),
+                ('last_seen', models.DateTimeField()),
+                ('submitted_at', models.DateTimeField(blank=True, null=True)),
+                ('site', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='sitemap_urls', to='seo.site')),
+                ('sitemap', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='urls', to='seo.sitemapfile')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['site', 'changed_at'], name='seo_sitemap_site_id_8db260_idx'), models.Index(fields=['sitemap', 'last_seen'], name='seo_sitemap_sitemap_d62aca_idx')],
+                'unique_together': {('site', 'loc')},
+            },
+        ),
+    ]
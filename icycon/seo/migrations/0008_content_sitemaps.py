@@ -0,0 +1,43 @@
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+
+
+def backfill_updated_at(apps, schema_editor):
+    ContentItem = apps.get_model('seo', 'ContentItem')
+    ContentItem.objects.update(updated_at=models.F('created_at'))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('seo', '0007_sitemap_inventory'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='contentitem',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True, default=django.utils.timezone.now),
+            preserve_default=False,
+        ),
+        migrations.RunPython(backfill_updated_at, migrations.RunPython.noop),
+        migrations.CreateModel(
+            name='ContentSitemapShard',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('number', models.PositiveIntegerField()),
+                ('first_pk', models.BigIntegerField()),
+                ('last_pk', models.BigIntegerField()),
+                ('url_count', models.IntegerField(default=0)),
+                ('lastmod', models.DateTimeField(blank=True, null=True)),
+                ('fingerprint', models.CharField(blank=True, default='', max_length=64)),
+                ('built_at', models.DateTimeField(blank=True, null=True)),
+                ('site', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='content_sitemap_shards', to='seo.site')),
+            ],
+            options={
+                'ordering': ['site', 'number'],
+                'unique_together': {('site', 'number')},
+            },
+        ),
+    ]
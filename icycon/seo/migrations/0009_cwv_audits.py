@@ -0,0 +1,75 @@
+# Generated by Django 4.2.23 on 2026-10-18 12:02
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tenants', '0002_fix_tenantuser_fk'),
+        ('seo', '0008_content_sitemaps'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AuditJob',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('status', models.CharField(choices=[('queued', 'Queued'), ('running', 'Running'), ('done', 'Done'), ('failed', 'Failed')], default='queued', max_length=20)),
+                ('collector', models.CharField(max_length=255)),
+                ('targets', models.JSONField(default=list, help_text='[site_id, url] pairs to audit')),
+                ('total', models.IntegerField(default=0)),
+                ('completed', models.IntegerField(default=0)),
+                ('failed', models.IntegerField(default=0)),
+                ('error', models.TextField(blank=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('started_at', models.DateTimeField(blank=True, null=True)),
+                ('finished_at', models.DateTimeField(blank=True, null=True)),
+                ('tenant', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='seo_audit_jobs', to='tenants.tenant')),
+            ],
+        ),
+        migrations.CreateModel(
+            name='CwvSummary',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('url', models.URLField(blank=True, max_length=2048)),
+                ('samples', models.IntegerField(default=0)),
+                ('p75_lcp_ms', models.FloatField(blank=True, null=True)),
+                ('p75_fid_ms', models.FloatField(blank=True, null=True)),
+                ('p75_inp_ms', models.FloatField(blank=True, null=True)),
+                ('p75_cls', models.FloatField(blank=True, null=True)),
+                ('p75_ttfb_ms', models.FloatField(blank=True, null=True)),
+                ('window_start', models.DateTimeField()),
+                ('computed_at', models.DateTimeField()),
+                ('site', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='cwv_summaries', to='seo.site')),
+            ],
+            options={
+                'unique_together': {('site', 'url')},
+            },
+        ),
+        migrations.CreateModel(
+            name='CwvAudit',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('url', models.URLField(max_length=2048)),
+                ('collected_at', models.DateTimeField()),
+                ('collector', models.CharField(max_length=255)),
+                ('lcp_ms', models.FloatField(blank=True, null=True)),
+                ('fid_ms', models.FloatField(blank=True, null=True)),
+                ('inp_ms', models.FloatField(blank=True, null=True)),
+                ('cls', models.FloatField(blank=True, null=True)),
+                ('ttfb_ms', models.FloatField(blank=True, null=True)),
+                ('error', models.CharField(blank=True, max_length=500)),
+                ('job', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='audits', to='seo.auditjob')),
+                ('site', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='cwv_audits', to='seo.site')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['site', 'url', 'collected_at'], name='seo_cwvaudi_site_id_0b68cf_idx')],
+            },
+        ),
+        migrations.AddIndex(
+            model_name='auditjob',
+            index=models.Index(fields=['status', 'created_at'], name='seo_auditjo_status_79f147_idx'),
+        ),
+    ]
@@ -0,0 +1,37 @@
+# Generated by Django 4.2.23 on 2026-10-18 12:18
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tenants', '0002_fix_tenantuser_fk'),
+        ('seo', '0009_cwv_audits'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='contentitem',
+            name='json_ld_etag',
+            field=models.CharField(blank=True, default='', max_length=40),
+        ),
+        migrations.AlterField(
+            model_name='contentitem',
+            name='json_ld',
+            field=models.TextField(blank=True, help_text='Serialized JSON-LD, maintained by save()'),
+        ),
+        migrations.CreateModel(
+            name='FaqPageDocument',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('fragments', models.JSONField(default=dict)),
+                ('body', models.TextField(blank=True)),
+                ('etag', models.CharField(blank=True, default='', max_length=40)),
+                ('faq_count', models.IntegerField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('tenant', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='seo_faq_page', to='tenants.tenant')),
+            ],
+        ),
+    ]
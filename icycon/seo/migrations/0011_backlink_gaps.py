@@ -0,0 +1,66 @@
+# Generated by Django 4.2.23 on 2026-10-18 12:22
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('seo', '0010_jsonld'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='LinkDomain',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=255, unique=True)),
+            ],
+        ),
+        migrations.AddField(
+            model_name='backlinkprofile',
+            name='gaps_built_at',
+            field=models.DateTimeField(blank=True, help_text='When BacklinkGap rows were last fully rebuilt', null=True),
+        ),
+        migrations.AddField(
+            model_name='competitorbacklink',
+            name='source_domain',
+            field=models.CharField(blank=True, default='', help_text='Derived from source_url', max_length=255),
+        ),
+        migrations.AddField(
+            model_name='competitorbacklink',
+            name='link_domain',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.PROTECT, related_name='+', to='seo.linkdomain'),
+        ),
+        migrations.AddField(
+            model_name='referringdomain',
+            name='link_domain',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.PROTECT, related_name='+', to='seo.linkdomain'),
+        ),
+        migrations.AddIndex(
+            model_name='competitorbacklink',
+            index=models.Index(fields=['site', 'link_domain'], name='seo_competi_site_id_6ce2d6_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='referringdomain',
+            index=models.Index(fields=['site', 'link_domain'], name='seo_referri_site_id_775dea_idx'),
+        ),
+        migrations.CreateModel(
+            name='BacklinkGap',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('competitor_count', models.IntegerField(default=0)),
+                ('competitor_links', models.IntegerField(default=0)),
+                ('dofollow_links', models.IntegerField(default=0)),
+                ('domain_rating', models.IntegerField(default=0)),
+                ('score', models.IntegerField(default=0)),
+                ('link_domain', models.ForeignKey(on_delete=django.db.models.deletion.PROTECT, related_name='+', to='seo.linkdomain')),
+                ('site', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='backlink_gaps', to='seo.site')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['site', '-score'], name='seo_backlin_site_id_9dcc95_idx')],
+                'unique_together': {('site', 'link_domain')},
+            },
+        ),
+    ]
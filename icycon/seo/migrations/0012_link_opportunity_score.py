@@ -0,0 +1,34 @@
+# Generated by Django 4.2.23 on 2026-10-18 12:35
+
+from django.db import migrations, models
+
+
+def backfill_score(apps, schema_editor):
+    # The expression only reads columns and settings, so it applies to the historical model
+    from seo.services.opportunity_scoring import score_expression
+
+    LinkOpportunity = apps.get_model('seo', 'LinkOpportunity')
+    LinkOpportunity.objects.update(score=score_expression())
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('seo', '0011_backlink_gaps'),
+    ]
+
+    operations = [
+        migrations.AlterModelOptions(
+            name='linkopportunity',
+            options={'ordering': ['-score', 'id']},
+        ),
+        migrations.AddField(
+            model_name='linkopportunity',
+            name='score',
+            field=models.FloatField(default=0, editable=False, help_text='Composite ranking score (0-100)'),
+        ),
+        migrations.RunPython(backfill_score, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='linkopportunity',
+            index=models.Index(fields=['site', '-score', 'id'], name='seo_linkopp_site_id_256319_idx'),
+        ),
+    ]
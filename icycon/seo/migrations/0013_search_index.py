@@ -0,0 +1,113 @@
+# Generated by Django 4.2.23 on 2026-10-18 12:41
+
+from django.db import migrations, models
+import django.db.models.deletion
+from django.utils.html import strip_tags
+
+SQLITE_FORWARD = [
+    "CREATE VIRTUAL TABLE seo_searchdocument_fts USING fts5(title, body, scope, tokenize='unicode61 remove_diacritics 2')",
+    """CREATE TRIGGER seo_searchdocument_fts_insert AFTER INSERT ON seo_searchdocument BEGIN
+        INSERT INTO seo_searchdocument_fts (rowid, title, body, scope)
+        VALUES (new.id, new.title, new.body, 't' || new.tenant_id || ' k' || new.kind);
+    END""",
+    """CREATE TRIGGER seo_searchdocument_fts_update AFTER UPDATE ON seo_searchdocument BEGIN
+        DELETE FROM seo_searchdocument_fts WHERE rowid = old.id;
+        INSERT INTO seo_searchdocument_fts (rowid, title, body, scope)
+        VALUES (new.id, new.title, new.body, 't' || new.tenant_id || ' k' || new.kind);
+    END""",
+    """CREATE TRIGGER seo_searchdocument_fts_delete AFTER DELETE ON seo_searchdocument BEGIN
+        DELETE FROM seo_searchdocument_fts WHERE rowid = old.id;
+    END""",
+]
+SQLITE_REVERSE = [
+    "DROP TRIGGER IF EXISTS seo_searchdocument_fts_insert",
+    "DROP TRIGGER IF EXISTS seo_searchdocument_fts_update",
+    "DROP TRIGGER IF EXISTS seo_searchdocument_fts_delete",
+    "DROP TABLE IF EXISTS seo_searchdocument_fts",
+]
+POSTGRES_FORWARD = [
+    """ALTER TABLE seo_searchdocument ADD COLUMN search_vector tsvector GENERATED ALWAYS AS (
+        setweight(to_tsvector('simple', title), 'A') || setweight(to_tsvector('simple', body), 'B')
+    ) STORED""",
+    "CREATE INDEX seo_searchdocument_search_vector ON seo_searchdocument USING GIN (search_vector)",
+]
+POSTGRES_REVERSE = [
+    "DROP INDEX IF EXISTS seo_searchdocument_search_vector",
+    "ALTER TABLE seo_searchdocument DROP COLUMN IF EXISTS search_vector",
+]
+
+
+def _run(schema_editor, statements):
+    for statement in statements.get(schema_editor.connection.vendor, []):
+        schema_editor.execute(statement)
+
+
+def create_text_index(apps, schema_editor):
+    _run(schema_editor, {'sqlite': SQLITE_FORWARD, 'postgresql': POSTGRES_FORWARD})
+
+
+def drop_text_index(apps, schema_editor):
+    _run(schema_editor, {'sqlite': SQLITE_REVERSE, 'postgresql': POSTGRES_REVERSE})
+
+
+# Frozen copies of seo.services.search_index as of this migration
+BACKFILL_BATCH_SIZE = 500
+MAX_BODY_CHARS = 100_000
+
+
+def document_text(kind, row):
+    if kind == 'content':
+        brief = row.brief_json if isinstance(row.brief_json, dict) else {}
+        title = brief.get('title') or brief.get('name') or brief.get('topic') or row.url
+        extra = [brief.get(key) for key in ('description', 'summary', 'question')]
+        body = ' '.join([row.url, row.type, *(str(value) for value in extra if value), strip_tags(row.draft_html or '')])
+        title = str(title)
+    elif kind == 'faq':
+        title, body = row.question, row.answer
+    else:
+        title, body = row.intent, ' '.join(str(term) for term in row.terms or [])
+    return title, body[:MAX_BODY_CHARS]
+
+
+def backfill_documents(apps, schema_editor):
+    SearchDocument = apps.get_model('seo', 'SearchDocument')
+    for kind, model_name in (('content', 'ContentItem'), ('faq', 'FAQ'), ('keywords', 'KeywordCluster')):
+        model = apps.get_model('seo', model_name)
+        batch = []
+        for row in model.objects.order_by('pk').iterator(chunk_size=BACKFILL_BATCH_SIZE):
+            title, body = document_text(kind, row)
+            batch.append(SearchDocument(tenant_id=row.tenant_id, kind=kind, object_id=row.pk,
+                                        locale=getattr(row, 'locale', ''), title=title, body=body))
+            if len(batch) >= BACKFILL_BATCH_SIZE:
+                SearchDocument.objects.bulk_create(batch)
+                batch = []
+        SearchDocument.objects.bulk_create(batch)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tenants', '0002_fix_tenantuser_fk'),
+        ('seo', '0012_link_opportunity_score'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SearchDocument',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(choices=[('content', 'Content item'), ('faq', 'FAQ'), ('keywords', 'Keyword cluster')], max_length=20)),
+                ('object_id', models.BigIntegerField()),
+                ('locale', models.CharField(blank=True, default='', max_length=10)),
+                ('title', models.TextField(blank=True)),
+                ('body', models.TextField(blank=True)),
+                ('tenant', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='tenants.tenant')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['tenant', 'kind'], name='seo_searchd_tenant__737935_idx')],
+                'unique_together': {('kind', 'object_id')},
+            },
+        ),
+        migrations.RunPython(create_text_index, drop_text_index),
+        migrations.RunPython(backfill_documents, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 4.2.23 on 2026-10-18 12:46
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('seo', '0013_search_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='contentitem',
+            name='site',
+            field=models.ForeignKey(blank=True, db_index=False, editable=False, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='content_items', to='seo.site'),
+        ),
+        migrations.AddIndex(
+            model_name='contentitem',
+            index=models.Index(fields=['site', 'status'], name='seo_content_site_id_de94d3_idx'),
+        ),
+    ]
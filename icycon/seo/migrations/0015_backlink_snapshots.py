@@ -0,0 +1,31 @@
+# Generated by Django 4.2.23 on 2026-10-18 12:51
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('seo', '0014_content_item_site'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='BacklinkSnapshot',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField()),
+                ('link_count', models.IntegerField(default=0)),
+                ('new_count', models.IntegerField(default=0)),
+                ('lost_count', models.IntegerField(default=0)),
+                ('link_ids', models.BinaryField(blank=True, null=True)),
+                ('taken_at', models.DateTimeField(auto_now=True)),
+                ('site', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='backlink_snapshots', to='seo.site')),
+            ],
+            options={
+                'ordering': ['site', 'day'],
+                'unique_together': {('site', 'day')},
+            },
+        ),
+    ]
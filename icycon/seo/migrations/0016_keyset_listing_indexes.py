@@ -0,0 +1,49 @@
+# Generated by Django 4.2.23 on 2026-10-18 12:57
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('seo', '0015_backlink_snapshots'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='backlink',
+            name='seo_backlin_site_id_3b16c7_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='backlink',
+            name='seo_backlin_site_id_2ed988_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='linkopportunity',
+            name='seo_linkopp_site_id_8d2352_idx',
+        ),
+        migrations.AddIndex(
+            model_name='backlink',
+            index=models.Index(fields=['site', '-domain_rating', '-id'], name='seo_backlin_site_id_5230c7_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='backlink',
+            index=models.Index(fields=['site', 'status', '-domain_rating', '-id'], name='seo_backlin_site_id_6bb1fd_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='backlink',
+            index=models.Index(fields=['site', 'status', 'is_dofollow', '-domain_rating', '-id'], name='seo_backlin_site_id_1d0191_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='competitorbacklink',
+            index=models.Index(fields=['site', '-domain_rating', '-id'], name='seo_competi_site_id_4ebe42_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='competitorbacklink',
+            index=models.Index(fields=['site', 'is_dofollow', '-domain_rating', '-id'], name='seo_competi_site_id_e64a55_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='linkopportunity',
+            index=models.Index(fields=['site', 'status', '-score', 'id'], name='seo_linkopp_site_id_89703b_idx'),
+        ),
+    ]
@@ -1,9 +1,14 @@
-from django.db import models
+from django.db import models, router, transaction
 
 # Create your models here.
 from django.db import models
 
-class Site(models.Model):
+from tenants.managers import TenantScopedManager, TenantScopedQuerySet
+
+from .derived import Derived, DerivedQuerySet, TrackedFieldsMixin
+
+
+class Site(TrackedFieldsMixin, models.Model):
     tenant = models.ForeignKey('tenants.Tenant', on_delete=models.CASCADE, related_name='seo_sites')
     domain = models.URLField()
     sitemaps_url = models.URLField(blank=True)
@@ -11,6 +16,11 @@ class Site(models.Model):
     robots_txt = models.TextField(blank=True)
     created_at = models.DateTimeField(auto_now_add=True)
 
+    objects = TenantScopedManager()
+
+    # Lets seo.signals relink content only when the site's host can have changed
+    TRACKED_FIELDS = ('tenant_id', 'domain')
+
     class Meta:
         unique_together = ('tenant', 'domain')
 
@@ -18,6 +28,33 @@ class Site(models.Model):
         return f"{self.domain} ({self.tenant.name})"
 
 
+class SearchIndex(Derived):
+    """The rows' SearchDocuments; saves and deletes are indexed by ``seo.signals``.
+
+    See ``seo.services.search_index``.
+    """
+
+    def __init__(self, fields):
+        self.fields = frozenset(fields)
+
+    def before(self, write):
+        if write.kind == 'update':
+            return list(write.rows().values_list('pk', flat=True))
+
+    def after(self, write, pks):
+        from .services.search_index import index_ids, index_objects
+
+        if write.objs is not None:
+            index_objects(write.model, write.objs, using=write.using)
+        elif pks is not None:
+            index_ids(write.model, pks, using=write.using)
+
+
+class KeywordClusterQuerySet(DerivedQuerySet, TenantScopedQuerySet):
+    SEARCH_FIELDS = {'tenant', 'tenant_id', 'locale', 'intent', 'terms'}
+    derived = (SearchIndex(SEARCH_FIELDS),)
+
+
 class KeywordCluster(models.Model):
     tenant = models.ForeignKey('tenants.Tenant', on_delete=models.CASCADE, related_name='seo_keyword_clusters')
     locale = models.CharField(max_length=10, default='en')
@@ -25,10 +62,72 @@ class KeywordCluster(models.Model):
     terms = models.JSONField(default=list)  # list of keywords
     created_at = models.DateTimeField(auto_now_add=True)
 
+    objects = TenantScopedManager.from_queryset(KeywordClusterQuerySet)()
+
     def __str__(self):
         return f"{self.intent} ({self.locale})"
 
 
+class ContentSites(Derived):
+    """``ContentItem.site``, derived from the url; see ``seo.services.content_sites``."""
+
+    @property
+    def fields(self):
+        from .services.content_sites import SITE_FIELDS
+
+        return SITE_FIELDS
+
+    def prepare(self, write):
+        from .services.content_sites import assign_sites
+
+        if write.objs is not None:
+            assign_sites(write.objs, using=write.using)
+        if write.kind == 'bulk_update':
+            write.fields.append('site')
+
+    def before(self, write):
+        if write.kind == 'update':
+            return list(write.rows().values_list('pk', flat=True))
+
+    def after(self, write, pks):
+        from .services.content_sites import link_items
+
+        if pks is not None:
+            link_items(ContentItem.objects.using(write.using).filter(pk__in=pks))
+
+
+class ContentJsonLd(Derived):
+    """``ContentItem.json_ld``/``json_ld_etag``; see ``seo.services.jsonld_store``."""
+
+    # What content_jsonld() reads
+    fields = frozenset({'type', 'url', 'locale', 'brief_json', 'created_at', 'updated_at'})
+
+    def before(self, write):
+        if write.kind == 'update':
+            return list(write.rows().values_list('pk', flat=True))
+
+    def after(self, write, pks):
+        from django.db.models import Q
+
+        from .services.jsonld_store import refresh_content_jsonld
+
+        if write.objs is not None:
+            pks = [obj.pk for obj in write.objs if obj.pk is not None]
+            # Rows skipped or matched by ignore_conflicts come back without a pk
+            tenant_ids = {obj.tenant_id for obj in write.objs if obj.pk is None}
+            rows = Q(pk__in=pks) | Q(tenant_id__in=tenant_ids)
+        elif pks is not None:
+            rows = Q(pk__in=pks)
+        else:
+            return
+        refresh_content_jsonld(ContentItem.objects.using(write.using).filter(rows))
+
+
+class ContentItemQuerySet(DerivedQuerySet, TenantScopedQuerySet):
+    SEARCH_FIELDS = {'tenant', 'tenant_id', 'type', 'url', 'locale', 'brief_json', 'draft_html'}
+    derived = (ContentSites(), SearchIndex(SEARCH_FIELDS), ContentJsonLd())
+
+
 class ContentItem(models.Model):
     TYPE_CHOICES = [
         ("blog", "Blog Post"),
@@ -38,33 +137,277 @@ class ContentItem(models.Model):
     ]
 
     tenant = models.ForeignKey('tenants.Tenant', on_delete=models.CASCADE, related_name='seo_content_items')
+    # Derived from url on write; indexed together with status below
+    site = models.ForeignKey(Site, on_delete=models.SET_NULL, null=True, blank=True, editable=False,
+                             db_index=False, related_name='content_items')
     type = models.CharField(max_length=50, choices=TYPE_CHOICES)
     url = models.URLField()
     status = models.CharField(max_length=20, default="draft")
     locale = models.CharField(max_length=10, default='en')
     brief_json = models.JSONField(default=dict)
     draft_html = models.TextField(blank=True)
-    json_ld = models.TextField(blank=True)
+    json_ld = models.TextField(blank=True, help_text="Serialized JSON-LD, maintained by save()")
+    json_ld_etag = models.CharField(max_length=40, blank=True, default='')
     created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    objects = TenantScopedManager.from_queryset(ContentItemQuerySet)()
+
+    class Meta:
+        indexes = [models.Index(fields=['site', 'status'])]
 
     def __str__(self):
         return f"{self.type}: {self.url}"
 
+    def save(self, *args, **kwargs):
+        from .services.content_sites import SITE_FIELDS, assign_sites
+        from .services.jsonld_store import render_content
 
-class FAQ(models.Model):
+        using = kwargs.get('using') or router.db_for_write(ContentItem, instance=self)
+        update_fields = kwargs.get('update_fields')
+        if update_fields is None or SITE_FIELDS.intersection(update_fields):
+            assign_sites([self], using=using)
+            if update_fields is not None:
+                kwargs['update_fields'] = set(update_fields) | {'site'}
+        with transaction.atomic(using=using):
+            super().save(*args, **kwargs)
+            # Rendered after the write so the auto timestamps it includes are final
+            json_ld, etag = render_content(self)
+            if etag != self.json_ld_etag:
+                self.json_ld, self.json_ld_etag = json_ld, etag
+                ContentItem.objects.using(using).filter(pk=self.pk).update(json_ld=json_ld, json_ld_etag=etag)
+
+
+class FaqDocuments(Derived):
+    """The FaqPageDocuments of the tenants a bulk write touches, rebuilt whole."""
+
+    fields = frozenset({'tenant', 'tenant_id', 'question', 'answer'})
+
+    def before(self, write):
+        return set(write.rows().values_list('tenant_id', flat=True).distinct())
+
+    def after(self, write, tenant_ids):
+        from .services.jsonld_store import rebuild_faq_document
+
+        if write.objs is not None:
+            tenant_ids |= {obj.tenant_id for obj in write.objs}
+        elif write.kind == 'update':
+            target = write.values.get('tenant', write.values.get('tenant_id'))
+            if target is not None:
+                tenant_ids.add(getattr(target, 'pk', target))
+        for tenant_id in tenant_ids:
+            rebuild_faq_document(tenant_id, using=write.using)
+
+
+class FAQQuerySet(DerivedQuerySet, TenantScopedQuerySet):
+    SEARCH_FIELDS = {'tenant', 'tenant_id', 'question', 'answer'}
+    derived = (SearchIndex(SEARCH_FIELDS), FaqDocuments())
+
+
+class FAQ(TrackedFieldsMixin, models.Model):
     tenant = models.ForeignKey('tenants.Tenant', on_delete=models.CASCADE, related_name='seo_faqs')
     question = models.CharField(max_length=255)
     answer = models.TextField()
     source_urls = models.JSONField(default=list)
     created_at = models.DateTimeField(auto_now_add=True)
 
+    objects = TenantScopedManager.from_queryset(FAQQuerySet)()
+
+    # The stored tenant, so a move can be taken out of the old document
+    TRACKED_FIELDS = ('tenant_id',)
+
     def __str__(self):
         return self.question
 
+    def save(self, *args, **kwargs):
+        from .services.jsonld_store import apply_faq_change, faq_fragment
+
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None and not FaqDocuments.fields.intersection(update_fields):
+            return super().save(*args, **kwargs)
+        using = kwargs.get('using') or router.db_for_write(FAQ, instance=self)
+        with transaction.atomic(using=using):
+            stored = self.stored_values(using)
+            super().save(*args, **kwargs)
+            if stored is not None and stored != self.tracked_values():
+                apply_faq_change(stored[0], self.pk, using=using)
+            apply_faq_change(self.tenant_id, self.pk, faq_fragment(self.question, self.answer), using=using)
+        self.remember_stored_values()
+
+    def delete(self, *args, **kwargs):
+        from .services.jsonld_store import apply_faq_change
+
+        using = kwargs.get('using') or router.db_for_write(FAQ, instance=self)
+        faq_id = self.pk
+        with transaction.atomic(using=using):
+            deleted = super().delete(*args, **kwargs)
+            apply_faq_change(self.tenant_id, faq_id, using=using)
+        return deleted
+
+
+class FaqPageDocument(models.Model):
+    """Serialized FAQPage JSON-LD of all of a tenant's FAQs.
+
+    Maintained by FAQ writes (see ``seo.services.jsonld_store``): ``fragments``
+    holds each FAQ's serialized Question by FAQ id, and ``body``/``etag`` are
+    re-joined from them when one changes.
+    """
+    tenant = models.OneToOneField('tenants.Tenant', on_delete=models.CASCADE, related_name='seo_faq_page')
+    fragments = models.JSONField(default=dict)
+    body = models.TextField(blank=True)
+    etag = models.CharField(max_length=40, blank=True, default='')
+    faq_count = models.IntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    objects = TenantScopedManager()
+
+    def __str__(self):
+        return f"FAQPage for tenant {self.tenant_id} ({self.faq_count} FAQs)"
+
+
+class SearchDocument(models.Model):
+    """Searchable text of one ContentItem, FAQ or KeywordCluster.
+
+    Maintained on write by ``seo.services.search_index``. The full-text index
+    over ``title``/``body`` is backend specific and created by migration: an
+    FTS5 table kept in step by triggers on SQLite, a generated tsvector column
+    with a GIN index on PostgreSQL.
+    """
+    KIND_CHOICES = [
+        ('content', 'Content item'),
+        ('faq', 'FAQ'),
+        ('keywords', 'Keyword cluster'),
+    ]
+
+    tenant = models.ForeignKey('tenants.Tenant', on_delete=models.CASCADE, related_name='+')
+    kind = models.CharField(max_length=20, choices=KIND_CHOICES)
+    object_id = models.BigIntegerField()
+    locale = models.CharField(max_length=10, blank=True, default='')
+    title = models.TextField(blank=True)
+    body = models.TextField(blank=True)
+
+    objects = TenantScopedManager()
+
+    class Meta:
+        unique_together = ('kind', 'object_id')
+        indexes = [models.Index(fields=['tenant', 'kind'])]
+
+    def __str__(self):
+        return f"{self.kind} {self.object_id}"
+
 
 # ============ BACKLINKS MODELS ============
 
-class Backlink(models.Model):
+class BacklinkStats(Derived):
+    """BacklinkProfile/ReferringDomain aggregates, changed by the difference each write makes.
+
+    See ``seo.services.backlink_stats`` for how contributions are counted.
+    """
+
+    # Fields whose value changes a link's contribution to the aggregates
+    fields = frozenset({'site', 'site_id', 'source_url', 'source_domain', 'status', 'is_dofollow', 'domain_rating'})
+    # Position in a state of the fields update() can change by rewriting grouped states
+    GROUPED = {'status': 2, 'is_dofollow': 3}
+
+    def prepare(self, write):
+        from .services.backlink_stats import referring_domain
+
+        if write.kind == 'bulk_update' and 'source_url' not in write.fields:
+            return
+        for obj in write.objs or ():
+            obj.source_domain = referring_domain(obj.source_url)
+        if write.kind == 'bulk_update':
+            write.fields.append('source_domain')
+
+    def before(self, write):
+        from .services.backlink_stats import ProfileDelta, backlink_state, grouped_states, is_suspended
+
+        if is_suspended():
+            return None
+        delta = ProfileDelta()
+        if write.kind == 'create':
+            self._created(write, delta)
+        elif write.kind == 'bulk_update':
+            stored = {pk: tuple(state) for pk, *state in write.rows().values_list('pk', *Backlink.TRACKED_FIELDS)}
+            for obj in write.objs:
+                delta.change(stored.get(obj.pk), backlink_state(obj) if obj.pk in stored else None)
+        elif write.kind == 'update' and not self._grouped(write.values):
+            # Changes we can't derive from grouped rows: recompute the sites touched
+            site_ids = set(write.rows().values_list('site_id', flat=True).distinct())
+            target = write.values.get('site', write.values.get('site_id'))
+            if target is not None and not hasattr(target, 'resolve_expression'):
+                site_ids.add(getattr(target, 'pk', target))
+            return site_ids
+        else:
+            for state, count, dr_sum in grouped_states(write.rows()):
+                delta.add(state, -1, count, dr_sum)
+                if write.kind == 'update':
+                    new_state = list(state)
+                    for name, position in self.GROUPED.items():
+                        if name in write.values:
+                            new_state[position] = write.values[name]
+                    new_dr_sum = write.values['domain_rating'] * count if 'domain_rating' in write.values else dr_sum
+                    delta.add(tuple(new_state), 1, count, new_dr_sum)
+        return delta
+
+    def after(self, write, captured):
+        from .services.backlink_stats import reconcile_site
+
+        if isinstance(captured, set):
+            for site_id in captured:
+                reconcile_site(site_id, log_drift=False)
+        elif captured is not None:
+            captured.apply(using=write.using)
+
+    def _grouped(self, values):
+        tracked = self.fields.intersection(values)
+        return all(name in self.GROUPED or name == 'domain_rating' for name in tracked) and not any(
+            hasattr(values[name], 'resolve_expression') for name in tracked
+        )
+
+    def _created(self, write, delta):
+        from .services.backlink_stats import backlink_state
+
+        values = write.values
+        existing = self._existing_states(write) if values.get('update_conflicts') or values.get('ignore_conflicts') else {}
+        update_fields = set(values.get('update_fields') or ())
+        for obj in write.objs:
+            old = existing.get((obj.site_id, obj.source_url, obj.target_url))
+            new = backlink_state(obj)
+            if old is not None:
+                if values.get('ignore_conflicts'):
+                    continue
+                # Fields left out of update_fields keep their stored value
+                new = tuple(
+                    new[i] if name in update_fields else old[i]
+                    for i, name in enumerate(('site', 'source_url', 'status', 'is_dofollow', 'domain_rating'))
+                )
+            delta.change(old, new)
+            if old is None:
+                existing[(obj.site_id, obj.source_url, obj.target_url)] = new
+
+    def _existing_states(self, write):
+        """Stored states of rows sharing the unique key with the objects written."""
+        keys = {(obj.site_id, obj.source_url, obj.target_url) for obj in write.objs}
+        by_site = {}
+        for site_id, source_url, _ in keys:
+            by_site.setdefault(site_id, set()).add(source_url)
+        states = {}
+        for site_id, sources in by_site.items():
+            rows = Backlink.objects.using(write.using).filter(site_id=site_id, source_url__in=sources).values_list(
+                'source_url', 'target_url', 'source_domain', 'status', 'is_dofollow', 'domain_rating'
+            )
+            for source_url, target_url, domain, status, is_dofollow, rating in rows:
+                if (site_id, source_url, target_url) in keys:
+                    states[(site_id, source_url, target_url)] = (site_id, domain, status, is_dofollow, rating)
+        return states
+
+
+class BacklinkQuerySet(DerivedQuerySet):
+    derived = (BacklinkStats(),)
+
+
+class Backlink(TrackedFieldsMixin, models.Model):
     """External backlinks pointing to your site."""
     STATUS_CHOICES = [
         ('active', 'Active'),
@@ -75,6 +418,7 @@ class Backlink(models.Model):
     
     site = models.ForeignKey(Site, on_delete=models.CASCADE, related_name='backlinks')
     source_url = models.URLField()
+    source_domain = models.CharField(max_length=255, blank=True, default='', help_text="Derived from source_url")
     target_url = models.URLField()
     anchor_text = models.CharField(max_length=255, blank=True)
     domain_rating = models.IntegerField(default=0, help_text="0-100 scale")
@@ -84,56 +428,295 @@ class Backlink(models.Model):
     is_external = models.BooleanField(default=True)
     first_seen = models.DateTimeField(auto_now_add=True)
     last_checked = models.DateTimeField(null=True, blank=True)
+    # Validators from the last fetch of source_url, for conditional re-checks
+    http_etag = models.CharField(max_length=255, blank=True, default='')
+    http_last_modified = models.CharField(max_length=64, blank=True, default='')
+
+    objects = BacklinkQuerySet.as_manager()
     
     class Meta:
         unique_together = ('site', 'source_url', 'target_url')
         ordering = ['-domain_rating', '-last_checked']
         indexes = [
-            models.Index(fields=['site', 'status']),
-            models.Index(fields=['site', 'domain_rating']),
+            # Keyset listing order, unfiltered and by status (and dofollow)
+            models.Index(fields=['site', '-domain_rating', '-id']),
+            models.Index(fields=['site', 'status', '-domain_rating', '-id']),
+            models.Index(fields=['site', 'status', 'is_dofollow', '-domain_rating', '-id']),
+            models.Index(fields=['site', 'source_domain']),
         ]
     
+    # A link's state as seo.services.backlink_stats counts it (see backlink_state)
+    TRACKED_FIELDS = ('site_id', 'source_domain', 'status', 'is_dofollow', 'domain_rating')
+
     def __str__(self):
         return f"{self.source_url} -> {self.target_url}"
 
+    def save(self, *args, **kwargs):
+        from .services.backlink_stats import ProfileDelta, is_suspended, referring_domain
+
+        self.source_domain = referring_domain(self.source_url)
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None and 'source_url' in update_fields:
+            kwargs['update_fields'] = set(update_fields) | {'source_domain'}
+        if is_suspended():
+            return super().save(*args, **kwargs)
+
+        using = kwargs.get('using') or router.db_for_write(Backlink, instance=self)
+        with transaction.atomic(using=using):
+            old_state = self.stored_values(using)
+            super().save(*args, **kwargs)
+            delta = ProfileDelta()
+            delta.change(old_state, self.tracked_values())
+            delta.apply(using=using)
+        self.remember_stored_values()
+
+    def delete(self, *args, **kwargs):
+        from .services.backlink_stats import ProfileDelta, is_suspended
+
+        if is_suspended():
+            return super().delete(*args, **kwargs)
+        using = kwargs.get('using') or router.db_for_write(Backlink, instance=self)
+        with transaction.atomic(using=using):
+            old_state = self.stored_values(using)
+            deleted = super().delete(*args, **kwargs)
+            delta = ProfileDelta()
+            delta.change(old_state, None)
+            delta.apply(using=using)
+        return deleted
+
 
 class BacklinkProfile(models.Model):
-    """Summary profile of all backlinks for a site."""
+    """Summary profile of all backlinks for a site.
+
+    Counts cover active links (toxic = spam links) and are maintained
+    incrementally by Backlink writes; see ``seo.services.backlink_stats``.
+    """
     site = models.OneToOneField(Site, on_delete=models.CASCADE, related_name='backlink_profile')
     total_backlinks = models.IntegerField(default=0)
     unique_domains = models.IntegerField(default=0)
     avg_domain_rating = models.FloatField(default=0)
+    domain_rating_sum = models.BigIntegerField(default=0, help_text="Running sum behind avg_domain_rating")
     dofollow_backlinks = models.IntegerField(default=0)
     nofollow_backlinks = models.IntegerField(default=0)
     toxic_backlinks_count = models.IntegerField(default=0)
+    gaps_built_at = models.DateTimeField(null=True, blank=True, help_text="When BacklinkGap rows were last fully rebuilt")
     last_updated = models.DateTimeField(auto_now=True)
     
     def __str__(self):
         return f"Profile: {self.site.domain}"
 
+    def refresh_average(self):
+        self.avg_domain_rating = self.domain_rating_sum / self.total_backlinks if self.total_backlinks > 0 else 0
+
+
+class LinkDomain(models.Model):
+    """A referring domain name, interned so backlink tables can be compared by integer id."""
+    name = models.CharField(max_length=255, unique=True)
+
+    def __str__(self):
+        return self.name
+
+
+class ReferringDomain(models.Model):
+    """Number of active backlinks a site gets from one referring domain."""
+    site = models.ForeignKey(Site, on_delete=models.CASCADE, related_name='referring_domains')
+    domain = models.CharField(max_length=255)
+    link_domain = models.ForeignKey(LinkDomain, on_delete=models.PROTECT, null=True, blank=True, related_name='+')
+    backlink_count = models.IntegerField(default=0)
+
+    class Meta:
+        unique_together = ('site', 'domain')
+        indexes = [models.Index(fields=['site', 'link_domain'])]
+
+    def __str__(self):
+        return f"{self.domain} ({self.backlink_count})"
+
+
+class BacklinkSnapshot(models.Model):
+    """The ids of a site's active backlinks on one day.
+
+    Written by ``seo.services.backlink_snapshots``: ``link_ids`` is a compressed
+    sorted id array, and ``new_count``/``lost_count`` compare it with the
+    previous snapshot. Retention clears ``link_ids`` of old snapshots but keeps
+    their counts for trends.
+    """
+    site = models.ForeignKey(Site, on_delete=models.CASCADE, related_name='backlink_snapshots')
+    day = models.DateField()
+    link_count = models.IntegerField(default=0)
+    new_count = models.IntegerField(default=0)
+    lost_count = models.IntegerField(default=0)
+    link_ids = models.BinaryField(null=True, blank=True)
+    taken_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        unique_together = ('site', 'day')
+        ordering = ['site', 'day']
+
+    def __str__(self):
+        return f"Backlinks of site {self.site_id} on {self.day}"
+
+
+class CompetitorGaps(Derived):
+    """The cached BacklinkGap rows of the ``(site, referring domain)`` pairs a write touches.
+
+    See ``seo.services.backlink_gap``.
+    """
+
+    # Fields that change a link's contribution to the gaps; the derived
+    # source_domain/link_domain columns follow source_url and are not set directly
+    fields = frozenset({'site', 'site_id', 'source_url', 'competitor_domain', 'domain_rating', 'is_dofollow'})
+
+    def prepare(self, write):
+        from .services.backlink_gap import assign_domains, domain_fields
+
+        if write.kind == 'create' or (write.kind == 'bulk_update' and 'source_url' in write.fields):
+            assign_domains(write.objs, using=write.using)
+            if write.kind == 'bulk_update':
+                write.fields += ['source_domain', 'link_domain']
+        elif write.kind == 'update' and 'source_url' in write.values:
+            # A computed source_url clears the derived columns for backfill
+            source_url = write.values['source_url']
+            rederive = hasattr(source_url, 'resolve_expression')
+            write.values.update(domain_fields(None if rederive else source_url, using=write.using))
+
+    def before(self, write):
+        return set(write.rows().values_list('site_id', 'link_domain_id').distinct())
+
+    def after(self, write, touched):
+        from .services.backlink_gap import rebuild_site, refresh_pairs
+
+        if write.objs is not None:
+            touched |= {(obj.site_id, obj.link_domain_id) for obj in write.objs}
+        elif write.kind == 'update':
+            values = write.values
+            target = values.get('site', values.get('site_id'))
+            new_site = getattr(target, 'pk', target)
+            if hasattr(values.get('source_url'), 'resolve_expression') or hasattr(new_site, 'resolve_expression'):
+                for site_id in {site_id for site_id, _ in touched}:
+                    rebuild_site(site_id, using=write.using)
+                return
+            touched |= {
+                (new_site or site_id, values['link_domain_id'] if 'source_url' in values else domain_id)
+                for site_id, domain_id in touched
+            }
+        refresh_pairs(touched, using=write.using)
+
+
+class CompetitorBacklinkQuerySet(DerivedQuerySet):
+    derived = (CompetitorGaps(),)
+
 
-class CompetitorBacklink(models.Model):
+class CompetitorBacklink(TrackedFieldsMixin, models.Model):
     """Track backlinks of competing websites for benchmarking."""
     site = models.ForeignKey(Site, on_delete=models.CASCADE, related_name='competitor_backlinks')
     competitor_domain = models.URLField()
     source_url = models.URLField()
+    source_domain = models.CharField(max_length=255, blank=True, default='', help_text="Derived from source_url")
+    link_domain = models.ForeignKey(LinkDomain, on_delete=models.PROTECT, null=True, blank=True, related_name='+')
     target_url = models.URLField()
     anchor_text = models.CharField(max_length=255, blank=True)
     domain_rating = models.IntegerField(default=0)
     page_authority = models.IntegerField(default=0)
     is_dofollow = models.BooleanField(default=True)
     last_checked = models.DateTimeField(auto_now=True)
+
+    objects = CompetitorBacklinkQuerySet.as_manager()
     
     class Meta:
         unique_together = ('site', 'source_url', 'target_url')
         ordering = ['-domain_rating']
+        indexes = [
+            models.Index(fields=['site', 'link_domain']),
+            # Keyset listing order, unfiltered and by dofollow
+            models.Index(fields=['site', '-domain_rating', '-id']),
+            models.Index(fields=['site', 'is_dofollow', '-domain_rating', '-id']),
+        ]
     
+    # The (site, referring domain) pair whose gap the link feeds
+    TRACKED_FIELDS = ('site_id', 'link_domain_id')
+
     def __str__(self):
         return f"Competitor link: {self.source_url}"
 
+    def save(self, *args, **kwargs):
+        from .services.backlink_gap import assign_domains, refresh_pairs
+
+        using = kwargs.get('using') or router.db_for_write(CompetitorBacklink, instance=self)
+        assign_domains([self], using=using)
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None and 'source_url' in update_fields:
+            kwargs['update_fields'] = set(update_fields) | {'source_domain', 'link_domain'}
+        with transaction.atomic(using=using):
+            stored = self.stored_values(using)
+            super().save(*args, **kwargs)
+            refresh_pairs({stored, self.tracked_values()} - {None}, using=using)
+        self.remember_stored_values()
+
+    def delete(self, *args, **kwargs):
+        from .services.backlink_gap import refresh_pairs
+
+        using = kwargs.get('using') or router.db_for_write(CompetitorBacklink, instance=self)
+        pair = (self.site_id, self.link_domain_id)
+        with transaction.atomic(using=using):
+            deleted = super().delete(*args, **kwargs)
+            refresh_pairs({pair}, using=using)
+        return deleted
+
+
+class BacklinkGap(models.Model):
+    """A referring domain that links to competitors but not to the site.
+
+    A cache maintained by ``seo.services.backlink_gap``: ``score`` weights the
+    domain's rating by how many competitors it links to.
+    """
+    site = models.ForeignKey(Site, on_delete=models.CASCADE, related_name='backlink_gaps')
+    link_domain = models.ForeignKey(LinkDomain, on_delete=models.PROTECT, related_name='+')
+    competitor_count = models.IntegerField(default=0)
+    competitor_links = models.IntegerField(default=0)
+    dofollow_links = models.IntegerField(default=0)
+    domain_rating = models.IntegerField(default=0)
+    score = models.IntegerField(default=0)
+
+    class Meta:
+        unique_together = ('site', 'link_domain')
+        indexes = [models.Index(fields=['site', '-score'])]
+
+    def __str__(self):
+        return f"Gap: {self.link_domain_id} for site {self.site_id}"
+
+
+class OpportunityScore(Derived):
+    """``LinkOpportunity.score``; only the rows a write touches are rescored.
+
+    See ``seo.services.opportunity_scoring``.
+    """
+
+    fields = frozenset({'domain_rating', 'page_authority', 'traffic_estimate', 'relevance_score'})
+
+    def prepare(self, write):
+        from .services.opportunity_scoring import score_all, score_expression
+
+        if write.kind == 'update':
+            # One statement: the score is computed from the new values in the same UPDATE
+            write.values['score'] = score_expression(write.values)
+        elif write.objs is not None:
+            score_all(write.objs)
+            if write.kind == 'bulk_update':
+                write.fields.append('score')
+            elif self.fields.intersection(write.values.get('update_fields') or ()):
+                write.values['update_fields'] = list(write.values['update_fields']) + ['score']
+
+
+class LinkOpportunityQuerySet(DerivedQuerySet):
+    derived = (OpportunityScore(),)
+
 
 class LinkOpportunity(models.Model):
-    """Potential websites for link outreach and acquisition."""
+    """Potential websites for link outreach and acquisition.
+
+    ``score`` ranks opportunities by a weighted mix of their metrics and is
+    kept current on write (see ``seo.services.opportunity_scoring``).
+    """
     PRIORITY_CHOICES = [
         ('low', 'Low'),
         ('medium', 'Medium'),
@@ -164,15 +747,175 @@ class LinkOpportunity(models.Model):
     contact_name = models.CharField(max_length=255, blank=True)
     notes = models.TextField(blank=True)
     outreach_date = models.DateTimeField(null=True, blank=True)
+    score = models.FloatField(default=0, editable=False, help_text="Composite ranking score (0-100)")
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
+
+    objects = LinkOpportunityQuerySet.as_manager()
     
     class Meta:
-        ordering = ['-priority', '-relevance_score']
+        ordering = ['-score', 'id']
         indexes = [
-            models.Index(fields=['site', 'status']),
+            models.Index(fields=['site', 'status', '-score', 'id']),
             models.Index(fields=['site', 'priority']),
+            models.Index(fields=['site', '-score', 'id']),
         ]
     
     def __str__(self):
         return f"Opportunity: {self.prospect_domain}"
+
+    def save(self, *args, **kwargs):
+        from .services.opportunity_scoring import rescore, score_of
+
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None:
+            if not OpportunityScore.fields.intersection(update_fields):
+                return super().save(*args, **kwargs)
+            kwargs['update_fields'] = set(update_fields) | {'score'}
+        if not any(hasattr(getattr(self, field), 'resolve_expression') for field in OpportunityScore.fields):
+            self.score = score_of(self)
+            return super().save(*args, **kwargs)
+        # F() values are only known to the database; score them there, like refresh_from_db() would
+        using = kwargs.get('using') or router.db_for_write(LinkOpportunity, instance=self)
+        with transaction.atomic(using=using):
+            super().save(*args, **kwargs)
+            rescore(LinkOpportunity.objects.using(using).filter(pk=self.pk))
+
+
+class SitemapFile(models.Model):
+    """A sitemap index or urlset fetched for a site, with its HTTP validators."""
+    site = models.ForeignKey(Site, on_delete=models.CASCADE, related_name='sitemap_files')
+    parent = models.ForeignKey('self', on_delete=models.CASCADE, null=True, blank=True, related_name='children')
+    url = models.URLField(max_length=2048)
+    is_index = models.BooleanField(default=False)
+    lastmod = models.DateTimeField(null=True, blank=True, help_text="lastmod advertised by the parent index")
+    http_etag = models.CharField(max_length=255, blank=True, default='')
+    http_last_modified = models.CharField(max_length=64, blank=True, default='')
+    url_count = models.IntegerField(default=0)
+    fetched_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        unique_together = ('site', 'url')
+
+    def __str__(self):
+        return self.url
+
+
+class SitemapUrl(models.Model):
+    """One ``<url>`` entry of a site's sitemaps.
+
+    ``changed_at`` moves when the entry first appears or its ``lastmod``
+    changes; entries changed since ``submitted_at`` are pending resubmission.
+    """
+    site = models.ForeignKey(Site, on_delete=models.CASCADE, related_name='sitemap_urls')
+    sitemap = models.ForeignKey(SitemapFile, on_delete=models.CASCADE, related_name='urls')
+    loc = models.URLField(max_length=2048)
+    lastmod = models.DateTimeField(null=True, blank=True)
+    changed_at = models.DateTimeField()
+    last_seen = models.DateTimeField()
+    submitted_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        unique_together = ('site', 'loc')
+        indexes = [
+            models.Index(fields=['site', 'changed_at']),
+            models.Index(fields=['sitemap', 'last_seen']),
+        ]
+
+    def __str__(self):
+        return self.loc
+
+
+class ContentSitemapShard(models.Model):
+    """One generated child sitemap: a site's published ContentItems in a pk range.
+
+    Ranges are fixed once assigned (new items only extend the last shard), so
+    an edit only invalidates the shard holding it. ``fingerprint`` describes
+    the rows when the cached file was written.
+    """
+    site = models.ForeignKey(Site, on_delete=models.CASCADE, related_name='content_sitemap_shards')
+    number = models.PositiveIntegerField()
+    first_pk = models.BigIntegerField()
+    last_pk = models.BigIntegerField()
+    url_count = models.IntegerField(default=0)
+    lastmod = models.DateTimeField(null=True, blank=True)
+    fingerprint = models.CharField(max_length=64, blank=True, default='')
+    built_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        unique_together = ('site', 'number')
+        ordering = ['site', 'number']
+
+    def __str__(self):
+        return f"{self.site.domain} sitemap {self.number}"
+
+
+class AuditJob(models.Model):
+    """A batch of Core Web Vitals audits run in the background."""
+    STATUS_CHOICES = [
+        ('queued', 'Queued'),
+        ('running', 'Running'),
+        ('done', 'Done'),
+        ('failed', 'Failed'),
+    ]
+
+    tenant = models.ForeignKey('tenants.Tenant', on_delete=models.CASCADE, null=True, blank=True, related_name='seo_audit_jobs')
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='queued')
+    collector = models.CharField(max_length=255)
+    targets = models.JSONField(default=list, help_text="[site_id, url] pairs to audit")
+    total = models.IntegerField(default=0)
+    completed = models.IntegerField(default=0)
+    failed = models.IntegerField(default=0)
+    error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    objects = TenantScopedManager()
+
+    class Meta:
+        indexes = [models.Index(fields=['status', 'created_at'])]
+
+    def __str__(self):
+        return f"Audit job {self.pk} ({self.status})"
+
+
+class CwvAudit(models.Model):
+    """One Core Web Vitals measurement of a URL (time series)."""
+    site = models.ForeignKey(Site, on_delete=models.CASCADE, related_name='cwv_audits')
+    job = models.ForeignKey(AuditJob, on_delete=models.SET_NULL, null=True, blank=True, related_name='audits')
+    url = models.URLField(max_length=2048)
+    collected_at = models.DateTimeField()
+    collector = models.CharField(max_length=255)
+    lcp_ms = models.FloatField(null=True, blank=True)
+    fid_ms = models.FloatField(null=True, blank=True)
+    inp_ms = models.FloatField(null=True, blank=True)
+    cls = models.FloatField(null=True, blank=True)
+    ttfb_ms = models.FloatField(null=True, blank=True)
+    error = models.CharField(max_length=500, blank=True)
+
+    class Meta:
+        indexes = [models.Index(fields=['site', 'url', 'collected_at'])]
+
+    def __str__(self):
+        return f"{self.url} @ {self.collected_at:%Y-%m-%d %H:%M}"
+
+
+class CwvSummary(models.Model):
+    """p75 Core Web Vitals over a trailing window; ``url=''`` is the whole site."""
+    site = models.ForeignKey(Site, on_delete=models.CASCADE, related_name='cwv_summaries')
+    url = models.URLField(max_length=2048, blank=True)
+    samples = models.IntegerField(default=0)
+    p75_lcp_ms = models.FloatField(null=True, blank=True)
+    p75_fid_ms = models.FloatField(null=True, blank=True)
+    p75_inp_ms = models.FloatField(null=True, blank=True)
+    p75_cls = models.FloatField(null=True, blank=True)
+    p75_ttfb_ms = models.FloatField(null=True, blank=True)
+    window_start = models.DateTimeField()
+    computed_at = models.DateTimeField()
+
+    class Meta:
+        unique_together = ('site', 'url')
+
+    def __str__(self):
+        return f"CWV p75 {self.url or self.site.domain}"
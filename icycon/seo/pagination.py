@@ -0,0 +1,81 @@
+"""
+Keyset pagination for large listings.
+
+A page is the first ``limit`` rows after the previous page's last row in a
+fixed ordering that ends with the primary key, so it is total and stable.
+The cursor is that last row's ordering values, JSON encoded and base64url
+wrapped; clients pass it back unchanged.
+
+Rows after a cursor ``(v1, ..., vn)`` split into n groups: those equal to it
+on the first ``i`` fields and past it on field ``i + 1``. Each group is one
+range of a composite index on ``(filters..., ordering...)``, and groups come
+in page order. ``keyset_page`` reads them in turn until the page is full.
+That takes at most n small index range reads, however deep the page is.
+Ordering fields must not be nullable, because NULLs compare as neither
+before nor after a value.
+"""
+
+import binascii
+import json
+from base64 import urlsafe_b64decode, urlsafe_b64encode
+
+from django.core.exceptions import ValidationError
+from django.core.serializers.json import DjangoJSONEncoder
+
+DEFAULT_PAGE_SIZE = 25
+MAX_PAGE_SIZE = 500
+
+
+def _fields(model, ordering):
+    """``(model field, descending)`` for each entry of ``ordering``."""
+    fields = []
+    for name in ordering:
+        descending = name.startswith('-')
+        name = name.lstrip('-')
+        fields.append((model._meta.pk if name == 'pk' else model._meta.get_field(name), descending))
+    return fields
+
+
+def encode_cursor(row, ordering):
+    """The cursor pointing just past ``row``."""
+    values = [getattr(row, field.attname) for field, _ in _fields(type(row), ordering)]
+    raw = json.dumps(values, cls=DjangoJSONEncoder, separators=(',', ':')).encode()
+    return urlsafe_b64encode(raw).rstrip(b'=').decode()
+
+
+def decode_cursor(model, ordering, cursor):
+    """The ordering values in ``cursor``; raises ValueError if it is not one of ``ordering``'s."""
+    fields = _fields(model, ordering)
+    try:
+        values = json.loads(urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)))
+        if not isinstance(values, list) or len(values) != len(fields) or None in values:
+            raise ValueError(cursor)
+        return [field.to_python(value) for (field, _), value in zip(fields, values)]
+    except (binascii.Error, UnicodeDecodeError, ValidationError, TypeError) as exc:
+        raise ValueError(cursor) from exc
+
+
+def keyset_page(queryset, ordering, after=None, limit=DEFAULT_PAGE_SIZE):
+    """One page of ``queryset`` in ``ordering`` and the next page's cursor (or None).
+
+    ``ordering`` must end with the primary key; ``after`` is a cursor returned
+    with the previous page.
+    """
+    queryset = queryset.order_by(*ordering)
+    if not after:
+        rows = list(queryset[:limit + 1])
+    else:
+        fields = _fields(queryset.model, ordering)
+        values = decode_cursor(queryset.model, ordering, after)
+        rows = []
+        # Longest shared prefix first: those rows come right after the cursor
+        for depth in reversed(range(len(fields))):
+            field, descending = fields[depth]
+            equal = {prefix.attname: value for (prefix, _), value in zip(fields[:depth], values)}
+            past = {f'{field.attname}__{"lt" if descending else "gt"}': values[depth]}
+            rows += queryset.filter(**equal, **past)[:limit + 1 - len(rows)]
+            if len(rows) > limit:
+                break
+    if len(rows) <= limit:
+        return rows, None
+    return rows[:limit], encode_cursor(rows[limit - 1], ordering)
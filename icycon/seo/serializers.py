@@ -1,5 +1,5 @@
 from rest_framework import serializers
-from .models import Site, KeywordCluster, ContentItem, FAQ
+from .models import Site, KeywordCluster, ContentItem, FAQ, AuditJob
 
 class SiteSerializer(serializers.ModelSerializer):
     tenant_name = serializers.CharField(source='tenant.name', read_only=True)
@@ -20,7 +20,8 @@ class ContentItemSerializer(serializers.ModelSerializer):
 
     class Meta:
         model = ContentItem
-        fields = ['id', 'tenant', 'tenant_name', 'type', 'url', 'status', 'locale', 'brief_json', 'draft_html', 'json_ld', 'created_at']
+        fields = ['id', 'tenant', 'tenant_name', 'site', 'type', 'url', 'status', 'locale', 'brief_json', 'draft_html', 'json_ld', 'created_at']
+        read_only_fields = ['site', 'json_ld']
 
 class FAQSerializer(serializers.ModelSerializer):
     tenant_name = serializers.CharField(source='tenant.name', read_only=True)
@@ -28,3 +29,8 @@ class FAQSerializer(serializers.ModelSerializer):
     class Meta:
         model = FAQ
         fields = ['id', 'tenant', 'tenant_name', 'question', 'answer', 'source_urls', 'created_at']
+
+class AuditJobSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = AuditJob
+        fields = ['id', 'status', 'collector', 'total', 'completed', 'failed', 'error', 'created_at', 'started_at', 'finished_at']
@@ -0,0 +1,312 @@
+"""
+Asynchronous backlink liveness checker.
+
+Re-fetches each backlink's ``source_url`` and looks for an anchor pointing at
+``target_url``:
+
+* one ``httpx.AsyncClient`` shares keep-alive connections across checks;
+* a per-domain semaphore plus a minimum delay between requests keeps the
+  crawler polite, while ``concurrency`` bounds the total in flight;
+* stored ``ETag``/``Last-Modified`` validators are sent back, and a ``304``
+  keeps the previous verdict without downloading the page;
+* HTML is parsed incrementally while it streams in and the download stops as
+  soon as the anchor is found (or ``MAX_BYTES`` is reached);
+* source URLs are tenant input, so only public hosts are fetched, redirects
+  included (see ``make_client``).
+
+Verdicts are written back with batched ``bulk_update`` calls, which also keep
+the backlink profile aggregates in step (see ``backlink_stats``).
+"""
+
+import asyncio
+import logging
+import time
+from contextlib import asynccontextmanager
+from datetime import timedelta
+from html.parser import HTMLParser
+from urllib.parse import urljoin, urlsplit
+
+import httpx
+from asgiref.sync import sync_to_async
+from django.db.models import Q
+from django.utils import timezone
+
+from seo.models import Backlink
+from .backlink_stats import referring_domain
+from .sitemap_ingest import is_public_host
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_CONCURRENCY = 200
+DEFAULT_PER_DOMAIN = 2
+DEFAULT_DOMAIN_DELAY = 0.5  # seconds between requests to one domain
+DEFAULT_BATCH_SIZE = 500
+DEFAULT_TIMEOUT = 10
+MAX_BYTES = 2 * 1024 * 1024
+USER_AGENT = 'IcyconBacklinkChecker/1.0'
+NOFOLLOW_RELS = {'nofollow', 'ugc', 'sponsored'}
+UPDATE_FIELDS = ['status', 'is_dofollow', 'last_checked', 'http_etag', 'http_last_modified']
+
+
+def normalize_link(url):
+    """Comparable form of a URL: no scheme, fragment, ``www.`` or trailing slash; None if malformed."""
+    try:
+        parts = urlsplit(url.strip())
+        port = parts.port
+    except ValueError:
+        return None
+    host = (parts.hostname or '').lower()
+    if host.startswith('www.'):
+        host = host[4:]
+    port = f':{port}' if port and port not in (80, 443) else ''
+    path = parts.path.rstrip('/') or ''
+    query = f'?{parts.query}' if parts.query else ''
+    return f'{host}{port}{path}{query}'
+
+
+class AnchorFinder(HTMLParser):
+    """Incremental parser that stops at the first ``<a>`` linking to the target."""
+
+    def __init__(self, page_url, target_url):
+        super().__init__(convert_charrefs=True)
+        self.page_url = page_url
+        self.target = normalize_link(target_url)
+        self.found = False
+        self.is_dofollow = True
+
+    def handle_starttag(self, tag, attrs):
+        if self.found:
+            return
+        if tag == 'base':
+            href = dict(attrs).get('href')
+            if href:
+                self.page_url = urljoin(self.page_url, href)
+        elif tag == 'a':
+            attrs = dict(attrs)
+            href = attrs.get('href')
+            if href and self.target is not None and self._resolve(href) == self.target:
+                rels = set((attrs.get('rel') or '').lower().split())
+                self.found = True
+                self.is_dofollow = not (rels & NOFOLLOW_RELS)
+
+    def _resolve(self, href):
+        try:
+            return normalize_link(urljoin(self.page_url, href))
+        except ValueError:
+            return None
+
+
+class DomainThrottle:
+    """Caps concurrent requests and spaces out request starts per domain."""
+
+    def __init__(self, per_domain, delay):
+        self.per_domain = per_domain
+        self.delay = delay
+        self.semaphores = {}
+        self.next_start = {}
+
+    @asynccontextmanager
+    async def slot(self, domain):
+        semaphore = self.semaphores.setdefault(domain, asyncio.Semaphore(self.per_domain))
+        async with semaphore:
+            now = time.monotonic()
+            start = max(now, self.next_start.get(domain, now))
+            self.next_start[domain] = start + self.delay
+            if start > now:
+                await asyncio.sleep(start - now)
+            yield
+
+
+async def check_backlink(client, backlink, throttle):
+    """Return ``(backlink, changes)``; ``changes`` is None when nothing is known."""
+    headers = {}
+    if backlink.http_etag:
+        headers['If-None-Match'] = backlink.http_etag
+    if backlink.http_last_modified:
+        headers['If-Modified-Since'] = backlink.http_last_modified
+
+    async with throttle.slot(referring_domain(backlink.source_url)):
+        try:
+            async with client.stream('GET', backlink.source_url, headers=headers) as response:
+                changes = {
+                    'http_etag': response.headers.get('etag', '')[:255],
+                    'http_last_modified': response.headers.get('last-modified', '')[:64],
+                }
+                if response.status_code == 304:
+                    # Page unchanged since the last check: keep the previous verdict
+                    changes.update(http_etag=backlink.http_etag, http_last_modified=backlink.http_last_modified)
+                    return backlink, changes
+                if response.status_code in (404, 410):
+                    return backlink, {'status': 'broken', 'http_etag': '', 'http_last_modified': ''}
+                if response.status_code >= 400:
+                    # Transient or blocked; retry on a later run
+                    return backlink, None
+
+                finder = AnchorFinder(str(response.url), backlink.target_url)
+                received = 0
+                async for chunk in response.aiter_text():
+                    finder.feed(chunk)
+                    received += len(chunk)
+                    if finder.found or received >= MAX_BYTES:
+                        break
+        except (httpx.InvalidURL, httpx.UnsupportedProtocol, ValueError) as exc:
+            # The URL can never be fetched; mark the link broken instead of retrying it every run
+            logger.debug('Backlink %s has an invalid source URL: %s', backlink.pk, exc)
+            return backlink, {'status': 'broken', 'http_etag': '', 'http_last_modified': ''}
+        except httpx.HTTPError as exc:
+            logger.debug('Backlink check failed for %s: %s', backlink.source_url, exc)
+            return backlink, None
+
+    if finder.found:
+        changes.update(status='active', is_dofollow=finder.is_dofollow)
+    else:
+        changes['status'] = 'lost'
+    return backlink, changes
+
+
+def _write_results(results, checked_at):
+    """Apply verdicts with one bulk_update; returns how many links changed state."""
+    changed = dofollow_changed = 0
+    for backlink, changes in results:
+        before = (backlink.status, backlink.is_dofollow)
+        for field, value in changes.items():
+            setattr(backlink, field, value)
+        backlink.last_checked = checked_at
+        changed += (backlink.status, backlink.is_dofollow) != before
+        dofollow_changed += backlink.is_dofollow != before[1]
+    Backlink.objects.bulk_update([backlink for backlink, _ in results], UPDATE_FIELDS)
+    return changed, dofollow_changed
+
+
+def stale_backlinks(site_id=None, older_than_hours=24):
+    """Backlinks due for a re-check (spam is never re-checked)."""
+    cutoff = timezone.now() - timedelta(hours=older_than_hours)
+    queryset = Backlink.objects.exclude(status='spam').filter(
+        Q(last_checked__lt=cutoff) | Q(last_checked__isnull=True)
+    )
+    if site_id:
+        queryset = queryset.filter(site_id=site_id)
+    return queryset
+
+
+def _next_page(queryset, after_pk, size):
+    return list(queryset.filter(pk__gt=after_pk).order_by('pk')[:size])
+
+
+def _interleave_by_domain(backlinks):
+    """Round-robin over source domains so one busy domain can't stall every worker."""
+    by_domain = {}
+    for backlink in backlinks:
+        by_domain.setdefault(referring_domain(backlink.source_url), []).append(backlink)
+    queues = [list(reversed(links)) for links in by_domain.values()]
+    while queues:
+        for links in queues:
+            yield links.pop()
+        queues = [links for links in queues if links]
+
+
+async def _require_public_host(request):
+    # Hooks run for every request, so redirects to private hosts are refused too
+    if not await asyncio.to_thread(is_public_host, request.url.host, request.url.port):
+        raise httpx.ConnectError(f'{request.url.host} is not a public host', request=request)
+
+
+def make_client(concurrency=DEFAULT_CONCURRENCY, timeout=DEFAULT_TIMEOUT, transport=None):
+    """Async client for backlink checks that only connects to public hosts.
+
+    Source URLs are tenant input; a link into a private network is left
+    unknown instead of being fetched. ``transport`` (e.g. an
+    ``httpx.MockTransport``) stands in for the network.
+    """
+    return httpx.AsyncClient(
+        follow_redirects=True,
+        timeout=timeout,
+        headers={'User-Agent': USER_AGENT},
+        limits=httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency),
+        event_hooks={'request': [_require_public_host]},
+        transport=transport,
+    )
+
+
+async def check_backlinks_async(
+    queryset,
+    concurrency=DEFAULT_CONCURRENCY,
+    per_domain=DEFAULT_PER_DOMAIN,
+    domain_delay=DEFAULT_DOMAIN_DELAY,
+    batch_size=DEFAULT_BATCH_SIZE,
+    timeout=DEFAULT_TIMEOUT,
+    limit=None,
+    client=None,
+):
+    """Check every backlink in ``queryset``; returns a summary dict.
+
+    Pass ``client`` (e.g. with an ``httpx.MockTransport``) to run against a
+    stand-in server.
+    """
+    started = time.perf_counter()
+    throttle = DomainThrottle(per_domain, domain_delay)
+    queue = asyncio.Queue(maxsize=concurrency * 2)
+    pending = []
+    summary = {'checked': 0, 'unknown': 0, 'changed': 0, 'dofollow_changed': 0}
+    write_lock = asyncio.Lock()
+
+    owns_client = client is None
+    if owns_client:
+        client = make_client(concurrency, timeout)
+
+    async def flush():
+        async with write_lock:
+            if not pending:
+                return
+            batch = pending[:]
+            pending.clear()
+            changed, dofollow_changed = await sync_to_async(_write_results)(batch, timezone.now())
+            summary['changed'] += changed
+            summary['dofollow_changed'] += dofollow_changed
+
+    async def produce():
+        after_pk = 0
+        remaining = limit
+        while remaining is None or remaining > 0:
+            size = batch_size if remaining is None else min(batch_size, remaining)
+            page = await sync_to_async(_next_page)(queryset, after_pk, size)
+            if not page:
+                break
+            if remaining is not None:
+                remaining -= len(page)
+            for backlink in _interleave_by_domain(page):
+                await queue.put(backlink)
+            after_pk = page[-1].pk
+        for _ in range(concurrency):
+            await queue.put(None)
+
+    async def work():
+        while True:
+            backlink = await queue.get()
+            if backlink is None:
+                return
+            backlink, changes = await check_backlink(client, backlink, throttle)
+            summary['checked'] += 1
+            if changes is None:
+                summary['unknown'] += 1
+                continue
+            pending.append((backlink, changes))
+            if len(pending) >= batch_size:
+                await flush()
+
+    try:
+        await asyncio.gather(produce(), *(work() for _ in range(concurrency)))
+        await flush()
+    finally:
+        if owns_client:
+            await client.aclose()
+
+    elapsed = time.perf_counter() - started
+    summary['seconds'] = round(elapsed, 3)
+    summary['checks_per_minute'] = round(summary['checked'] / elapsed * 60) if elapsed else 0
+    return summary
+
+
+def check_backlinks(queryset, **options):
+    """Synchronous entry point for tasks and management commands."""
+    return asyncio.run(check_backlinks_async(queryset, **options))
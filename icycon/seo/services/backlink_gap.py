@@ -0,0 +1,188 @@
+"""
+Competitor backlink gap analysis.
+
+A site's gaps are the referring domains that link to its competitors but not
+to the site itself. Referring domains are interned in ``LinkDomain`` and both
+``ReferringDomain`` (our active links, see ``backlink_stats``) and
+``CompetitorBacklink`` carry the integer id. The gap is one grouped anti-join
+in the database, and nothing is compared row by row in Python.
+
+Results are cached in ``BacklinkGap``. A full ``rebuild_site`` runs once per
+site, from ``rebuild_backlink_gaps_task`` (``manage.py rebuild_backlink_gaps``);
+the views only read, and queue that task for a site not built yet. After that
+every write that changes a ``(site, domain)`` pair refreshes only that pair:
+CompetitorBacklink writes, and our referring domains appearing or
+disappearing. Backlink imports skip the per-pair refreshes and rebuild the
+site once, from ``backlink_stats.reconcile_site``. A domain's ``score`` is
+its highest domain rating times the number of competitors it links to.
+"""
+
+import logging
+from collections import defaultdict
+
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Count, Max, Q
+from django.utils import timezone
+from kombu.exceptions import OperationalError
+
+from seo.models import BacklinkGap, BacklinkProfile, CompetitorBacklink, LinkDomain, ReferringDomain
+from .backlink_stats import DOMAIN_CHUNK_SIZE, referring_domain
+from .sitemap_builder import site_host
+
+logger = logging.getLogger(__name__)
+
+WRITE_BATCH_SIZE = 2000
+# A site's first build is queued at most once per this many seconds
+REBUILD_QUEUE_SECONDS = 300
+
+
+def domain_ids(names, using=None):
+    """``{name: LinkDomain id}`` for ``names``, creating missing domains."""
+    names = sorted({name for name in names if name})
+    ids = {}
+    for start in range(0, len(names), DOMAIN_CHUNK_SIZE):
+        chunk = names[start:start + DOMAIN_CHUNK_SIZE]
+        found = dict(LinkDomain.objects.using(using).filter(name__in=chunk).values_list('name', 'pk'))
+        missing = [name for name in chunk if name not in found]
+        if missing:
+            LinkDomain.objects.using(using).bulk_create([LinkDomain(name=name) for name in missing], ignore_conflicts=True)
+            found.update(LinkDomain.objects.using(using).filter(name__in=missing).values_list('name', 'pk'))
+        ids.update(found)
+    return ids
+
+
+def assign_domains(links, using=None):
+    """Derive ``source_domain``/``link_domain`` of CompetitorBacklink instances from their URLs."""
+    for link in links:
+        link.source_domain = referring_domain(link.source_url)
+    ids = domain_ids((link.source_domain for link in links), using)
+    for link in links:
+        link.link_domain_id = ids.get(link.source_domain)
+
+
+def domain_fields(url, using=None):
+    """Update kwargs setting the derived domain columns for ``source_url=url``."""
+    name = referring_domain(url) if url else ''
+    return {'source_domain': name, 'link_domain_id': domain_ids([name], using).get(name)}
+
+
+def gap_rows(site_id, link_domain_ids=None, using=None):
+    """Grouped gap rows of a site, optionally limited to some domains."""
+    ours = ReferringDomain.objects.using(using).filter(site_id=site_id, link_domain__isnull=False).values('link_domain')
+    links = CompetitorBacklink.objects.using(using).filter(site_id=site_id, link_domain__isnull=False).exclude(
+        link_domain__in=ours
+    )
+    if link_domain_ids is not None:
+        links = links.filter(link_domain__in=link_domain_ids)
+    return links.order_by().values('link_domain').annotate(
+        competitor_count=Count('competitor_domain', distinct=True),
+        competitor_links=Count('pk'),
+        dofollow_links=Count('pk', filter=Q(is_dofollow=True)),
+        domain_rating=Max('domain_rating'),
+    )
+
+
+def _store(site_id, rows, using):
+    batch, stored = [], 0
+    for row in rows:
+        batch.append(BacklinkGap(
+            site_id=site_id, link_domain_id=row['link_domain'], competitor_count=row['competitor_count'],
+            competitor_links=row['competitor_links'], dofollow_links=row['dofollow_links'],
+            domain_rating=row['domain_rating'] or 0, score=(row['domain_rating'] or 0) * row['competitor_count'],
+        ))
+        if len(batch) >= WRITE_BATCH_SIZE:
+            BacklinkGap.objects.using(using).bulk_create(batch)
+            stored += len(batch)
+            batch = []
+    BacklinkGap.objects.using(using).bulk_create(batch)
+    return stored + len(batch)
+
+
+def refresh_pairs(pairs, using=None):
+    """Recompute the cached gaps of ``(site_id, link_domain_id)`` pairs."""
+    by_site = defaultdict(set)
+    for site_id, link_domain_id in pairs:
+        if site_id and link_domain_id:
+            by_site[site_id].add(link_domain_id)
+    for site_id, ids in sorted(by_site.items()):
+        ids = sorted(ids)
+        for start in range(0, len(ids), DOMAIN_CHUNK_SIZE):
+            chunk = ids[start:start + DOMAIN_CHUNK_SIZE]
+            with transaction.atomic(using=using):
+                BacklinkGap.objects.using(using).filter(site_id=site_id, link_domain__in=chunk).delete()
+                _store(site_id, gap_rows(site_id, chunk, using), using)
+
+
+def backfill_domains(site_id, using=None):
+    """Fill ``link_domain`` on a site's rows written before domains were interned."""
+    filled = 0
+    while True:
+        rows = list(ReferringDomain.objects.using(using).filter(site_id=site_id, link_domain__isnull=True)[:DOMAIN_CHUNK_SIZE])
+        if not rows:
+            break
+        ids = domain_ids((row.domain for row in rows), using)
+        for row in rows:
+            row.link_domain_id = ids[row.domain]
+        ReferringDomain.objects.using(using).bulk_update(rows, ['link_domain'])
+        filled += len(rows)
+
+    pending = CompetitorBacklink.objects.using(using).filter(site_id=site_id, link_domain__isnull=True)
+    # Keyset paging: links whose URL has no host stay NULL and must not be refetched
+    last_pk = 0
+    while True:
+        links = list(pending.filter(pk__gt=last_pk).order_by('pk')[:DOMAIN_CHUNK_SIZE])
+        if not links:
+            break
+        last_pk = links[-1].pk
+        assign_domains(links, using)
+        # Derived columns only, so the queryset does not refresh gaps; rebuild_site does
+        CompetitorBacklink.objects.using(using).bulk_update(links, ['source_domain', 'link_domain'])
+        filled += len(links)
+    return filled
+
+
+def rebuild_site(site_id, using=None):
+    """Recompute every cached gap of a site; returns the number of gap domains."""
+    backfill_domains(site_id, using)
+    with transaction.atomic(using=using):
+        BacklinkGap.objects.using(using).filter(site_id=site_id).delete()
+        stored = _store(site_id, gap_rows(site_id, using=using).iterator(), using)
+        profile, _ = BacklinkProfile.objects.using(using).get_or_create(site_id=site_id)
+        BacklinkProfile.objects.using(using).filter(pk=profile.pk).update(gaps_built_at=timezone.now())
+    return stored
+
+
+def gaps_built(site):
+    """Whether ``site``'s gaps have been fully built at least once."""
+    return BacklinkProfile.objects.filter(site=site, gaps_built_at__isnull=False).exists()
+
+
+def enqueue_rebuild(site):
+    """Queue ``site``'s full rebuild once the current transaction commits."""
+    from seo.tasks import rebuild_backlink_gaps_task
+
+    if not cache.add(f'seo:gap-rebuild:{site.pk}', True, REBUILD_QUEUE_SECONDS):
+        return
+
+    def send():
+        try:
+            rebuild_backlink_gaps_task.delay(site.pk)
+        except OperationalError as exc:
+            # `manage.py rebuild_backlink_gaps` builds it later
+            cache.delete(f'seo:gap-rebuild:{site.pk}')
+            logger.warning('Could not queue backlink gap rebuild for site %s: %s', site.pk, exc)
+
+    transaction.on_commit(send)
+
+
+def site_gaps(site, min_competitors=1, min_domain_rating=0):
+    """Stored gap rows of ``site``, best first; see ``gaps_built`` for whether they are complete."""
+    gaps = BacklinkGap.objects.filter(site=site).select_related('link_domain')
+    if min_competitors > 1:
+        gaps = gaps.filter(competitor_count__gte=min_competitors)
+    if min_domain_rating:
+        gaps = gaps.filter(domain_rating__gte=min_domain_rating)
+    # Links from the site's own host are internal, not a gap
+    own_domain = referring_domain(f'//{site_host(site)}')
+    return gaps.exclude(link_domain__name=own_domain).order_by('-score', '-domain_rating', 'link_domain_id')
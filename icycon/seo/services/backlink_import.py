@@ -0,0 +1,189 @@
+"""
+Streaming backlink import.
+
+Rows are read lazily from CSV or JSONL exports and upserted in batches on the
+(site, source_url, target_url) key with ``INSERT ... ON CONFLICT DO UPDATE``,
+so memory stays flat however large the file or the existing table is. Every
+row seen in a run gets ``last_checked`` set to the run's start time; after a
+full import, active links not touched by the run are marked ``lost`` with a
+single UPDATE, and the day's backlink snapshot is taken.
+
+The rows are written without per-batch aggregate tracking
+(``backlink_stats.suspended``); the site is reconciled once at the end
+instead, which also rebuilds its competitor gaps if its referring domains
+changed.
+"""
+
+import csv
+import gzip
+import io
+import json
+import time
+import zlib
+
+from django.db.models import Q
+from django.utils import timezone
+
+from seo.models import Backlink
+from .backlink_snapshots import take_snapshot
+from .backlink_stats import reconcile_site, suspended
+
+DEFAULT_BATCH_SIZE = 2000
+URL_MAX_LENGTH = Backlink._meta.get_field('source_url').max_length
+ANCHOR_MAX_LENGTH = Backlink._meta.get_field('anchor_text').max_length
+STATUSES = {choice for choice, _ in Backlink.STATUS_CHOICES}
+
+# Column names used by common backlink exports, mapped to Backlink fields
+COLUMN_ALIASES = {
+    'source_url': 'source_url', 'source url': 'source_url', 'source': 'source_url',
+    'referring page url': 'source_url', 'url from': 'source_url',
+    'target_url': 'target_url', 'target url': 'target_url', 'target': 'target_url', 'url to': 'target_url',
+    'anchor_text': 'anchor_text', 'anchor': 'anchor_text',
+    'domain_rating': 'domain_rating', 'domain rating': 'domain_rating', 'dr': 'domain_rating',
+    'page_authority': 'page_authority', 'page authority': 'page_authority', 'ur': 'page_authority', 'pa': 'page_authority',
+    'is_dofollow': 'is_dofollow', 'dofollow': 'is_dofollow',
+    'nofollow': 'nofollow',
+    'status': 'status',
+}
+UPDATE_FIELDS = ['anchor_text', 'domain_rating', 'page_authority', 'is_dofollow', 'status', 'last_checked']
+FORMATS = ('csv', 'jsonl')
+# Raised while reading a malformed export (bad JSON or CSV, truncated gzip, wrong encoding)
+PARSE_ERRORS = (ValueError, csv.Error, OSError, EOFError, zlib.error)
+
+
+def detect_format(filename):
+    name = filename.lower()
+    if name.endswith('.gz'):
+        name = name[:-3]
+    return 'jsonl' if name.endswith(('.jsonl', '.ndjson', '.json')) else 'csv'
+
+
+def open_export(fileobj, filename):
+    """Wrap the binary ``fileobj`` so it reads plain export data, gunzipping ``.gz`` files."""
+    if filename.lower().endswith('.gz'):
+        return gzip.GzipFile(fileobj=fileobj, mode='rb')
+    return fileobj
+
+
+def iter_rows(stream, fmt='csv'):
+    """Yield one dict per record from a text or binary stream."""
+    if not isinstance(stream, io.TextIOBase):
+        stream = io.TextIOWrapper(stream, encoding='utf-8-sig', newline='')
+    if fmt == 'jsonl':
+        for line in stream:
+            line = line.strip()
+            if line:
+                yield json.loads(line)
+    else:
+        yield from csv.DictReader(stream)
+
+
+def _as_bool(value, default=True):
+    if value is None or value == '':
+        return default
+    if isinstance(value, bool):
+        return value
+    return str(value).strip().lower() in ('1', 'true', 'yes', 'y', 'dofollow')
+
+
+def _as_score(value):
+    try:
+        return min(max(int(float(value)), 0), 100)
+    except (TypeError, ValueError):
+        return 0
+
+
+def normalize_row(raw):
+    """Map an export row onto Backlink fields; returns None for unusable rows."""
+    if not isinstance(raw, dict):
+        return None
+    row = {}
+    for key, value in raw.items():
+        field = COLUMN_ALIASES.get(str(key).strip().lower())
+        if field:
+            row[field] = value.strip() if isinstance(value, str) else value
+
+    source_url, target_url = row.get('source_url'), row.get('target_url')
+    if not isinstance(source_url, str) or not isinstance(target_url, str) or not source_url or not target_url:
+        return None
+    if len(source_url) > URL_MAX_LENGTH or len(target_url) > URL_MAX_LENGTH:
+        return None
+
+    if 'is_dofollow' in row:
+        is_dofollow = _as_bool(row['is_dofollow'])
+    else:
+        is_dofollow = not _as_bool(row.get('nofollow'), default=False)
+    status = row.get('status')
+    anchor_text = row.get('anchor_text')
+    return {
+        'source_url': source_url,
+        'target_url': target_url,
+        'anchor_text': (anchor_text if isinstance(anchor_text, str) else '')[:ANCHOR_MAX_LENGTH],
+        'domain_rating': _as_score(row.get('domain_rating')),
+        'page_authority': _as_score(row.get('page_authority')),
+        'is_dofollow': is_dofollow,
+        # A link present in the export is live unless the export says otherwise
+        'status': status if isinstance(status, str) and status in STATUSES else 'active',
+    }
+
+
+def _flush(site, batch, checked_at):
+    Backlink.objects.bulk_create(
+        [Backlink(site=site, last_checked=checked_at, **fields) for fields in batch.values()],
+        update_conflicts=True,
+        unique_fields=['site', 'source_url', 'target_url'],
+        update_fields=UPDATE_FIELDS,
+    )
+
+
+def import_backlinks(site, rows, full=False, batch_size=DEFAULT_BATCH_SIZE):
+    """Upsert ``rows`` (raw export dicts) into ``site``'s backlinks.
+
+    With ``full=True`` the rows are treated as the complete current link set
+    and active links missing from it are marked ``lost``, then the day's
+    snapshot is recorded (see ``backlink_snapshots``). Returns a summary
+    dict with counts and throughput.
+    """
+    started = time.perf_counter()
+    checked_at = timezone.now()
+    total = upserted = skipped = 0
+    # Keyed on the unique columns: one statement may not touch a row twice
+    batch = {}
+
+    lost = 0
+    try:
+        with suspended():
+            for raw in rows:
+                total += 1
+                fields = normalize_row(raw)
+                if fields is None:
+                    skipped += 1
+                    continue
+                batch[(fields['source_url'], fields['target_url'])] = fields
+                if len(batch) >= batch_size:
+                    _flush(site, batch, checked_at)
+                    upserted += len(batch)
+                    batch = {}
+            if batch:
+                _flush(site, batch, checked_at)
+                upserted += len(batch)
+
+            if full:
+                lost = Backlink.objects.filter(site=site, status='active').filter(
+                    Q(last_checked__lt=checked_at) | Q(last_checked__isnull=True)
+                ).update(status='lost')
+    finally:
+        # Also after a malformed file: the batches written before it are counted
+        reconcile_site(site.pk, log_drift=False)
+    if full:
+        take_snapshot(site.pk)
+
+    seconds = time.perf_counter() - started
+    return {
+        'rows': total,
+        'upserted': upserted,
+        'skipped': skipped,
+        'lost': lost,
+        'seconds': round(seconds, 3),
+        'rows_per_second': round(total / seconds) if seconds else total,
+    }
@@ -0,0 +1,154 @@
+"""
+Daily snapshots of a site's active backlinks, for new/lost link history.
+
+``take_snapshot`` stores the sorted ids of the site's active backlinks as one
+``BacklinkSnapshot`` per site and day. The ids are delta-encoded and zlib
+compressed, which comes to under a byte per link for typical id spreads. Its
+new/lost counts are set diffs against the previous stored id set, done in
+memory. ``diff`` compares any two days the same way, using the nearest
+snapshots that still have ids.
+
+``apply_retention`` bounds storage. Ids are kept for every day of the last
+``DAILY_DAYS``, then for the last snapshot of each ISO week up to
+``WEEKLY_DAYS``, then for the last of each month. Clearing ids keeps the row
+and its counts, so trends stay complete.
+"""
+
+import sys
+import zlib
+from array import array
+from datetime import timedelta
+from itertools import accumulate
+
+from django.db import transaction
+from django.utils import timezone
+
+from seo.models import Backlink, BacklinkSnapshot, Site
+from .backlink_stats import LIVE_STATUS
+
+DAILY_DAYS = 35
+WEEKLY_DAYS = 400
+READ_CHUNK_SIZE = 10000
+WRITE_CHUNK_SIZE = 500
+
+# First byte of an encoded id set: width of the stored deltas
+_WIDE, _NARROW = b'Q', b'I'
+
+
+def encode_ids(ids):
+    """Compact bytes for an ascending sequence of ids."""
+    deltas = array('Q', map(int.__sub__, ids, [0, *ids[:-1]]))
+    kind = _NARROW if not deltas or max(deltas) < 2 ** 32 else _WIDE
+    if kind == _NARROW:
+        deltas = array('I', deltas)
+    if sys.byteorder == 'big':
+        deltas.byteswap()
+    return kind + zlib.compress(deltas.tobytes(), 6)
+
+
+def decode_ids(blob):
+    """The ascending ids of ``encode_ids`` output (an array of ints)."""
+    if not blob:
+        return array('Q')
+    blob = bytes(blob)
+    deltas = array(blob[:1].decode())
+    deltas.frombytes(zlib.decompress(blob[1:]))
+    if sys.byteorder == 'big':
+        deltas.byteswap()
+    return array('Q', accumulate(deltas))
+
+
+def active_ids(site_id, using=None):
+    rows = Backlink.objects.using(using).filter(site_id=site_id, status=LIVE_STATUS).order_by('pk')
+    return list(rows.values_list('pk', flat=True).iterator(chunk_size=READ_CHUNK_SIZE))
+
+
+def _stored(site_id, before=None, on_or_before=None, using=None):
+    """The latest snapshot of a site that still has its ids."""
+    snapshots = BacklinkSnapshot.objects.using(using).filter(site_id=site_id, link_ids__isnull=False)
+    if before is not None:
+        snapshots = snapshots.filter(day__lt=before)
+    if on_or_before is not None:
+        snapshots = snapshots.filter(day__lte=on_or_before)
+    return snapshots.order_by('-day').first()
+
+
+def take_snapshot(site_id, day=None, using=None):
+    """Record today's (or ``day``'s) active links of a site, replacing an earlier snapshot of that day."""
+    day = day or timezone.localdate()
+    ids = active_ids(site_id, using)
+    previous = _stored(site_id, before=day, using=using)
+    new = lost = 0
+    # A site's first snapshot is the baseline: nothing is new or lost yet
+    if previous is not None:
+        current, before = set(ids), set(decode_ids(previous.link_ids))
+        new, lost = len(current - before), len(before - current)
+    with transaction.atomic(using=using):
+        snapshot, _ = BacklinkSnapshot.objects.using(using).update_or_create(
+            site_id=site_id, day=day,
+            defaults={'link_count': len(ids), 'new_count': new, 'lost_count': lost, 'link_ids': encode_ids(ids)},
+        )
+    return snapshot
+
+
+def diff(site_id, start, end=None, using=None):
+    """Links that became active (``new``) or stopped being active (``lost``) between two days.
+
+    Compares the latest stored id sets on or before ``start`` (or the oldest,
+    if ``start`` predates them) and ``end`` (default today); ``start_day`` and
+    ``end_day`` are the snapshot days used.
+    """
+    end = end or timezone.localdate()
+    head = _stored(site_id, on_or_before=end, using=using)
+    base = _stored(site_id, on_or_before=start, using=using) or (
+        BacklinkSnapshot.objects.using(using).filter(site_id=site_id, link_ids__isnull=False).order_by('day').first()
+    )
+    current = set(decode_ids(head.link_ids)) if head else set()
+    before = set(decode_ids(base.link_ids)) if base else set()
+    return {
+        'start_day': base.day if base else None,
+        'end_day': head.day if head else None,
+        'new': sorted(current - before),
+        'lost': sorted(before - current),
+    }
+
+
+def trend(site_id, days=30, using=None):
+    """Daily ``(day, links, new, lost)`` counts of the last ``days`` days, oldest first."""
+    since = timezone.localdate() - timedelta(days=days)
+    rows = BacklinkSnapshot.objects.using(using).filter(site_id=site_id, day__gt=since).order_by('day')
+    return list(rows.values_list('day', 'link_count', 'new_count', 'lost_count'))
+
+
+def _period(day, today):
+    if (today - day).days <= WEEKLY_DAYS:
+        return day.isocalendar()[:2]
+    return day.year, day.month, 0
+
+
+def apply_retention(site_id=None, today=None, using=None):
+    """Clear the ids of snapshots that are no longer kept; returns how many were cleared."""
+    today = today or timezone.localdate()
+    aged = BacklinkSnapshot.objects.using(using).filter(day__lt=today - timedelta(days=DAILY_DAYS), link_ids__isnull=False)
+    if site_id:
+        aged = aged.filter(site_id=site_id)
+    keep, drop = {}, []
+    # Newest first, so the first snapshot seen in a period is the one kept
+    for pk, site, day in aged.order_by('site_id', '-day').values_list('pk', 'site_id', 'day').iterator():
+        key = (site, _period(day, today))
+        if key in keep:
+            drop.append(pk)
+        else:
+            keep[key] = pk
+    for start in range(0, len(drop), WRITE_CHUNK_SIZE):
+        BacklinkSnapshot.objects.using(using).filter(pk__in=drop[start:start + WRITE_CHUNK_SIZE]).update(link_ids=None)
+    return len(drop)
+
+
+def snapshot_sites(site_ids=None, day=None):
+    """Snapshot every (or the given) site, then apply retention; returns ``{site_id: link_count}``."""
+    if site_ids is None:
+        site_ids = Site.objects.order_by('pk').values_list('pk', flat=True).iterator()
+    counts = {site_id: take_snapshot(site_id, day).link_count for site_id in site_ids}
+    apply_retention()
+    return counts
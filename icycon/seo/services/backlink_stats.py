@@ -0,0 +1,227 @@
+"""
+Incrementally maintained backlink aggregates.
+
+``BacklinkProfile`` and the per-site ``ReferringDomain`` counters are updated
+from deltas instead of being recomputed from ``Backlink``. A backlink's
+contribution depends only on its *state* ``(site_id, source_domain, status,
+is_dofollow, domain_rating)``: active links count towards the totals, the
+dofollow/nofollow split, the domain-rating sum and their referring domain;
+spam links count as toxic. Every write path records the old and new state
+in a ``ProfileDelta`` and applies it in the same transaction.
+
+Deltas computed outside a row lock can drift under concurrent writers, so
+``reconcile_site`` recomputes a site from scratch and repairs any difference.
+"""
+
+import logging
+from collections import Counter, defaultdict
+from contextlib import contextmanager
+from contextvars import ContextVar
+from urllib.parse import urlsplit
+
+from django.db import transaction
+from django.db.models import Count, Q, Sum
+
+logger = logging.getLogger(__name__)
+
+LIVE_STATUS = 'active'
+TOXIC_STATUS = 'spam'
+# Bounded IN lists when touching many referring domains at once
+DOMAIN_CHUNK_SIZE = 500
+
+_suspended = ContextVar('backlink_stats_suspended', default=False)
+
+
+def referring_domain(url):
+    """Host of ``url`` without a leading ``www.``, lower-cased; empty if there is none or it is malformed."""
+    try:
+        host = (urlsplit(url).hostname or '') if url else ''
+    except ValueError:
+        return ''
+    return host[4:] if host.startswith('www.') else host
+
+
+def backlink_state(backlink):
+    return (
+        backlink.site_id, backlink.source_domain, backlink.status,
+        backlink.is_dofollow, backlink.domain_rating,
+    )
+
+
+def is_suspended():
+    return _suspended.get()
+
+
+@contextmanager
+def suspended():
+    """Skip delta tracking for writes that are accounted for by the caller."""
+    token = _suspended.set(True)
+    try:
+        yield
+    finally:
+        _suspended.reset(token)
+
+
+class ProfileDelta:
+    """Accumulates aggregate changes per site before writing them."""
+
+    def __init__(self):
+        self.counters = defaultdict(Counter)
+        self.domains = defaultdict(Counter)
+
+    def add(self, state, sign=1, count=1, domain_rating_sum=None):
+        """Add (``sign=1``) or remove (``sign=-1``) ``count`` links in ``state``.
+
+        ``domain_rating_sum`` lets grouped callers pass the summed rating of
+        links that share every other part of the state.
+        """
+        site_id, domain, status, is_dofollow, domain_rating = state
+        counters = self.counters[site_id]
+        if status == LIVE_STATUS:
+            if domain_rating_sum is None:
+                domain_rating_sum = domain_rating * count
+            counters['total_backlinks'] += sign * count
+            counters['dofollow_backlinks' if is_dofollow else 'nofollow_backlinks'] += sign * count
+            counters['domain_rating_sum'] += sign * domain_rating_sum
+            if domain:
+                self.domains[site_id][domain] += sign * count
+        elif status == TOXIC_STATUS:
+            counters['toxic_backlinks_count'] += sign * count
+
+    def change(self, old_state, new_state):
+        if old_state == new_state:
+            return
+        if old_state is not None:
+            self.add(old_state, -1)
+        if new_state is not None:
+            self.add(new_state, 1)
+
+    def apply(self, using=None):
+        """Write the accumulated changes; call inside the writing transaction."""
+        from seo.models import BacklinkProfile
+
+        with transaction.atomic(using=using):
+            for site_id in sorted(set(self.counters) | set(self.domains)):
+                counters = {k: v for k, v in self.counters[site_id].items() if v}
+                domain_changes = {d: n for d, n in self.domains[site_id].items() if n}
+                if not counters and not domain_changes:
+                    continue
+                profile, _ = BacklinkProfile.objects.using(using).select_for_update().get_or_create(site_id=site_id)
+                for field, value in counters.items():
+                    setattr(profile, field, getattr(profile, field) + value)
+                profile.unique_domains += _apply_domain_changes(site_id, domain_changes, using)
+                profile.refresh_average()
+                profile.save()
+        self.counters.clear()
+        self.domains.clear()
+
+
+def _apply_domain_changes(site_id, changes, using):
+    """Update referring-domain counters; returns the change in unique domains."""
+    from seo.models import ReferringDomain
+    from .backlink_gap import domain_ids, refresh_pairs
+
+    appeared = disappeared = 0
+    flipped = []
+    domains = list(changes)
+    for start in range(0, len(domains), DOMAIN_CHUNK_SIZE):
+        chunk = domains[start:start + DOMAIN_CHUNK_SIZE]
+        existing = {
+            rd.domain: rd for rd in
+            ReferringDomain.objects.using(using).select_for_update().filter(site_id=site_id, domain__in=chunk)
+        }
+        to_create, to_update, to_delete = [], [], []
+        for domain in chunk:
+            row = existing.get(domain)
+            before = row.backlink_count if row else 0
+            after = before + changes[domain]
+            if before <= 0 < after:
+                appeared += 1
+                flipped.append(domain)
+            elif after <= 0 < before:
+                disappeared += 1
+                flipped.append(domain)
+            if row is None:
+                if after > 0:
+                    to_create.append(ReferringDomain(site_id=site_id, domain=domain, backlink_count=after))
+            elif after > 0:
+                row.backlink_count = after
+                to_update.append(row)
+            else:
+                to_delete.append(row.pk)
+        ids = domain_ids((row.domain for row in to_create), using)
+        for row in to_create:
+            row.link_domain_id = ids.get(row.domain)
+        ReferringDomain.objects.using(using).bulk_create(to_create)
+        ReferringDomain.objects.using(using).bulk_update(to_update, ['backlink_count'])
+        ReferringDomain.objects.using(using).filter(pk__in=to_delete).delete()
+    if flipped:
+        # A domain starting or ceasing to link to us opens or closes a competitor gap
+        ids = domain_ids(flipped, using)
+        refresh_pairs({(site_id, ids.get(domain)) for domain in flipped}, using=using)
+    return appeared - disappeared
+
+
+def grouped_states(queryset):
+    """Yield ``(state, count, domain_rating_sum)`` for the rows of ``queryset``."""
+    rows = (
+        queryset.order_by()
+        .values_list('site_id', 'source_domain', 'status', 'is_dofollow')
+        .annotate(n=Count('pk'), dr=Sum('domain_rating'))
+    )
+    for site_id, domain, status, is_dofollow, count, dr_sum in rows.iterator():
+        # domain_rating is carried by dr_sum; the state's rating slot is unused
+        yield (site_id, domain, status, is_dofollow, 0), count, dr_sum or 0
+
+
+def reconcile_site(site_id, log_drift=True):
+    """Recompute a site's profile and referring domains; returns the drift found."""
+    from seo.models import Backlink, BacklinkProfile, ReferringDomain
+    from .backlink_gap import domain_ids, rebuild_site
+
+    with transaction.atomic():
+        profile, _ = BacklinkProfile.objects.select_for_update().get_or_create(site_id=site_id)
+        links = Backlink.objects.filter(site_id=site_id).order_by()
+        live = links.filter(status=LIVE_STATUS)
+        expected = live.aggregate(
+            total_backlinks=Count('pk'),
+            dofollow_backlinks=Count('pk', filter=Q(is_dofollow=True)),
+            domain_rating_sum=Sum('domain_rating'),
+        )
+        expected['domain_rating_sum'] = expected['domain_rating_sum'] or 0
+        expected['nofollow_backlinks'] = expected['total_backlinks'] - expected['dofollow_backlinks']
+        expected['toxic_backlinks_count'] = links.filter(status=TOXIC_STATUS).count()
+
+        domain_counts = dict(
+            live.exclude(source_domain='').values_list('source_domain').annotate(n=Count('pk')).iterator()
+        )
+        stored = dict(ReferringDomain.objects.filter(site_id=site_id).values_list('domain', 'backlink_count'))
+        domain_drift = sum(1 for d in set(domain_counts) | set(stored) if domain_counts.get(d) != stored.get(d))
+        if domain_drift:
+            ids = domain_ids(domain_counts)
+            ReferringDomain.objects.filter(site_id=site_id).delete()
+            ReferringDomain.objects.bulk_create(
+                (
+                    ReferringDomain(site_id=site_id, domain=d, link_domain_id=ids.get(d), backlink_count=n)
+                    for d, n in domain_counts.items()
+                ),
+                batch_size=DOMAIN_CHUNK_SIZE,
+            )
+            if profile.gaps_built_at is not None:
+                rebuild_site(site_id)
+        expected['unique_domains'] = len(domain_counts)
+
+        drift = {
+            field: value - getattr(profile, field)
+            for field, value in expected.items() if value != getattr(profile, field)
+        }
+        if domain_drift:
+            drift['referring_domains'] = domain_drift
+        if drift:
+            for field, value in expected.items():
+                setattr(profile, field, value)
+            profile.refresh_average()
+            profile.save()
+            if log_drift:
+                logger.warning('Repaired backlink profile drift for site %s: %s', site_id, drift)
+    return drift
@@ -0,0 +1,95 @@
+"""
+Links ContentItems to the Site their URL is on.
+
+``ContentItem.site`` is derived: it is the tenant's site whose host
+(``sitemap_builder.site_host``) equals the host of the item's URL, or NULL.
+``ContentItem.save()`` and the queryset's bulk writes set it. Site saves that
+add a host relink the tenant's unlinked items and the site's own items.
+
+Rows written before the column existed are linked by ``backfill``
+(``manage.py link_content_sites``). It walks items in pk order and commits
+every batch, so an interrupted run can continue from the last pk it reported.
+"""
+
+from collections import defaultdict
+from urllib.parse import urlsplit
+
+from django.db import transaction
+from django.db.models import Q
+
+from seo.models import ContentItem, Site
+from .sitemap_builder import site_host
+
+BATCH_SIZE = 1000
+# Fields of a ContentItem that decide its site
+SITE_FIELDS = {'url', 'tenant', 'tenant_id'}
+
+
+def url_host(url):
+    try:
+        return (urlsplit(url).hostname or '').lower() if url else ''
+    except ValueError:
+        return ''
+
+
+def tenant_hosts(tenant_id, using=None):
+    """``{host: site id}`` of a tenant's sites; the oldest site wins a shared host."""
+    hosts = {}
+    for site in Site.objects.using(using).filter(tenant_id=tenant_id).order_by('pk').only('pk', 'domain'):
+        hosts.setdefault(site_host(site), site.pk)
+    hosts.pop('', None)
+    return hosts
+
+
+def assign_sites(items, using=None):
+    """Set ``site_id`` on ContentItem instances from their URLs; returns the items that changed."""
+    hosts, changed = {}, []
+    for item in items:
+        if item.tenant_id not in hosts:
+            hosts[item.tenant_id] = tenant_hosts(item.tenant_id, using)
+        site_id = hosts[item.tenant_id].get(url_host(item.url))
+        if site_id != item.site_id:
+            item.site_id = site_id
+            changed.append(item)
+    return changed
+
+
+def link_items(queryset, after=0, batch_size=BATCH_SIZE, progress=None):
+    """Relink the items of ``queryset`` with pk above ``after``, one committed batch at a time.
+
+    ``progress`` is called with the running totals after every batch.
+    """
+    totals = {'scanned': 0, 'changed': 0, 'last_pk': after}
+    while True:
+        batch = list(
+            queryset.filter(pk__gt=totals['last_pk']).order_by('pk').only('pk', 'tenant_id', 'url', 'site_id')[:batch_size]
+        )
+        if not batch:
+            return totals
+        changed = assign_sites(batch, queryset.db)
+        by_site = defaultdict(list)
+        for item in changed:
+            by_site[item.site_id].append(item.pk)
+        # One UPDATE per site instead of bulk_update's per-row CASE
+        with transaction.atomic(using=queryset.db):
+            for site_id, pks in by_site.items():
+                ContentItem.objects.using(queryset.db).filter(pk__in=pks).update(site_id=site_id)
+        totals['scanned'] += len(batch)
+        totals['changed'] += len(changed)
+        totals['last_pk'] = batch[-1].pk
+        if progress:
+            progress(totals)
+
+
+def backfill(tenant_id=None, after=0, batch_size=BATCH_SIZE, progress=None):
+    """Link every unlinked item (optionally of one tenant) that is on one of its tenant's sites."""
+    items = ContentItem.objects.filter(site__isnull=True)
+    if tenant_id:
+        items = items.filter(tenant_id=tenant_id)
+    return link_items(items, after, batch_size, progress)
+
+
+def relink_site(site, using=None):
+    """Relink the items a site may have gained or lost after its domain changed."""
+    items = ContentItem.objects.using(using).filter(Q(site=site) | Q(tenant_id=site.tenant_id, site__isnull=True))
+    return link_items(items)
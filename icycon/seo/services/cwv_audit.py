@@ -0,0 +1,250 @@
+"""
+Batch Core Web Vitals audits.
+
+An ``AuditJob`` holds the ``[site_id, url]`` pairs to measure. ``run_job``
+audits them with at most ``settings.CWV_AUDIT_WORKERS`` collector processes
+alive at a time. Each audit gets its own process, so one that overruns
+``CWV_AUDIT_TIMEOUT`` can be killed without stalling the rest of the batch.
+Results are appended to the ``CwvAudit`` time series in batches. When the
+job ends the p75 summaries of the affected sites are recomputed, so
+dashboards never aggregate raw audit rows. A job left ``running`` by a
+worker that died is put back in the queue by ``requeue_stale``.
+"""
+
+import logging
+import math
+import multiprocessing
+import multiprocessing.connection
+import time
+from collections import defaultdict
+from datetime import timedelta
+from urllib.parse import urlsplit
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+from django.utils.module_loading import import_string
+from kombu.exceptions import OperationalError
+
+from seo.models import AuditJob, CwvAudit, CwvSummary, Site
+from .lighthouse_audit import METRICS
+from .sitemap_builder import site_content_items, site_host
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_URLS_PER_SITE = 20
+SUMMARY_WINDOW_DAYS = 28
+WRITE_BATCH_SIZE = 100
+# Seconds past the collector timeout before its process is killed
+KILL_GRACE = 5
+# Slack on top of a job's longest possible run before it counts as abandoned
+STALE_GRACE = timedelta(minutes=30)
+
+
+def _collect(collector_path, url, timeout, conn):
+    """Worker process body: run one collector and send back ``(metrics, error)``."""
+    try:
+        collector = import_string(collector_path)
+        conn.send((collector(url, timeout), ''))
+    except Exception as exc:
+        conn.send((None, (str(exc) or type(exc).__name__)[:500]))
+    finally:
+        conn.close()
+
+
+def run_collectors(targets, collector_path, workers, timeout):
+    """Yield ``(target, metrics, error)`` as audits finish, ``workers`` at a time."""
+    context = multiprocessing.get_context()
+    pending = iter(targets)
+    running = {}
+    exhausted = False
+    try:
+        while True:
+            while not exhausted and len(running) < workers:
+                target = next(pending, None)
+                if target is None:
+                    exhausted = True
+                    break
+                receiver, sender = context.Pipe(duplex=False)
+                process = context.Process(
+                    target=_collect, args=(collector_path, target[1], timeout, sender), daemon=True,
+                )
+                process.start()
+                sender.close()
+                running[receiver] = (process, target, time.monotonic() + timeout + KILL_GRACE)
+            if not running:
+                return
+
+            next_deadline = min(deadline for _, _, deadline in running.values())
+            ready = multiprocessing.connection.wait(list(running), timeout=max(next_deadline - time.monotonic(), 0))
+            for receiver in ready:
+                process, target, _ = running.pop(receiver)
+                try:
+                    metrics, error = receiver.recv()
+                except EOFError:
+                    process.join()
+                    metrics, error = None, f'collector process exited with code {process.exitcode}'
+                receiver.close()
+                process.join()
+                yield target, metrics, error
+
+            now = time.monotonic()
+            for receiver, (process, target, deadline) in list(running.items()):
+                if deadline <= now:
+                    process.kill()
+                    process.join()
+                    receiver.close()
+                    del running[receiver]
+                    yield target, None, f'timed out after {timeout}s'
+    finally:
+        for receiver, (process, _, _) in running.items():
+            process.kill()
+            process.join()
+            receiver.close()
+
+
+def default_urls(site, limit=DEFAULT_URLS_PER_SITE):
+    """The site's home page plus its most recently updated published content."""
+    home = site.domain if '://' in site.domain else f'https://{site.domain}'
+    urls = [home.rstrip('/') + '/']
+    urls += site_content_items(site).order_by('-updated_at').values_list('url', flat=True)[:max(limit - 1, 0)]
+    return list(dict.fromkeys(urls))
+
+
+def foreign_urls(site, urls):
+    """URLs in ``urls`` that are not on the site's host."""
+    host = site_host(site)
+    return [url for url in urls if (urlsplit(url).hostname or '').lower() != host]
+
+
+def create_job(sites, tenant=None, urls=None, collector=None, urls_per_site=DEFAULT_URLS_PER_SITE):
+    """Queue an audit of ``urls`` (default: ``default_urls``) for each of ``sites``."""
+    targets = [[site.pk, url] for site in sites for url in (urls or default_urls(site, urls_per_site))]
+    return AuditJob.objects.create(
+        tenant=tenant,
+        collector=collector or settings.CWV_COLLECTOR,
+        targets=targets,
+        total=len(targets),
+    )
+
+
+def enqueue_job(job):
+    """Hand ``job`` to a Celery worker once the current transaction commits."""
+    from seo.tasks import run_audit_job_task
+
+    def send():
+        try:
+            run_audit_job_task.delay(job.pk)
+        except OperationalError as exc:
+            # The job stays queued; `manage.py run_audits` drains queued jobs
+            logger.warning('Could not queue audit job %s: %s', job.pk, exc)
+
+    transaction.on_commit(send)
+
+
+def _flush(job, batch):
+    CwvAudit.objects.bulk_create(batch)
+    batch.clear()
+    AuditJob.objects.filter(pk=job.pk).update(completed=job.completed, failed=job.failed)
+
+
+def run_job(job_id, workers=None, timeout=None):
+    """Run a queued job to completion; returns it, or None if it was already claimed."""
+    claimed = AuditJob.objects.filter(pk=job_id, status='queued').update(status='running', started_at=timezone.now())
+    if not claimed:
+        return None
+    job = AuditJob.objects.get(pk=job_id)
+    workers = workers or settings.CWV_AUDIT_WORKERS
+    timeout = timeout or settings.CWV_AUDIT_TIMEOUT
+
+    live_sites = set(Site.objects.filter(pk__in={site_id for site_id, _ in job.targets}).values_list('pk', flat=True))
+    targets = [target for target in job.targets if target[0] in live_sites]
+    batch = []
+    try:
+        for (site_id, url), metrics, error in run_collectors(targets, job.collector, workers, timeout):
+            values = {key: float(value) for key, value in (metrics or {}).items() if key in METRICS and value is not None}
+            batch.append(CwvAudit(
+                site_id=site_id, job=job, url=url, collected_at=timezone.now(),
+                collector=job.collector, error=error, **values,
+            ))
+            if error:
+                job.failed += 1
+            else:
+                job.completed += 1
+            if len(batch) >= WRITE_BATCH_SIZE:
+                _flush(job, batch)
+        _flush(job, batch)
+        job.status = 'done'
+    except Exception as exc:
+        logger.exception('Audit job %s failed', job.pk)
+        job.status = 'failed'
+        job.error = str(exc)
+    job.finished_at = timezone.now()
+    job.save()
+    refresh_summaries(live_sites)
+    return job
+
+
+def requeue_stale(workers=None, timeout=None, now=None):
+    """Put ``running`` jobs whose worker must have died back in the queue; returns their ids.
+
+    A job is abandoned once it has run longer than its targets could take
+    ``workers`` at a time, each given its full timeout, plus ``STALE_GRACE``.
+    Its partial results are dropped, since the rerun audits every target again.
+    """
+    workers = workers or settings.CWV_AUDIT_WORKERS
+    timeout = timeout or settings.CWV_AUDIT_TIMEOUT
+    now = now or timezone.now()
+    requeued = []
+    for job in AuditJob.objects.filter(status='running').only('pk', 'total', 'started_at'):
+        longest = timedelta(seconds=math.ceil(job.total / workers) * (timeout + KILL_GRACE))
+        if job.started_at and job.started_at + longest + STALE_GRACE > now:
+            continue
+        with transaction.atomic():
+            reset = AuditJob.objects.filter(pk=job.pk, status='running', started_at=job.started_at).update(
+                status='queued', started_at=None, completed=0, failed=0,
+            )
+            if reset:
+                CwvAudit.objects.filter(job_id=job.pk).delete()
+                requeued.append(job.pk)
+    if requeued:
+        logger.warning('Requeued abandoned audit jobs %s', requeued)
+    return requeued
+
+
+def p75(values):
+    """Nearest-rank 75th percentile, the threshold Core Web Vitals are judged at."""
+    if not values:
+        return None
+    ordered = sorted(values)
+    return ordered[max(math.ceil(0.75 * len(ordered)), 1) - 1]
+
+
+def _summary(site_id, url, values, samples, window_start, computed_at):
+    return CwvSummary(
+        site_id=site_id, url=url, samples=samples, window_start=window_start, computed_at=computed_at,
+        **{f'p75_{metric}': p75(values[metric]) for metric in METRICS},
+    )
+
+
+def refresh_summaries(site_ids, window_days=SUMMARY_WINDOW_DAYS):
+    """Recompute per-URL and site-wide p75 summaries over the trailing window."""
+    computed_at = timezone.now()
+    window_start = computed_at - timedelta(days=window_days)
+    for site_id in site_ids:
+        rows = CwvAudit.objects.filter(site_id=site_id, collected_at__gte=window_start, error='').values_list('url', *METRICS)
+        by_url = defaultdict(lambda: defaultdict(list))
+        site_values = defaultdict(list)
+        samples = defaultdict(int)
+        for url, *values in rows.iterator():
+            samples[url] += 1
+            for metric, value in zip(METRICS, values):
+                if value is not None:
+                    by_url[url][metric].append(value)
+                    site_values[metric].append(value)
+
+        summaries = [_summary(site_id, '', site_values, sum(samples.values()), window_start, computed_at)]
+        summaries += [_summary(site_id, url, by_url[url], n, window_start, computed_at) for url, n in samples.items()]
+        with transaction.atomic():
+            CwvSummary.objects.filter(site_id=site_id).delete()
+            CwvSummary.objects.bulk_create(summaries)
@@ -1,5 +1,84 @@
-def submit_sitemap(site):
-    # Placeholder for Google Search Console API call
-    print(f"Submitting sitemap for {site.domain} at {site.sitemaps_url}")
-    # Would use OAuth credentials from tenant integrations here
+"""
+Google Search Console sitemap submission.
+
+A submission first refreshes the site's URL inventory (see ``sitemap_ingest``)
+and only calls the Search Console sitemaps API when entries were added,
+changed or removed since the last successful submission.
+"""
+
+import logging
+from urllib.parse import quote
+
+import httpx
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+from kombu.exceptions import OperationalError
+
+from .sitemap_ingest import SitemapError, ingest_site, make_client, pending_urls
+
+logger = logging.getLogger(__name__)
+
+
+def _notify_search_console(site, client):
+    """PUT the site's sitemap to Search Console; returns True on success."""
+    token = settings.SEARCH_CONSOLE_ACCESS_TOKEN
+    if not token:
+        logger.info('SEARCH_CONSOLE_ACCESS_TOKEN not set; sitemap for %s not submitted', site.domain)
+        return False
+    endpoint = '{}/sites/{}/sitemaps/{}'.format(
+        settings.SEARCH_CONSOLE_API_URL.rstrip('/'),
+        quote(site.domain, safe=''),
+        quote(site.sitemaps_url, safe=''),
+    )
+    try:
+        response = client.put(endpoint, headers={'Authorization': f'Bearer {token}'})
+    except httpx.HTTPError as exc:
+        logger.warning('Search Console submission failed for %s: %s', site.domain, exc)
+        return False
+    if response.status_code >= 400:
+        logger.warning('Search Console rejected sitemap for %s: HTTP %s', site.domain, response.status_code)
+        return False
     return True
+
+
+def submit_sitemap(site, source=None, client=None, force=False, allow_local=False):
+    """Refresh ``site``'s sitemap inventory and resubmit it if anything changed.
+
+    ``source`` overrides where the sitemap is read from (e.g. a local fixture
+    with ``allow_local=True``); the URL submitted is always
+    ``site.sitemaps_url``. Returns the ingest summary plus ``pending`` and
+    ``submitted``.
+    """
+    if not site.sitemaps_url:
+        raise SitemapError(f'Site {site.pk} has no sitemaps_url')
+    owns_client = client is None
+    if owns_client:
+        client = make_client(public_only=not allow_local)
+    try:
+        result = ingest_site(site, url=source, client=client, force=force, allow_local=allow_local)
+        pending = pending_urls(site)
+        result['pending'] = pending.count()
+        result['submitted'] = False
+        if result['pending'] or result['removed']:
+            result['submitted'] = _notify_search_console(site, client)
+            if result['submitted']:
+                pending.update(submitted_at=timezone.now())
+    finally:
+        if owns_client:
+            client.close()
+    return result
+
+
+def enqueue_submission(site):
+    """Hand ``site``'s submission to a Celery worker once the current transaction commits."""
+    from seo.tasks import submit_sitemaps_task
+
+    def send():
+        try:
+            submit_sitemaps_task.delay(site.pk)
+        except OperationalError as exc:
+            # `manage.py submit_sitemaps` picks the site up later
+            logger.warning('Could not queue sitemap submission for site %s: %s', site.pk, exc)
+
+    transaction.on_commit(send)
@@ -1,13 +1,152 @@
+"""
+schema.org JSON-LD builders for FAQs and ContentItems.
+
+Builders return plain dicts; ``serialize`` turns them into the compact text
+that is stored and served. Content types read their details from
+``ContentItem.brief_json``:
+
+* blog: ``title``, ``description``/``summary``, ``author``, ``image``
+* product: ``name``/``title``, ``description``, ``sku``, ``brand``, ``image``,
+  ``price``, ``currency``, ``availability``
+* faq: ``faqs`` as ``[{"question": ..., "answer": ...}]``
+* qapage: ``question``, ``text`` and ``answers`` as
+  ``[{"text": ..., "accepted": bool, "upvotes": int}]``
+"""
+
+import json
+
+SCHEMA_CONTEXT = 'https://schema.org'
+AVAILABILITY = {
+    'in_stock': 'https://schema.org/InStock',
+    'out_of_stock': 'https://schema.org/OutOfStock',
+    'preorder': 'https://schema.org/PreOrder',
+    'discontinued': 'https://schema.org/Discontinued',
+}
+# Same escapes as Django's json_script, so stored JSON-LD is safe inside <script>
+_SCRIPT_ESCAPES = {ord('<'): '\\u003C', ord('>'): '\\u003E', ord('&'): '\\u0026'}
+
+
+def serialize(data):
+    return json.dumps(data, ensure_ascii=False, separators=(',', ':')).translate(_SCRIPT_ESCAPES)
+
+
+def _compact(data):
+    return {key: value for key, value in data.items() if value not in (None, '', [], {})}
+
+
+def faq_question(question, answer):
+    return {
+        "@type": "Question",
+        "name": question,
+        "acceptedAnswer": {"@type": "Answer", "text": answer}
+    }
+
+
 def generate_faq_jsonld(faqs):
-    items = []
-    for f in faqs:
-        items.append({
-            "@type": "Question",
-            "name": f.question,
-            "acceptedAnswer": {"@type": "Answer", "text": f.answer}
-        })
     return {
-        "@context": "https://schema.org",
+        "@context": SCHEMA_CONTEXT,
         "@type": "FAQPage",
-        "mainEntity": items
+        "mainEntity": [faq_question(f.question, f.answer) for f in faqs]
+    }
+
+
+def faq_page_parts():
+    """``(head, tail)`` of a serialized FAQPage; serialized Questions go between, comma separated."""
+    head = serialize({"@context": SCHEMA_CONTEXT, "@type": "FAQPage"})[:-1]
+    return head + ',"mainEntity":[', ']}'
+
+
+def _timestamp(value):
+    return value.isoformat(timespec='seconds') if value else None
+
+
+def _blog(item, brief):
+    author = brief.get('author')
+    return _compact({
+        "@type": "BlogPosting",
+        "headline": brief.get('title') or brief.get('topic'),
+        "description": brief.get('description') or brief.get('summary'),
+        "image": brief.get('image'),
+        "author": {"@type": "Person", "name": author} if isinstance(author, str) and author else author,
+        "datePublished": _timestamp(item.created_at),
+        "dateModified": _timestamp(item.updated_at),
+        "mainEntityOfPage": item.url,
+    })
+
+
+def _product(item, brief):
+    offer = None
+    if brief.get('price') not in (None, ''):
+        offer = _compact({
+            "@type": "Offer",
+            "price": str(brief['price']),
+            "priceCurrency": brief.get('currency') or 'USD',
+            "availability": AVAILABILITY.get(brief.get('availability'), brief.get('availability')),
+            "url": item.url,
+        })
+    brand = brief.get('brand')
+    return _compact({
+        "@type": "Product",
+        "name": brief.get('name') or brief.get('title'),
+        "description": brief.get('description'),
+        "sku": brief.get('sku'),
+        "image": brief.get('image'),
+        "brand": {"@type": "Brand", "name": brand} if isinstance(brand, str) and brand else brand,
+        "offers": offer,
+    })
+
+
+def _faq_page(item, brief):
+    entities = [
+        faq_question(entry['question'], entry['answer'])
+        for entry in brief.get('faqs') or []
+        if isinstance(entry, dict) and entry.get('question') and entry.get('answer')
+    ]
+    if not entities:
+        return None
+    return {"@type": "FAQPage", "mainEntity": entities}
+
+
+def _qa_page(item, brief):
+    question = brief.get('question') or brief.get('title')
+    if not question:
+        return None
+    answers = [entry for entry in brief.get('answers') or [] if isinstance(entry, dict) and entry.get('text')]
+    rendered = [
+        _compact({"@type": "Answer", "text": entry['text'], "upvoteCount": entry.get('upvotes'), "url": entry.get('url')})
+        for entry in answers
+    ]
+    accepted = [answer for answer, entry in zip(rendered, answers) if entry.get('accepted')]
+    suggested = [answer for answer, entry in zip(rendered, answers) if not entry.get('accepted')]
+    return {
+        "@type": "QAPage",
+        "mainEntity": _compact({
+            "@type": "Question",
+            "name": question,
+            "text": brief.get('text') or question,
+            "answerCount": len(rendered),
+            "acceptedAnswer": accepted[0] if accepted else None,
+            "suggestedAnswer": suggested + accepted[1:],
+        }),
     }
+
+
+CONTENT_BUILDERS = {
+    'blog': _blog,
+    'product': _product,
+    'faq': _faq_page,
+    'qapage': _qa_page,
+}
+
+
+def content_jsonld(item):
+    """JSON-LD dict for a ContentItem, or None when its type/brief has nothing to describe."""
+    builder = CONTENT_BUILDERS.get(item.type)
+    brief = item.brief_json if isinstance(item.brief_json, dict) else {}
+    data = builder(item, brief) if builder else None
+    if not data:
+        return None
+    data = {"@context": SCHEMA_CONTEXT, **data, "url": item.url}
+    if item.locale and data["@type"] != "Product":
+        data["inLanguage"] = item.locale
+    return data
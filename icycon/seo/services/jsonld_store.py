@@ -0,0 +1,100 @@
+"""
+Stored JSON-LD for ContentItems and per-tenant FAQPage documents.
+
+``ContentItem.save()`` stores the item's serialized JSON-LD and its hash in
+``json_ld``/``json_ld_etag``. ``FAQ.save()``/``delete()`` splice the FAQ's
+serialized Question into its tenant's ``FaqPageDocument`` so no write ever
+re-reads the tenant's other FAQs. Public views only read these columns.
+
+Queryset writes that bypass ``save()`` are covered by the querysets'
+trackers (see ``seo.derived``):
+
+* FAQ ``update``, ``delete``, ``bulk_create`` and ``bulk_update`` rebuild the
+  documents of the tenants they touch;
+* ContentItem ``bulk_create``, ``bulk_update`` and ``update`` re-render the
+  items they write, when they set a field the JSON-LD is built from.
+
+Only raw SQL needs ``refresh_content_jsonld`` or ``manage.py build_jsonld``
+afterwards.
+"""
+
+import hashlib
+
+from django.db import transaction
+
+from seo.models import FAQ, ContentItem, FaqPageDocument
+from .jsonld_helper import content_jsonld, faq_page_parts, faq_question, serialize
+
+REFRESH_BATCH_SIZE = 500
+
+
+def etag_for(text):
+    return hashlib.sha1(text.encode()).hexdigest() if text else ''
+
+
+def render_content(item):
+    """``(json_ld, etag)`` for ``item``; both empty if it has no structured data."""
+    data = content_jsonld(item)
+    text = serialize(data) if data else ''
+    return text, etag_for(text)
+
+
+def refresh_content_jsonld(queryset=None, batch_size=REFRESH_BATCH_SIZE):
+    """Recompute stored JSON-LD for ``queryset`` (default: every item); returns rows changed."""
+    queryset = ContentItem.objects.all() if queryset is None else queryset
+    items = ContentItem.objects.using(queryset.db)
+    changed, batch = 0, []
+    for item in queryset.order_by('pk').iterator(chunk_size=batch_size):
+        text, etag = render_content(item)
+        if etag != item.json_ld_etag:
+            item.json_ld, item.json_ld_etag = text, etag
+            batch.append(item)
+        if len(batch) >= batch_size:
+            items.bulk_update(batch, ['json_ld', 'json_ld_etag'])
+            changed += len(batch)
+            batch = []
+    items.bulk_update(batch, ['json_ld', 'json_ld_etag'])
+    return changed + len(batch)
+
+
+def faq_fragment(question, answer):
+    return serialize(faq_question(question, answer))
+
+
+def _store(document, fragments):
+    head, tail = faq_page_parts()
+    document.fragments = fragments
+    document.faq_count = len(fragments)
+    # Ids are ascending in creation order; the document lists FAQs oldest first
+    document.body = head + ','.join(fragments[key] for key in sorted(fragments, key=int)) + tail
+    document.etag = etag_for(document.body)
+    document.save()
+    return document
+
+
+def _locked_document(tenant_id, using):
+    document, _ = FaqPageDocument.objects.using(using).get_or_create(tenant_id=tenant_id)
+    return FaqPageDocument.objects.using(using).select_for_update().get(pk=document.pk)
+
+
+def apply_faq_change(tenant_id, faq_id, fragment=None, using='default'):
+    """Set (or with ``fragment=None`` remove) one FAQ's Question in its tenant's document."""
+    with transaction.atomic(using=using):
+        document = _locked_document(tenant_id, using)
+        fragments = dict(document.fragments)
+        if fragment is None:
+            if fragments.pop(str(faq_id), None) is None:
+                return document
+        elif fragments.get(str(faq_id)) == fragment:
+            return document
+        else:
+            fragments[str(faq_id)] = fragment
+        return _store(document, fragments)
+
+
+def rebuild_faq_document(tenant_id, using='default'):
+    """Rebuild a tenant's document from its FAQs."""
+    rows = FAQ.objects.using(using).filter(tenant_id=tenant_id).values_list('pk', 'question', 'answer')
+    fragments = {str(pk): faq_fragment(question, answer) for pk, question, answer in rows.iterator()}
+    with transaction.atomic(using=using):
+        return _store(_locked_document(tenant_id, using), fragments)
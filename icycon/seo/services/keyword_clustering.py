@@ -0,0 +1,241 @@
+"""
+Keyword clustering for KeywordCluster.
+
+Keywords are normalised and turned into sets of character trigrams taken per
+word, so word order does not matter ("shoes running" == "running shoes").
+Each set gets a MinHash signature and is indexed by locality sensitive
+hashing (``BANDS`` bands of ``ROWS`` values), so a keyword is only compared
+with cluster leaders that share a band, never with every cluster. Word
+signatures are cached and combined, so a few hundred thousand keywords take
+well under a minute on one core without numeric libraries.
+
+Clustering is leader based: keywords are visited head terms first (highest
+volume, then shortest) and join the most similar leader at or above
+``threshold`` Jaccard similarity, otherwise they lead a new cluster. A
+cluster's leader is ``terms[0]``, so existing clusters seed the index and new
+keywords are assigned to them incrementally; only the keywords that match
+nothing form new clusters. Intent is inferred from the modifiers of the
+cluster's terms.
+"""
+
+import csv
+import io
+import itertools
+import logging
+import random
+import re
+import time
+import unicodedata
+import zlib
+from collections import Counter
+
+from django.db import transaction
+
+from seo.models import KeywordCluster
+
+logger = logging.getLogger(__name__)
+
+SHINGLE_SIZE = 3
+BANDS = 16
+ROWS = 3
+DEFAULT_THRESHOLD = 0.5
+# Bands made of very common words ("best", "buy") would match thousands of
+# leaders; a full bucket stops growing and similar keywords meet in other bands
+MAX_BUCKET_SIZE = 40
+WRITE_BATCH_SIZE = 1000
+MAX_BATCH_KEYWORDS = 10000
+# Fixed seed: signatures must agree between runs for results to be reproducible
+_MASKS = random.Random(20240601).sample(range(1 << 32), BANDS * ROWS)
+
+_punctuation = re.compile(r"[^\w\s'&+-]+")
+
+# English modifiers; checked in this order, the first group with a hit wins
+INTENT_MODIFIERS = (
+    ('navigational', {'login', 'log in', 'sign in', 'signin', 'account', 'official', 'website', 'app', 'download',
+                      'contact', 'customer service', 'near me', 'hours', 'address', 'phone number'}),
+    ('transactional', {'buy', 'price', 'prices', 'pricing', 'cheap', 'cheapest', 'discount', 'coupon', 'deal', 'deals',
+                       'sale', 'for sale', 'order', 'shop', 'purchase', 'free shipping', 'cost', 'quote', 'hire',
+                       'subscription', 'promo code'}),
+    ('commercial', {'best', 'top', 'review', 'reviews', 'vs', 'versus', 'compare', 'comparison', 'alternative',
+                    'alternatives', 'rated', 'recommended', 'pros and cons'}),
+    ('informational', {'how', 'what', 'why', 'when', 'where', 'who', 'which', 'guide', 'tutorial', 'tips', 'ideas',
+                       'examples', 'meaning', 'definition', 'learn', 'is', 'can', 'does', 'benefits'}),
+)
+DEFAULT_INTENT = 'informational'
+
+
+def normalize(keyword):
+    """NFKC-normalised, lowercased keyword with punctuation and extra spaces removed."""
+    text = unicodedata.normalize('NFKC', keyword).lower()
+    text = _punctuation.sub(' ', text)
+    return ' '.join(text.split())
+
+
+def keyword_intent(keyword, default=DEFAULT_INTENT):
+    """Intent of one normalised keyword from its modifiers (``default`` if it has none)."""
+    words = keyword.split()
+    phrases = set(words) | {' '.join(pair) for pair in zip(words, words[1:])}
+    for intent, modifiers in INTENT_MODIFIERS:
+        if phrases & modifiers:
+            return intent
+    return default
+
+
+def cluster_intent(terms):
+    """Most common intent among the ``terms`` that have modifiers; earlier terms win ties."""
+    counts = Counter(intent for intent in (keyword_intent(term, None) for term in terms) if intent)
+    # Counter keeps first-seen order and most_common() is stable
+    return counts.most_common(1)[0][0] if counts else DEFAULT_INTENT
+
+
+class ClusterIndex:
+    """LSH index over cluster leaders."""
+
+    def __init__(self, threshold=DEFAULT_THRESHOLD):
+        self.threshold = threshold
+        self.buckets = [{} for _ in range(BANDS)]
+        self.leader_shingles = []
+        self._tokens = {}
+
+    def _token(self, token):
+        """``(shingles, signature)`` of one word, cached: exports repeat words constantly."""
+        padded = f' {token} '.encode()
+        shingles = frozenset(
+            zlib.crc32(padded[i:i + SHINGLE_SIZE]) for i in range(max(len(padded) - SHINGLE_SIZE + 1, 1))
+        )
+        # XOR with a random mask permutes the hash space; one C-level min() per permutation
+        signature = [min(map(mask.__xor__, shingles)) for mask in _MASKS]
+        entry = self._tokens[token] = (shingles, signature)
+        return entry
+
+    def sketch(self, keyword):
+        """``(shingles, band_keys)`` of a normalised keyword.
+
+        A keyword's trigram set is the union of its words' sets, so its MinHash
+        signature is the element-wise minimum of theirs.
+        """
+        tokens = [self._tokens.get(token) or self._token(token) for token in keyword.split()]
+        if len(tokens) == 1:
+            shingles, signature = tokens[0]
+        else:
+            shingles = frozenset().union(*(entry[0] for entry in tokens))
+            signature = list(map(min, *(entry[1] for entry in tokens)))
+        return shingles, [tuple(signature[band * ROWS:(band + 1) * ROWS]) for band in range(BANDS)]
+
+    def add(self, shingles, keys):
+        """Index a new leader; returns its position."""
+        position = len(self.leader_shingles)
+        self.leader_shingles.append(shingles)
+        for bucket, key in zip(self.buckets, keys):
+            members = bucket.setdefault(key, [])
+            if len(members) < MAX_BUCKET_SIZE:
+                members.append(position)
+        return position
+
+    def match(self, shingles, keys):
+        """Position of the most similar leader at or above the threshold, or None."""
+        candidates = set()
+        for bucket, key in zip(self.buckets, keys):
+            members = bucket.get(key)
+            if members:
+                candidates.update(members)
+        if not candidates:
+            return None
+        positions = sorted(candidates)
+        leaders = [self.leader_shingles[position] for position in positions]
+        commons = map(len, map(shingles.__and__, leaders))
+        size = len(shingles)
+        best, best_score = None, self.threshold
+        # Ascending positions: on a tie the older cluster wins
+        for position, common, leader_size in zip(positions, commons, map(len, leaders)):
+            score = common / (size + leader_size - common)
+            if score > best_score or (score == best_score and best is None):
+                best, best_score = position, score
+        return best
+
+
+def read_keywords(stream):
+    """Yield ``(keyword, volume)`` from a text or binary stream.
+
+    Accepts one keyword per line, or CSV with a ``keyword`` column and an
+    optional ``volume``/``search_volume`` column.
+    """
+    if not isinstance(stream, io.TextIOBase):
+        stream = io.TextIOWrapper(stream, encoding='utf-8-sig', newline='')
+    first = stream.readline()
+    header = [column.strip().lower() for column in next(csv.reader([first]), [])]
+    if 'keyword' not in header:
+        for line in itertools.chain([first], stream):
+            if line.strip():
+                yield line.strip(), 0
+        return
+    volume_column = next((column for column in ('volume', 'search_volume', 'search volume') if column in header), None)
+    for row in csv.DictReader(stream, fieldnames=header):
+        keyword = (row.get('keyword') or '').strip()
+        if keyword:
+            try:
+                volume = int(float(row.get(volume_column) or 0)) if volume_column else 0
+            except ValueError:
+                volume = 0
+            yield keyword, volume
+
+
+def cluster_keywords(tenant, keywords, locale='en', threshold=DEFAULT_THRESHOLD, batch_size=WRITE_BATCH_SIZE):
+    """Assign ``keywords`` (strings or ``(keyword, volume)`` pairs) to ``tenant``'s clusters.
+
+    Keywords similar to an existing cluster's leader are appended to it; the
+    rest are clustered among themselves into new KeywordCluster rows. Returns
+    a summary dict.
+    """
+    started = time.perf_counter()
+    volumes = {}
+    for entry in keywords:
+        keyword, volume = (entry, 0) if isinstance(entry, str) else entry
+        keyword = normalize(keyword)
+        if keyword:
+            volumes[keyword] = max(volumes.get(keyword, 0), volume or 0)
+
+    index = ClusterIndex(threshold)
+    existing = list(KeywordCluster.objects.filter(tenant=tenant, locale=locale).exclude(terms=[]).order_by('pk'))
+    known = set()
+    clusters = []
+    for cluster in existing:
+        known.update(normalize(term) for term in cluster.terms)
+        leader = normalize(cluster.terms[0])
+        if leader:
+            index.add(*index.sketch(leader))
+            clusters.append((cluster, []))
+
+    new_keywords = sorted((keyword for keyword in volumes if keyword not in known), key=lambda k: (-volumes[k], len(k), k))
+    for keyword in new_keywords:
+        shingles, keys = index.sketch(keyword)
+        position = index.match(shingles, keys)
+        if position is None:
+            index.add(shingles, keys)
+            clusters.append((None, [keyword]))
+        else:
+            clusters[position][1].append(keyword)
+
+    updated = []
+    created = []
+    for cluster, added in clusters:
+        if cluster is None:
+            created.append(KeywordCluster(tenant=tenant, locale=locale, intent=cluster_intent(added), terms=added))
+        elif added:
+            cluster.terms = cluster.terms + added
+            updated.append(cluster)
+    with transaction.atomic():
+        KeywordCluster.objects.bulk_create(created, batch_size=batch_size)
+        KeywordCluster.objects.bulk_update(updated, ['terms'], batch_size=batch_size)
+
+    assigned = sum(len(added) for cluster, added in clusters if cluster is not None)
+    seconds = time.perf_counter() - started
+    logger.info('Clustered %s keywords for tenant %s/%s in %.1fs', len(new_keywords), tenant.pk, locale, seconds)
+    return {
+        'keywords': len(new_keywords),
+        'duplicates': len(volumes) - len(new_keywords),
+        'assigned': assigned,
+        'clusters_updated': len(updated),
+        'clusters_created': len(created),
+        'seconds': round(seconds, 3),
+    }
@@ -1,4 +1,92 @@
-def run_audit(domain):
-    # Placeholder for Lighthouse or CWV metrics collector
-    print(f"Running CWV audit for {domain}")
-    return {"LCP": 2.1, "FID": 80, "CLS": 0.05}
+"""
+Core Web Vitals collectors.
+
+A collector is a plain function ``collector(url, timeout) -> dict`` returning
+any of ``lcp_ms``, ``fid_ms``, ``inp_ms``, ``cls`` and ``ttfb_ms``; it raises
+``CollectorError`` when the page could not be measured. Collectors run in
+worker processes (see ``cwv_audit``), so this module must not touch the
+database. Which one is used is set by ``settings.CWV_COLLECTOR``.
+
+Audited URLs are on tenant-controlled hosts, so ``lighthouse_collector``
+refuses a page whose host, or the host it finally landed on, is not public.
+"""
+
+import hashlib
+import json
+import os
+import shutil
+import subprocess
+from urllib.parse import urlsplit
+
+from .sitemap_ingest import is_public_host
+
+METRICS = ('lcp_ms', 'fid_ms', 'inp_ms', 'cls', 'ttfb_ms')
+
+# Lighthouse lab audits behind each stored metric (lab runs have no real INP)
+LIGHTHOUSE_AUDITS = {
+    'lcp_ms': 'largest-contentful-paint',
+    'fid_ms': 'max-potential-fid',
+    'cls': 'cumulative-layout-shift',
+    'ttfb_ms': 'server-response-time',
+}
+
+
+class CollectorError(Exception):
+    """The page could not be measured."""
+
+
+def _require_public_url(url):
+    parts = urlsplit(url)
+    try:
+        port = parts.port
+    except ValueError:
+        port = None
+    if not parts.hostname or not is_public_host(parts.hostname, port):
+        raise CollectorError(f'{parts.hostname or url} is not a public host')
+
+
+def lighthouse_collector(url, timeout):
+    """Run the Lighthouse CLI (``LIGHTHOUSE_BIN``) against ``url`` in headless Chrome."""
+    binary = shutil.which(os.getenv('LIGHTHOUSE_BIN', 'lighthouse'))
+    if binary is None:
+        raise CollectorError('lighthouse CLI not found; set LIGHTHOUSE_BIN or CWV_COLLECTOR')
+    _require_public_url(url)
+    command = [
+        binary, url, '--output=json', '--output-path=stdout', '--quiet',
+        '--only-categories=performance', '--chrome-flags=--headless=new --no-sandbox',
+    ]
+    try:
+        completed = subprocess.run(command, capture_output=True, timeout=timeout, check=False)
+    except subprocess.TimeoutExpired:
+        raise CollectorError(f'lighthouse timed out after {timeout}s')
+    if completed.returncode != 0:
+        raise CollectorError(completed.stderr.decode(errors='replace').strip()[-500:] or 'lighthouse failed')
+    try:
+        report = json.loads(completed.stdout)
+        audits = report['audits']
+    except (ValueError, KeyError, TypeError) as exc:
+        raise CollectorError(f'unreadable lighthouse report: {exc}')
+    # Chrome follows redirects on its own; drop the results if one led off the public internet
+    _require_public_url(report.get('finalDisplayedUrl') or report.get('finalUrl') or url)
+    return {
+        metric: audits[audit_id]['numericValue']
+        for metric, audit_id in LIGHTHOUSE_AUDITS.items()
+        if audits.get(audit_id, {}).get('numericValue') is not None
+    }
+
+
+def stub_collector(url, timeout):
+    """Deterministic fake metrics derived from the URL, for tests and local runs."""
+    seed = int(hashlib.sha1(url.encode()).hexdigest()[:8], 16)
+    return {
+        'lcp_ms': 1200 + seed % 3000,
+        'fid_ms': 20 + seed % 280,
+        'inp_ms': 80 + seed % 420,
+        'cls': (seed % 40) / 100,
+        'ttfb_ms': 100 + seed % 700,
+    }
+
+
+def run_audit(url, collector=lighthouse_collector, timeout=60):
+    """Measure a single URL in the current process."""
+    return collector(url, timeout)
@@ -0,0 +1,107 @@
+"""
+Composite ranking scores for LinkOpportunity rows.
+
+An opportunity's ``score`` (0-100) is the weighted mean of four signals, each
+scaled to [0, 1]:
+
+* ``domain_rating``, ``page_authority`` and ``relevance_score``: divided by 100
+* ``traffic_estimate``: log scale, reaching 1 at ``TRAFFIC_CAP`` visits a month
+
+Weights come from ``settings.LINK_OPPORTUNITY_WEIGHTS`` and need not sum to 1.
+``score_expression`` is the formula as a database expression, so ``rescore``
+scores a whole queryset in one UPDATE; ``score_of`` is the same formula for
+one instance. ``LinkOpportunity.save()`` and its queryset's write methods use
+them to rescore only the rows they write. The ``(site, -score, id)`` index
+and its ``(site, status, -score, id)`` twin keep ranked reads an index scan,
+and ``ranked`` pages through them by keyset (``seo.pagination``) instead of
+OFFSET. After changing the weights, run
+``manage.py score_link_opportunities``.
+"""
+
+import math
+from functools import reduce
+
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.db.models import F, FloatField, Value
+from django.db.models.functions import Cast, Greatest, Least, Ln
+
+from seo.models import LinkOpportunity
+from seo.pagination import DEFAULT_PAGE_SIZE, keyset_page
+
+SCORE_FIELDS = ('domain_rating', 'page_authority', 'relevance_score', 'traffic_estimate')
+TRAFFIC_CAP = 1_000_000
+RANKING = ('-score', 'id')
+
+_TRAFFIC_SCALE = math.log1p(TRAFFIC_CAP)
+
+
+def weights():
+    """Configured weights normalised to sum to 1, zero weights dropped."""
+    configured = settings.LINK_OPPORTUNITY_WEIGHTS
+    unknown = set(configured) - set(SCORE_FIELDS)
+    if unknown:
+        raise ImproperlyConfigured(f'Unknown LINK_OPPORTUNITY_WEIGHTS fields: {sorted(unknown)}')
+    raw = {field: float(configured.get(field, 0)) for field in SCORE_FIELDS}
+    total = sum(raw.values())
+    if min(raw.values()) < 0 or total <= 0:
+        raise ImproperlyConfigured('LINK_OPPORTUNITY_WEIGHTS must be non-negative with a positive total')
+    return {field: weight / total for field, weight in raw.items() if weight}
+
+
+def _component(field, value):
+    value = max(float(value or 0), 0.0)
+    if field == 'traffic_estimate':
+        return min(math.log1p(value) / _TRAFFIC_SCALE, 1.0)
+    return min(value / 100, 1.0)
+
+
+def _component_expression(field, value):
+    value = Greatest(Cast(value, FloatField()), Value(0.0))
+    if field == 'traffic_estimate':
+        return Least(Ln(value + Value(1.0)) / Value(_TRAFFIC_SCALE), Value(1.0))
+    return Least(value / Value(100.0), Value(1.0))
+
+
+def score_of(opportunity, field_weights=None):
+    """Score of one LinkOpportunity instance from its current attribute values."""
+    field_weights = field_weights or weights()
+    return 100 * sum(weight * _component(field, getattr(opportunity, field)) for field, weight in field_weights.items())
+
+
+def score_all(opportunities):
+    """Set ``score`` on instances before ``bulk_create``/``bulk_update``."""
+    field_weights = weights()
+    for opportunity in opportunities:
+        opportunity.score = score_of(opportunity, field_weights)
+
+
+def score_expression(values=None):
+    """The score as a database expression.
+
+    ``values`` maps fields to new values or expressions, as passed to
+    ``update()``; other fields are read from the row.
+    """
+    values = values or {}
+    terms = [
+        Value(weight) * _component_expression(field, values.get(field, F(field)))
+        for field, weight in weights().items()
+    ]
+    return Value(100.0) * reduce(lambda total, term: total + term, terms)
+
+
+def rescore(queryset=None):
+    """Recompute ``score`` for ``queryset`` (default: every opportunity) in one UPDATE."""
+    queryset = LinkOpportunity.objects.all() if queryset is None else queryset
+    return queryset.update(score=score_expression())
+
+
+def ranked(site, status=None, after=None, limit=DEFAULT_PAGE_SIZE):
+    """One page of a site's opportunities, best first, and the next page's cursor (or None).
+
+    ``after`` is a cursor returned with the previous page.
+    """
+    rows = LinkOpportunity.objects.filter(site=site)
+    if status:
+        rows = rows.filter(status=status)
+    return keyset_page(rows, RANKING, after, limit)
@@ -0,0 +1,221 @@
+"""
+Compiled robots.txt matching.
+
+``parse_robots`` reads robots.txt into user-agent groups following RFC 9309:
+groups naming the same agent are merged, the most specific group name that
+prefixes the crawler's product token wins (falling back to ``*``), the
+longest matching rule decides, and ``allow`` wins ties. Each group is
+compiled into a ``RuleSet`` that looks up plain prefix rules with one dict
+probe per distinct rule length. Only rules containing ``*`` or ``$`` fall
+back to regular expressions.
+
+Compiled matchers are cached by a hash of the robots.txt content, in process
+(LRU) and in the shared cache, so a changed ``Site.robots_txt`` simply hashes
+to a new entry. The site -> hash pointer in the shared cache is dropped when
+a Site is saved (see ``seo.signals``).
+"""
+
+import hashlib
+import re
+import threading
+from collections import OrderedDict
+from urllib.parse import quote, urlsplit
+
+from django.core.cache import cache
+
+from seo.models import Site
+
+ROBOTS_CACHE_TIMEOUT = 24 * 60 * 60
+MAX_BATCH_URLS = 10000
+LOCAL_CACHE_SIZE = 512
+# robots.txt files past this size may be ignored (RFC 9309 asks for at least 500 KiB)
+MAX_ROBOTS_BYTES = 500 * 1024
+SAFE_PATH_CHARS = "/:@!$&'()*+,;=-._~%?"
+_escape_case = re.compile(r'%[0-9a-f]{2}')
+_needs_quoting = re.compile(r"[^A-Za-z0-9/:@!$&'()*+,;=\-._~?]")
+
+_local_cache = OrderedDict()
+_local_lock = threading.Lock()
+
+
+def content_hash(text):
+    return hashlib.sha1((text or '').encode()).hexdigest()
+
+
+def normalize_path(value):
+    """Path plus query of a URL or path, percent-encoded the same way rules are."""
+    if '://' in value:
+        parts = urlsplit(value)
+        value = (parts.path or '/') + (f'?{parts.query}' if parts.query else '')
+    elif not value.startswith('/'):
+        value = '/' + value
+    if not _needs_quoting.search(value):
+        return value
+    return _escape_case.sub(lambda m: m.group(0).upper(), quote(value, safe=SAFE_PATH_CHARS))
+
+
+def parse_robots(text):
+    """Return ``{'groups': {agent: [(allow, pattern), ...]}, 'sitemaps': [...]}``."""
+    groups = {}
+    sitemaps = []
+    agents, in_rules = [], False
+    for line in (text or '')[:MAX_ROBOTS_BYTES].splitlines():
+        line = line.split('#', 1)[0].strip()
+        key, sep, value = line.partition(':')
+        if not sep:
+            continue
+        key, value = key.strip().lower(), value.strip()
+        if key == 'user-agent':
+            if in_rules:
+                agents, in_rules = [], False
+            agent = value.split('/', 1)[0].strip().lower()
+            agents.append(agent)
+            groups.setdefault(agent, [])
+        elif key in ('allow', 'disallow'):
+            in_rules = True
+            if value and agents:
+                # '*.php' and '/*.php' are equivalent: every path starts with '/'
+                rule = (key == 'allow', normalize_path(value))
+                for agent in agents:
+                    groups[agent].append(rule)
+        elif key == 'sitemap':
+            sitemaps.append(value)
+    return {'groups': groups, 'sitemaps': sitemaps}
+
+
+def _wildcard_rule(pattern, allow):
+    """``(length, allow, needle, match)``; ``needle`` is a literal every match contains."""
+    anchored = pattern.endswith('$')
+    parts = (pattern[:-1] if anchored else pattern).split('*')
+    regex = re.compile('.*?'.join(re.escape(part) for part in parts) + (r'\Z' if anchored else ''))
+    return len(pattern), allow, max(parts, key=len), regex.match
+
+
+class RuleSet:
+    """Allow/disallow rules of one user-agent group."""
+
+    def __init__(self, rules):
+        self.prefixes = {}
+        self.exact = {}
+        wildcards = {}
+        for allow, pattern in rules:
+            if '*' in pattern or (pattern.endswith('$') and '$' in pattern[:-1]):
+                wildcards[pattern] = wildcards.get(pattern, False) or allow
+            elif pattern.endswith('$'):
+                self.exact[pattern[:-1]] = self.exact.get(pattern[:-1], False) or allow
+            else:
+                self.prefixes[pattern] = self.prefixes.get(pattern, False) or allow
+        self.lengths = sorted({len(prefix) for prefix in self.prefixes}, reverse=True)
+        # Longest first, allow before disallow, so the first hit is the winner
+        self.wildcards = sorted(
+            (_wildcard_rule(pattern, allow) for pattern, allow in wildcards.items()),
+            key=lambda rule: (-rule[0], not rule[1]),
+        )
+
+    def allowed(self, path):
+        best_length, best_allow = -1, True
+        for length in self.lengths:
+            if length <= len(path):
+                allow = self.prefixes.get(path[:length])
+                if allow is not None:
+                    best_length, best_allow = length, allow
+                    break
+        allow = self.exact.get(path)
+        if allow is not None:
+            length = len(path) + 1
+            if length > best_length or (length == best_length and allow):
+                best_length, best_allow = length, allow
+        for length, allow, needle, match in self.wildcards:
+            if length < best_length or (length == best_length and (best_allow or not allow)):
+                break
+            # A substring test is far cheaper than the regex and rules most paths out
+            if needle in path and match(path):
+                best_length, best_allow = length, allow
+                break
+        return best_allow
+
+
+class RobotsMatcher:
+    """Compiled robots.txt; ``allowed``/``allowed_many`` answer per user agent."""
+
+    def __init__(self, parsed):
+        self.sitemaps = parsed['sitemaps']
+        self.groups = {agent: RuleSet(rules) for agent, rules in parsed['groups'].items()}
+        # Longest names first so the most specific group is found first
+        self.agent_names = sorted((name for name in self.groups if name != '*'), key=len, reverse=True)
+        self._by_agent = {}
+
+    def rules_for(self, agent):
+        token = agent.split('/', 1)[0].strip().lower()
+        ruleset = self._by_agent.get(token)
+        if ruleset is None:
+            name = next((name for name in self.agent_names if token.startswith(name)), '*')
+            ruleset = self._by_agent[token] = self.groups.get(name) or RuleSet([])
+        return ruleset
+
+    def allowed(self, url, agent='*'):
+        path = normalize_path(url)
+        return path == '/robots.txt' or self.rules_for(agent).allowed(path)
+
+    def allowed_many(self, urls, agent='*'):
+        ruleset = self.rules_for(agent)
+        results = []
+        for url in urls:
+            path = normalize_path(url)
+            results.append(path == '/robots.txt' or ruleset.allowed(path))
+        return results
+
+
+def matcher_cache_key(digest):
+    return f'seo:robots:{digest}'
+
+
+def site_cache_key(site_id):
+    return f'seo:robots:site:{site_id}'
+
+
+def get_matcher(text, digest=None):
+    """Compiled matcher for robots.txt ``text`` (cached by content hash)."""
+    digest = digest or content_hash(text)
+    with _local_lock:
+        matcher = _local_cache.get(digest)
+        if matcher is not None:
+            _local_cache.move_to_end(digest)
+            return matcher
+
+    key = matcher_cache_key(digest)
+    parsed = cache.get(key)
+    if parsed is None:
+        if text is None:
+            return None
+        parsed = parse_robots(text)
+        cache.set(key, parsed, ROBOTS_CACHE_TIMEOUT)
+    matcher = RobotsMatcher(parsed)
+    with _local_lock:
+        _local_cache[digest] = matcher
+        if len(_local_cache) > LOCAL_CACHE_SIZE:
+            _local_cache.popitem(last=False)
+    return matcher
+
+
+def matcher_for_site(site):
+    """Compiled matcher for a Site instance or id."""
+    if isinstance(site, Site):
+        return get_matcher(site.robots_txt)
+    digest = cache.get(site_cache_key(site))
+    matcher = get_matcher(None, digest) if digest else None
+    if matcher is None:
+        text = Site.objects.filter(pk=site).values_list('robots_txt', flat=True).first() or ''
+        digest = content_hash(text)
+        cache.set(site_cache_key(site), digest, ROBOTS_CACHE_TIMEOUT)
+        matcher = get_matcher(text, digest)
+    return matcher
+
+
+def invalidate_site(site_id):
+    cache.delete(site_cache_key(site_id))
+
+
+def check_urls(site, urls, agent='*'):
+    """``[(url, allowed), ...]`` for ``urls`` under ``site``'s robots.txt."""
+    return list(zip(urls, matcher_for_site(site).allowed_many(urls, agent)))
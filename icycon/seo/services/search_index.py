@@ -0,0 +1,211 @@
+"""
+Full-text search over ContentItems, FAQs and KeywordClusters.
+
+Every indexed row has one ``SearchDocument`` (title and body text), kept
+current on write: ``seo.signals`` handles saves and deletes, and the
+``SearchIndex`` tracker of the models' querysets (see ``seo.derived``) handles
+``bulk_create``, ``bulk_update`` and ``update``. The text index over those documents depends on the backend and is
+created by migration 0013:
+
+* SQLite: the FTS5 table ``seo_searchdocument_fts(title, body, scope)``, filled
+  by triggers on seo_searchdocument. ``scope`` holds a tenant token and a kind
+  token, so tenant and kind filters are answered by the index too;
+* PostgreSQL: the generated ``search_vector`` column (title weighted above
+  body) and its GIN index.
+
+Queries are reduced to word tokens, which must all match; the last one also
+matches as a prefix for search-as-you-type. Nothing is stemmed, because content
+comes in several locales.
+"""
+
+import html
+import re
+
+from django.db import connections, router
+from django.db.models.expressions import RawSQL
+from django.utils.html import strip_tags
+
+from seo.models import FAQ, ContentItem, KeywordCluster, SearchDocument
+
+KINDS = {'content': ContentItem, 'faq': FAQ, 'keywords': KeywordCluster}
+MAX_TERMS = 16
+MAX_BODY_CHARS = 100_000
+DEFAULT_LIMIT = 20
+MAX_LIMIT = 100
+INDEX_BATCH_SIZE = 500
+
+FTS_TABLE = 'seo_searchdocument_fts'
+# Title matches count ten times body matches; scope tokens never add to the rank
+FTS_WEIGHTS = (10.0, 1.0, 0.0)
+
+_KIND_OF = {model: kind for kind, model in KINDS.items()}
+_WORD = re.compile(r'[^\W_]+')
+# Highlight markers, swapped for <mark> once the text is HTML-escaped
+_MARK_START, _MARK_END = '\x02', '\x03'
+_PG_TITLE_OPTIONS = f'StartSel={_MARK_START}, StopSel={_MARK_END}, HighlightAll=true'
+_PG_SNIPPET_OPTIONS = (f'StartSel={_MARK_START}, StopSel={_MARK_END}, MaxWords=24, MinWords=8, '
+                       'MaxFragments=2, FragmentDelimiter=" … "')
+
+
+def _content_text(item):
+    brief = item.brief_json if isinstance(item.brief_json, dict) else {}
+    title = brief.get('title') or brief.get('name') or brief.get('topic') or item.url
+    extra = [brief.get(key) for key in ('description', 'summary', 'question')]
+    body = ' '.join([item.url, item.type, *(str(value) for value in extra if value), strip_tags(item.draft_html or '')])
+    return str(title), body
+
+
+def document_text(kind, obj):
+    """``(title, body)`` indexed for an instance of ``KINDS[kind]``."""
+    if kind == 'content':
+        title, body = _content_text(obj)
+    elif kind == 'faq':
+        title, body = obj.question, obj.answer
+    else:
+        title, body = obj.intent, ' '.join(str(term) for term in obj.terms or [])
+    return title, body[:MAX_BODY_CHARS]
+
+
+def document_for(obj):
+    """The unsaved SearchDocument of an indexed instance."""
+    kind = _KIND_OF[type(obj)]
+    title, body = document_text(kind, obj)
+    return SearchDocument(tenant_id=obj.tenant_id, kind=kind, object_id=obj.pk, locale=getattr(obj, 'locale', ''),
+                          title=title, body=body)
+
+
+def index_objects(model, objs, using=None):
+    """Write the documents of saved ``objs``; returns documents written."""
+    objs = list(objs)
+    kind = _KIND_OF[model]
+    # bulk_create(ignore_conflicts=True) leaves pks unset; reindex those tenants instead
+    unsaved_tenants = {obj.tenant_id for obj in objs if obj.pk is None}
+    documents = [document_for(obj) for obj in objs if obj.pk is not None]
+    for start in range(0, len(documents), INDEX_BATCH_SIZE):
+        SearchDocument.objects.using(using).bulk_create(
+            documents[start:start + INDEX_BATCH_SIZE], update_conflicts=True,
+            unique_fields=['kind', 'object_id'], update_fields=['tenant', 'locale', 'title', 'body'],
+        )
+    return len(documents) + sum(reindex(kind, tenant_id, using) for tenant_id in unsaved_tenants)
+
+
+def index_ids(model, pks, using=None):
+    """Re-read rows by pk and rewrite their documents."""
+    pks = list(pks)
+    written = 0
+    for start in range(0, len(pks), INDEX_BATCH_SIZE):
+        rows = model._base_manager.using(using).filter(pk__in=pks[start:start + INDEX_BATCH_SIZE])
+        written += index_objects(model, rows, using)
+    return written
+
+
+def remove(model, pks, using=None):
+    SearchDocument.objects.using(using).filter(kind=_KIND_OF[model], object_id__in=list(pks)).delete()
+
+
+def reindex(kind=None, tenant_id=None, using=None):
+    """Rebuild documents of one kind (default: all) and tenant (default: all); returns documents written."""
+    written = 0
+    for name in [kind] if kind else KINDS:
+        model = KINDS[name]
+        documents = SearchDocument.objects.using(using).filter(kind=name)
+        rows = model._base_manager.using(using).order_by('pk')
+        if tenant_id:
+            documents, rows = documents.filter(tenant_id=tenant_id), rows.filter(tenant_id=tenant_id)
+        documents.delete()
+        batch = []
+        for row in rows.iterator(chunk_size=INDEX_BATCH_SIZE):
+            batch.append(document_for(row))
+            if len(batch) >= INDEX_BATCH_SIZE:
+                SearchDocument.objects.using(using).bulk_create(batch)
+                written += len(batch)
+                batch = []
+        SearchDocument.objects.using(using).bulk_create(batch)
+        written += len(batch)
+    return written
+
+
+def terms(query):
+    return _WORD.findall((query or '').lower())[:MAX_TERMS]
+
+
+def _fts5_query(words, tenant_id, kinds):
+    match = ' AND '.join(f'"{word}"' for word in words) + '*'
+    scope = ' OR '.join(f'k{kind}' for kind in kinds)
+    return f'scope:t{tenant_id} AND scope:({scope}) AND {{title body}}:({match})'
+
+
+def _tsquery(words):
+    return ' & '.join(words[:-1] + [f'{words[-1]}:*'])
+
+
+def matching_ids(model, tenant_id, query, using=None):
+    """Subquery of the pks of ``model`` rows of the tenant matching ``query``, for ``pk__in``.
+
+    None when the query has no words to search for.
+    """
+    words = terms(query)
+    if not words:
+        return None
+    kind = _KIND_OF[model]
+    using = using or router.db_for_read(model)
+    if connections[using].vendor == 'postgresql':
+        return RawSQL(
+            "SELECT object_id FROM seo_searchdocument"
+            " WHERE tenant_id = %s AND kind = %s AND search_vector @@ to_tsquery('simple', %s)",
+            (tenant_id, kind, _tsquery(words)),
+        )
+    return RawSQL(
+        f"SELECT object_id FROM seo_searchdocument"
+        f" WHERE id IN (SELECT rowid FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s)",
+        (_fts5_query(words, tenant_id, [kind]),),
+    )
+
+
+def _highlighted(text):
+    return html.escape(text or '').replace(_MARK_START, '<mark>').replace(_MARK_END, '</mark>')
+
+
+def search(tenant_id, query, kinds=None, limit=DEFAULT_LIMIT, using=None):
+    """Best matches of ``query`` among a tenant's documents.
+
+    Returns dicts with ``kind``, ``id``, the highlighted ``title`` and
+    ``snippet`` (HTML with ``<mark>`` around matches) and ``score`` (higher is
+    better; comparable within one backend only).
+    """
+    words = terms(query)
+    if not words or not tenant_id:
+        return []
+    kinds = list(kinds or KINDS)
+    using = using or router.db_for_read(SearchDocument)
+    connection = connections[using]
+    if connection.vendor == 'postgresql':
+        sql = (
+            "WITH q AS (SELECT to_tsquery('simple', %s) AS query),"
+            " top AS ("
+            "  SELECT d.id, ts_rank(d.search_vector, q.query) AS rank FROM seo_searchdocument d, q"
+            "  WHERE d.tenant_id = %s AND d.kind = ANY(%s) AND d.search_vector @@ q.query"
+            "  ORDER BY rank DESC, d.id LIMIT %s"
+            ")"
+            " SELECT d.kind, d.object_id, ts_headline('simple', d.title, q.query, %s),"
+            "  ts_headline('simple', d.body, q.query, %s), top.rank"
+            " FROM top JOIN seo_searchdocument d ON d.id = top.id CROSS JOIN q ORDER BY top.rank DESC, d.id"
+        )
+        params = (_tsquery(words), tenant_id, kinds, limit, _PG_TITLE_OPTIONS, _PG_SNIPPET_OPTIONS)
+    else:
+        sql = (
+            f"SELECT d.kind, d.object_id, highlight({FTS_TABLE}, 0, %s, %s),"
+            f" snippet({FTS_TABLE}, 1, %s, %s, '…', 24), -bm25({FTS_TABLE}, %s, %s, %s) AS rank"
+            f" FROM {FTS_TABLE} JOIN seo_searchdocument d ON d.id = {FTS_TABLE}.rowid"
+            f" WHERE {FTS_TABLE} MATCH %s ORDER BY rank DESC, d.id LIMIT %s"
+        )
+        params = (_MARK_START, _MARK_END, _MARK_START, _MARK_END, *FTS_WEIGHTS,
+                  _fts5_query(words, tenant_id, kinds), limit)
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params)
+        rows = cursor.fetchall()
+    return [
+        {'kind': kind, 'id': object_id, 'title': _highlighted(title), 'snippet': _highlighted(snippet),
+         'score': round(rank, 6)}
+        for kind, object_id, title, snippet, rank in rows
+    ]
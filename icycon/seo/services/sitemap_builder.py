@@ -0,0 +1,240 @@
+"""
+Sharded, incrementally rebuilt sitemaps for ContentItem.
+
+A site's published ContentItems (its tenant's items on the site's host) are
+split by pk range into shards of at most ``SHARD_SIZE`` URLs, tracked by
+``ContentSitemapShard``. Each shard is written as a gzipped urlset under
+``settings.SITEMAP_CACHE_DIR``:
+
+* a shard's fingerprint covers its range, published row count and newest
+  ``updated_at``; it doubles as the HTTP ETag, and a cached file is reused
+  until the fingerprint moves, so an edit only rebuilds the shard holding it;
+* output is generated row by row through ``GzipFile`` and written to the
+  cache through a temporary file.
+
+The public views only read the shard rows and cached files as last built;
+``manage.py build_sitemaps`` or ``build_content_sitemaps_task`` (run every
+few minutes) does the planning and rebuilding, so a crawler hit never locks,
+aggregates or writes.
+
+Writes that bypass ``save()`` (``QuerySet.update``) must set ``updated_at``
+themselves or the affected shard is not noticed until its row count changes.
+"""
+
+import gzip
+import hashlib
+import logging
+import os
+import tempfile
+import time
+from urllib.parse import urlsplit
+from xml.sax.saxutils import escape
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Count, Max
+from django.utils import timezone
+
+from seo.models import ContentItem, ContentSitemapShard, Site
+
+logger = logging.getLogger(__name__)
+
+# Protocol limit; ContentItem.url is at most 200 chars, far below the 50MB cap
+SHARD_SIZE = 50000
+PUBLISHED_STATUS = 'published'
+ITERATOR_CHUNK_SIZE = 2000
+FLUSH_BYTES = 64 * 1024
+SITEMAP_NS = 'http://www.sitemaps.org/schemas/sitemap/0.9'
+URLSET_OPEN = f'<?xml version="1.0" encoding="UTF-8"?>\n<urlset xmlns="{SITEMAP_NS}">\n'.encode()
+URLSET_CLOSE = b'</urlset>\n'
+
+
+def site_host(site):
+    domain = site.domain.strip()
+    return (urlsplit(domain if '://' in domain else f'//{domain}').hostname or '').lower()
+
+
+def site_content_items(site, published_only=True):
+    """The site's ContentItems, i.e. those whose URL is on the site's host (see ``content_sites``)."""
+    items = ContentItem.objects.filter(site=site)
+    return items.filter(status=PUBLISHED_STATUS) if published_only else items
+
+
+def _shard_items(site, shard, published_only=True):
+    return site_content_items(site, published_only).filter(pk__gte=shard.first_pk, pk__lte=shard.last_pk)
+
+
+def current_fingerprint(shard):
+    lastmod = shard.lastmod.isoformat() if shard.lastmod else ''
+    raw = f'{shard.site_id}:{shard.first_pk}-{shard.last_pk}:{shard.url_count}:{lastmod}'
+    return hashlib.sha1(raw.encode()).hexdigest()
+
+
+def shard_path(shard):
+    return os.path.join(settings.SITEMAP_CACHE_DIR, str(shard.site_id), f'content-{shard.number}.xml.gz')
+
+
+def is_stale(shard):
+    return shard.fingerprint != current_fingerprint(shard) or not os.path.exists(shard_path(shard))
+
+
+def refresh_shard(site, shard):
+    """Reload ``url_count``/``lastmod`` from the rows; returns True if they moved."""
+    stats = _shard_items(site, shard).aggregate(n=Count('pk'), lastmod=Max('updated_at'))
+    if (shard.url_count, shard.lastmod) == (stats['n'], stats['lastmod']):
+        return False
+    shard.url_count, shard.lastmod = stats['n'], stats['lastmod']
+    return True
+
+
+def plan_shards(site):
+    """Assign new items to shards and refresh every shard's counts; no files are written.
+
+    Ranges are cut every ``SHARD_SIZE`` items of any status, so publishing
+    drafts later can never push a shard over the limit.
+    """
+    with transaction.atomic():
+        # Serialise planning per site so two callers can't add the same shard number
+        Site.objects.select_for_update().filter(pk=site.pk).exists()
+        shards = list(ContentSitemapShard.objects.filter(site=site).order_by('number'))
+        new_shards, extended = [], None
+
+        last = shards[-1] if shards else None
+        room = SHARD_SIZE - _shard_items(site, last, published_only=False).count() if last else 0
+        tail = (
+            site_content_items(site, published_only=False)
+            .filter(pk__gt=last.last_pk if last else 0)
+            .order_by('pk').values_list('pk', flat=True)
+        )
+        for pk in tail.iterator(chunk_size=ITERATOR_CHUNK_SIZE):
+            if room > 0:
+                last.last_pk = pk
+                extended = last
+            else:
+                last = ContentSitemapShard(
+                    site=site, number=last.number + 1 if last else 1,
+                    first_pk=last.last_pk + 1 if last else 1, last_pk=pk,
+                )
+                new_shards.append(last)
+                shards.append(last)
+                room = SHARD_SIZE
+            room -= 1
+
+        changed = [shard for shard in shards if refresh_shard(site, shard) and shard.pk]
+        if extended is not None and extended not in changed:
+            changed.append(extended)
+        ContentSitemapShard.objects.bulk_create(new_shards)
+        ContentSitemapShard.objects.bulk_update(changed, ['last_pk', 'url_count', 'lastmod'])
+    return shards
+
+
+class _ChunkSink:
+    """Write target for ``GzipFile`` that hands compressed bytes back in chunks."""
+
+    def __init__(self):
+        self.parts = []
+        self.size = 0
+
+    def write(self, data):
+        self.parts.append(bytes(data))
+        self.size += len(data)
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def take(self):
+        data = b''.join(self.parts)
+        self.parts, self.size = [], 0
+        return data
+
+
+def render_shard(site, shard):
+    """Yield the gzipped urlset for ``shard`` in chunks as rows are read."""
+    sink = _ChunkSink()
+    rows = _shard_items(site, shard).order_by('pk').values_list('url', 'updated_at')
+    written = 0
+    with gzip.GzipFile(fileobj=sink, mode='wb', mtime=0) as gz:
+        gz.write(URLSET_OPEN)
+        for url, updated_at in rows.iterator(chunk_size=ITERATOR_CHUNK_SIZE):
+            if written == SHARD_SIZE:
+                # Only possible if items moved onto this host into an old range
+                logger.warning('Sitemap shard %s of site %s is over %s URLs', shard.number, site.pk, SHARD_SIZE)
+                break
+            gz.write(
+                f'<url><loc>{escape(url)}</loc><lastmod>{updated_at.isoformat(timespec="seconds")}</lastmod></url>\n'.encode()
+            )
+            written += 1
+            if sink.size >= FLUSH_BYTES:
+                yield sink.take()
+        gz.write(URLSET_CLOSE)
+    yield sink.take()
+
+
+def stream_and_cache(site, shard, fingerprint=None):
+    """Yield the shard's bytes while writing them to the cache file.
+
+    The file replaces the cached copy only once complete, so an interrupted
+    stream leaves the previous version in place.
+    """
+    fingerprint = fingerprint or current_fingerprint(shard)
+    path = shard_path(shard)
+    directory = os.path.dirname(path)
+    os.makedirs(directory, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=directory, suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'wb') as fh:
+            for chunk in render_shard(site, shard):
+                fh.write(chunk)
+                yield chunk
+        # mkstemp creates the file 0600; cached sitemaps are public
+        os.chmod(tmp_path, 0o644)
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.unlink(tmp_path)
+        raise
+    shard.fingerprint = fingerprint
+    shard.built_at = timezone.now()
+    ContentSitemapShard.objects.filter(pk=shard.pk).update(fingerprint=fingerprint, built_at=shard.built_at)
+
+
+def build_site_sitemaps(site, force=False):
+    """Bring every shard file of ``site`` up to date; returns a summary dict."""
+    started = time.perf_counter()
+    shards = plan_shards(site)
+    built = 0
+    for shard in shards:
+        if force or is_stale(shard):
+            for _ in stream_and_cache(site, shard):
+                pass
+            built += 1
+    return {
+        'shards': len(shards),
+        'built': built,
+        'urls': sum(shard.url_count for shard in shards),
+        'seconds': round(time.perf_counter() - started, 3),
+    }
+
+
+def built_shards(site):
+    """The site's shards whose files have been written, as last built."""
+    return ContentSitemapShard.objects.filter(site=site).exclude(fingerprint='').order_by('number')
+
+
+def index_etag(shards, base_url=''):
+    """ETag of the index; ``base_url`` is included because shard locs are absolute."""
+    raw = ','.join([base_url] + [shard.fingerprint for shard in shards])
+    return hashlib.sha1(raw.encode()).hexdigest()
+
+
+def render_index(shards, shard_url):
+    """Sitemap index listing non-empty shards; ``shard_url(number)`` gives their URLs."""
+    parts = [f'<?xml version="1.0" encoding="UTF-8"?>\n<sitemapindex xmlns="{SITEMAP_NS}">\n']
+    for shard in shards:
+        if not shard.url_count:
+            continue
+        lastmod = f'<lastmod>{shard.lastmod.isoformat(timespec="seconds")}</lastmod>' if shard.lastmod else ''
+        parts.append(f'<sitemap><loc>{escape(shard_url(shard.number))}</loc>{lastmod}</sitemap>\n')
+    parts.append('</sitemapindex>\n')
+    return ''.join(parts).encode()
@@ -0,0 +1,351 @@
+"""
+Streaming sitemap ingest.
+
+Fetches a site's sitemap (index or urlset), following index entries into
+child sitemaps, and keeps a per-site URL inventory (``SitemapUrl``) in step:
+
+* documents are parsed with ``XMLPullParser`` as bytes arrive and finished
+  elements are dropped, so memory stays flat for 50k-URL files and
+  multi-million-URL sites; gzipped sitemaps are inflated on the fly;
+* child sitemaps whose index ``lastmod`` is unchanged are skipped, and the
+  rest are fetched conditionally with their stored ``ETag``/``Last-Modified``;
+* entries are upserted in batches and only new entries or ones whose
+  ``lastmod`` moved get a new ``changed_at``, which is what resubmission
+  looks at (see ``gsc_client.submit_sitemap``).
+
+Local files (paths or ``file://`` URLs) can be ingested for fixtures and
+offline runs, but only when the caller passes ``allow_local=True``. Sitemap
+URLs come from tenants, so the default client refuses every request
+(redirects included) to a host that resolves to a loopback, private,
+link-local or otherwise non-public address.
+"""
+
+import ipaddress
+import logging
+import os
+import socket
+import time
+import zlib
+from contextlib import contextmanager
+from datetime import datetime, time as dt_time, timezone as dt_timezone
+from functools import partial
+from urllib.parse import unquote, urlsplit
+from xml.etree import ElementTree
+
+import httpx
+from django.db.models import F, Q
+from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime
+from django.utils.http import http_date
+
+from seo.models import SitemapFile, SitemapUrl
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_BATCH_SIZE = 1000
+DEFAULT_TIMEOUT = 30
+CHUNK_SIZE = 64 * 1024
+# Protocol limit for one uncompressed sitemap; also caps gzip bombs
+MAX_SITEMAP_BYTES = 50 * 1024 * 1024
+# Indexes should not nest, but tolerate one extra level
+MAX_INDEX_DEPTH = 2
+USER_AGENT = 'IcyconSitemapFetcher/1.0'
+GZIP_MAGIC = b'\x1f\x8b'
+
+
+class SitemapError(Exception):
+    """A sitemap could not be fetched or parsed."""
+
+
+def is_public_host(host, port=None):
+    """True if every address ``host`` resolves to is globally routable."""
+    try:
+        addresses = socket.getaddrinfo(host, port, type=socket.SOCK_STREAM)
+    except (socket.gaierror, UnicodeError):
+        return False
+    return bool(addresses) and all(
+        ipaddress.ip_address(address[4][0].split('%')[0]).is_global for address in addresses
+    )
+
+
+def _require_public_host(request):
+    if not is_public_host(request.url.host, request.url.port):
+        raise httpx.ConnectError(f'{request.url.host} is not a public host', request=request)
+
+
+def make_client(timeout=DEFAULT_TIMEOUT, public_only=True, transport=None):
+    """Client for sitemap fetches; with ``public_only`` it only connects to public hosts.
+
+    ``transport`` (e.g. an ``httpx.MockTransport``) stands in for the network.
+    """
+    hooks = {'request': [_require_public_host]} if public_only else {}
+    return httpx.Client(
+        follow_redirects=True, timeout=timeout, headers={'User-Agent': USER_AGENT}, event_hooks=hooks, transport=transport,
+    )
+
+
+def parse_lastmod(value):
+    """Aware datetime for a W3C ``lastmod`` (date or date-time), else None."""
+    if not value:
+        return None
+    try:
+        parsed = parse_datetime(value)
+        if parsed is None:
+            day = parse_date(value)
+            if day is None:
+                return None
+            parsed = datetime.combine(day, dt_time.min)
+    except ValueError:
+        return None
+    if timezone.is_naive(parsed):
+        parsed = timezone.make_aware(parsed, dt_timezone.utc)
+    return parsed
+
+
+def _local_name(tag):
+    return tag.rpartition('}')[2]
+
+
+def _child_text(elem, name):
+    for child in elem:
+        if _local_name(child.tag) == name:
+            return (child.text or '').strip()
+    return ''
+
+
+def _inflated(chunks):
+    """Yield the document bytes, gunzipping when the stream is gzip."""
+    decompressor = None
+    total = 0
+    for chunk in chunks:
+        if decompressor is None:
+            decompressor = zlib.decompressobj(zlib.MAX_WBITS | 16) if chunk[:2] == GZIP_MAGIC else False
+        if decompressor:
+            chunk = decompressor.decompress(chunk)
+        total += len(chunk)
+        if total > MAX_SITEMAP_BYTES:
+            raise SitemapError(f'sitemap exceeds {MAX_SITEMAP_BYTES} bytes uncompressed')
+        yield chunk
+    if decompressor:
+        yield decompressor.flush()
+
+
+def iter_entries(chunks):
+    """Yield ``(kind, loc, lastmod)`` for each ``<url>`` or ``<sitemap>`` element.
+
+    ``chunks`` is an iterable of raw (possibly gzipped) bytes.
+    """
+    parser = ElementTree.XMLPullParser(events=('start', 'end'))
+    root = None
+    try:
+        for data in _inflated(chunks):
+            parser.feed(data)
+            for event, elem in parser.read_events():
+                if event == 'start':
+                    if root is None:
+                        root = elem
+                    continue
+                kind = _local_name(elem.tag)
+                if kind in ('url', 'sitemap') and elem is not root:
+                    loc = _child_text(elem, 'loc')
+                    if loc:
+                        yield kind, loc, parse_lastmod(_child_text(elem, 'lastmod'))
+                    # Drop finished entries so the tree never grows
+                    root.clear()
+        parser.close()
+    except (ElementTree.ParseError, zlib.error) as exc:
+        raise SitemapError(f'invalid sitemap: {exc}') from exc
+
+
+def _local_path(url):
+    parts = urlsplit(url)
+    if parts.scheme == 'file':
+        return unquote(parts.path)
+    return url if not parts.scheme else None
+
+
+@contextmanager
+def fetch(client, url, etag='', last_modified='', allow_local=False):
+    """Yield ``(chunks, etag, last_modified)``; ``chunks`` is None when not modified."""
+    path = _local_path(url) if allow_local else None
+    if path is not None:
+        try:
+            stat = os.stat(path)
+        except OSError as exc:
+            raise SitemapError(f'{url}: {exc}') from exc
+        local_etag = f'"{stat.st_size:x}-{stat.st_mtime_ns:x}"'
+        if etag and etag == local_etag:
+            yield None, etag, last_modified
+            return
+        with open(path, 'rb') as fh:
+            yield iter(partial(fh.read, CHUNK_SIZE), b''), local_etag, http_date(stat.st_mtime)
+        return
+
+    if urlsplit(url).scheme not in ('http', 'https'):
+        raise SitemapError(f'{url}: only http(s) sitemaps can be fetched')
+    headers = {}
+    if etag:
+        headers['If-None-Match'] = etag
+    if last_modified:
+        headers['If-Modified-Since'] = last_modified
+    try:
+        with client.stream('GET', url, headers=headers) as response:
+            if response.status_code == 304:
+                yield None, etag, last_modified
+                return
+            if response.status_code >= 400:
+                raise SitemapError(f'{url}: HTTP {response.status_code}')
+            yield (
+                response.iter_bytes(CHUNK_SIZE),
+                response.headers.get('etag', '')[:255],
+                response.headers.get('last-modified', '')[:64],
+            )
+    except httpx.HTTPError as exc:
+        raise SitemapError(f'{url}: {exc}') from exc
+
+
+def pending_urls(site):
+    """Inventory entries that are new or changed since they were last submitted."""
+    return SitemapUrl.objects.filter(site=site).filter(
+        Q(submitted_at__isnull=True) | Q(changed_at__gt=F('submitted_at'))
+    )
+
+
+class SitemapIngest:
+    """One ingest run over a site's sitemap tree."""
+
+    def __init__(self, site, client, batch_size=DEFAULT_BATCH_SIZE, force=False, allow_local=False):
+        self.site = site
+        self.client = client
+        self.batch_size = batch_size
+        self.force = force
+        self.allow_local = allow_local
+        self.run_at = timezone.now()
+        self.visited = set()
+        self.summary = {
+            'files': 0, 'files_unchanged': 0, 'urls': 0,
+            'new': 0, 'changed': 0, 'unchanged': 0, 'removed': 0, 'errors': [],
+        }
+
+    def run(self, url):
+        started = time.perf_counter()
+        self.ingest_file(url)
+        # The site's sitemap moved: forget the old tree
+        old_roots = SitemapFile.objects.filter(site=self.site, parent=None).exclude(url=url)
+        self._delete_files(old_roots)
+        self.summary['seconds'] = round(time.perf_counter() - started, 3)
+        return self.summary
+
+    def ingest_file(self, url, parent=None, lastmod=None, depth=0):
+        record, _ = SitemapFile.objects.get_or_create(site=self.site, url=url, defaults={'parent': parent})
+        if url in self.visited:
+            return record
+        self.visited.add(url)
+
+        if not self.force and record.fetched_at and lastmod is not None and record.lastmod == lastmod:
+            # The parent index says this file has not changed since it was last read
+            self.summary['files_unchanged'] += 1
+            return record
+
+        validators = ('', '') if self.force else (record.http_etag, record.http_last_modified)
+        try:
+            with fetch(self.client, url, *validators, allow_local=self.allow_local) as (chunks, etag, last_modified):
+                if chunks is None:
+                    self.summary['files_unchanged'] += 1
+                    return record
+                count, children = self._consume(record, iter_entries(chunks))
+        except SitemapError as exc:
+            logger.warning('Sitemap ingest failed for site %s: %s', self.site.pk, exc)
+            self.summary['errors'].append(str(exc))
+            return record
+
+        if children:
+            if depth >= MAX_INDEX_DEPTH:
+                self.summary['errors'].append(f'{url}: sitemap indexes nested too deeply')
+                return record
+            seen = [self.ingest_file(loc, record, child_lastmod, depth + 1).pk for loc, child_lastmod in children]
+            self._delete_files(record.children.exclude(pk__in=seen))
+        else:
+            # Entries no longer listed in this file
+            removed, _ = SitemapUrl.objects.filter(sitemap=record, last_seen__lt=self.run_at).delete()
+            self.summary['removed'] += removed
+
+        record.parent = parent
+        record.is_index = bool(children)
+        record.lastmod = lastmod
+        record.http_etag = etag
+        record.http_last_modified = last_modified
+        record.url_count = count
+        record.fetched_at = self.run_at
+        record.save()
+        self.summary['files'] += 1
+        return record
+
+    def _consume(self, record, entries):
+        """Upsert the urlset entries of one file; returns (count, child sitemaps)."""
+        count = 0
+        batch = {}
+        # An index lists at most 50k children, so these fit in memory
+        children = []
+        for kind, loc, lastmod in entries:
+            count += 1
+            if kind == 'sitemap':
+                children.append((loc, lastmod))
+                continue
+            batch[loc] = lastmod
+            if len(batch) >= self.batch_size:
+                self._upsert(record, batch)
+                batch = {}
+        if batch:
+            self._upsert(record, batch)
+        return count, children
+
+    def _upsert(self, record, batch):
+        existing = dict(SitemapUrl.objects.filter(site=self.site, loc__in=list(batch)).values_list('loc', 'lastmod'))
+        changed, unchanged = [], []
+        for loc, lastmod in batch.items():
+            if loc not in existing:
+                self.summary['new'] += 1
+            elif existing[loc] != lastmod:
+                self.summary['changed'] += 1
+            else:
+                unchanged.append(loc)
+                continue
+            changed.append(SitemapUrl(
+                site=self.site, sitemap=record, loc=loc, lastmod=lastmod,
+                changed_at=self.run_at, last_seen=self.run_at,
+            ))
+        if changed:
+            SitemapUrl.objects.bulk_create(
+                changed,
+                update_conflicts=True,
+                unique_fields=['site', 'loc'],
+                update_fields=['sitemap', 'lastmod', 'changed_at', 'last_seen'],
+            )
+        if unchanged:
+            SitemapUrl.objects.filter(site=self.site, loc__in=unchanged).update(sitemap=record, last_seen=self.run_at)
+        self.summary['unchanged'] += len(unchanged)
+        self.summary['urls'] += len(batch)
+
+    def _delete_files(self, queryset):
+        _, deleted = queryset.delete()
+        self.summary['removed'] += deleted.get(SitemapUrl._meta.label, 0)
+
+
+def ingest_site(site, url=None, client=None, batch_size=DEFAULT_BATCH_SIZE, force=False, allow_local=False):
+    """Refresh ``site``'s URL inventory from ``url`` (default ``site.sitemaps_url``).
+
+    Returns a summary dict; fetch and parse failures of individual files are
+    listed under ``errors`` rather than raised.
+    """
+    url = url or site.sitemaps_url
+    if not url:
+        raise SitemapError(f'Site {site.pk} has no sitemaps_url')
+    owns_client = client is None
+    if owns_client:
+        client = make_client(public_only=not allow_local)
+    try:
+        return SitemapIngest(site, client, batch_size, force, allow_local).run(url)
+    finally:
+        if owns_client:
+            client.close()
@@ -0,0 +1,36 @@
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from .models import FAQ, ContentItem, KeywordCluster, Site
+from .services import search_index
+from .services.content_sites import relink_site
+from .services.robots import invalidate_site
+
+
+@receiver([post_save, post_delete], sender=Site)
+def site_changed(sender, instance, **kwargs):
+    # Compiled matchers are keyed by content hash; only the site's pointer goes stale
+    invalidate_site(instance.pk)
+
+
+@receiver(post_save, sender=Site)
+def site_location_changed(sender, instance, using=None, **kwargs):
+    if instance.stored_values() != instance.tracked_values():
+        relink_site(instance, using=using)
+        instance.remember_stored_values()
+
+
+@receiver(post_save, sender=ContentItem)
+@receiver(post_save, sender=FAQ)
+@receiver(post_save, sender=KeywordCluster)
+def search_source_saved(sender, instance, update_fields=None, using=None, **kwargs):
+    if update_fields is not None and not sender._default_manager.all().SEARCH_FIELDS.intersection(update_fields):
+        return
+    search_index.index_objects(sender, [instance], using=using)
+
+
+@receiver(post_delete, sender=ContentItem)
+@receiver(post_delete, sender=FAQ)
+@receiver(post_delete, sender=KeywordCluster)
+def search_source_deleted(sender, instance, using=None, **kwargs):
+    search_index.remove(sender, [instance.pk], using=using)
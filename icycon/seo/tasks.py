@@ -1 +1,111 @@
-# DRY RUN: All task logic removed. No async jobs.
+from celery import shared_task
+
+from tenants.models import Tenant
+
+from .models import ContentItem, LinkOpportunity, Site
+from .services.backlink_checker import check_backlinks, stale_backlinks
+from .services.backlink_gap import rebuild_site
+from .services.backlink_snapshots import snapshot_sites
+from .services.backlink_stats import reconcile_site
+from .services.content_sites import backfill as backfill_content_sites
+from .services.cwv_audit import create_job, run_job
+from .services.gsc_client import submit_sitemap
+from .services.jsonld_store import refresh_content_jsonld
+from .services.keyword_clustering import cluster_keywords
+from .services.opportunity_scoring import rescore
+from .services.sitemap_builder import build_site_sitemaps
+
+
+@shared_task
+def reconcile_backlink_profiles_task(site_id=None):
+    """Verify incrementally maintained backlink aggregates and repair drift."""
+    site_ids = [site_id] if site_id else Site.objects.order_by('pk').values_list('pk', flat=True).iterator()
+    repaired = {}
+    for pk in site_ids:
+        drift = reconcile_site(pk)
+        if drift:
+            repaired[pk] = drift
+    return {"sites_repaired": len(repaired), "drift": repaired}
+
+
+@shared_task
+def rebuild_backlink_gaps_task(site_id=None):
+    """Fully recompute cached competitor gaps (normally kept current by writes)."""
+    site_ids = [site_id] if site_id else Site.objects.order_by('pk').values_list('pk', flat=True).iterator()
+    return {pk: rebuild_site(pk) for pk in site_ids}
+
+
+@shared_task
+def check_backlinks_task(site_id=None, older_than_hours=24, limit=None):
+    """Re-verify backlinks not checked within ``older_than_hours``."""
+    return check_backlinks(stale_backlinks(site_id, older_than_hours), limit=limit)
+
+
+@shared_task
+def submit_sitemaps_task(site_id=None, force=False):
+    """Refresh sitemap inventories and resubmit the sites whose entries changed."""
+    sites = Site.objects.exclude(sitemaps_url='').order_by('pk')
+    if site_id:
+        sites = sites.filter(pk=site_id)
+    return {site.pk: submit_sitemap(site, force=force) for site in sites.iterator()}
+
+
+@shared_task
+def build_content_sitemaps_task(site_id=None, force=False):
+    """Rebuild the ContentItem sitemap shards whose rows changed."""
+    sites = Site.objects.order_by('pk')
+    if site_id:
+        sites = sites.filter(pk=site_id)
+    return {site.pk: build_site_sitemaps(site, force=force) for site in sites.iterator()}
+
+
+@shared_task
+def run_audit_job_task(job_id):
+    """Run a queued Core Web Vitals audit job."""
+    job = run_job(job_id)
+    if job is None:
+        return {"job_id": job_id, "status": "already claimed"}
+    return {"job_id": job.pk, "status": job.status, "completed": job.completed, "failed": job.failed}
+
+
+@shared_task
+def audit_all_sites_task():
+    """Scheduled audit of every site's default URLs in one job."""
+    job = create_job(Site.objects.order_by('pk'))
+    return run_audit_job_task(job.pk)
+
+
+@shared_task
+def cluster_keywords_task(tenant_id, keywords, locale='en'):
+    """Assign ``keywords`` to the tenant's clusters, creating clusters for the rest."""
+    return cluster_keywords(Tenant.objects.get(pk=tenant_id), keywords, locale=locale)
+
+
+@shared_task
+def refresh_content_jsonld_task(tenant_id=None):
+    """Recompute stored ContentItem JSON-LD, e.g. after bulk imports."""
+    items = ContentItem.objects.all()
+    if tenant_id:
+        items = items.filter(tenant_id=tenant_id)
+    return {"updated": refresh_content_jsonld(items)}
+
+
+@shared_task
+def score_link_opportunities_task(site_id=None):
+    """Rescore link opportunities with the current weights (writes keep scores current otherwise)."""
+    opportunities = LinkOpportunity.objects.all()
+    if site_id:
+        opportunities = opportunities.filter(site_id=site_id)
+    return {"scored": rescore(opportunities)}
+
+
+@shared_task
+def link_content_sites_task(tenant_id=None):
+    """Link ContentItems written before ``ContentItem.site`` existed to their sites."""
+    return backfill_content_sites(tenant_id)
+
+
+@shared_task
+def snapshot_backlinks_task(site_id=None):
+    """Record today's backlink snapshot of every (or one) site and apply snapshot retention."""
+    return {"snapshots": len(snapshot_sites([site_id] if site_id else None))}
@@ -1,3 +1,1267 @@
-from django.test import TestCase
+import gzip
+import io
+import json
+import os
+import tempfile
+import time
+from datetime import timedelta
+from unittest import mock
 
-# Create your tests here.
+import httpx
+from django.contrib.auth import get_user_model
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import CommandError, call_command
+from django.core.cache import cache
+from django.db import connection
+from django.db.models import F
+from django.http import FileResponse
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from icycon.testing import QueryBudgetTestMixin
+from tenants.models import Tenant, TenantUser
+from .models import (
+    Site, KeywordCluster, ContentItem, ContentSitemapShard, FAQ, FaqPageDocument, SitemapFile, SitemapUrl, AuditJob, CwvAudit,
+    CwvSummary, Backlink, BacklinkProfile, ReferringDomain, BacklinkGap, BacklinkSnapshot, CompetitorBacklink, LinkOpportunity, SearchDocument,
+)
+from .services import (
+    backlink_checker, backlink_gap, backlink_snapshots, backlink_stats, content_sites, cwv_audit, keyword_clustering, lighthouse_audit, opportunity_scoring, robots,
+    search_index, sitemap_builder, sitemap_ingest,
+)
+from .pagination import keyset_page
+from .services.backlink_import import import_backlinks
+from .services.gsc_client import submit_sitemap
+from .services.sitemap_ingest import ingest_site, pending_urls
+
+User = get_user_model()
+
+
+class SiteOwnerTestCase(TestCase):
+    """Logged in as the owner of tenant Acme, which has one site."""
+
+    site_domain = 'https://acme.example'
+    site_fields = {}
+
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username='owner', password='pass1234')
+        self.tenant = Tenant.objects.create(name='Acme', region='US')
+        TenantUser.objects.create(user=self.user, tenant=self.tenant, role='owner')
+        self.site = Site.objects.create(tenant=self.tenant, domain=self.site_domain, **self.site_fields)
+        self.client.force_login(self.user)
+
+
+class TenantScopedViewSetTests(SiteOwnerTestCase):
+    def setUp(self):
+        super().setUp()
+        self.other_tenant = Tenant.objects.create(name='Other', region='EU')
+        Site.objects.create(tenant=self.other_tenant, domain='https://other.example')
+
+        for tenant in (self.tenant, self.other_tenant):
+            KeywordCluster.objects.create(tenant=tenant, intent='informational', terms=['seo'])
+            ContentItem.objects.create(tenant=tenant, type='blog', url=f'https://{tenant.name.lower()}.example/post')
+            FAQ.objects.create(tenant=tenant, question='Why?', answer='Because.')
+
+        # Warm the membership cache so the counts below only cover the view itself
+        self.client.get(reverse('site-list'))
+
+    def test_list_endpoints_filter_on_tenant_id_without_membership_join(self):
+        for name in ('site-list', 'keywordcluster-list', 'contentitem-list', 'faq-list'):
+            with self.subTest(endpoint=name):
+                # session + user + the tenant-scoped list query
+                with self.assertNumQueries(3), CaptureQueriesContext(connection) as ctx:
+                    response = self.client.get(reverse(name))
+                self.assertEqual(response.status_code, 200)
+                self.assertEqual(len(response.json()), 1)
+
+                list_sql = ctx.captured_queries[-1]['sql'].upper()
+                self.assertNotIn('TENANTS_TENANTUSER', list_sql)
+                self.assertNotIn('DISTINCT', list_sql)
+                self.assertIn('"TENANT_ID" = %s' % self.tenant.pk, list_sql)
+
+    def test_membership_change_invalidates_cached_tenant(self):
+        TenantUser.objects.filter(user=self.user).delete()
+        response = self.client.get(reverse('site-list'))
+        self.assertEqual(response.json(), [])
+
+
+class SiteDetailQueryBudgetTests(QueryBudgetTestMixin, SiteOwnerTestCase):
+    site_domain = 'acme.example'
+
+    def setUp(self):
+        super().setUp()
+        for i in range(10):
+            ContentItem.objects.create(tenant=self.tenant, type='blog', url=f'https://acme.example/post-{i}')
+            KeywordCluster.objects.create(tenant=self.tenant, intent='informational', terms=['seo', str(i)])
+            FAQ.objects.create(tenant=self.tenant, question=f'Q{i}?', answer='A.')
+
+    def test_site_detail_within_budget(self):
+        # The bare /seo/sites/<pk>/ path is shadowed by the API router
+        response = self.assertWithinQueryBudget(f'/seo/ui/sites/{self.site.pk}/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.context['content_items']), 10)
+
+
+SITEMAP_NS = 'http://www.sitemaps.org/schemas/sitemap/0.9'
+
+
+def urlset(entries):
+    rows = ''.join(f'<url><loc>{loc}</loc><lastmod>{lastmod}</lastmod></url>' for loc, lastmod in entries)
+    return f'<?xml version="1.0" encoding="UTF-8"?><urlset xmlns="{SITEMAP_NS}">{rows}</urlset>'.encode()
+
+
+def sitemap_index(children):
+    rows = ''.join(f'<sitemap><loc>{loc}</loc><lastmod>{lastmod}</lastmod></sitemap>' for loc, lastmod in children)
+    return f'<?xml version="1.0" encoding="UTF-8"?><sitemapindex xmlns="{SITEMAP_NS}">{rows}</sitemapindex>'.encode()
+
+
+class SitemapIngestTests(TestCase):
+    def setUp(self):
+        tenant = Tenant.objects.create(name='Acme', region='US')
+        self.site = Site.objects.create(
+            tenant=tenant, domain='https://acme.example', sitemaps_url='https://acme.example/sitemap.xml'
+        )
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+
+    def write_fixture(self, name, content):
+        path = os.path.join(self.tmp.name, name)
+        with (gzip.open if name.endswith('.gz') else open)(path, 'wb') as fh:
+            fh.write(content)
+        return path
+
+    def write_site(self, posts_lastmod='2024-01-01', products=None, products_lastmod='2024-01-01'):
+        posts = self.write_fixture('posts.xml.gz', urlset(
+            (f'https://acme.example/post-{i}', posts_lastmod) for i in range(2500)
+        ))
+        products = self.write_fixture('products.xml', urlset(products or [
+            ('https://acme.example/product-1', '2024-01-01'),
+            ('https://acme.example/product-2', '2024-01-01T10:00:00+00:00'),
+        ]))
+        return self.write_fixture('index.xml', sitemap_index([
+            (f'file://{posts}', posts_lastmod), (f'file://{products}', products_lastmod),
+        ]))
+
+    def test_local_index_with_gzipped_children(self):
+        index = self.write_site()
+        result = ingest_site(self.site, url=index, allow_local=True, batch_size=1000)
+
+        self.assertEqual(result['errors'], [])
+        self.assertEqual((result['files'], result['new'], result['urls']), (3, 2502, 2502))
+        self.assertEqual(SitemapUrl.objects.filter(site=self.site).count(), 2502)
+        self.assertEqual(SitemapFile.objects.get(site=self.site, parent=None).children.count(), 2)
+        self.assertEqual(pending_urls(self.site).count(), 2502)
+
+    def test_rerun_only_processes_changed_entries(self):
+        index = self.write_site()
+        ingest_site(self.site, url=index, allow_local=True)
+        SitemapUrl.objects.update(submitted_at=timezone.now())
+
+        # Index rewritten with the same lastmods: both children are skipped
+        os.utime(index, ns=(0, 0))
+        result = ingest_site(self.site, url=index, allow_local=True)
+        self.assertEqual((result['files'], result['files_unchanged'], result['urls']), (1, 2, 0))
+
+        index = self.write_site(products=[('https://acme.example/product-1', '2024-02-01')], products_lastmod='2024-02-01')
+        result = ingest_site(self.site, url=index, allow_local=True)
+        self.assertEqual((result['changed'], result['removed'], result['unchanged']), (1, 1, 0))
+        self.assertEqual(list(pending_urls(self.site).values_list('loc', flat=True)), ['https://acme.example/product-1'])
+
+    def test_local_files_are_refused_unless_allowed(self):
+        with self.assertLogs('seo.services.sitemap_ingest', 'WARNING'):
+            result = ingest_site(self.site, url=self.write_site())
+        self.assertEqual(len(result['errors']), 1)
+        self.assertFalse(SitemapUrl.objects.exists())
+
+    @override_settings(SEARCH_CONSOLE_ACCESS_TOKEN='token', SEARCH_CONSOLE_API_URL='https://gsc.test/v3')
+    def test_http_stand_in_with_conditional_requests_and_submission(self):
+        requests = []
+        documents = {
+            '/sitemap.xml': sitemap_index([('https://acme.example/pages.xml.gz', '2024-01-01')]),
+            '/pages.xml.gz': gzip.compress(urlset((f'https://acme.example/p{i}', '2024-01-01') for i in range(10))),
+        }
+
+        def handler(request):
+            requests.append((request.method, request.url.host, request.url.path))
+            if request.method == 'PUT':
+                return httpx.Response(204)
+            if request.headers.get('if-none-match') == '"v1"':
+                return httpx.Response(304)
+            return httpx.Response(200, content=documents[request.url.path], headers={'ETag': '"v1"'})
+
+        client = httpx.Client(transport=httpx.MockTransport(handler))
+        result = submit_sitemap(self.site, client=client)
+        self.assertEqual((result['new'], result['pending'], result['submitted']), (10, 10, True))
+        self.assertEqual(requests[-1][:2], ('PUT', 'gsc.test'))
+        self.assertFalse(pending_urls(self.site).exists())
+
+        requests.clear()
+        result = submit_sitemap(self.site, client=client)
+        # One conditional GET answered 304, nothing pending, no resubmission
+        self.assertEqual(requests, [('GET', 'acme.example', '/sitemap.xml')])
+        self.assertEqual((result['files_unchanged'], result['submitted']), (1, False))
+
+    def test_default_client_only_connects_to_public_hosts(self):
+        for host in ('127.0.0.1', '10.1.2.3', '169.254.169.254', '::1', 'fd00::1'):
+            self.assertFalse(sitemap_ingest.is_public_host(host), host)
+        self.assertTrue(sitemap_ingest.is_public_host('8.8.8.8'))
+
+        with self.assertLogs('seo.services.sitemap_ingest', 'WARNING'):
+            result = ingest_site(self.site, url='http://127.0.0.1:9/sitemap.xml')
+        self.assertIn('not a public host', result['errors'][0])
+
+        # A public sitemap host redirecting to an internal one is refused too
+        requests = []
+
+        def handler(request):
+            requests.append(str(request.url))
+            return httpx.Response(302, headers={'Location': 'http://169.254.169.254/latest/meta-data/'})
+
+        client = sitemap_ingest.make_client(transport=httpx.MockTransport(handler))
+        with self.assertLogs('seo.services.sitemap_ingest', 'WARNING'):
+            result = ingest_site(self.site, url='http://8.8.8.8/sitemap.xml', client=client)
+        self.assertEqual(requests, ['http://8.8.8.8/sitemap.xml'])
+        self.assertIn('169.254.169.254 is not a public host', result['errors'][0])
+
+    def test_submit_action_queues_the_submission(self):
+        user = User.objects.create_user(username='owner', password='pass1234')
+        TenantUser.objects.create(user=user, tenant=self.site.tenant, role='owner')
+        self.client.force_login(user)
+        with self.captureOnCommitCallbacks(execute=False) as callbacks:
+            response = self.client.post(f'/seo/sites/{self.site.pk}/submit_sitemap/')
+        self.assertEqual(response.status_code, 202)
+        self.assertEqual(len(callbacks), 1)
+        self.assertFalse(SitemapFile.objects.exists())
+
+        Site.objects.filter(pk=self.site.pk).update(sitemaps_url='')
+        self.assertEqual(self.client.post(f'/seo/sites/{self.site.pk}/submit_sitemap/').status_code, 400)
+
+
+@mock.patch.object(sitemap_builder, 'SHARD_SIZE', 3)
+class ContentSitemapTests(TestCase):
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        cache_dir = self.settings(SITEMAP_CACHE_DIR=tmp.name)
+        cache_dir.enable()
+        self.addCleanup(cache_dir.disable)
+
+        tenant = Tenant.objects.create(name='Acme', region='US')
+        self.site = Site.objects.create(tenant=tenant, domain='https://acme.example')
+        self.items = [
+            ContentItem.objects.create(tenant=tenant, type='blog', url=f'https://acme.example/post-{i}', status='published')
+            for i in range(7)
+        ]
+        ContentItem.objects.create(tenant=tenant, type='blog', url='https://acme.example/draft', status='draft')
+        ContentItem.objects.create(tenant=tenant, type='blog', url='https://elsewhere.example/post', status='published')
+
+    def shard_locs(self, response):
+        body = gzip.decompress(b''.join(response.streaming_content))
+        return [line.split('<loc>')[1].split('</loc>')[0] for line in body.decode().splitlines() if '<loc>' in line]
+
+    def test_build_is_incremental(self):
+        self.assertEqual(sitemap_builder.build_site_sitemaps(self.site), {
+            'shards': 3, 'built': 3, 'urls': 7, 'seconds': mock.ANY,
+        })
+        self.assertEqual(sitemap_builder.build_site_sitemaps(self.site)['built'], 0)
+
+        self.items[4].url = 'https://acme.example/renamed'
+        self.items[4].save()
+        result = sitemap_builder.build_site_sitemaps(self.site)
+        self.assertEqual(result['built'], 1)
+        self.assertEqual(ContentSitemapShard.objects.filter(site=self.site).count(), 3)
+
+    def test_endpoints_serve_built_shards_with_etags(self):
+        url = f'/seo/sitemaps/{self.site.pk}/content-1.xml.gz'
+        # Nothing is planned, built or written on a crawler hit: the site and its built shards are read
+        with self.assertNumQueries(2):
+            index = self.client.get(f'/seo/sitemaps/{self.site.pk}/sitemap.xml')
+        self.assertNotContains(index, '<sitemap>')
+        self.assertEqual(self.client.get(url).status_code, 404)
+        self.assertFalse(ContentSitemapShard.objects.exists())
+
+        sitemap_builder.build_site_sitemaps(self.site)
+        index = self.client.get(f'/seo/sitemaps/{self.site.pk}/sitemap.xml')
+        self.assertEqual(index.status_code, 200)
+        self.assertContains(index, f'/seo/sitemaps/{self.site.pk}/content-3.xml.gz')
+        self.assertEqual(self.client.get(
+            f'/seo/sitemaps/{self.site.pk}/sitemap.xml', HTTP_IF_NONE_MATCH=index['ETag']
+        ).status_code, 304)
+
+        with self.assertNumQueries(1):
+            served = self.client.get(url)
+        self.assertIsInstance(served, FileResponse)
+        self.assertEqual(self.shard_locs(served), [f'https://acme.example/post-{i}' for i in range(3)])
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=served['ETag']).status_code, 304)
+
+        # Edits show up once the build job has run
+        self.items[0].delete()
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=served['ETag']).status_code, 304)
+        sitemap_builder.build_site_sitemaps(self.site)
+        rebuilt = self.client.get(url, HTTP_IF_NONE_MATCH=served['ETag'])
+        self.assertEqual(rebuilt.status_code, 200)
+        self.assertEqual(self.shard_locs(rebuilt), [f'https://acme.example/post-{i}' for i in range(1, 3)])
+
+
+def hanging_collector(url, timeout):
+    if url.endswith('/slow'):
+        time.sleep(60)
+    return {'lcp_ms': 1000, 'cls': 0.1}
+
+
+@override_settings(CWV_COLLECTOR='seo.services.lighthouse_audit.stub_collector', CWV_AUDIT_WORKERS=3)
+class CwvAuditTests(SiteOwnerTestCase):
+    def setUp(self):
+        super().setUp()
+        for i in range(4):
+            ContentItem.objects.create(tenant=self.tenant, type='blog', url=f'https://acme.example/post-{i}', status='published')
+
+    def test_audit_action_queues_job_and_returns_immediately(self):
+        with self.captureOnCommitCallbacks(execute=False) as callbacks:
+            response = self.client.post(f'/seo/sites/{self.site.pk}/audit/')
+        self.assertEqual(response.status_code, 202)
+        job = AuditJob.objects.get(pk=response.json()['job_id'])
+        self.assertEqual((job.status, job.total, job.tenant_id), ('queued', 5, self.tenant.pk))
+        self.assertEqual(len(callbacks), 1)
+
+        response = self.client.post(
+            f'/seo/sites/{self.site.pk}/audit/', {'urls': ['https://evil.example/']}, content_type='application/json'
+        )
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(self.client.get(f'/seo/audit-jobs/{job.pk}/').json()['status'], 'queued')
+
+        urls = [f'https://acme.example/p/{i}' for i in range(robots.MAX_BATCH_URLS + 1)]
+        response = self.client.post(f'/seo/sites/{self.site.pk}/audit/', {'urls': urls}, content_type='application/json')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(AuditJob.objects.count(), 1)
+
+    def test_run_audits_requeues_jobs_abandoned_by_a_dead_worker(self):
+        abandoned = cwv_audit.create_job([self.site])
+        AuditJob.objects.filter(pk=abandoned.pk).update(status='running', started_at=timezone.now() - timedelta(days=1), completed=2)
+        CwvAudit.objects.create(site=self.site, job=abandoned, url='https://acme.example/', collected_at=timezone.now(), collector='stub')
+        live = cwv_audit.create_job([self.site])
+        AuditJob.objects.filter(pk=live.pk).update(status='running', started_at=timezone.now())
+
+        call_command('run_audits', stdout=io.StringIO())
+        abandoned.refresh_from_db()
+        self.assertEqual((abandoned.status, abandoned.completed, abandoned.audits.count()), ('done', 5, 5))
+        self.assertEqual(AuditJob.objects.get(pk=live.pk).status, 'running')
+
+    def test_lighthouse_only_audits_public_hosts(self):
+        report = {'finalDisplayedUrl': 'http://intranet.example/', 'audits': {'largest-contentful-paint': {'numericValue': 900}}}
+        completed = mock.Mock(returncode=0, stdout=json.dumps(report).encode())
+        with mock.patch.object(lighthouse_audit.shutil, 'which', return_value='/usr/bin/lighthouse'), \
+                mock.patch.object(lighthouse_audit, 'is_public_host', lambda host, port=None: host != 'intranet.example'), \
+                mock.patch.object(lighthouse_audit.subprocess, 'run', return_value=completed) as run:
+            with self.assertRaisesMessage(lighthouse_audit.CollectorError, 'intranet.example is not a public host'):
+                lighthouse_audit.lighthouse_collector('http://intranet.example/admin', 60)
+            run.assert_not_called()
+            with self.assertRaisesMessage(lighthouse_audit.CollectorError, 'intranet.example is not a public host'):
+                lighthouse_audit.lighthouse_collector('https://acme.example/', 60)
+            report['finalDisplayedUrl'] = 'https://acme.example/'
+            completed.stdout = json.dumps(report).encode()
+            self.assertEqual(lighthouse_audit.lighthouse_collector('https://acme.example/', 60), {'lcp_ms': 900})
+
+    def test_run_job_stores_time_series_and_p75_summaries(self):
+        job = cwv_audit.create_job([self.site])
+        job = cwv_audit.run_job(job.pk)
+        self.assertEqual((job.status, job.completed, job.failed), ('done', 5, 0))
+        self.assertIsNone(cwv_audit.run_job(job.pk))
+        self.assertEqual(CwvAudit.objects.filter(site=self.site).count(), 5)
+
+        site_wide = CwvSummary.objects.get(site=self.site, url='')
+        lcps = sorted(CwvAudit.objects.values_list('lcp_ms', flat=True))
+        self.assertEqual((site_wide.samples, site_wide.p75_lcp_ms), (5, lcps[3]))
+        self.assertEqual(CwvSummary.objects.filter(site=self.site).exclude(url='').count(), 5)
+
+        response = self.client.get(reverse('seo_dashboard'))
+        self.assertContains(response, f'LCP {site_wide.p75_lcp_ms:.0f} ms')
+        self.assertContains(response, '4 content items')
+        self.assertEqual(response.context['metrics']['content_items'], 4)
+
+    @mock.patch.object(cwv_audit, 'KILL_GRACE', 0)
+    def test_overrunning_collector_is_killed(self):
+        urls = ['https://acme.example/slow', 'https://acme.example/fast']
+        job = cwv_audit.create_job([self.site], urls=urls, collector='seo.tests.hanging_collector')
+        started = time.monotonic()
+        job = cwv_audit.run_job(job.pk, timeout=1)
+        self.assertLess(time.monotonic() - started, 10)
+        self.assertEqual((job.completed, job.failed), (1, 1))
+        self.assertEqual(CwvAudit.objects.get(url=urls[0]).error, 'timed out after 1s')
+
+
+ROBOTS_TXT = """
+User-agent: *
+Disallow: /admin
+Allow: /admin/public
+Disallow: /*.pdf$
+Disallow: /search?
+
+User-agent: Googlebot
+Disallow: /
+
+User-agent: Googlebot-News
+Allow: /
+"""
+
+
+class RobotsMatcherTests(SiteOwnerTestCase):
+    site_fields = {'robots_txt': ROBOTS_TXT}
+
+    def test_longest_match_wildcards_and_agent_groups(self):
+        matcher = robots.get_matcher(ROBOTS_TXT)
+        cases = [
+            ('*', '/admin/settings', False),
+            ('*', '/admin/public/logo.png', True),
+            ('*', 'https://acme.example/files/report.pdf', False),
+            ('*', '/files/report.pdf?download=1', True),
+            ('*', '/search?q=seo', False),
+            ('*', '/blog/', True),
+            ('Googlebot/2.1', '/blog/', False),
+            ('Googlebot-News', '/blog/', True),
+            ('Googlebot-Image', '/blog/', False),
+            ('Googlebot', '/robots.txt', True),
+        ]
+        for agent, url, expected in cases:
+            with self.subTest(agent=agent, url=url):
+                self.assertIs(matcher.allowed(url, agent), expected)
+        self.assertIs(robots.get_matcher(ROBOTS_TXT), matcher)
+
+    def test_site_matcher_follows_robots_txt_changes(self):
+        self.assertFalse(robots.matcher_for_site(self.site.pk).allowed('/admin'))
+        with self.assertNumQueries(0):
+            robots.matcher_for_site(self.site.pk)
+
+        self.site.robots_txt = 'User-agent: *\nAllow: /'
+        self.site.save()
+        self.assertTrue(robots.matcher_for_site(self.site.pk).allowed('/admin'))
+
+    def test_batch_api(self):
+        urls = ['/admin/x', '/blog/a', '/files/a.pdf'] * 1000
+        response = self.client.post(
+            f'/seo/sites/{self.site.pk}/robots-check/', {'urls': urls, 'agent': 'mybot'}, content_type='application/json'
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['allowed'][:3], [False, True, False])
+        self.assertEqual(response.json()['disallowed'], 2000)
+
+
+class KeywordClusteringTests(SiteOwnerTestCase):
+    def test_clusters_similar_keywords_and_infers_intent(self):
+        keywords = [
+            ('running shoes', 900), 'best running shoes', 'Running Shoes!', 'shoes running women',
+            'buy running shoes', 'running shoes price', ('how to bake sourdough bread', 50),
+            'how to bake sourdough', 'easy sourdough bread', 'yoga mat',
+        ]
+        result = keyword_clustering.cluster_keywords(self.tenant, keywords)
+        self.assertEqual(result['keywords'], 9)
+        self.assertEqual(result['clusters_created'], 3)
+
+        clusters = {cluster.terms[0]: cluster for cluster in KeywordCluster.objects.filter(tenant=self.tenant)}
+        self.assertEqual(set(clusters), {'running shoes', 'how to bake sourdough bread', 'yoga mat'})
+        shoes = clusters['running shoes']
+        self.assertCountEqual(shoes.terms[1:], ['best running shoes', 'shoes running women', 'buy running shoes', 'running shoes price'])
+        self.assertEqual(shoes.intent, 'transactional')
+        self.assertEqual(clusters['how to bake sourdough bread'].intent, 'informational')
+
+    def test_incremental_assignment(self):
+        keyword_clustering.cluster_keywords(self.tenant, ['running shoes', 'trail running shoes'])
+        existing = KeywordCluster.objects.get(tenant=self.tenant)
+        other = KeywordCluster.objects.create(tenant=self.tenant, locale='de', intent='informational', terms=['running shoes'])
+
+        response = self.client.post(
+            '/seo/keywords/assign/', {'keywords': ['Trail Running Shoes', 'running shoes sale', 'garden hose']},
+            content_type='application/json',
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['duplicates'], 1)
+        self.assertEqual(response.json()['assigned'], 1)
+        self.assertEqual(response.json()['clusters_created'], 1)
+        existing.refresh_from_db()
+        self.assertEqual(existing.terms, ['running shoes', 'trail running shoes', 'running shoes sale'])
+        other.refresh_from_db()
+        self.assertEqual(other.terms, ['running shoes'])
+
+    def test_assign_without_tenant(self):
+        loner = User.objects.create_user(username='loner', password='pass1234')
+        self.client.force_login(loner)
+        response = self.client.post('/seo/keywords/assign/', {'keywords': ['garden hose']}, content_type='application/json')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json()['error'], 'No tenant for this user')
+        self.assertFalse(KeywordCluster.objects.filter(terms__icontains='garden').exists())
+
+    def test_read_keywords_formats(self):
+        self.assertEqual(list(keyword_clustering.read_keywords(io.BytesIO(b'a b\n\nc d\n'))), [('a b', 0), ('c d', 0)])
+        csv_export = io.BytesIO(b'\xef\xbb\xbfKeyword,Volume\nred shoes,1200\nblue shoes,\n')
+        self.assertEqual(list(keyword_clustering.read_keywords(csv_export)), [('red shoes', 1200), ('blue shoes', 0)])
+
+
+class StoredJsonLdTests(TestCase):
+    def setUp(self):
+        self.tenant = Tenant.objects.create(name='Acme', region='US')
+        self.other = Tenant.objects.create(name='Other', region='EU')
+
+    def test_content_jsonld_is_stored_on_save_and_served_with_etag(self):
+        product = ContentItem.objects.create(
+            tenant=self.tenant, type='product', url='https://acme.example/p/1', status='published',
+            brief_json={'name': 'Widget <b>', 'price': 9.5, 'currency': 'EUR', 'availability': 'in_stock'},
+        )
+        data = json.loads(product.json_ld)
+        self.assertEqual(data['@type'], 'Product')
+        self.assertEqual(data['offers']['availability'], 'https://schema.org/InStock')
+        self.assertNotIn('<', product.json_ld)
+        self.assertEqual(ContentItem.objects.get(pk=product.pk).json_ld, product.json_ld)
+
+        url = reverse('seo_content_jsonld', args=[product.pk])
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Type'], 'application/ld+json')
+        self.assertEqual(response.content.decode(), product.json_ld)
+        etag = response['ETag']
+        self.assertFalse(etag.startswith('W/'))
+        with self.assertNumQueries(1):
+            self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+
+        product.brief_json['price'] = 12
+        product.save()
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+        draft = ContentItem.objects.create(
+            tenant=self.tenant, type='qapage', url='https://acme.example/q/1',
+            brief_json={'question': 'Why?', 'answers': [{'text': 'Because', 'accepted': True}, {'text': 'Maybe'}]},
+        )
+        self.assertEqual(json.loads(draft.json_ld)['mainEntity']['answerCount'], 2)
+        self.assertEqual(self.client.get(reverse('seo_content_jsonld', args=[draft.pk])).status_code, 404)
+
+    def test_faq_document_follows_faq_writes(self):
+        first = FAQ.objects.create(tenant=self.tenant, question='Q1?', answer='A1')
+        second = FAQ.objects.create(tenant=self.tenant, question='Q2?', answer='A2')
+        document = FaqPageDocument.objects.get(tenant=self.tenant)
+        self.assertEqual(
+            [entity['name'] for entity in json.loads(document.body)['mainEntity']], ['Q1?', 'Q2?']
+        )
+
+        url = reverse('seo_tenant_faq_jsonld', args=[self.tenant.pk])
+        etag = self.client.get(url)['ETag']
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+
+        first.answer = 'A1, revised'
+        first.save()
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(json.loads(response.content)['mainEntity'][0]['acceptedAnswer']['text'], 'A1, revised')
+
+        second.tenant = self.other
+        second.save()
+        self.assertEqual(FaqPageDocument.objects.get(tenant=self.tenant).faq_count, 1)
+        self.assertEqual(FaqPageDocument.objects.get(tenant=self.other).faq_count, 1)
+
+        FAQ.objects.filter(tenant=self.other).update(question='Q2, bulk?')
+        self.assertIn('Q2, bulk?', FaqPageDocument.objects.get(tenant=self.other).body)
+        first.delete()
+        self.assertEqual(self.client.get(url).status_code, 404)
+
+    def test_faq_move_after_deferred_load(self):
+        faq = FAQ.objects.create(tenant=self.tenant, question='Q1?', answer='A1')
+        loaded = FAQ.objects.only('question').get(pk=faq.pk)
+        loaded.tenant = self.other
+        loaded.save()
+        self.assertEqual(FaqPageDocument.objects.get(tenant=self.tenant).faq_count, 0)
+        self.assertEqual(FaqPageDocument.objects.get(tenant=self.other).faq_count, 1)
+
+    def test_content_jsonld_follows_bulk_writes(self):
+        def stored(item):
+            return json.loads(ContentItem.objects.get(pk=item.pk).json_ld)
+
+        product, post = ContentItem.objects.bulk_create([
+            ContentItem(tenant=self.tenant, type='product', url='https://acme.example/p/1', brief_json={'name': 'Widget'}),
+            ContentItem(tenant=self.tenant, type='blog', url='https://acme.example/b/1', brief_json={'title': 'Hello'}),
+        ])
+        self.assertEqual(stored(product)['name'], 'Widget')
+        self.assertEqual(stored(post)['@type'], 'BlogPosting')
+
+        product.brief_json = {'name': 'Gadget'}
+        ContentItem.objects.bulk_update([product], ['brief_json'])
+        self.assertEqual(stored(product)['name'], 'Gadget')
+
+        ContentItem.objects.filter(pk=post.pk).update(url='https://acme.example/b/2')
+        self.assertEqual(stored(post)['url'], 'https://acme.example/b/2')
+
+        # Writes that can't change the JSON-LD don't re-render it
+        with self.assertNumQueries(1):
+            ContentItem.objects.filter(pk=post.pk).update(status='published')
+
+
+class BacklinkGapTests(SiteOwnerTestCase):
+    def setUp(self):
+        super().setUp()
+        Backlink.objects.create(site=self.site, source_url='https://www.shared.example/a', target_url='https://acme.example/')
+        CompetitorBacklink.objects.bulk_create([
+            CompetitorBacklink(site=self.site, competitor_domain='https://rival-a.example', source_url=source,
+                               target_url=f'https://rival-a.example/{n}', domain_rating=rating)
+            for n, (source, rating) in enumerate([
+                ('https://shared.example/x', 80), ('https://news.example/1', 70), ('https://news.example/2', 75),
+                ('https://blog.example/p', 30),
+            ])
+        ] + [
+            CompetitorBacklink(site=self.site, competitor_domain='https://rival-b.example', source_url=source,
+                               target_url='https://rival-b.example/', domain_rating=rating)
+            for source, rating in [('https://news.example/3', 75), ('https://acme.example/partners', 50)]
+        ])
+
+    def gaps(self):
+        return {gap.link_domain.name: (gap.competitor_count, gap.score) for gap in backlink_gap.site_gaps(self.site)}
+
+    def test_gaps_are_ranked_and_follow_both_sides(self):
+        self.assertEqual(self.gaps(), {'news.example': (2, 150), 'blog.example': (1, 30)})
+
+        # Competitor side: a new link and a removed link refresh just their domains
+        CompetitorBacklink.objects.create(
+            site=self.site, competitor_domain='https://rival-b.example', source_url='https://blog.example/q',
+            target_url='https://rival-b.example/q', domain_rating=40,
+        )
+        self.assertEqual(self.gaps()['blog.example'], (2, 80))
+        CompetitorBacklink.objects.filter(source_url__startswith='https://news.example').delete()
+        self.assertNotIn('news.example', self.gaps())
+
+        # Our side: once blog.example links to us it is no longer a gap, and back again when lost
+        ours = Backlink.objects.create(site=self.site, source_url='https://blog.example/review', target_url='https://acme.example/')
+        self.assertNotIn('blog.example', self.gaps())
+        ours.status = 'lost'
+        ours.save()
+        self.assertIn('blog.example', self.gaps())
+
+        incremental = self.gaps()
+        backlink_gap.rebuild_site(self.site.pk)
+        self.assertEqual(self.gaps(), incremental)
+
+    def test_api(self):
+        url = f'/seo/sites/{self.site.pk}/backlink-gaps/'
+        # Not built yet: the GET queues the rebuild, once, instead of running it
+        with self.captureOnCommitCallbacks(execute=False) as callbacks:
+            response = self.client.get(url, {'min_competitors': 2})
+            self.assertEqual(self.client.get(url).status_code, 202)
+        self.assertEqual(response.status_code, 202)
+        self.assertEqual(response.json(), {'site_id': self.site.pk, 'status': 'queued'})
+        self.assertEqual(len(callbacks), 1)
+        self.assertFalse(BacklinkProfile.objects.filter(site=self.site, gaps_built_at__isnull=False).exists())
+
+        backlink_gap.rebuild_site(self.site.pk)
+        response = self.client.get(url, {'min_competitors': 2})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([row['domain'] for row in response.json()], ['news.example'])
+        # Served from the cache; the site's own host is never a gap
+        with self.assertNumQueries(5):
+            response = self.client.get(url)
+        self.assertEqual([row['domain'] for row in response.json()], ['news.example', 'blog.example'])
+
+    def test_page_does_not_build_gaps(self):
+        url = reverse('seo_backlinks_competitors')
+        with self.captureOnCommitCallbacks(execute=False) as callbacks:
+            response = self.client.get(url, {'site_id': self.site.pk})
+        self.assertContains(response, 'Link gaps are being computed')
+        self.assertEqual(len(callbacks), 1)
+        backlink_gap.rebuild_site(self.site.pk)
+        self.assertContains(self.client.get(url, {'site_id': self.site.pk}), 'news.example')
+
+
+class LinkOpportunityScoringTests(SiteOwnerTestCase):
+    def opportunity(self, domain, **metrics):
+        return LinkOpportunity(site=self.site, prospect_url=f'https://{domain}/', prospect_domain=domain,
+                               anchor_text='acme', target_page='https://acme.example/', **metrics)
+
+    def assertScoresCurrent(self):
+        for opportunity in LinkOpportunity.objects.all():
+            self.assertAlmostEqual(opportunity.score, opportunity_scoring.score_of(opportunity), places=6)
+
+    def test_every_write_path_rescores_touched_rows(self):
+        strong = self.opportunity('strong.example', domain_rating=90, page_authority=70,
+                                  traffic_estimate=1_000_000, relevance_score=80)
+        strong.save()
+        LinkOpportunity.objects.bulk_create([
+            self.opportunity(f'blog{n}.example', domain_rating=10 * n, traffic_estimate=100 * n, relevance_score=50)
+            for n in range(1, 6)
+        ])
+        self.assertScoresCurrent()
+        self.assertEqual(LinkOpportunity.objects.first(), strong)
+
+        LinkOpportunity.objects.filter(prospect_domain='blog1.example').update(domain_rating=F('domain_rating') + 90)
+        LinkOpportunity.objects.filter(prospect_domain='blog2.example').update(relevance_score=100, traffic_estimate=5_000)
+        rows = list(LinkOpportunity.objects.filter(prospect_domain__in=['blog3.example', 'blog4.example']))
+        for row in rows:
+            row.page_authority = 60
+        LinkOpportunity.objects.bulk_update(rows, ['page_authority'])
+        strong.relevance_score = 0
+        strong.save(update_fields=['relevance_score'])
+        blog5 = LinkOpportunity.objects.get(prospect_domain='blog5.example')
+        blog5.traffic_estimate = F('traffic_estimate') * 10
+        blog5.save()
+        self.assertScoresCurrent()
+
+        # Unscored fields leave the score alone; clamping keeps it within 0-100
+        LinkOpportunity.objects.update(status='contacted')
+        LinkOpportunity.objects.filter(pk=strong.pk).update(domain_rating=500, page_authority=500, relevance_score=500,
+                                                            traffic_estimate=10 ** 9)
+        self.assertAlmostEqual(LinkOpportunity.objects.get(pk=strong.pk).score, 100)
+        self.assertScoresCurrent()
+
+    @override_settings(LINK_OPPORTUNITY_WEIGHTS={'relevance_score': 1})
+    def test_weights_and_rescore(self):
+        LinkOpportunity.objects.bulk_create([
+            self.opportunity('a.example', domain_rating=90, relevance_score=20),
+            self.opportunity('b.example', domain_rating=10, relevance_score=60),
+        ])
+        self.assertEqual([o.score for o in LinkOpportunity.objects.all()], [60, 20])
+        with override_settings(LINK_OPPORTUNITY_WEIGHTS={'domain_rating': 3, 'relevance_score': 1}):
+            self.assertEqual(opportunity_scoring.rescore(), 2)
+            self.assertEqual([o.prospect_domain for o in LinkOpportunity.objects.all()], ['a.example', 'b.example'])
+            self.assertScoresCurrent()
+
+    def test_api_pages_by_score(self):
+        LinkOpportunity.objects.bulk_create([
+            self.opportunity(f'p{n}.example', domain_rating=n % 4 * 20, relevance_score=50) for n in range(9)
+        ])
+        expected = list(LinkOpportunity.objects.filter(site=self.site).values_list('prospect_domain', flat=True))
+        seen, after = [], None
+        while True:
+            params = {'limit': 2, **({'after': after} if after else {})}
+            response = self.client.get(f'/seo/sites/{self.site.pk}/link-opportunities/', params)
+            self.assertEqual(response.status_code, 200)
+            seen += [row['prospect_domain'] for row in response.json()['results']]
+            after = response.json()['next']
+            if not after:
+                break
+        self.assertEqual(seen, expected)
+        response = self.client.get(f'/seo/sites/{self.site.pk}/link-opportunities/', {'after': 'bogus'})
+        self.assertEqual(response.status_code, 400)
+
+        response = self.client.get(reverse('seo_backlinks_outreach'), {'site_id': self.site.pk})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([o.prospect_domain for o in response.context['opportunities']], expected[:25])
+
+
+class FullTextSearchTests(SiteOwnerTestCase):
+    def setUp(self):
+        super().setUp()
+        self.other = Tenant.objects.create(name='Other', region='EU')
+
+    def found(self, query, **kwargs):
+        return [(hit['kind'], hit['id']) for hit in search_index.search(self.tenant.pk, query, **kwargs)]
+
+    def test_index_follows_writes(self):
+        faq = FAQ.objects.create(tenant=self.tenant, question='How do canonical tags work?', answer='They pick the <preferred> URL.')
+        FAQ.objects.create(tenant=self.other, question='Canonical tags elsewhere', answer='Not ours.')
+        item = ContentItem.objects.create(tenant=self.tenant, type='blog', url='https://acme.example/guide',
+                                          brief_json={'title': 'Crawl budget guide'}, draft_html='<p>Sitemaps and <b>canonical</b> hints</p>')
+        KeywordCluster.objects.bulk_create([KeywordCluster(tenant=self.tenant, intent='informational', terms=['crawl budget tips'])])
+        cluster = KeywordCluster.objects.get()
+
+        self.assertEqual(self.found('canonical'), [('faq', faq.pk), ('content', item.pk)])
+        self.assertEqual(self.found('crawl budg'), [('content', item.pk), ('keywords', cluster.pk)])
+        self.assertEqual(self.found('canonical', kinds=['content']), [('content', item.pk)])
+        hit = search_index.search(self.tenant.pk, 'preferred')[0]
+        self.assertEqual(hit['snippet'], 'They pick the &lt;<mark>preferred</mark>&gt; URL.')
+
+        FAQ.objects.filter(pk=faq.pk).update(question='How do hreflang tags work?')
+        item.draft_html = '<p>Only sitemaps now</p>'
+        ContentItem.objects.bulk_update([item], ['draft_html'])
+        self.assertEqual(self.found('canonical'), [])
+        self.assertEqual(self.found('hreflang'), [('faq', faq.pk)])
+
+        cluster.delete()
+        FAQ.objects.filter(tenant=self.tenant).delete()
+        self.assertEqual(self.found('crawl'), [('content', item.pk)])
+
+        incremental = set(SearchDocument.objects.values_list('kind', 'object_id', 'title', 'body'))
+        search_index.reindex()
+        self.assertEqual(set(SearchDocument.objects.values_list('kind', 'object_id', 'title', 'body')), incremental)
+
+    def test_api(self):
+        faq = FAQ.objects.create(tenant=self.tenant, question='What is a sitemap?', answer='A list of URLs.')
+        FAQ.objects.create(tenant=self.tenant, question='What is robots.txt?', answer='Crawl rules.')
+        FAQ.objects.create(tenant=self.other, question='What is a sitemap index?', answer='Theirs.')
+
+        response = self.client.get('/seo/search/', {'q': 'sitemap'})
+        self.assertEqual(response.status_code, 200)
+        results = response.json()['results']
+        self.assertEqual([(hit['kind'], hit['id']) for hit in results], [('faq', faq.pk)])
+        self.assertEqual(results[0]['title'], 'What is a <mark>sitemap</mark>?')
+        self.assertEqual(self.client.get('/seo/search/', {'q': 'x', 'kind': 'pages'}).status_code, 400)
+
+        response = self.client.get('/seo/faqs/', {'search': 'SITEMAP'})
+        self.assertEqual([row['id'] for row in response.json()], [faq.pk])
+        self.assertEqual(len(self.client.get('/seo/faqs/', {'search': '!!'}).json()), 2)
+
+
+class ContentItemSiteTests(TestCase):
+    def setUp(self):
+        self.tenant = Tenant.objects.create(name='Acme', region='US')
+        self.other = Tenant.objects.create(name='Other', region='EU')
+        self.site = Site.objects.create(tenant=self.tenant, domain='https://acme.example')
+        Site.objects.create(tenant=self.other, domain='https://shop.example')
+
+    def item(self, url, tenant=None):
+        return ContentItem.objects.create(tenant=tenant or self.tenant, type='blog', url=url)
+
+    def test_site_follows_url_and_sites(self):
+        post = self.item('https://acme.example/blog/1')
+        foreign = self.item('https://shop.example/p/1')
+        www = self.item('https://www.acme.example/blog/2')
+        self.assertEqual((post.site_id, foreign.site_id, www.site_id), (self.site.pk, None, None))
+
+        ContentItem.objects.filter(pk=post.pk).update(url='https://shop.example/moved')
+        post.refresh_from_db()
+        self.assertIsNone(post.site_id)
+        post.url = 'https://acme.example/back'
+        ContentItem.objects.bulk_update([post], ['url'])
+        self.assertEqual(ContentItem.objects.get(pk=post.pk).site_id, self.site.pk)
+
+        # A new site picks up existing items on its host; a domain change moves them
+        blog = Site.objects.create(tenant=self.tenant, domain='https://www.acme.example/')
+        self.assertEqual(ContentItem.objects.get(pk=www.pk).site_id, blog.pk)
+        blog.domain = 'https://blog.acme.example'
+        blog.save()
+        self.assertIsNone(ContentItem.objects.get(pk=www.pk).site_id)
+        self.site.delete()
+        self.assertIsNone(ContentItem.objects.get(pk=post.pk).site_id)
+
+    def test_backfill_is_batched_and_resumable(self):
+        items = [self.item(f'https://acme.example/{n}') for n in range(5)] + [self.item('https://elsewhere.example/')]
+        ContentItem.objects.update(site=None)
+
+        result = content_sites.backfill(after=items[1].pk, batch_size=2)
+        self.assertEqual((result['scanned'], result['changed'], result['last_pk']), (4, 3, items[-1].pk))
+        self.assertEqual(ContentItem.objects.filter(site=self.site).count(), 3)
+        content_sites.backfill(batch_size=2)
+        self.assertEqual(ContentItem.objects.filter(site=self.site).count(), 5)
+
+        user = User.objects.create_user(username='owner', password='pass1234')
+        TenantUser.objects.create(user=user, tenant=self.tenant, role='owner')
+        self.client.force_login(user)
+        response = self.client.get(f'/seo/ui/sites/{self.site.pk}/')
+        self.assertEqual(len(response.context['content_items']), 5)
+
+
+class BacklinkSnapshotTests(SiteOwnerTestCase):
+    def setUp(self):
+        super().setUp()
+        self.today = timezone.localdate()
+
+    def links(self, *names):
+        return [Backlink.objects.create(site=self.site, source_url=f'https://{name}.example/',
+                                        target_url='https://acme.example/') for name in names]
+
+    def test_ids_round_trip(self):
+        for ids in ([], [7], list(range(1, 5000, 3)), [1, 2 ** 40, 2 ** 40 + 1]):
+            self.assertEqual(list(backlink_snapshots.decode_ids(backlink_snapshots.encode_ids(ids))), ids)
+        self.assertLess(len(backlink_snapshots.encode_ids(list(range(100_000)))), 1000)
+
+    def test_snapshots_count_new_and_lost_links(self):
+        old, kept = self.links('old', 'kept')
+        first = backlink_snapshots.take_snapshot(self.site.pk, self.today - timedelta(days=2))
+        self.assertEqual((first.link_count, first.new_count, first.lost_count), (2, 0, 0))
+
+        Backlink.objects.filter(pk=old.pk).update(status='lost')
+        fresh, = self.links('fresh')
+        second = backlink_snapshots.take_snapshot(self.site.pk, self.today - timedelta(days=1))
+        self.assertEqual((second.link_count, second.new_count, second.lost_count), (2, 1, 1))
+        # Retaking a day replaces its snapshot
+        Backlink.objects.filter(pk=kept.pk).update(status='broken')
+        second = backlink_snapshots.take_snapshot(self.site.pk, self.today - timedelta(days=1))
+        self.assertEqual((second.link_count, second.new_count, second.lost_count), (1, 1, 2))
+        self.assertEqual(BacklinkSnapshot.objects.count(), 2)
+
+        changes = backlink_snapshots.diff(self.site.pk, self.today - timedelta(days=30))
+        self.assertEqual((changes['new'], changes['lost']), ([fresh.pk], [old.pk, kept.pk]))
+        self.assertEqual(changes['start_day'], self.today - timedelta(days=2))
+        self.assertEqual([row[1:] for row in backlink_snapshots.trend(self.site.pk)], [(2, 0, 0), (1, 1, 2)])
+
+        response = self.client.get(f'/seo/sites/{self.site.pk}/backlink-changes/', {'days': 7})
+        body = response.json()
+        self.assertEqual((body['new'], body['lost']), (1, 2))
+        self.assertEqual([link['id'] for link in body['lost_links']], [kept.pk, old.pk])
+        response = self.client.get(f'/seo/sites/{self.site.pk}/backlink-trend/', {'days': 7})
+        self.assertEqual([point['links'] for point in response.json()], [2, 1])
+        self.assertEqual(self.client.get(f'/seo/sites/{self.site.pk}/backlink-trend/', {'days': 'x'}).status_code, 400)
+
+        response = self.client.get(reverse('seo_backlinks_analysis'), {'site_id': self.site.pk})
+        self.assertEqual(response.context['lost_this_month'], 2)
+        self.assertContains(response, 'id="backlink-trend"')
+
+    def test_full_import_takes_snapshot(self):
+        rows = [{'source_url': 'https://a.example/', 'target_url': 'https://acme.example/'}]
+        result = import_backlinks(self.site, rows, full=True)
+        self.assertEqual(result['upserted'], 1)
+        self.assertEqual(BacklinkSnapshot.objects.get(site=self.site, day=self.today).link_count, 1)
+
+    def test_retention_keeps_one_snapshot_per_period(self):
+        self.links('a')
+        for age in (1, 36, 37, 38, 39, 40, 41, 42, 500, 510):
+            backlink_snapshots.take_snapshot(self.site.pk, self.today - timedelta(days=age))
+        backlink_snapshots.apply_retention(today=self.today)
+        kept = set(BacklinkSnapshot.objects.filter(link_ids__isnull=False).values_list('day', flat=True))
+        self.assertIn(self.today - timedelta(days=1), kept)
+        aged = [self.today - timedelta(days=age) for age in (36, 37, 38, 39, 40, 41, 42)]
+        weeks = {day.isocalendar()[:2] for day in aged}
+        self.assertEqual(len([day for day in kept if day in aged]), len(weeks))
+        old = [self.today - timedelta(days=age) for age in (500, 510)]
+        months = {(day.year, day.month) for day in old}
+        self.assertEqual(len([day for day in kept if day in old]), len(months))
+        # Counts survive on every row
+        self.assertEqual(BacklinkSnapshot.objects.count(), 10)
+
+
+class BacklinkStatsTests(TestCase):
+    def setUp(self):
+        tenant = Tenant.objects.create(name='Acme', region='US')
+        self.site = Site.objects.create(tenant=tenant, domain='https://acme.example')
+        self.other = Site.objects.create(tenant=tenant, domain='https://other.example')
+
+    def link(self, source, site=None, **fields):
+        return Backlink(site=site or self.site, source_url=source, target_url='https://acme.example/', **fields)
+
+    def assertNoDrift(self):
+        for site in (self.site, self.other):
+            self.assertEqual(backlink_stats.reconcile_site(site.pk, log_drift=False), {})
+
+    def profile(self):
+        profile = BacklinkProfile.objects.get(site=self.site)
+        return (profile.total_backlinks, profile.dofollow_backlinks, profile.nofollow_backlinks,
+                profile.domain_rating_sum, profile.toxic_backlinks_count, profile.unique_domains)
+
+    def test_save_and_delete(self):
+        a = self.link('https://www.a.example/1', domain_rating=40)
+        a.save()
+        b = self.link('https://b.example/1', domain_rating=20, is_dofollow=False)
+        b.save()
+        self.assertEqual(self.profile(), (2, 1, 1, 60, 0, 2))
+        self.assertEqual(ReferringDomain.objects.get(site=self.site, domain='a.example').backlink_count, 1)
+        self.assertNoDrift()
+
+        a.status = 'spam'
+        a.save()
+        b.source_url = 'https://a.example/2'
+        b.domain_rating = 30
+        b.save()
+        self.assertEqual(self.profile(), (1, 0, 1, 30, 1, 1))
+        self.assertNoDrift()
+
+        # Saved from a deferred load: the stored state is read back first
+        partial = Backlink.objects.only('id', 'anchor_text').get(pk=b.pk)
+        partial.anchor_text = 'Acme'
+        partial.save()
+        fresh = Backlink.objects.get(pk=a.pk)
+        fresh.status = 'active'
+        fresh.save()
+        self.assertNoDrift()
+
+        Backlink.objects.get(pk=a.pk).delete()
+        b.delete()
+        self.assertEqual(self.profile(), (0, 0, 0, 0, 0, 0))
+        self.assertFalse(ReferringDomain.objects.filter(site=self.site).exists())
+        self.assertNoDrift()
+
+    def test_bulk_create_and_upserts(self):
+        Backlink.objects.bulk_create([
+            self.link('https://a.example/', domain_rating=10),
+            self.link('https://b.example/', domain_rating=20, status='spam'),
+            self.link('https://c.example/', site=self.other, domain_rating=30),
+        ])
+        self.assertNoDrift()
+        Backlink.objects.bulk_create(
+            [self.link('https://a.example/', domain_rating=50, status='lost'),
+             self.link('https://b.example/', domain_rating=60),
+             self.link('https://d.example/', domain_rating=70)],
+            update_conflicts=True, unique_fields=['site', 'source_url', 'target_url'],
+            update_fields=['status', 'domain_rating'],
+        )
+        self.assertEqual(self.profile(), (2, 2, 0, 130, 0, 2))
+        self.assertNoDrift()
+        # Upsert leaving is_dofollow out of update_fields keeps the stored value
+        Backlink.objects.bulk_create(
+            [self.link('https://d.example/', domain_rating=75, is_dofollow=False)],
+            update_conflicts=True, unique_fields=['site', 'source_url', 'target_url'],
+            update_fields=['domain_rating'],
+        )
+        Backlink.objects.bulk_create(
+            [self.link('https://d.example/', status='spam'), self.link('https://e.example/')], ignore_conflicts=True,
+        )
+        self.assertNoDrift()
+
+    def test_bulk_update(self):
+        links = Backlink.objects.bulk_create([self.link(f'https://{name}.example/') for name in 'abc'])
+        links = list(Backlink.objects.filter(site=self.site).order_by('source_url'))
+        links[0].status = 'spam'
+        links[1].source_url = 'https://c.example/other'
+        links[2].is_dofollow = False
+        links[2].domain_rating = 90
+        Backlink.objects.bulk_update(links, ['status', 'source_url', 'is_dofollow', 'domain_rating'])
+        self.assertEqual(self.profile(), (2, 1, 1, 90, 1, 1))
+        self.assertNoDrift()
+
+    def test_queryset_update_and_delete(self):
+        Backlink.objects.bulk_create(
+            [self.link(f'https://{name}.example/', domain_rating=10) for name in 'abcd']
+            + [self.link('https://x.example/', site=self.other)]
+        )
+        links = Backlink.objects.filter(site=self.site)
+        links.filter(source_url__in=['https://a.example/', 'https://b.example/']).update(status='lost')
+        self.assertNoDrift()
+        links.filter(source_url='https://c.example/').update(is_dofollow=False, domain_rating=55)
+        self.assertNoDrift()
+        links.update(domain_rating=F('domain_rating') + 1)
+        self.assertNoDrift()
+        links.filter(source_url='https://d.example/').update(site=self.other)
+        self.assertNoDrift()
+        Backlink.objects.filter(source_url__in=['https://a.example/', 'https://c.example/']).delete()
+        self.assertEqual(self.profile(), (0, 0, 0, 0, 0, 0))
+        self.assertNoDrift()
+
+    def test_reconcile_repairs_drift(self):
+        self.link('https://a.example/', domain_rating=10).save()
+        with backlink_stats.suspended():
+            self.link('https://b.example/', domain_rating=20).save()
+        drift = backlink_stats.reconcile_site(self.site.pk, log_drift=False)
+        self.assertEqual(drift['total_backlinks'], 1)
+        self.assertEqual(self.profile(), (2, 2, 0, 30, 0, 2))
+        self.assertNoDrift()
+
+
+class BacklinkCheckerTests(TransactionTestCase):
+    # The checker reads and writes through sync_to_async on another thread, which needs committed rows
+    def setUp(self):
+        tenant = Tenant.objects.create(name='Acme', region='US')
+        self.site = Site.objects.create(tenant=tenant, domain='https://acme.example')
+        self.requests = []
+
+    def link(self, source, **fields):
+        return Backlink.objects.create(site=self.site, source_url=source, target_url='https://acme.example/pricing', **fields)
+
+    def handler(self, request):
+        self.requests.append(request)
+        if request.url.scheme not in ('http', 'https') or not request.url.host:
+            # As the real transport does; MockTransport skips this check
+            raise httpx.UnsupportedProtocol("Request URL is missing an 'http://' or 'https://' protocol.")
+        host, path = request.url.host, request.url.path
+        if host == 'live.example':
+            return httpx.Response(200, html='<p>See <a href="https://www.acme.example/pricing/">Acme</a></p>')
+        if host == 'nofollow.example':
+            return httpx.Response(200, html='<a rel="nofollow" href="/x"></a><a rel="ugc" href="https://acme.example/pricing">Acme</a>')
+        if host == 'gone.example':
+            return httpx.Response(404)
+        if host == 'moved.example' and path == '/old':
+            return httpx.Response(301, headers={'Location': 'https://moved.example/new'})
+        if host == 'moved.example':
+            return httpx.Response(200, html='<base href="https://acme.example/"><a href="pricing">Acme</a>')
+        if host == 'removed.example':
+            return httpx.Response(200, html='<a href="http://[broken">x</a><a href="https://acme.example/">home</a>')
+        if host == 'cached.example':
+            return httpx.Response(304)
+        if host == 'blocked.example':
+            return httpx.Response(503)
+        if host == 'bounce.example':
+            return httpx.Response(302, headers={'Location': 'http://intranet.example/admin'})
+        if host == 'intranet.example':
+            return httpx.Response(200, html='<a href="https://acme.example/pricing">Acme</a>')
+        raise httpx.ConnectTimeout('timed out', request=request)
+
+    def check(self):
+        client = httpx.AsyncClient(transport=httpx.MockTransport(self.handler), follow_redirects=True)
+        return backlink_checker.check_backlinks(Backlink.objects.filter(site=self.site), domain_delay=0, client=client)
+
+    def test_private_hosts_are_not_fetched(self):
+        internal = self.link('http://intranet.example/admin', status='lost')
+        bounced = self.link('https://bounce.example/post', status='lost')
+        client = backlink_checker.make_client(transport=httpx.MockTransport(self.handler))
+        public = mock.patch.object(backlink_checker, 'is_public_host', lambda host, port=None: host != 'intranet.example')
+        with public:
+            summary = backlink_checker.check_backlinks(Backlink.objects.filter(site=self.site), domain_delay=0, client=client)
+        self.assertEqual((summary['checked'], summary['unknown']), (2, 2))
+        self.assertEqual([request.url.host for request in self.requests], ['bounce.example'])
+        self.assertEqual(set(Backlink.objects.filter(pk__in=[internal.pk, bounced.pk]).values_list('status', flat=True)), {'lost'})
+
+    def test_verdicts(self):
+        live = self.link('https://live.example/post', status='lost')
+        nofollow = self.link('https://nofollow.example/post')
+        gone = self.link('https://gone.example/post')
+        moved = self.link('https://moved.example/old')
+        removed = self.link('https://removed.example/post')
+        cached = self.link('https://cached.example/post', status='lost', http_etag='"v1"')
+        blocked = self.link('https://blocked.example/post')
+        slow = self.link('https://slow.example/post')
+        summary = self.check()
+
+        self.assertEqual((summary['checked'], summary['unknown']), (8, 2))
+        status = dict(Backlink.objects.values_list('pk', 'status'))
+        self.assertEqual(
+            [status[link.pk] for link in (live, nofollow, gone, moved, removed, cached, blocked, slow)],
+            ['active', 'active', 'broken', 'active', 'lost', 'lost', 'active', 'active'],
+        )
+        self.assertFalse(Backlink.objects.get(pk=nofollow.pk).is_dofollow)
+        self.assertEqual(Backlink.objects.get(pk=cached.pk).http_etag, '"v1"')
+        sent = {request.url.host: request.headers.get('if-none-match') for request in self.requests}
+        self.assertEqual(sent['cached.example'], '"v1"')
+        # Unknown verdicts are not stamped, so the next run retries them
+        self.assertIsNone(Backlink.objects.get(pk=slow.pk).last_checked)
+        self.assertIsNotNone(Backlink.objects.get(pk=gone.pk).last_checked)
+
+    def test_invalid_urls_do_not_abort_the_run(self):
+        with backlink_stats.suspended():
+            # Stored as-is by an import; such links used to raise out of the run
+            bad = [self.link(url) for url in ('http://a:port/', 'http://exa\x00mple/', 'http://', 'mailto:x@y')]
+            unparsable_host = self.link('http://[bad-ipv6/page')
+        live = self.link('https://live.example/post', status='lost')
+        summary = self.check()
+        self.assertEqual((summary['checked'], summary['unknown']), (6, 1))
+        self.assertEqual(Backlink.objects.get(pk=unparsable_host.pk).status, 'active')
+        self.assertEqual(set(Backlink.objects.filter(pk__in=[link.pk for link in bad]).values_list('status', flat=True)),
+                         {'broken'})
+        self.assertEqual(Backlink.objects.get(pk=live.pk).status, 'active')
+
+
+class BacklinkImportTests(SiteOwnerTestCase):
+    def setUp(self):
+        super().setUp()
+        self.url = f'/seo/sites/{self.site.pk}/import-backlinks/'
+
+    def upload(self, name, content, **data):
+        return self.client.post(self.url, {'file': SimpleUploadedFile(name, content), **data})
+
+    def test_csv(self):
+        content = (
+            'Referring Page URL,Target URL,Anchor,DR,Nofollow\n'
+            'https://a.example/,https://acme.example/,Acme,55,false\n'
+            'https://b.example/,https://acme.example/,,101,true\n'
+            ',https://acme.example/,missing source,1,false\n'
+        ).encode()
+        response = self.upload('export.csv', content)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual((response.json()['upserted'], response.json()['skipped']), (2, 1))
+        a = Backlink.objects.get(site=self.site, source_url='https://a.example/')
+        self.assertEqual((a.anchor_text, a.domain_rating, a.is_dofollow), ('Acme', 55, True))
+        b = Backlink.objects.get(site=self.site, source_url='https://b.example/')
+        self.assertEqual((b.domain_rating, b.is_dofollow), (100, False))
+
+    def test_jsonl_rejects_rows_that_are_not_link_objects(self):
+        lines = [
+            {'source_url': 'https://a.example/', 'target_url': 'https://acme.example/', 'status': 'broken'},
+            [1, 2],
+            'x',
+            {'source_url': ['https://b.example/'], 'target_url': 'https://acme.example/'},
+            {'source_url': 'https://c.example/', 'target_url': 7},
+            {'source_url': 'https://d.example/', 'target_url': 'https://acme.example/', 'status': ['x'], 'anchor': 3},
+        ]
+        response = self.upload('export.jsonl', '\n'.join(json.dumps(line) for line in lines).encode())
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual((response.json()['rows'], response.json()['upserted'], response.json()['skipped']), (6, 2, 4))
+        self.assertEqual(Backlink.objects.get(source_url='https://a.example/').status, 'broken')
+        d = Backlink.objects.get(source_url='https://d.example/')
+        self.assertEqual((d.status, d.anchor_text), ('active', ''))
+
+    def test_gzip_upload_and_format_override(self):
+        line = json.dumps({'source': 'https://a.example/', 'target': 'https://acme.example/'}).encode()
+        response = self.upload('export.jsonl.gz', gzip.compress(line))
+        self.assertEqual(response.json()['upserted'], 1)
+        response = self.upload('export.gz', gzip.compress(line), format='jsonl')
+        self.assertEqual(response.json()['upserted'], 1)
+        self.assertEqual(Backlink.objects.filter(site=self.site).count(), 1)
+
+    def test_malformed_input(self):
+        self.assertEqual(self.upload('export.jsonl', b'{"source_url": ').status_code, 400)
+        self.assertEqual(self.upload('export.csv', b'\xff\xfe\x00bad').status_code, 400)
+        self.assertEqual(self.upload('export.csv.gz', b'not gzip').status_code, 400)
+        self.assertEqual(self.upload('export.jsonl.gz', gzip.compress(b'{"a": 1}\n' * 100)[:-20]).status_code, 400)
+        response = self.upload('export.csv', b'source,target\n', format='xml')
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('format', response.json()['error'])
+        self.assertEqual(self.client.post(self.url).status_code, 400)
+
+    def test_import_reconciles_profile_and_gaps_once(self):
+        CompetitorBacklink.objects.bulk_create([
+            CompetitorBacklink(site=self.site, competitor_domain='https://rival.example', source_url=f'https://{name}.example/',
+                               target_url='https://rival.example/', domain_rating=40)
+            for name in ('a', 'z')
+        ])
+        backlink_gap.rebuild_site(self.site.pk)
+        content = 'source_url,target_url\nhttps://a.example/,https://acme.example/\nhttps://www.a.example/x,https://acme.example/\n'
+        with mock.patch.object(backlink_gap, 'refresh_pairs') as refresh_pairs:
+            self.assertEqual(self.upload('export.csv', content.encode()).status_code, 200)
+        refresh_pairs.assert_not_called()
+        profile = BacklinkProfile.objects.get(site=self.site)
+        self.assertEqual((profile.total_backlinks, profile.unique_domains), (2, 1))
+        self.assertEqual(list(BacklinkGap.objects.filter(site=self.site).values_list('link_domain__name', flat=True)), ['z.example'])
+        self.assertEqual(backlink_stats.reconcile_site(self.site.pk, log_drift=False), {})
+
+        # Batches written before a parse error are still counted
+        def rows():
+            yield {'source_url': 'https://b.example/', 'target_url': 'https://acme.example/'}
+            raise ValueError('truncated export')
+
+        with self.assertRaises(ValueError):
+            import_backlinks(self.site, rows(), batch_size=1)
+        self.assertEqual(BacklinkProfile.objects.get(site=self.site).total_backlinks, 3)
+
+    def test_command_reads_gzip(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'export.csv.gz')
+            with gzip.open(path, 'wt') as fh:
+                fh.write('source_url,target_url\nhttps://a.example/,https://acme.example/\n')
+            call_command('import_backlinks', self.site.pk, path, stdout=io.StringIO())
+            self.assertTrue(Backlink.objects.filter(site=self.site, source_url='https://a.example/').exists())
+            with open(path, 'wb') as fh:
+                fh.write(b'not gzip')
+            with self.assertRaises(CommandError):
+                call_command('import_backlinks', self.site.pk, path, stdout=io.StringIO())
+
+
+class KeysetPaginationTests(SiteOwnerTestCase):
+    def setUp(self):
+        super().setUp()
+        # Few distinct ratings, so pages end inside runs of ties
+        Backlink.objects.bulk_create([
+            Backlink(site=self.site, source_url=f'https://s{n}.example/', target_url='https://acme.example/',
+                     domain_rating=n % 3 * 30, status='lost' if n % 4 == 0 else 'active', is_dofollow=n % 5 != 0)
+            for n in range(23)
+        ])
+
+    def walk(self, url, **params):
+        seen, after = [], None
+        while True:
+            response = self.client.get(url, {**params, 'limit': 4, **({'after': after} if after else {})})
+            self.assertEqual(response.status_code, 200)
+            seen += [row['id'] for row in response.json()['results']]
+            after = response.json()['next']
+            if not after:
+                return seen
+
+    def test_pages_cover_listing_once_in_order(self):
+        url = f'/seo/sites/{self.site.pk}/backlinks/'
+        expected = list(Backlink.objects.order_by('-domain_rating', '-id').values_list('pk', flat=True))
+        self.assertEqual(self.walk(url), expected)
+        active_nofollow = Backlink.objects.filter(status='active', is_dofollow=False).order_by('-domain_rating', '-id')
+        self.assertEqual(self.walk(url, status='active', dofollow='false'), list(active_nofollow.values_list('pk', flat=True)))
+        self.assertEqual(self.client.get(url, {'after': 'bogus'}).status_code, 400)
+        self.assertEqual(self.client.get(url, {'dofollow': 'maybe'}).status_code, 400)
+
+        CompetitorBacklink.objects.bulk_create([
+            CompetitorBacklink(site=self.site, competitor_domain='https://rival.example', source_url=f'https://c{n}.example/',
+                               target_url='https://rival.example/', domain_rating=n % 2 * 50)
+            for n in range(7)
+        ])
+        expected = list(CompetitorBacklink.objects.order_by('-domain_rating', '-id').values_list('pk', flat=True))
+        self.assertEqual(self.walk(f'/seo/sites/{self.site.pk}/competitor-backlinks/'), expected)
+
+    def test_deep_pages_read_index_ranges_only(self):
+        rows = Backlink.objects.filter(site=self.site)
+        ordering = ('-domain_rating', '-id')
+        page, cursor = keyset_page(rows, ordering, limit=10)
+        with CaptureQueriesContext(connection) as queries:
+            page, cursor = keyset_page(rows, ordering, cursor, limit=10)
+        # One range within the cursor's rating, one past it; never an OFFSET
+        self.assertEqual(len(queries), 2)
+        self.assertFalse(any('OFFSET' in query['sql'] for query in queries.captured_queries))
+        self.assertEqual(len(page), 10)
+        with self.assertRaises(ValueError):
+            keyset_page(rows, ('-domain_rating', '-last_checked', '-id'), cursor)
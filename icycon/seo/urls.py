@@ -5,6 +5,8 @@ from .views import (
     KeywordClusterViewSet,
     ContentItemViewSet,
     FAQViewSet,
+    AuditJobViewSet,
+    SearchViewSet,
     seo_dashboard,
     seo_sites_list,
     seo_site_detail,
@@ -17,6 +19,10 @@ from .views import (
     seo_backlinks_analysis,
     seo_backlinks_competitors,
     seo_backlinks_outreach,
+    content_sitemap_index,
+    content_sitemap_shard,
+    content_jsonld,
+    tenant_faq_jsonld,
 )
 
 router = DefaultRouter()
@@ -24,6 +30,8 @@ router.register(r'sites', SiteViewSet)
 router.register(r'keywords', KeywordClusterViewSet)
 router.register(r'content-items', ContentItemViewSet)
 router.register(r'faqs', FAQViewSet)
+router.register(r'audit-jobs', AuditJobViewSet)
+router.register(r'search', SearchViewSet, basename='search')
 
 urlpatterns = [
     # API endpoints (DRF viewsets)
@@ -44,6 +52,14 @@ urlpatterns = [
     path('backlinks/competitors/', seo_backlinks_competitors, name='seo_backlinks_competitors'),
     path('backlinks/outreach/', seo_backlinks_outreach, name='seo_backlinks_outreach'),
 
+    # Public generated sitemaps
+    path('sitemaps/<int:site_id>/sitemap.xml', content_sitemap_index, name='seo_content_sitemap'),
+    path('sitemaps/<int:site_id>/content-<int:number>.xml.gz', content_sitemap_shard, name='seo_content_sitemap_shard'),
+
+    # Public precomputed JSON-LD
+    path('jsonld/content/<int:item_id>.json', content_jsonld, name='seo_content_jsonld'),
+    path('jsonld/tenants/<int:tenant_id>/faq.json', tenant_faq_jsonld, name='seo_tenant_faq_jsonld'),
+
     # UI group for future use
     path('ui/', include([
         path('', seo_dashboard, name='seo_dashboard'),
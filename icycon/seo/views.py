@@ -1,110 +1,400 @@
+from datetime import timedelta
+
+from django.db.models import Count
+from django.http import FileResponse, Http404, HttpResponse
 from django.shortcuts import redirect, render, get_object_or_404
-from django.views.decorators.csrf import csrf_exempt
+from django.urls import reverse
+from django.utils import timezone
+from django.utils.cache import get_conditional_response
+from django.utils.http import quote_etag
 from django.contrib.auth.decorators import login_required
 
 # Create your views here.
-from rest_framework import viewsets, permissions, filters
+from rest_framework import viewsets, permissions, filters, status
 from rest_framework.decorators import action
 from rest_framework.response import Response
-from .models import Site, KeywordCluster, ContentItem, FAQ
-from .serializers import SiteSerializer, KeywordClusterSerializer, ContentItemSerializer, FAQSerializer
-from tenants.models import Tenant, TenantUser
-
-class SiteViewSet(viewsets.ModelViewSet):
-    queryset = Site.objects.all()  # Base queryset, will be filtered in get_queryset
+from .models import Site, KeywordCluster, ContentItem, FAQ, FaqPageDocument, Backlink, BacklinkProfile, CompetitorBacklink, LinkOpportunity, AuditJob, CwvSummary
+from .serializers import SiteSerializer, KeywordClusterSerializer, ContentItemSerializer, FAQSerializer, AuditJobSerializer
+from .services.backlink_import import FORMATS, PARSE_ERRORS, detect_format, import_backlinks, iter_rows, open_export
+from .services.gsc_client import enqueue_submission
+from .filters import FullTextSearchFilter
+from .pagination import DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE, keyset_page
+from .services import backlink_gap, backlink_snapshots, cwv_audit, keyword_clustering, opportunity_scoring, robots, search_index, sitemap_builder
+from tenants.mixins import TenantScopedViewSetMixin
+from icycon.db_routers import replica_reads
+from icycon.profiling import query_budget
+
+MAX_GAP_ROWS = 1000
+# Keyset listing orders; each has matching (site, [filters,] ...) indexes
+BACKLINK_ORDERING = ('-domain_rating', '-id')
+COMPETITOR_BACKLINK_ORDERING = ('-domain_rating', '-id')
+DOFOLLOW_VALUES = {'true': True, '1': True, 'false': False, '0': False}
+MAX_CHANGED_LINKS = 50
+MAX_HISTORY_DAYS = 3660
+
+
+def _keyset_response(request, rows, ordering, row_data):
+    """A keyset page of ``rows`` as ``{'results': [...], 'next': cursor}``.
+
+    Reads ``limit``, ``after`` and, for models with ``is_dofollow``, the
+    ``dofollow`` filter from the query string; answers 400 if any is malformed.
+    """
+    dofollow = request.query_params.get('dofollow', '').lower()
+    if dofollow and hasattr(rows.model, 'is_dofollow'):
+        if dofollow not in DOFOLLOW_VALUES:
+            return Response({'error': 'dofollow must be true or false'}, status=status.HTTP_400_BAD_REQUEST)
+        rows = rows.filter(is_dofollow=DOFOLLOW_VALUES[dofollow])
+    try:
+        limit = min(int(request.query_params.get('limit', DEFAULT_PAGE_SIZE)), MAX_PAGE_SIZE)
+        page, next_cursor = keyset_page(rows, ordering, request.query_params.get('after'), max(limit, 1))
+    except ValueError:
+        return Response({'error': 'limit must be an integer and after a cursor from a previous page'},
+                        status=status.HTTP_400_BAD_REQUEST)
+    return Response({'results': [row_data(row) for row in page], 'next': next_cursor})
+
+
+class SiteViewSet(TenantScopedViewSetMixin, viewsets.ModelViewSet):
+    queryset = Site.objects.select_related('tenant')
     serializer_class = SiteSerializer
     permission_classes = [permissions.IsAuthenticated]
     filter_backends = [filters.SearchFilter]
     search_fields = ['domain']
 
-    def get_queryset(self):
-        """Get sites for the user's primary tenant."""
-        tenant = Tenant.objects.filter(tenantuser__user=self.request.user).first()
-        if not tenant:
-            return Site.objects.none()
-        return Site.objects.filter(tenant=tenant)
-
-    @csrf_exempt
     @action(detail=True, methods=["post"])
     def submit_sitemap(self, request, pk=None):
+        """Queue a refresh of the site's sitemap inventory and resubmission to Search Console."""
         site = self.get_object()
-        # DRY RUN: No task, just dummy response
-        return Response({"message": "[DRY RUN] Sitemap submission simulated (no task executed)"})
+        if not site.sitemaps_url:
+            return Response({'error': 'Site has no sitemaps_url'}, status=status.HTTP_400_BAD_REQUEST)
+        enqueue_submission(site)
+        return Response({'site_id': site.pk, 'status': 'queued'}, status=status.HTTP_202_ACCEPTED)
 
     @action(detail=True, methods=["post"])
     def audit(self, request, pk=None):
+        """Queue a Core Web Vitals audit (optional ``urls`` on the site's host, up to ``MAX_BATCH_URLS``); returns the job id."""
         site = self.get_object()
-        # DRY RUN: No task, just dummy response
-        return Response({"message": "[DRY RUN] CWV audit simulated (no task executed)"})
-
-
-class KeywordClusterViewSet(viewsets.ModelViewSet):
-    queryset = KeywordCluster.objects.all()  # Base queryset, will be filtered in get_queryset
+        urls = request.data.get('urls') or None
+        if urls is not None:
+            if not isinstance(urls, list) or not all(isinstance(url, str) for url in urls):
+                return Response({'error': 'urls must be a list of URLs'}, status=status.HTTP_400_BAD_REQUEST)
+            if len(urls) > robots.MAX_BATCH_URLS:
+                return Response({'error': f'At most {robots.MAX_BATCH_URLS} urls per call'}, status=status.HTTP_400_BAD_REQUEST)
+            foreign = cwv_audit.foreign_urls(site, urls)
+            if foreign:
+                return Response({'error': f'URLs not on {site.domain}: {foreign[:5]}'}, status=status.HTTP_400_BAD_REQUEST)
+        job = cwv_audit.create_job([site], tenant=site.tenant, urls=urls)
+        cwv_audit.enqueue_job(job)
+        return Response({'job_id': job.pk, 'status': job.status, 'total': job.total}, status=status.HTTP_202_ACCEPTED)
+
+    @action(detail=True, methods=["post"], url_path='robots-check')
+    def robots_check(self, request, pk=None):
+        """Check ``urls`` (up to ``MAX_BATCH_URLS``) against the site's robots.txt for ``agent``."""
+        site = self.get_object()
+        urls = request.data.get('urls')
+        if not isinstance(urls, list) or not all(isinstance(url, str) for url in urls):
+            return Response({'error': 'urls must be a list of URLs or paths'}, status=status.HTTP_400_BAD_REQUEST)
+        if len(urls) > robots.MAX_BATCH_URLS:
+            return Response({'error': f'At most {robots.MAX_BATCH_URLS} urls per call'}, status=status.HTTP_400_BAD_REQUEST)
+        agent = request.data.get('agent') or '*'
+        allowed = robots.matcher_for_site(site).allowed_many(urls, agent)
+        return Response({'agent': agent, 'allowed': allowed, 'disallowed': allowed.count(False)})
+
+    @action(detail=True, methods=["get"], url_path='backlink-gaps')
+    def backlink_gaps(self, request, pk=None):
+        """Referring domains linking to competitors but not to the site, best first."""
+        site = self.get_object()
+        try:
+            limit = min(int(request.query_params.get('limit', 100)), MAX_GAP_ROWS)
+            min_competitors = int(request.query_params.get('min_competitors', 1))
+            min_domain_rating = int(request.query_params.get('min_domain_rating', 0))
+        except ValueError:
+            return Response({'error': 'limit, min_competitors and min_domain_rating must be integers'},
+                            status=status.HTTP_400_BAD_REQUEST)
+        if not backlink_gap.gaps_built(site):
+            backlink_gap.enqueue_rebuild(site)
+            return Response({'site_id': site.pk, 'status': 'queued'}, status=status.HTTP_202_ACCEPTED)
+        gaps = backlink_gap.site_gaps(site, min_competitors, min_domain_rating)[:max(limit, 0)]
+        return Response([
+            {
+                'domain': gap.link_domain.name,
+                'competitors': gap.competitor_count,
+                'competitor_links': gap.competitor_links,
+                'dofollow_links': gap.dofollow_links,
+                'domain_rating': gap.domain_rating,
+                'score': gap.score,
+            }
+            for gap in gaps
+        ])
+
+    @action(detail=True, methods=["get"])
+    def backlinks(self, request, pk=None):
+        """The site's backlinks, highest domain rating first, filtered by ``status`` and ``dofollow``.
+
+        Keyset paged: pass the returned ``next`` as ``after`` for the next page.
+        """
+        site = self.get_object()
+        rows = Backlink.objects.filter(site=site)
+        if request.query_params.get('status'):
+            rows = rows.filter(status=request.query_params['status'])
+        return _keyset_response(request, rows, BACKLINK_ORDERING, lambda link: {
+            'id': link.pk,
+            'source_url': link.source_url,
+            'target_url': link.target_url,
+            'anchor_text': link.anchor_text,
+            'domain_rating': link.domain_rating,
+            'page_authority': link.page_authority,
+            'status': link.status,
+            'is_dofollow': link.is_dofollow,
+            'first_seen': link.first_seen,
+            'last_checked': link.last_checked,
+        })
+
+    @action(detail=True, methods=["get"], url_path='competitor-backlinks')
+    def competitor_backlinks(self, request, pk=None):
+        """Competitors' backlinks, highest domain rating first, filtered by ``competitor`` and ``dofollow``.
+
+        Keyset paged like ``backlinks``.
+        """
+        site = self.get_object()
+        rows = CompetitorBacklink.objects.filter(site=site)
+        if request.query_params.get('competitor'):
+            rows = rows.filter(competitor_domain=request.query_params['competitor'])
+        return _keyset_response(request, rows, COMPETITOR_BACKLINK_ORDERING, lambda link: {
+            'id': link.pk,
+            'competitor_domain': link.competitor_domain,
+            'source_url': link.source_url,
+            'target_url': link.target_url,
+            'anchor_text': link.anchor_text,
+            'domain_rating': link.domain_rating,
+            'page_authority': link.page_authority,
+            'is_dofollow': link.is_dofollow,
+        })
+
+    @action(detail=True, methods=["get"], url_path='link-opportunities')
+    def link_opportunities(self, request, pk=None):
+        """Outreach opportunities ranked by score, filtered by ``status``; keyset paged like ``backlinks``."""
+        site = self.get_object()
+        rows = LinkOpportunity.objects.filter(site=site)
+        if request.query_params.get('status'):
+            rows = rows.filter(status=request.query_params['status'])
+        return _keyset_response(request, rows, opportunity_scoring.RANKING, lambda opportunity: {
+            'id': opportunity.pk,
+            'prospect_domain': opportunity.prospect_domain,
+            'prospect_url': opportunity.prospect_url,
+            'target_page': opportunity.target_page,
+            'domain_rating': opportunity.domain_rating,
+            'page_authority': opportunity.page_authority,
+            'traffic_estimate': opportunity.traffic_estimate,
+            'relevance_score': opportunity.relevance_score,
+            'score': round(opportunity.score, 2),
+            'priority': opportunity.priority,
+            'status': opportunity.status,
+        })
+
+    @action(detail=True, methods=["get"], url_path='backlink-changes')
+    def backlink_changes(self, request, pk=None):
+        """Links gained and lost over the last ``days`` (default 7), from the daily snapshots.
+
+        Counts are complete; ``new_links``/``lost_links`` list the most recent
+        ``MAX_CHANGED_LINKS`` of each.
+        """
+        site = self.get_object()
+        try:
+            days = min(max(int(request.query_params.get('days', 7)), 1), MAX_HISTORY_DAYS)
+        except ValueError:
+            return Response({'error': 'days must be an integer'}, status=status.HTTP_400_BAD_REQUEST)
+        changes = backlink_snapshots.diff(site.pk, timezone.localdate() - timedelta(days=days))
+
+        def links(ids):
+            rows = Backlink.objects.filter(site=site, pk__in=ids[-MAX_CHANGED_LINKS:]).order_by('-pk')
+            return list(rows.values('id', 'source_url', 'target_url', 'anchor_text', 'domain_rating', 'status'))
+
+        return Response({
+            'start_day': changes['start_day'],
+            'end_day': changes['end_day'],
+            'new': len(changes['new']),
+            'lost': len(changes['lost']),
+            'new_links': links(changes['new']),
+            'lost_links': links(changes['lost']),
+        })
+
+    @action(detail=True, methods=["get"], url_path='backlink-trend')
+    def backlink_trend(self, request, pk=None):
+        """Daily link, new and lost counts of the last ``days`` (default 30)."""
+        site = self.get_object()
+        try:
+            days = min(max(int(request.query_params.get('days', 30)), 1), MAX_HISTORY_DAYS)
+        except ValueError:
+            return Response({'error': 'days must be an integer'}, status=status.HTTP_400_BAD_REQUEST)
+        return Response([
+            {'day': day, 'links': links, 'new': new, 'lost': lost}
+            for day, links, new, lost in backlink_snapshots.trend(site.pk, days)
+        ])
+
+    @action(detail=True, methods=["post"], url_path='import-backlinks')
+    def import_backlinks(self, request, pk=None):
+        """Upsert backlinks from an uploaded CSV/JSONL export, optionally gzipped (multipart ``file``)."""
+        site = self.get_object()
+        upload = request.FILES.get('file')
+        if upload is None:
+            return Response({'error': 'file is required'}, status=status.HTTP_400_BAD_REQUEST)
+        fmt = request.data.get('format') or detect_format(upload.name)
+        if fmt not in FORMATS:
+            return Response({'error': f"format must be one of {', '.join(FORMATS)}"}, status=status.HTTP_400_BAD_REQUEST)
+        full = str(request.data.get('full', '')).lower() in ('1', 'true', 'yes')
+        # Large uploads are spooled to disk by Django, so this streams from a file
+        try:
+            result = import_backlinks(site, iter_rows(open_export(upload.file, upload.name), fmt), full=full)
+        except PARSE_ERRORS as exc:
+            return Response({'error': f'Could not parse {upload.name}: {exc}'}, status=status.HTTP_400_BAD_REQUEST)
+        return Response(result)
+
+
+class KeywordClusterViewSet(TenantScopedViewSetMixin, viewsets.ModelViewSet):
+    queryset = KeywordCluster.objects.select_related('tenant')
     serializer_class = KeywordClusterSerializer
     permission_classes = [permissions.IsAuthenticated]
-    filter_backends = [filters.SearchFilter]
-    search_fields = ['intent', 'terms']
-
-    def get_queryset(self):
-        """Get keyword clusters for the user's primary tenant."""
-        tenant = Tenant.objects.filter(tenantuser__user=self.request.user).first()
-        if not tenant:
-            return KeywordCluster.objects.none()
-        return KeywordCluster.objects.filter(tenant=tenant)
-
-
-class ContentItemViewSet(viewsets.ModelViewSet):
-    queryset = ContentItem.objects.all()  # Base queryset, will be filtered in get_queryset
+    filter_backends = [FullTextSearchFilter]
+
+    @action(detail=False, methods=["post"])
+    def assign(self, request):
+        """Add ``keywords`` (up to ``MAX_BATCH_KEYWORDS``) to the tenant's clusters for ``locale``."""
+        keywords = request.data.get('keywords')
+        if not isinstance(keywords, list) or not all(isinstance(keyword, str) for keyword in keywords):
+            return Response({'error': 'keywords must be a list of strings'}, status=status.HTTP_400_BAD_REQUEST)
+        if len(keywords) > keyword_clustering.MAX_BATCH_KEYWORDS:
+            return Response(
+                {'error': f'At most {keyword_clustering.MAX_BATCH_KEYWORDS} keywords per call; use manage.py cluster_keywords'},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+        if not request.tenant:
+            return Response({'error': 'No tenant for this user'}, status=status.HTTP_400_BAD_REQUEST)
+        locale = request.data.get('locale') or 'en'
+        return Response(keyword_clustering.cluster_keywords(request.tenant, keywords, locale=locale))
+
+
+class ContentItemViewSet(TenantScopedViewSetMixin, viewsets.ModelViewSet):
+    queryset = ContentItem.objects.select_related('tenant')
     serializer_class = ContentItemSerializer
     permission_classes = [permissions.IsAuthenticated]
-    filter_backends = [filters.SearchFilter, filters.OrderingFilter]
-    search_fields = ['url', 'type', 'status']
+    filter_backends = [FullTextSearchFilter, filters.OrderingFilter]
     ordering_fields = ['created_at', 'status']
     ordering = ['-created_at']
 
-    def get_queryset(self):
-        """Get content items for the user's primary tenant."""
-        tenant = Tenant.objects.filter(tenantuser__user=self.request.user).first()
-        if not tenant:
-            return ContentItem.objects.none()
-        return ContentItem.objects.filter(tenant=tenant)
-
 
-class FAQViewSet(viewsets.ModelViewSet):
-    queryset = FAQ.objects.all()  # Base queryset, will be filtered in get_queryset
+class FAQViewSet(TenantScopedViewSetMixin, viewsets.ModelViewSet):
+    queryset = FAQ.objects.select_related('tenant')
     serializer_class = FAQSerializer
     permission_classes = [permissions.IsAuthenticated]
-    filter_backends = [filters.SearchFilter]
-    search_fields = ['question', 'answer']
+    filter_backends = [FullTextSearchFilter]
+
+
+class SearchViewSet(viewsets.ViewSet):
+    """Ranked full-text search over the tenant's content items, FAQs and keyword clusters."""
+    permission_classes = [permissions.IsAuthenticated]
+
+    def list(self, request):
+        query = request.query_params.get('q', '')
+        kinds = [kind for kind in request.query_params.get('kind', '').split(',') if kind]
+        unknown = set(kinds) - set(search_index.KINDS)
+        if unknown:
+            return Response({'error': f'kind must be among {sorted(search_index.KINDS)}'}, status=status.HTTP_400_BAD_REQUEST)
+        try:
+            limit = min(int(request.query_params.get('limit', search_index.DEFAULT_LIMIT)), search_index.MAX_LIMIT)
+        except ValueError:
+            return Response({'error': 'limit must be an integer'}, status=status.HTTP_400_BAD_REQUEST)
+        tenant_id = request.tenant_membership.tenant_id
+        return Response({'results': search_index.search(tenant_id, query, kinds=kinds, limit=max(limit, 1))})
+
+
+class AuditJobViewSet(TenantScopedViewSetMixin, viewsets.ReadOnlyModelViewSet):
+    queryset = AuditJob.objects.order_by('-created_at')
+    serializer_class = AuditJobSerializer
+    permission_classes = [permissions.IsAuthenticated]
+
+
+# Public sitemaps generated from published ContentItems, served as last built
+# by `manage.py build_sitemaps` / build_content_sitemaps_task
+def content_sitemap_index(request, site_id):
+    site = get_object_or_404(Site, pk=site_id)
+    shards = list(sitemap_builder.built_shards(site))
+    base_url = request.build_absolute_uri('/')
+    etag = quote_etag(sitemap_builder.index_etag(shards, base_url))
+    response = get_conditional_response(request, etag=etag)
+    if response is None:
+        def shard_url(number):
+            return request.build_absolute_uri(reverse('seo_content_sitemap_shard', args=[site.pk, number]))
+
+        response = HttpResponse(sitemap_builder.render_index(shards, shard_url), content_type='application/xml')
+    response['ETag'] = etag
+    return response
+
 
-    def get_queryset(self):
-        """Get FAQs for the user's primary tenant."""
-        tenant = Tenant.objects.filter(tenantuser__user=self.request.user).first()
-        if not tenant:
-            return FAQ.objects.none()
-        return FAQ.objects.filter(tenant=tenant)
+def content_sitemap_shard(request, site_id, number):
+    shard = get_object_or_404(sitemap_builder.built_shards(site_id), number=number)
+    etag = quote_etag(shard.fingerprint)
+    response = get_conditional_response(request, etag=etag)
+    if response is None:
+        try:
+            response = FileResponse(open(sitemap_builder.shard_path(shard), 'rb'), content_type='application/gzip')
+        except FileNotFoundError:
+            raise Http404('Sitemap not built yet')
+    response['ETag'] = etag
+    return response
+
+
+# Public precomputed JSON-LD; responses only read the stored text and its hash
+JSONLD_CONTENT_TYPE = 'application/ld+json'
+
+
+def _stored_jsonld(request, body, etag):
+    etag = quote_etag(etag)
+    response = get_conditional_response(request, etag=etag)
+    if response is None:
+        response = HttpResponse(body, content_type=JSONLD_CONTENT_TYPE)
+    response['ETag'] = etag
+    return response
+
+
+def content_jsonld(request, item_id):
+    item = ContentItem.objects.filter(pk=item_id, status=sitemap_builder.PUBLISHED_STATUS).exclude(json_ld='')
+    row = item.values_list('json_ld', 'json_ld_etag').first()
+    if row is None:
+        raise Http404('No structured data for this item')
+    return _stored_jsonld(request, *row)
+
+
+def tenant_faq_jsonld(request, tenant_id):
+    row = FaqPageDocument.objects.filter(tenant_id=tenant_id, faq_count__gt=0).values_list('body', 'etag').first()
+    if row is None:
+        raise Http404('No FAQs for this tenant')
+    return _stored_jsonld(request, *row)
 
 
 # Server-rendered tenant-facing SEO pages
 @login_required
+@replica_reads
 def seo_dashboard(request):
     """Tenant-scoped SEO dashboard (server-rendered).
 
     Picks the first tenant the user belongs to and displays basic site
     statistics and quick actions.
     """
-    tenant_qs = Tenant.objects.filter(tenantuser__user=request.user)
-    tenant = tenant_qs.first()
+    tenant = request.tenant
     if not tenant:
         return render(request, 'seo/no_tenant.html')
 
-    sites = Site.objects.filter(tenant=tenant)
+    sites = list(Site.objects.filter(tenant=tenant).annotate(content_count=Count('content_items')))
+    # Precomputed p75 Core Web Vitals (site-wide rows), never raw audits
+    cwv = {summary.site_id: summary for summary in CwvSummary.objects.filter(site__in=sites, url='')}
+    for site in sites:
+        site.cwv = cwv.get(site.pk)
     # Simple metrics for the dashboard (can be expanded later)
     metrics = {
-        'site_count': sites.count(),
-        # Models are tenant-scoped (no direct FK to Site in this schema), count by tenant
+        'site_count': len(sites),
+        # Keyword clusters have no Site FK, so they are counted per tenant
         'keyword_clusters': KeywordCluster.objects.filter(tenant=tenant).count(),
-        'content_items': ContentItem.objects.filter(tenant=tenant).count(),
+        'content_items': sum(site.content_count for site in sites),
     }
     return render(request, 'seo/dashboard.html', {
         'tenant': tenant,
@@ -115,8 +405,7 @@ def seo_dashboard(request):
 
 @login_required
 def seo_sites_list(request):
-    tenant_qs = Tenant.objects.filter(tenantuser__user=request.user)
-    tenant = tenant_qs.first()
+    tenant = request.tenant
     if not tenant:
         return render(request, 'seo/no_tenant.html')
     sites = Site.objects.filter(tenant=tenant)
@@ -124,23 +413,15 @@ def seo_sites_list(request):
 
 
 @login_required
+@query_budget(8)
 def seo_site_detail(request, site_id):
-    tenant_qs = Tenant.objects.filter(tenantuser__user=request.user)
-    tenant = tenant_qs.first()
+    tenant = request.tenant
     if not tenant:
         return render(request, 'seo/no_tenant.html')
 
     site = get_object_or_404(Site, id=site_id, tenant=tenant)
 
-    # Try to get items linked to this specific site first, fall back to tenant-wide items
-    # For now these are tenant-scoped; if site relationships are added later, this will use them
-    content_items = ContentItem.objects.filter(
-        tenant=tenant,
-        url__icontains=site.domain  # Simple heuristic to find content for this site
-    )
-    if not content_items.exists():
-        # Fall back to tenant-wide items if no site-specific ones found
-        content_items = ContentItem.objects.filter(tenant=tenant)
+    content_items = ContentItem.objects.filter(site=site)
 
     # Keyword clusters and FAQs are tenant-wide for now
     keyword_clusters = KeywordCluster.objects.filter(tenant=tenant)
@@ -158,8 +439,7 @@ def seo_site_detail(request, site_id):
 @login_required
 def seo_site_create(request):
     """Create a new Site for the user's first tenant."""
-    tenant_qs = Tenant.objects.filter(tenantuser__user=request.user)
-    tenant = tenant_qs.first()
+    tenant = request.tenant
     if not tenant:
         return render(request, 'seo/no_tenant.html')
 
@@ -202,8 +482,7 @@ def seo_site_create(request):
 @login_required
 def seo_site_edit(request, site_id):
     """Edit an existing Site belonging to the user's tenant."""
-    tenant_qs = Tenant.objects.filter(tenantuser__user=request.user)
-    tenant = tenant_qs.first()
+    tenant = request.tenant
     if not tenant:
         return render(request, 'seo/no_tenant.html')
 
@@ -246,8 +525,7 @@ def seo_site_edit(request, site_id):
 @login_required
 def seo_keyword_clusters(request):
     """SEO Keyword Clusters view."""
-    tenant_qs = Tenant.objects.filter(tenantuser__user=request.user)
-    tenant = tenant_qs.first()
+    tenant = request.tenant
     if not tenant:
         return render(request, 'seo/no_tenant.html')
     
@@ -261,8 +539,7 @@ def seo_keyword_clusters(request):
 @login_required
 def seo_content_items(request):
     """SEO Content Items view."""
-    tenant_qs = Tenant.objects.filter(tenantuser__user=request.user)
-    tenant = tenant_qs.first()
+    tenant = request.tenant
     if not tenant:
         return render(request, 'seo/no_tenant.html')
     
@@ -276,8 +553,7 @@ def seo_content_items(request):
 @login_required
 def seo_faqs(request):
     """SEO FAQs view."""
-    tenant_qs = Tenant.objects.filter(tenantuser__user=request.user)
-    tenant = tenant_qs.first()
+    tenant = request.tenant
     if not tenant:
         return render(request, 'seo/no_tenant.html')
     
@@ -291,25 +567,27 @@ def seo_faqs(request):
 # ============ BACKLINKS VIEWS ============
 
 @login_required
+@replica_reads
 def seo_backlinks_dashboard(request):
     """Backlinks Dashboard - Overview of backlink profile and opportunities."""
-    tenant_qs = Tenant.objects.filter(tenantuser__user=request.user)
-    tenant = tenant_qs.first()
+    tenant = request.tenant
     if not tenant:
         return render(request, 'seo/no_tenant.html')
 
     sites = Site.objects.filter(tenant=tenant)
+    # One precomputed row per site instead of aggregating Backlink
+    profiles = BacklinkProfile.objects.filter(site__tenant=tenant).select_related('site').order_by('site__domain')
     return render(request, 'seo/backlinks_dashboard.html', {
         'tenant': tenant,
         'sites': sites,
+        'profiles': profiles,
     })
 
 
 @login_required
 def seo_backlinks_analysis(request):
     """Backlinks Analysis - Detailed analysis of backlinks for a site."""
-    tenant_qs = Tenant.objects.filter(tenantuser__user=request.user)
-    tenant = tenant_qs.first()
+    tenant = request.tenant
     if not tenant:
         return render(request, 'seo/no_tenant.html')
 
@@ -319,18 +597,28 @@ def seo_backlinks_analysis(request):
         site = get_object_or_404(Site, id=site_id, tenant=tenant)
     
     sites = Site.objects.filter(tenant=tenant)
-    return render(request, 'seo/backlinks_analysis.html', {
+    trend = []
+    lost_this_month = 0
+    if site:
+        trend = [
+            {'day': day.isoformat(), 'links': links, 'new': new, 'lost': lost}
+            for day, links, new, lost in backlink_snapshots.trend(site.pk, 90)
+        ]
+        month_ago = (timezone.localdate() - timedelta(days=30)).isoformat()
+        lost_this_month = sum(point['lost'] for point in trend if point['day'] > month_ago)
+    return render(request, 'seo/analysis.html', {
         'tenant': tenant,
         'site': site,
         'sites': sites,
+        'backlink_trend': trend,
+        'lost_this_month': lost_this_month,
     })
 
 
 @login_required
 def seo_backlinks_competitors(request):
     """Competitors - Compare backlinks with competitors."""
-    tenant_qs = Tenant.objects.filter(tenantuser__user=request.user)
-    tenant = tenant_qs.first()
+    tenant = request.tenant
     if not tenant:
         return render(request, 'seo/no_tenant.html')
 
@@ -340,18 +628,26 @@ def seo_backlinks_competitors(request):
         site = get_object_or_404(Site, id=site_id, tenant=tenant)
     
     sites = Site.objects.filter(tenant=tenant)
-    return render(request, 'seo/backlinks_competitors.html', {
+    gaps, gaps_pending = [], False
+    if site:
+        gaps_pending = not backlink_gap.gaps_built(site)
+        if gaps_pending:
+            backlink_gap.enqueue_rebuild(site)
+        else:
+            gaps = backlink_gap.site_gaps(site)[:50]
+    return render(request, 'seo/competitors.html', {
         'tenant': tenant,
         'site': site,
         'sites': sites,
+        'gaps': gaps,
+        'gaps_pending': gaps_pending,
     })
 
 
 @login_required
 def seo_backlinks_outreach(request):
     """Outreach - Manage link outreach and opportunities."""
-    tenant_qs = Tenant.objects.filter(tenantuser__user=request.user)
-    tenant = tenant_qs.first()
+    tenant = request.tenant
     if not tenant:
         return render(request, 'seo/no_tenant.html')
 
@@ -361,8 +657,20 @@ def seo_backlinks_outreach(request):
         site = get_object_or_404(Site, id=site_id, tenant=tenant)
     
     sites = Site.objects.filter(tenant=tenant)
-    return render(request, 'seo/backlinks_outreach.html', {
+    status_filter = request.GET.get('status') or ''
+    opportunities, next_cursor = [], None
+    if site:
+        try:
+            opportunities, next_cursor = opportunity_scoring.ranked(site, status=status_filter,
+                                                                    after=request.GET.get('after'))
+        except ValueError:
+            raise Http404('Invalid page cursor')
+    return render(request, 'seo/outreach.html', {
         'tenant': tenant,
         'site': site,
         'sites': sites,
+        'opportunities': opportunities,
+        'next_cursor': next_cursor,
+        'status_filter': status_filter,
+        'status_choices': LinkOpportunity.STATUS_CHOICES,
     })
@@ -2,6 +2,8 @@ from django.db import models
 from django.utils import timezone
 from django.conf import settings
 
+from tenants.managers import TenantScopedManager
+
 class SocialAccount(models.Model):
     PLATFORM_CHOICES = [
         ("x", "X / Twitter"),
@@ -19,6 +21,8 @@ class SocialAccount(models.Model):
     oauth_tokens = models.JSONField(default=dict)
     connected_at = models.DateTimeField(auto_now_add=True)
 
+    objects = TenantScopedManager()
+
     class Meta:
         unique_together = ['tenant', 'platform', 'handle']
 
@@ -81,6 +85,8 @@ class Post(models.Model):
     published_at = models.DateTimeField(blank=True, null=True)
     campaign_id = models.CharField(max_length=50, blank=True)
 
+    objects = TenantScopedManager()
+
     class Meta:
         ordering = ['-created_at']
 
@@ -99,6 +105,8 @@ class Engagement(models.Model):
     reach = models.IntegerField(default=0)
     timestamp = models.DateTimeField(default=timezone.now)
 
+    objects = TenantScopedManager('post__tenant')
+
     class Meta:
         ordering = ['-timestamp']
 
@@ -112,6 +120,8 @@ class Comment(models.Model):
     parent = models.ForeignKey('self', null=True, blank=True, on_delete=models.CASCADE)
     is_approved = models.BooleanField(default=True)
 
+    objects = TenantScopedManager('post__tenant')
+
     class Meta:
         ordering = ['-created_at']
 
@@ -126,6 +136,8 @@ class Conversation(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    objects = TenantScopedManager('participants')
+
     class Meta:
         ordering = ['-updated_at']
 
@@ -142,6 +154,8 @@ class Message(models.Model):
     sent_at = models.DateTimeField(auto_now_add=True)
     is_read = models.BooleanField(default=False)
 
+    objects = TenantScopedManager('conversation__participants')
+
     class Meta:
         ordering = ['sent_at']
 
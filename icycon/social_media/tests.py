@@ -1,3 +1,56 @@
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
 from django.test import TestCase
+from django.urls import reverse
 
-# Create your tests here.
+from icycon.testing import QueryBudgetTestMixin
+from tenants.models import Tenant, TenantUser
+from .models import Post, Engagement, Comment, Conversation, Message
+
+User = get_user_model()
+
+
+class PostViewSetQueryBudgetTests(QueryBudgetTestMixin, TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username='author', password='pass1234')
+        tenant = Tenant.objects.create(name='Acme', region='US')
+        TenantUser.objects.create(user=self.user, tenant=tenant, role='owner')
+        for i in range(10):
+            post = Post.objects.create(tenant=tenant, author=self.user, title=f'Post {i}', content='Body')
+            Engagement.objects.create(post=post, platform='x', likes=i)
+            for j in range(3):
+                commenter = User.objects.create_user(username=f'commenter-{i}-{j}')
+                Comment.objects.create(post=post, author=commenter, content='Nice')
+        self.client.force_login(self.user)
+
+    def test_list_with_nested_engagements_and_comments(self):
+        response = self.assertWithinQueryBudget(reverse('post-list'))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.json()), 10)
+        self.assertEqual(len(response.json()[0]['comments']), 3)
+
+
+class MultiTenantScopeTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username='author', password='pass1234')
+        self.acme = Tenant.objects.create(name='Acme', region='US')
+        self.beta = Tenant.objects.create(name='Beta', region='EU')
+        outsider = Tenant.objects.create(name='Other', region='UK')
+        for tenant in (self.acme, self.beta):
+            TenantUser.objects.create(user=self.user, tenant=tenant, role='owner')
+        for tenant in (self.acme, self.beta, outsider):
+            Post.objects.create(tenant=tenant, author=self.user, title=tenant.name, content='Body')
+        self.client.force_login(self.user)
+
+    def test_posts_of_every_membership(self):
+        response = self.client.get(reverse('post-list'))
+        self.assertEqual(sorted(post['title'] for post in response.json()), ['Acme', 'Beta'])
+
+    def test_shared_conversation_listed_once(self):
+        conversation = Conversation.objects.create(subject='Launch')
+        conversation.participants.set([self.acme, self.beta])
+        Message.objects.create(conversation=conversation, sender=self.acme, author=self.user, content='Hi')
+        self.assertEqual(len(self.client.get(reverse('conversation-list')).json()), 1)
+        self.assertEqual(len(self.client.get(reverse('message-list')).json()), 1)
@@ -1,6 +1,7 @@
 from rest_framework import viewsets, permissions, filters
 from rest_framework.decorators import action
 from rest_framework.response import Response
+from django.db.models import Prefetch
 from django.utils import timezone
 from .models import SocialAccount, Post, Engagement, Comment
 from .serializers import SocialAccountSerializer, PostSerializer, EngagementSerializer, CommentSerializer
@@ -9,28 +10,34 @@ from .serializers import ConversationSerializer, MessageSerializer
 from django.shortcuts import render, redirect
 from django.contrib.auth.decorators import login_required
 from django.contrib import messages
-from tenants.models import Tenant, TenantUser
+from tenants.models import Tenant
+from tenants.mixins import TenantScopedViewSetMixin
+from icycon.db_routers import ReplicaReadMixin
 from django.views.decorators.http import require_http_methods
 
-class SocialAccountViewSet(viewsets.ModelViewSet):
+class SocialAccountViewSet(TenantScopedViewSetMixin, viewsets.ModelViewSet):
+    # Social data spans every tenant the user belongs to, not just the primary one
+    all_tenants = True
+    queryset = SocialAccount.objects.all()
     serializer_class = SocialAccountSerializer
     permission_classes = [permissions.IsAuthenticated]
     filter_backends = [filters.SearchFilter]
     search_fields = ['handle', 'platform']
 
-    def get_queryset(self):
-        return SocialAccount.objects.filter(tenant__users=self.request.user)
-
-class PostViewSet(viewsets.ModelViewSet):
+class PostViewSet(TenantScopedViewSetMixin, viewsets.ModelViewSet):
+    all_tenants = True
+    # Nested engagements/comments (and their authors) are fetched in bulk
+    queryset = Post.objects.select_related('author').prefetch_related(
+        'engagements',
+        Prefetch('comments', queryset=Comment.objects.select_related('author')),
+    )
     serializer_class = PostSerializer
     permission_classes = [permissions.IsAuthenticated]
     filter_backends = [filters.SearchFilter, filters.OrderingFilter]
     search_fields = ['title', 'content', 'tags']
     ordering_fields = ['created_at', 'published_at', 'updated_at']
     ordering = ['-created_at']
-
-    def get_queryset(self):
-        return Post.objects.filter(tenant__tenantuser__user=self.request.user)
+    query_budget = 6
 
     def perform_create(self, serializer):
         serializer.save(author=self.request.user)
@@ -43,37 +50,28 @@ class PostViewSet(viewsets.ModelViewSet):
         post.save()
         return Response({'status': 'post published'})
 
-class CommentViewSet(viewsets.ModelViewSet):
+class CommentViewSet(TenantScopedViewSetMixin, viewsets.ModelViewSet):
+    all_tenants = True
+    queryset = Comment.objects.all()
     serializer_class = CommentSerializer
     permission_classes = [permissions.IsAuthenticated]
 
-    def get_queryset(self):
-        return Comment.objects.filter(post__tenant__users=self.request.user)
-
     def perform_create(self, serializer):
         serializer.save(author=self.request.user)
 
-class EngagementViewSet(viewsets.ReadOnlyModelViewSet):
+class EngagementViewSet(ReplicaReadMixin, TenantScopedViewSetMixin, viewsets.ReadOnlyModelViewSet):
+    all_tenants = True
+    queryset = Engagement.objects.all()
     serializer_class = EngagementSerializer
     permission_classes = [permissions.IsAuthenticated]
 
-    def get_queryset(self):
-        return Engagement.objects.filter(post__tenant__users=self.request.user)
-
 
-class ConversationViewSet(viewsets.ModelViewSet):
+class ConversationViewSet(TenantScopedViewSetMixin, viewsets.ModelViewSet):
+    all_tenants = True
+    queryset = Conversation.objects.all()
     serializer_class = ConversationSerializer
     permission_classes = [permissions.IsAuthenticated]
 
-    def get_tenants_for_user(self):
-        # Return queryset of Tenant instances the requesting user belongs to
-        from tenants.models import Tenant
-        return Tenant.objects.filter(tenantuser__user=self.request.user)
-
-    def get_queryset(self):
-        tenants = self.get_tenants_for_user()
-        return Conversation.objects.filter(participants__in=tenants).distinct()
-
     def perform_create(self, serializer):
         # Expect `participants` to be a list of tenant ids in the request data
         conversation = serializer.save()
@@ -83,18 +81,12 @@ class ConversationViewSet(viewsets.ModelViewSet):
         conversation.save()
 
 
-class MessageViewSet(viewsets.ModelViewSet):
+class MessageViewSet(TenantScopedViewSetMixin, viewsets.ModelViewSet):
+    all_tenants = True
+    queryset = Message.objects.all()
     serializer_class = MessageSerializer
     permission_classes = [permissions.IsAuthenticated]
 
-    def get_tenants_for_user(self):
-        from tenants.models import Tenant
-        return Tenant.objects.filter(tenantuser__user=self.request.user)
-
-    def get_queryset(self):
-        tenants = self.get_tenants_for_user()
-        return Message.objects.filter(conversation__participants__in=tenants).distinct()
-
     def perform_create(self, serializer):
         # Ensure the author is the current user
         serializer.save(author=self.request.user)
@@ -108,7 +100,7 @@ def create_post_view(request):
     Shows a simple form and creates a Post with the authenticated user as author.
     """
     # Get tenants the user belongs to
-    tenant_qs = Tenant.objects.filter(tenantuser__user=request.user)
+    tenant_qs = Tenant.objects.filter(id__in=request.tenant_membership.tenant_ids)
 
     if request.method == 'POST':
         tenant_id = request.POST.get('tenant')
@@ -147,8 +139,7 @@ def create_post_view(request):
 @login_required
 def social_channels_view(request):
     """Display connected social media channels for tenant's org promotion."""
-    tenant_qs = Tenant.objects.filter(tenantuser__user=request.user)
-    tenant = tenant_qs.first()
+    tenant = request.tenant
     if not tenant:
         return render(request, 'social_media/no_tenant.html')
     
@@ -168,8 +159,7 @@ def social_channels_view(request):
 @login_required
 def social_posts_view(request):
     """Display all posts for tenant's social media content."""
-    tenant_qs = Tenant.objects.filter(tenantuser__user=request.user)
-    tenant = tenant_qs.first()
+    tenant = request.tenant
     if not tenant:
         return render(request, 'social_media/no_tenant.html')
     
@@ -189,8 +179,7 @@ def social_posts_view(request):
 @login_required
 def conversations_view(request):
     """Display conversations/messages for org communication and promotion."""
-    tenant_qs = Tenant.objects.filter(tenantuser__user=request.user)
-    tenant = tenant_qs.first()
+    tenant = request.tenant
     if not tenant:
         return render(request, 'social_media/no_tenant.html')
     
@@ -205,8 +194,7 @@ def conversations_view(request):
 @login_required
 def conversation_detail_view(request, conversation_id):
     """Display messages within a specific conversation."""
-    tenant_qs = Tenant.objects.filter(tenantuser__user=request.user)
-    tenant = tenant_qs.first()
+    tenant = request.tenant
     if not tenant:
         return render(request, 'social_media/no_tenant.html')
     
@@ -233,8 +221,7 @@ def send_message_view(request, conversation_id):
     if request.method != 'POST':
         return redirect('social_media:conversations')
     
-    tenant_qs = Tenant.objects.filter(tenantuser__user=request.user)
-    tenant = tenant_qs.first()
+    tenant = request.tenant
     if not tenant:
         return redirect('social_media:conversations')
     
@@ -0,0 +1,74 @@
+from django.db import models
+
+
+class TenantScopedQuerySet(models.QuerySet):
+    """QuerySet that knows which lookup leads to the owning tenant."""
+
+    tenant_field = 'tenant'
+
+    def _clone(self):
+        clone = super()._clone()
+        clone.tenant_field = self.tenant_field
+        return clone
+
+    def for_tenant(self, tenant):
+        """Filter to rows owned by ``tenant`` (a Tenant instance or id).
+
+        Filtering on the id compiles to a plain ``tenant_id = X`` predicate for
+        direct foreign keys, so no join against tenants/tenant users and no
+        ``DISTINCT`` is needed.
+        """
+        if not tenant:
+            return self.none()
+        return self.filter(**{self.tenant_field: getattr(tenant, 'pk', tenant)})
+
+    def for_tenants(self, tenant_ids):
+        """Filter to rows owned by any of ``tenant_ids``.
+
+        A row reached through a many-valued relation (e.g. a conversation's
+        ``participants``) can match several of the ids, so the result is made
+        ``DISTINCT`` in that case only.
+        """
+        tenant_ids = list(tenant_ids)
+        if not tenant_ids:
+            return self.none()
+        queryset = self.filter(**{f'{self.tenant_field}__in': tenant_ids})
+        if len(tenant_ids) > 1 and self._tenant_path_is_multivalued():
+            queryset = queryset.distinct()
+        return queryset
+
+    def _tenant_path_is_multivalued(self):
+        opts = self.model._meta
+        for name in self.tenant_field.split('__'):
+            field = opts.get_field(name)
+            if field.many_to_many or field.one_to_many:
+                return True
+            opts = field.related_model._meta
+        return False
+
+
+class TenantScopedManager(models.Manager):
+    """Default manager for tenant-owned models.
+
+    ``tenant_field`` is the lookup path to the tenant, e.g. ``'tenant'`` for
+    models with a direct foreign key or ``'post__tenant'`` for children of a
+    tenant-owned model. Use ``TenantScopedManager.from_queryset(...)`` with a
+    ``TenantScopedQuerySet`` subclass to add queryset behaviour.
+    """
+
+    _queryset_class = TenantScopedQuerySet
+
+    def __init__(self, tenant_field='tenant'):
+        super().__init__()
+        self.tenant_field = tenant_field
+
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        queryset.tenant_field = self.tenant_field
+        return queryset
+
+    def for_tenant(self, tenant):
+        return self.get_queryset().for_tenant(tenant)
+
+    def for_tenants(self, tenant_ids):
+        return self.get_queryset().for_tenants(tenant_ids)
@@ -0,0 +1,77 @@
+"""
+Cached tenant membership lookups.
+
+Views used to resolve the current tenant with
+``Tenant.objects.filter(tenantuser__user=user).first()`` on every call. The
+helpers here keep a per-user membership entry in the shared cache instead, so
+the join runs once per user until a ``TenantUser`` (or ``Tenant``) row changes.
+"""
+
+from django.conf import settings
+from django.core.cache import cache
+
+from .models import TenantUser
+
+MEMBERSHIP_CACHE_TIMEOUT = getattr(settings, 'TENANT_MEMBERSHIP_CACHE_TIMEOUT', 300)
+
+
+def membership_cache_key(user_id):
+    return f"tenants:membership:{user_id}"
+
+
+class TenantMembership:
+    """Tenants a user belongs to.
+
+    ``tenant`` is the primary tenant, i.e. the one the views used to pick with
+    ``.first()`` (lowest tenant id); ``tenant_ids`` lists every membership and
+    ``role`` is the user's ``TenantUser.role`` in the primary tenant.
+    """
+
+    def __init__(self, tenant=None, tenant_ids=(), role=None):
+        self.tenant = tenant
+        self.tenant_ids = list(tenant_ids)
+        self.role = role
+
+    @property
+    def tenant_id(self):
+        return self.tenant.pk if self.tenant is not None else None
+
+
+def get_user_membership(user):
+    """Return the (cached) ``TenantMembership`` for ``user``."""
+    if not getattr(user, 'is_authenticated', False):
+        return TenantMembership()
+
+    key = membership_cache_key(user.pk)
+    cached = cache.get(key)
+    if cached is None:
+        memberships = list(
+            TenantUser.objects.filter(user_id=user.pk).select_related('tenant').order_by('tenant_id')
+        )
+        cached = {
+            'tenant': memberships[0].tenant if memberships else None,
+            'tenant_ids': [m.tenant_id for m in memberships],
+            'role': memberships[0].role if memberships else None,
+        }
+        cache.set(key, cached, MEMBERSHIP_CACHE_TIMEOUT)
+    return TenantMembership(**cached)
+
+
+def get_user_tenant(user):
+    """Primary tenant for ``user`` or None."""
+    return get_user_membership(user).tenant
+
+
+def get_user_tenant_ids(user):
+    """Ids of every tenant ``user`` belongs to, ordered by id."""
+    return get_user_membership(user).tenant_ids
+
+
+def invalidate_user_membership(user_id):
+    cache.delete(membership_cache_key(user_id))
+
+
+def invalidate_tenant_memberships(tenant_id):
+    """Drop cached memberships for every member of a tenant."""
+    user_ids = TenantUser.objects.filter(tenant_id=tenant_id).values_list('user_id', flat=True)
+    cache.delete_many([membership_cache_key(user_id) for user_id in user_ids])
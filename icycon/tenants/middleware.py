@@ -0,0 +1,29 @@
+from django.utils.functional import SimpleLazyObject
+
+from .membership import get_user_membership
+
+
+class TenantMiddleware:
+    """Resolve the current tenant once per request.
+
+    Sets ``request.tenant`` (the primary tenant) and
+    ``request.tenant_membership`` (a ``TenantMembership`` exposing
+    ``tenant_id`` and ``tenant_ids``). Both are lazy and read ``request.user``
+    when first accessed, so DRF views that authenticate inside the view still
+    see the right user.
+
+    Being a lazy proxy, ``request.tenant`` is never ``None`` itself; for a
+    user without a tenant it is falsy. Test ``not request.tenant`` or
+    ``request.tenant_membership.tenant_id is None``, never
+    ``request.tenant is None``.
+
+    Must be placed after ``AuthenticationMiddleware``.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        request.tenant_membership = SimpleLazyObject(lambda: get_user_membership(request.user))
+        request.tenant = SimpleLazyObject(lambda: request.tenant_membership.tenant)
+        return self.get_response(request)
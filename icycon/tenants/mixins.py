@@ -0,0 +1,18 @@
+class TenantScopedViewSetMixin:
+    """Limit a DRF viewset to the tenant(s) resolved by ``TenantMiddleware``.
+
+    The viewset's ``queryset`` must come from a ``TenantScopedManager``; the
+    mixin narrows it with ``for_tenant`` using the already-resolved tenant id,
+    so list endpoints filter on ``tenant_id = X`` instead of joining through
+    tenant users. Viewsets that show the rows of every tenant the user belongs
+    to set ``all_tenants = True`` and are narrowed with ``for_tenants``.
+    """
+
+    all_tenants = False
+
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        membership = self.request.tenant_membership
+        if self.all_tenants:
+            return queryset.for_tenants(membership.tenant_ids)
+        return queryset.for_tenant(membership.tenant_id)
@@ -0,0 +1,17 @@
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from .membership import invalidate_tenant_memberships, invalidate_user_membership
+from .models import Tenant, TenantUser
+
+
+@receiver([post_save, post_delete], sender=TenantUser)
+def tenant_user_changed(sender, instance, **kwargs):
+    invalidate_user_membership(instance.user_id)
+
+
+@receiver(post_save, sender=Tenant)
+def tenant_changed(sender, instance, created, **kwargs):
+    # Cached memberships hold the primary Tenant instance; refresh them on rename etc.
+    if not created:
+        invalidate_tenant_memberships(instance.pk)
@@ -1,3 +1,91 @@
-from django.test import TestCase
+from django.contrib.auth import get_user_model
+from django.contrib.auth.models import AnonymousUser
+from django.core.cache import cache
+from django.test import RequestFactory, TestCase
 
-# Create your tests here.
+from .membership import get_user_membership, membership_cache_key
+from .middleware import TenantMiddleware
+from .models import Tenant, TenantUser
+
+User = get_user_model()
+
+
+class TenantMiddlewareTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username='owner', password='pass1234')
+        self.tenant = Tenant.objects.create(name='Acme', region='US')
+        self.other = Tenant.objects.create(name='Beta', region='EU')
+        TenantUser.objects.create(user=self.user, tenant=self.other, role='viewer')
+        TenantUser.objects.create(user=self.user, tenant=self.tenant, role='owner')
+
+    def _process(self, user):
+        request = RequestFactory().get('/')
+        request.user = user
+        seen = {}
+
+        def view(request):
+            seen['request'] = request
+            return None
+
+        TenantMiddleware(view)(request)
+        return seen['request']
+
+    def test_primary_tenant_and_memberships(self):
+        request = self._process(self.user)
+        primary = min(self.tenant, self.other, key=lambda tenant: tenant.pk)
+        self.assertEqual(request.tenant.pk, primary.pk)
+        self.assertEqual(request.tenant_membership.tenant_id, primary.pk)
+        self.assertEqual(request.tenant_membership.tenant_ids, sorted([self.tenant.pk, self.other.pk]))
+
+    def test_resolved_lazily_from_the_user_at_access_time(self):
+        request = RequestFactory().get('/')
+        request.user = AnonymousUser()
+        TenantMiddleware(lambda request: None)(request)
+        # As DRF does when it authenticates inside the view
+        request.user = self.user
+        with self.assertNumQueries(1):
+            self.assertTrue(request.tenant)
+            self.assertIsNotNone(request.tenant_membership.tenant_id)
+
+    def test_user_without_tenant_is_falsy(self):
+        loner = User.objects.create_user(username='loner', password='pass1234')
+        for user in (loner, AnonymousUser()):
+            request = self._process(user)
+            self.assertFalse(request.tenant)
+            self.assertIsNone(request.tenant_membership.tenant_id)
+            self.assertEqual(request.tenant_membership.tenant_ids, [])
+
+    def test_membership_cached_across_requests(self):
+        self._process(self.user).tenant_membership.tenant_id
+        with self.assertNumQueries(0):
+            self.assertTrue(self._process(self.user).tenant)
+
+
+class MembershipInvalidationTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username='owner', password='pass1234')
+        self.tenant = Tenant.objects.create(name='Acme', region='US')
+
+    def test_new_membership_invalidates(self):
+        self.assertIsNone(get_user_membership(self.user).tenant)
+        TenantUser.objects.create(user=self.user, tenant=self.tenant, role='owner')
+        self.assertEqual(get_user_membership(self.user).tenant_id, self.tenant.pk)
+
+    def test_role_change_and_removal_invalidate(self):
+        member = TenantUser.objects.create(user=self.user, tenant=self.tenant, role='viewer')
+        self.assertEqual(get_user_membership(self.user).role, 'viewer')
+        member.role = 'admin'
+        member.save()
+        self.assertEqual(get_user_membership(self.user).role, 'admin')
+        member.delete()
+        self.assertIsNone(cache.get(membership_cache_key(self.user.pk)))
+        self.assertEqual(get_user_membership(self.user).tenant_ids, [])
+
+    def test_tenant_rename_invalidates_members(self):
+        TenantUser.objects.create(user=self.user, tenant=self.tenant, role='owner')
+        self.assertEqual(get_user_membership(self.user).tenant.name, 'Acme')
+        self.tenant.name = 'Acme Ltd'
+        self.tenant.save()
+        self.assertEqual(get_user_membership(self.user).tenant.name, 'Acme Ltd')